@@ -0,0 +1,305 @@
+"""Plan adherence, ported from ``frontend/src/lib/adherence.js``.
+
+The functions mirror ``computeDayAdherence``, ``computeWeekAdherence`` and
+``summarizePlanProgress`` field for field, including the JavaScript coercions (``Number()``
+on targets and order indexes, ``||`` defaults), so the API returns exactly what the client
+would compute; ``tests/test_adherence.py`` checks this against the JS module under node.
+Where the JS uses the browser's local time, these take an explicit ``tzinfo``.
+"""
+
+from __future__ import annotations
+
+import math
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import Any, Iterable, Optional
+
+DEFAULT_DAY_START_HOUR = 4
+MAX_SAFE_INTEGER = 2**53 - 1
+
+
+def _js_number(value: Any) -> float:
+    """``Number(value)`` for the JSON-shaped values plan rows hold."""
+    if value is None:
+        return 0.0
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return 0.0
+        try:
+            return float(text)
+        except ValueError:
+            return math.nan
+    return math.nan
+
+
+def _is_finite(value: float) -> bool:
+    return not math.isnan(value) and not math.isinf(value)
+
+
+def _int_if_whole(value: float) -> int | float:
+    return int(value) if value.is_integer() else value
+
+
+def normalize_set_type(value: Any) -> str:
+    return str(value or "working").strip() or "working"
+
+
+def normalize_day_start_hour(value: Any) -> int:
+    candidate = _js_number(value)
+    if not _is_finite(candidate):
+        return DEFAULT_DAY_START_HOUR
+    return min(23, max(0, math.floor(candidate)))
+
+
+def parse_day_key(value: Any) -> Optional[date]:
+    if not isinstance(value, str) or len(value.strip()) != 10:
+        return None
+    try:
+        return date.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+
+def effective_day_key(now: datetime, day_start_hour: Any = DEFAULT_DAY_START_HOUR, tz: Optional[tzinfo] = None) -> str:
+    """Training day ``now`` falls on: hours before ``day_start_hour`` count toward the previous day."""
+    local = now.astimezone(tz) if tz is not None else now
+    day = local.date()
+    if local.hour < normalize_day_start_hour(day_start_hour):
+        day -= timedelta(days=1)
+    return day.isoformat()
+
+
+def shift_day_key(day_key: str, delta_days: int) -> Optional[str]:
+    parsed = parse_day_key(day_key)
+    return (parsed + timedelta(days=delta_days)).isoformat() if parsed else None
+
+
+def weekday_for_day_key(day_key: str) -> Optional[int]:
+    """Weekday with Sunday as 0, like ``Date.getUTCDay()`` and ``plan_days.weekday``."""
+    parsed = parse_day_key(day_key)
+    return (parsed.weekday() + 1) % 7 if parsed else None
+
+
+def week_day_keys(anchor_day_key: str) -> list[str]:
+    """The Monday-to-Sunday day keys of the week containing ``anchor_day_key``."""
+    anchor_weekday = weekday_for_day_key(anchor_day_key)
+    monday_offset = 0 if anchor_weekday is None else (anchor_weekday + 6) % 7
+    monday = shift_day_key(anchor_day_key, -monday_offset)
+    return [shift_day_key(monday, index) for index in range(7)]
+
+
+def _window_for_day_key(day_key: str, day_start_hour: Any, tz: Optional[tzinfo]) -> Optional[tuple[datetime, datetime]]:
+    parsed = parse_day_key(day_key)
+    if not parsed:
+        return None
+    hour = normalize_day_start_hour(day_start_hour)
+    # A fixed 24 hours like the JS DAY_MS, not a calendar day, across DST changes.
+    start = datetime(parsed.year, parsed.month, parsed.day, hour, tzinfo=tz or timezone.utc).astimezone(timezone.utc)
+    return start, start + timedelta(hours=24)
+
+
+def _parse_timestamp(value: Any, tz: Optional[tzinfo]) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=tz or timezone.utc)
+
+
+def _ratio(completed_sets: int, planned_sets: int, touched_items: int, total_items: int) -> float:
+    # Set targets when the plan has any, otherwise the share of exercises touched.
+    if planned_sets > 0:
+        return completed_sets / planned_sets
+    return touched_items / total_items if total_items > 0 else 0
+
+
+def _match_key(machine_id: Any, set_type: Any) -> str:
+    return f"{machine_id or ''}::{normalize_set_type(set_type)}"
+
+
+def compute_day_adherence(
+    plan_items: Iterable[dict],
+    logged_sets: Iterable[dict],
+    day_key: Optional[str] = None,
+    day_start_hour: Any = DEFAULT_DAY_START_HOUR,
+    now: Optional[datetime] = None,
+    tz: Optional[tzinfo] = None,
+) -> dict[str, Any]:
+    target_day_key = day_key or effective_day_key(now or datetime.now(tz), day_start_hour, tz)
+    window = _window_for_day_key(target_day_key, day_start_hour, tz)
+    sets_in_window: list[dict] = []
+    if window:
+        for logged in logged_sets:
+            logged = logged or {}
+            if logged.get("training_date"):
+                if logged["training_date"] == target_day_key:
+                    sets_in_window.append(logged)
+                continue
+            logged_at = _parse_timestamp(logged.get("logged_at"), tz)
+            if logged_at and window[0] <= logged_at < window[1]:
+                sets_in_window.append(logged)
+
+    matched_set_counts: dict[str, int] = {}
+    for logged in sets_in_window:
+        key = _match_key(logged.get("machine_id"), logged.get("set_type"))
+        matched_set_counts[key] = matched_set_counts.get(key, 0) + 1
+
+    normalized_items = []
+    for index, item in enumerate(plan_items):
+        item = item or {}
+        planned_raw = _js_number(item.get("targetSets"))
+        # Number(null) is 0 but Number(undefined) is NaN, so a missing index sorts last.
+        order_raw = _js_number(item["orderIndex"]) if "orderIndex" in item else math.nan
+        normalized_items.append(
+            {
+                "id": item.get("id") or f"item-{index}",
+                "orderIndex": _int_if_whole(order_raw) if _is_finite(order_raw) else MAX_SAFE_INTEGER,
+                "machineId": item.get("equipmentId") or item.get("machine_id") or None,
+                "setType": normalize_set_type(item.get("targetSetType") or item.get("target_set_type")),
+                "plannedSets": math.floor(planned_raw) if _is_finite(planned_raw) and planned_raw > 0 else 0,
+                "raw": item,
+            }
+        )
+
+    grouped: dict[str, list[dict]] = {}
+    for item in normalized_items:
+        grouped.setdefault(_match_key(item["machineId"], item["setType"]), []).append(item)
+
+    allocated_by_item_id: dict[Any, int] = {}
+    for key, items_for_key in grouped.items():
+        remaining = matched_set_counts.get(key, 0)
+        # Code-point order stands in for localeCompare; they agree on uuid and item-N ids.
+        ordered = sorted(items_for_key, key=lambda item: (item["orderIndex"], str(item["id"])))
+        for item in ordered:
+            if item["plannedSets"] > 0:
+                allocated = min(item["plannedSets"], remaining)
+                allocated_by_item_id[item["id"]] = allocated
+                remaining -= allocated
+            else:
+                allocated_by_item_id[item["id"]] = 0
+        # Sets beyond every target go to open-ended items, one each in plan order.
+        for item in ordered:
+            if remaining <= 0:
+                break
+            if item["plannedSets"] > 0:
+                continue
+            allocated_by_item_id[item["id"]] = allocated_by_item_id.get(item["id"], 0) + 1
+            remaining -= 1
+
+    items = []
+    for item in normalized_items:
+        completed = allocated_by_item_id.get(item["id"], 0)
+        touched = completed > 0
+        planned = item["plannedSets"]
+        items.append(
+            {
+                **item["raw"],
+                "machineId": item["machineId"],
+                "targetSetType": item["setType"],
+                "plannedSets": planned,
+                "completedSets": completed,
+                "touched": touched,
+                "isComplete": completed >= planned if planned > 0 else touched,
+                "isPartial": planned > 0 and 0 < completed < planned,
+            }
+        )
+
+    planned_sets = sum(item["plannedSets"] for item in items if item["plannedSets"] > 0)
+    completed_sets = sum(min(item["completedSets"], item["plannedSets"]) for item in items if item["plannedSets"] > 0)
+    touched_items = sum(1 for item in items if item["touched"])
+    total_items = len(items)
+    return {
+        "dayKey": target_day_key,
+        "dayStartHour": normalize_day_start_hour(day_start_hour),
+        "plannedSets": planned_sets,
+        "completedSets": completed_sets,
+        "touchedItems": touched_items,
+        "completeItems": sum(1 for item in items if item["isComplete"]),
+        "partialItems": sum(1 for item in items if item["isPartial"]),
+        "totalItems": total_items,
+        "ratio": _ratio(completed_sets, planned_sets, touched_items, total_items),
+        "items": items,
+        "matchedSetCount": len(sets_in_window),
+    }
+
+
+def plan_day_by_weekday(plan_days: Iterable[dict]) -> dict[int, dict]:
+    by_weekday: dict[int, dict] = {}
+    for day in plan_days:
+        weekday = (day or {}).get("weekday")
+        if isinstance(weekday, bool) or not isinstance(weekday, (int, float)) or not float(weekday).is_integer():
+            continue
+        by_weekday[int(weekday)] = day
+    return by_weekday
+
+
+def plan_items_by_day_id(plan_items: Iterable[dict]) -> dict[Any, list[dict]]:
+    by_day: dict[Any, list[dict]] = {}
+    for item in plan_items:
+        key = (item or {}).get("planDayId") or (item or {}).get("plan_day_id")
+        if key:
+            by_day.setdefault(key, []).append(item)
+    return by_day
+
+
+def compute_plan_day(
+    day_key: str,
+    plan_day: Optional[dict],
+    day_items: list[dict],
+    logged_sets: Iterable[dict],
+    day_start_hour: Any = DEFAULT_DAY_START_HOUR,
+    tz: Optional[tzinfo] = None,
+) -> dict[str, Any]:
+    """One entry of ``computeWeekAdherence().days``."""
+    adherence = compute_day_adherence(day_items, logged_sets, day_key=day_key, day_start_hour=day_start_hour, tz=tz)
+    return {
+        "dayKey": day_key,
+        "weekday": weekday_for_day_key(day_key),
+        "planDayId": (plan_day or {}).get("id") or None,
+        "label": (plan_day or {}).get("label") or None,
+        **adherence,
+    }
+
+
+def compute_week_adherence(
+    plan_days: Iterable[dict] = (),
+    plan_items: Iterable[dict] = (),
+    logged_sets: Iterable[dict] = (),
+    day_start_hour: Any = DEFAULT_DAY_START_HOUR,
+    anchor: Optional[datetime] = None,
+    tz: Optional[tzinfo] = None,
+) -> dict[str, Any]:
+    anchor_day_key = effective_day_key(anchor or datetime.now(tz), day_start_hour, tz)
+    by_weekday = plan_day_by_weekday(plan_days)
+    items_by_day = plan_items_by_day_id(plan_items)
+    logged_sets = list(logged_sets)
+    days = []
+    for day_key in week_day_keys(anchor_day_key):
+        plan_day = by_weekday.get(weekday_for_day_key(day_key))
+        day_items = items_by_day.get(plan_day.get("id"), []) if plan_day else []
+        days.append(compute_plan_day(day_key, plan_day, day_items, logged_sets, day_start_hour, tz))
+    return summarize_plan_progress(days)
+
+
+def summarize_plan_progress(day_entries: Iterable[Optional[dict]]) -> dict[str, Any]:
+    days = [day for day in day_entries if day]
+    planned_sets = sum(day.get("plannedSets") or 0 for day in days)
+    completed_sets = sum(day.get("completedSets") or 0 for day in days)
+    planned_items = sum(day.get("totalItems") or 0 for day in days)
+    touched_items = sum(day.get("touchedItems") or 0 for day in days)
+    return {
+        "days": days,
+        "plannedSets": planned_sets,
+        "completedSets": completed_sets,
+        "plannedItems": planned_items,
+        "touchedItems": touched_items,
+        "partialItems": sum(day.get("partialItems") or 0 for day in days),
+        "ratio": _ratio(completed_sets, planned_sets, touched_items, planned_items),
+        "completionMode": "set_targets" if planned_sets > 0 else "exercise_touch",
+    }
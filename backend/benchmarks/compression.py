@@ -0,0 +1,160 @@
+"""Compression benchmark: bytes on the wire and codec latency for typical payloads.
+
+Builds representative request/response bodies (a client-assembled recommendation
+request, an identify-machine photo upload, a recommendation response and a CSV
+export page), then for each available coding reports compressed size, encode and
+decode time, and the estimated end-to-end transfer time over a slow mobile link.
+The last column runs the body through ``CompressionMiddleware`` in-process to
+include the middleware overhead.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.compression
+    python -m benchmarks.compression --uplink-kbps 750 --downlink-kbps 4000 --repeat 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import random
+import statistics
+import time
+from typing import Callable
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware, available_encodings, compress_bytes, decompress_body
+
+
+def _recommendation_request(sets: int = 600) -> bytes:
+    rng = random.Random(1)
+    buckets = []
+    for day in range(sets // 20):
+        buckets.append(
+            {
+                "training_bucket_id": f"training_day:2026-01-{day % 28 + 1:02d}",
+                "sets": [
+                    {
+                        "machine_id": f"00000000-0000-0000-0000-{rng.randrange(40):012d}",
+                        "machine_name": rng.choice(["Leg press", "Seated row", "Chest press", "Lat pulldown"]),
+                        "reps": rng.randint(5, 15),
+                        "weight": rng.choice([20, 22.5, 40, 55, 60, 80]),
+                        "set_type": "working",
+                        "logged_at": f"2026-01-{day % 28 + 1:02d}T{rng.randrange(6, 21):02d}:{rng.randrange(60):02d}:00+00:00",
+                    }
+                    for _ in range(20)
+                ],
+            }
+        )
+    return json.dumps({"scope": {"grouping": "training_day"}, "grouped_training": buckets}).encode()
+
+
+def _identify_request() -> bytes:
+    # JPEG bytes are already entropy-coded; random bytes are a fair stand-in.
+    photo = os.urandom(300 * 1024)
+    return json.dumps({"images": [base64.b64encode(photo).decode()]}).encode()
+
+
+def _recommendation_response() -> bytes:
+    evidence = [
+        {"claim": f"Volume on machine {index} increased week over week", "set_ids": [f"set-{index}-{n}" for n in range(6)]}
+        for index in range(40)
+    ]
+    return json.dumps({"summary": "Progress is steady across the scope. " * 20, "evidence": evidence}).encode()
+
+
+def _export_page(rows: int = 1000) -> bytes:
+    lines = ["id,machine_id,reps,weight,set_type,logged_at"]
+    for index in range(rows):
+        lines.append(f"set-{index},machine-{index % 40},{8 + index % 5},{40 + index % 9 * 2.5},working,2026-01-02T10:{index % 60:02d}:00Z")
+    return ("\n".join(lines) + "\n").encode()
+
+
+PAYLOADS: dict[str, tuple[str, Callable[[], bytes]]] = {
+    "recommendation_request": ("up", _recommendation_request),
+    "identify_request": ("up", _identify_request),
+    "recommendation_response": ("down", _recommendation_response),
+    "export_csv_page": ("down", _export_page),
+}
+
+
+def _median_ms(action: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _middleware_ms(body: bytes, encoding: str, repeat: int) -> float:
+    app = FastAPI()
+
+    @app.get("/payload")
+    async def payload(request: Request) -> Response:
+        return Response(body, media_type="application/json")
+
+    app.add_middleware(CompressionMiddleware, encodings=(encoding,))
+    client = TestClient(app)
+    return _median_ms(lambda: client.get("/payload", headers={"Accept-Encoding": encoding}), repeat)
+
+
+def run(uplink_kbps: float, downlink_kbps: float, repeat: int) -> list[dict]:
+    rows = []
+    for name, (direction, build) in PAYLOADS.items():
+        body = build()
+        link_kbps = uplink_kbps if direction == "up" else downlink_kbps
+        for encoding in ("identity", *available_encodings()):
+            if encoding == "identity":
+                wire, encode_ms, decode_ms = body, 0.0, 0.0
+            else:
+                wire = compress_bytes(body, encoding)
+                encode_ms = _median_ms(lambda: compress_bytes(body, encoding), repeat)
+                decode_ms = _median_ms(lambda: decompress_body(wire, encoding, len(body)), repeat)
+            transfer_ms = len(wire) * 8 / link_kbps
+            rows.append(
+                {
+                    "payload": name,
+                    "encoding": encoding,
+                    "bytes": len(wire),
+                    "ratio": round(len(body) / len(wire), 2),
+                    "encode_ms": round(encode_ms, 3),
+                    "decode_ms": round(decode_ms, 3),
+                    "transfer_ms": round(transfer_ms, 1),
+                    "total_ms": round(encode_ms + decode_ms + transfer_ms, 1),
+                    "middleware_ms": round(_middleware_ms(body, encoding, repeat), 3) if direction == "down" and encoding != "identity" else None,
+                }
+            )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uplink-kbps", type=float, default=1500, help="simulated client upload bandwidth")
+    parser.add_argument("--downlink-kbps", type=float, default=8000, help="simulated client download bandwidth")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print rows as JSON")
+    args = parser.parse_args()
+
+    rows = run(args.uplink_kbps, args.downlink_kbps, args.repeat)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    columns = ["payload", "encoding", "bytes", "ratio", "encode_ms", "decode_ms", "transfer_ms", "total_ms", "middleware_ms"]
+    print(" ".join(f"{column:>24}" if index == 0 else f"{column:>13}" for index, column in enumerate(columns)))
+    for row in rows:
+        print(
+            " ".join(
+                f"{str(row[column]):>24}" if index == 0 else f"{'-' if row[column] is None else row[column]:>13}"
+                for index, column in enumerate(columns)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
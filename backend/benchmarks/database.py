@@ -0,0 +1,742 @@
+"""Synthetic-data generator and database workload harness.
+
+Generates users with preferences, equipment with muscle profiles, weekly plans
+and years of sets, soreness reports and weekly trend reports with realistic
+timing (split sessions and late-night sets, so ``recompute_workout_clusters``
+sees gaps and day-boundary cases). The data is loaded into a local Postgres
+with ``supabase_schema.sql`` applied, through the real triggers. A timed
+read/write workload then runs per object, as ``authenticated`` with RLS where
+the app does, and the harness reports latency percentiles and EXPLAIN plans.
+
+Only ``psql`` is required; no Python database driver is needed.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.database --dsn postgresql://postgres@localhost:5432/postgres --apply-schema
+    python -m benchmarks.database --dsn "$DATABASE_URL" --users 20 --years 4 --iterations 50
+    python -m benchmarks.database --dsn "$DATABASE_URL" --skip-load --json > db-report.json
+    python -m benchmarks.database --users 5 --dump load.sql   # write the load script only
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Iterable
+from zoneinfo import ZoneInfo
+
+from benchmarks.endpoints import percentile
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+SCHEMA_PATH = REPO_ROOT / "supabase_schema.sql"
+SHIM_PATH = Path(__file__).parent / "local_supabase.sql"
+EMAIL_DOMAIN = "bench.invalid"
+SYNTHETIC_EMAIL_PATTERN = f"synthetic+%@{EMAIL_DOMAIN}"
+TIMEZONES = ("UTC", "Europe/Berlin", "America/New_York", "America/Los_Angeles", "Asia/Tokyo", "Australia/Sydney")
+SESSION_START_HOURS = (6, 7, 12, 17, 18, 19, 20)
+CLUSTER_GAP = timedelta(minutes=90)
+
+# name, movement, equipment_type, movement_pattern, primary group, secondary groups
+EQUIPMENT_CATALOG: tuple[tuple[str, str, str, str, str, tuple[str, ...]], ...] = (
+    ("Leg Press", "Leg Press", "machine", "squat", "Legs", ("Glutes",)),
+    ("Hack Squat", "Hack Squat", "machine", "squat", "Legs", ("Glutes",)),
+    ("Back Squat Rack", "Back Squat", "freeweight", "squat", "Legs", ("Glutes", "Core")),
+    ("Leg Extension", "Leg Extension", "machine", "isolation", "Legs", ()),
+    ("Seated Leg Curl", "Leg Curl", "machine", "isolation", "Hamstrings", ()),
+    ("Romanian Deadlift Bar", "Romanian Deadlift", "freeweight", "hip_hinge", "Hamstrings", ("Glutes", "Back")),
+    ("Hip Thrust Bench", "Hip Thrust", "freeweight", "hip_hinge", "Glutes", ("Hamstrings",)),
+    ("Walking Lunge Dumbbells", "Walking Lunge", "freeweight", "lunge", "Legs", ("Glutes",)),
+    ("Chest Press", "Chest Press", "machine", "horizontal_push", "Chest", ("Triceps", "Shoulders")),
+    ("Flat Bench", "Bench Press", "freeweight", "horizontal_push", "Chest", ("Triceps", "Shoulders")),
+    ("Incline Dumbbell Bench", "Incline Press", "freeweight", "horizontal_push", "Chest", ("Shoulders",)),
+    ("Pec Deck", "Chest Fly", "machine", "isolation", "Chest", ()),
+    ("Shoulder Press", "Shoulder Press", "machine", "vertical_push", "Shoulders", ("Triceps",)),
+    ("Lateral Raise Cable", "Lateral Raise", "cable", "isolation", "Shoulders", ()),
+    ("Lat Pulldown", "Lat Pulldown", "cable", "vertical_pull", "Back", ("Biceps",)),
+    ("Assisted Pull-up", "Pull-up", "machine", "vertical_pull", "Back", ("Biceps",)),
+    ("Seated Row", "Seated Row", "cable", "horizontal_pull", "Back", ("Biceps", "Shoulders")),
+    ("Chest-Supported Row", "Chest-Supported Row", "machine", "horizontal_pull", "Back", ("Biceps",)),
+    ("Biceps Curl Machine", "Biceps Curl", "machine", "isolation", "Biceps", ()),
+    ("Triceps Pushdown", "Triceps Pushdown", "cable", "isolation", "Triceps", ()),
+    ("Cable Crunch", "Cable Crunch", "cable", "rotation", "Core", ()),
+    ("Farmer Carry Handles", "Farmer Carry", "freeweight", "carry", "Core", ("Forearms",)),
+    ("Calf Raise", "Calf Raise", "machine", "isolation", "Calves", ()),
+    ("Back Extension", "Back Extension", "bodyweight", "hip_hinge", "Back", ("Glutes", "Hamstrings")),
+)
+
+
+@dataclass
+class SyntheticMachine:
+    id: str
+    name: str
+    movement: str
+    primary_group: str
+    groups: tuple[str, ...]
+    base_weight: float
+
+
+@dataclass
+class SyntheticUser:
+    id: str
+    email: str
+    timezone: str
+    day_start_hour: int
+    machines: list[SyntheticMachine] = field(default_factory=list)
+
+
+@dataclass
+class Dataset:
+    users: list[SyntheticUser] = field(default_factory=list)
+    # Table name -> (column list, rows). Order is load order.
+    tables: dict[str, tuple[tuple[str, ...], list[tuple[Any, ...]]]] = field(default_factory=dict)
+
+    def add(self, table: str, columns: tuple[str, ...], row: tuple[Any, ...]) -> None:
+        self.tables.setdefault(table, (columns, []))[1].append(row)
+
+    def rows(self, table: str) -> list[tuple[Any, ...]]:
+        return self.tables.get(table, ((), []))[1]
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def training_bucket(logged_at: datetime, tz: ZoneInfo, day_start_hour: int) -> date:
+    # Mirrors compute_set_grouping_fields: local wall time shifted back by the day-start hour.
+    return (logged_at.astimezone(tz).replace(tzinfo=None) - timedelta(hours=day_start_hour)).date()
+
+
+def _muscle_profile(primary: str, secondaries: Iterable[str], rng: random.Random) -> list[dict]:
+    profile = [{"group": primary, "role": "primary", "percent": 100}]
+    profile.extend({"group": group, "role": "secondary", "percent": rng.randint(20, 60)} for group in secondaries)
+    return profile
+
+
+def _training_block(
+    rng: random.Random, user: SyntheticUser, started: datetime, progress: float
+) -> list[tuple[SyntheticMachine, int, float, str, int, datetime]]:
+    """One continuous block of work: 4-6 exercises, 3-4 sets each, short rests."""
+    # The first few machines are the user's favourites and come up far more often.
+    weights = [4 if index < 5 else 1 for index in range(len(user.machines))]
+    exercise_count = min(rng.randint(4, 6), len(user.machines))
+    chosen: list[SyntheticMachine] = []
+    while len(chosen) < exercise_count:
+        machine = rng.choices(user.machines, weights=weights)[0]
+        if machine not in chosen:
+            chosen.append(machine)
+
+    rows = []
+    logged_at = started
+    for machine in chosen:
+        working_weight = round(machine.base_weight * (1 + 0.35 * progress) * rng.uniform(0.95, 1.05) / 2.5) * 2.5
+        for set_index in range(rng.randint(3, 4)):
+            rest = rng.randint(90, 240)
+            # Occasional long pause (phone, chat) that still stays inside the cluster gap.
+            if rng.random() < 0.03:
+                rest = rng.randint(1200, 2400)
+            logged_at += timedelta(seconds=rest)
+            set_type = "warmup" if set_index == 0 and rng.random() < 0.4 else "working"
+            weight = max(0.0, working_weight * (0.6 if set_type == "warmup" else 1.0))
+            rows.append((machine, rng.randint(6, 12), weight, set_type, rest, logged_at))
+        logged_at += timedelta(seconds=rng.randint(180, 420))
+    return rows
+
+
+def generate_dataset(users: int, years: float, seed: int = 42, end: datetime | None = None) -> Dataset:
+    rng = random.Random(seed)
+    end = end or datetime.now(timezone.utc)
+    days = int(years * 365)
+    dataset = Dataset()
+
+    for user_index in range(users):
+        user = SyntheticUser(
+            id=_uuid(rng),
+            email=f"synthetic+{user_index}@{EMAIL_DOMAIN}",
+            timezone=rng.choice(TIMEZONES),
+            day_start_hour=rng.randint(3, 5),
+        )
+        dataset.users.append(user)
+        tz = ZoneInfo(user.timezone)
+        dataset.add("auth.users", ("id", "email"), (user.id, user.email))
+        dataset.add(
+            "public.user_preferences",
+            ("user_id", "day_start_hour", "timezone"),
+            (user.id, user.day_start_hour, user.timezone),
+        )
+
+        joined = end - timedelta(days=days + 7)
+        for index, (name, movement, equipment_type, pattern, primary, secondaries) in enumerate(
+            rng.sample(EQUIPMENT_CATALOG, rng.randint(12, 20))
+        ):
+            machine = SyntheticMachine(
+                id=_uuid(rng),
+                name=name,
+                movement=movement,
+                primary_group=primary,
+                groups=(primary, *secondaries),
+                base_weight=rng.choice((20.0, 30.0, 40.0, 50.0, 60.0, 80.0)),
+            )
+            user.machines.append(machine)
+            dataset.add(
+                "public.machines",
+                ("id", "user_id", "name", "movement", "equipment_type", "movement_pattern", "muscle_profile", "created_at"),
+                (
+                    machine.id,
+                    user.id,
+                    name,
+                    movement,
+                    equipment_type,
+                    pattern,
+                    json.dumps(_muscle_profile(primary, secondaries, rng)),
+                    joined + timedelta(minutes=index),
+                ),
+            )
+
+        training_weekdays = sorted(rng.sample(range(7), rng.choice((3, 4, 4, 5))))
+        for plan_index in range(rng.randint(1, 2)):
+            plan_id = _uuid(rng)
+            dataset.add(
+                "public.plans",
+                ("id", "user_id", "name", "goal", "is_active", "created_at", "updated_at"),
+                (plan_id, user.id, f"Plan {plan_index + 1}", "hypertrophy", plan_index == 0, joined, joined),
+            )
+            for weekday in training_weekdays:
+                plan_day_id = _uuid(rng)
+                # plan_days.weekday follows JavaScript's Date#getDay (0 = Sunday).
+                dataset.add(
+                    "public.plan_days",
+                    ("id", "plan_id", "weekday", "label"),
+                    (plan_day_id, plan_id, (weekday + 1) % 7, f"Day {weekday + 1}"),
+                )
+                for order_index, machine in enumerate(rng.sample(user.machines, rng.randint(4, 6))):
+                    low = machine.base_weight
+                    dataset.add(
+                        "public.plan_items",
+                        (
+                            "id",
+                            "plan_day_id",
+                            "machine_id",
+                            "target_sets",
+                            "target_rep_range",
+                            "target_weight_range",
+                            "order_index",
+                        ),
+                        (_uuid(rng), plan_day_id, machine.id, 3, "[8,13)", f"[{low},{low * 1.25}]", order_index),
+                    )
+
+        start_hour = rng.choice(SESSION_START_HOURS)
+        soreness_seen: set[tuple[date, str]] = set()
+        trained_weeks: set[date] = set()
+        for day_offset in range(days, -1, -1):
+            local_day = (end - timedelta(days=day_offset)).astimezone(tz).date()
+            if local_day.weekday() not in training_weekdays or rng.random() > 0.8:
+                continue
+            if rng.random() < 0.08:
+                # Late session that runs past midnight but stays before the day-start hour.
+                started = datetime(local_day.year, local_day.month, local_day.day, 22, rng.randint(30, 59), tzinfo=tz)
+            else:
+                started = datetime(
+                    local_day.year, local_day.month, local_day.day, start_hour, rng.randint(0, 59), tzinfo=tz
+                ) + timedelta(minutes=rng.randint(-45, 45))
+            if started >= end:
+                continue
+
+            progress = 1 - day_offset / max(days, 1)
+            block = _training_block(rng, user, started, progress)
+            if rng.random() < 0.1:
+                # Split session: a second block well past the cluster gap on the same training day.
+                second_start = block[-1][5] + CLUSTER_GAP + timedelta(minutes=rng.randint(30, 180))
+                block += _training_block(rng, user, second_start, progress)
+
+            block = [row for row in block if row[5] < end]
+            if not block:
+                continue
+            for machine, reps, weight, set_type, rest, logged_at in block:
+                dataset.add(
+                    "public.sets",
+                    ("id", "user_id", "machine_id", "reps", "weight", "set_type", "rest_seconds", "logged_at"),
+                    (_uuid(rng), user.id, machine.id, reps, weight, set_type, rest, logged_at),
+                )
+
+            training_date = training_bucket(block[0][5], tz, user.day_start_hour)
+            trained_weeks.add(training_date - timedelta(days=training_date.weekday()))
+            if rng.random() < 0.35:
+                trained_groups = sorted({machine.primary_group for machine, *_ in block})
+                for group in rng.sample(trained_groups, min(len(trained_groups), rng.randint(1, 3))):
+                    if (training_date, group) in soreness_seen:
+                        continue
+                    soreness_seen.add((training_date, group))
+                    reported_at = block[-1][5] + timedelta(hours=rng.randint(18, 30))
+                    if reported_at >= end:
+                        continue
+                    dataset.add(
+                        "public.soreness_reports",
+                        ("user_id", "training_bucket_id", "muscle_group", "level", "reported_at"),
+                        (user.id, f"training_day:{training_date.isoformat()}", group, rng.randint(0, 4), reported_at),
+                    )
+
+        for week_start in sorted(trained_weeks):
+            created_at = datetime.combine(week_start + timedelta(days=7), datetime.min.time(), timezone.utc)
+            created_at += timedelta(hours=3, minutes=rng.randint(0, 59))
+            if created_at >= end:
+                continue
+            dataset.add(
+                "public.analysis_reports",
+                ("user_id", "report_type", "title", "summary", "payload", "metadata", "created_at"),
+                (
+                    user.id,
+                    "weekly_trend",
+                    "Weekly trend report",
+                    f"Week of {week_start.isoformat()}",
+                    json.dumps({"trend_points": [{"week_start": week_start.isoformat()}]}),
+                    json.dumps({"fingerprint": f"{rng.getrandbits(64):016x}", "source": "synthetic"}),
+                    created_at,
+                ),
+            )
+
+    return dataset
+
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_block(table: str, columns: tuple[str, ...], rows: list[tuple[Any, ...]]) -> str:
+    lines = [f"copy {table} ({', '.join(columns)}) from stdin;"]
+    lines.extend("\t".join(_copy_value(value) for value in row) for row in rows)
+    lines.append("\\.")
+    return "\n".join(lines) + "\n"
+
+
+def _synthetic_users_sql() -> str:
+    return f"select id from auth.users where email like '{SYNTHETIC_EMAIL_PATTERN}'"
+
+
+def load_phases(dataset: Dataset) -> list[tuple[str, int, str]]:
+    """(phase name, row count, psql script) in load order."""
+    tables = dataset.tables
+
+    def copies(*names: str) -> str:
+        return "".join(copy_block(name, *tables[name]) for name in names if name in tables)
+
+    reference_tables = (
+        "auth.users",
+        "public.user_preferences",
+        "public.machines",
+        "public.plans",
+        "public.plan_days",
+        "public.plan_items",
+    )
+    report_rows = dataset.rows("public.analysis_reports")
+    first_report = min((row[-1] for row in report_rows), default=None)
+    return [
+        (
+            # One transaction per user: the cascade through sets fires the per-training-day
+            # cluster recomputation, whose advisory locks would pile up across users.
+            "reset",
+            0,
+            "do $$\n"
+            "declare\n"
+            "  v_user uuid;\n"
+            "begin\n"
+            f"  for v_user in {_synthetic_users_sql()} loop\n"
+            "    delete from auth.users where id = v_user;\n"
+            "    commit;\n"
+            "  end loop;\n"
+            "end;\n"
+            "$$;\n",
+        ),
+        (
+            "reference",
+            sum(len(dataset.rows(name)) for name in reference_tables),
+            "begin;\n" + copies(*reference_tables) + "commit;\n",
+        ),
+        (
+            # Row-level cluster recomputation would redo each training day once per inserted set,
+            # so it is switched off for the bulk COPY and run once per day in the next phase.
+            # The statement-level summary/count triggers and the row-level grouping and
+            # ownership triggers stay on.
+            "sets",
+            len(dataset.rows("public.sets")),
+            "begin;\n"
+            "alter table public.sets disable trigger trg_sets_refresh_workout_clusters;\n"
+            + copies("public.sets")
+            + "alter table public.sets enable trigger trg_sets_refresh_workout_clusters;\n"
+            "commit;\n",
+        ),
+        (
+            "workout_clusters",
+            len(dataset.rows("public.sets")),
+            "select count(*) from (\n"
+            "  select public.recompute_workout_clusters(d.user_id, d.training_date)\n"
+            "  from (select distinct user_id, training_date from public.sets\n"
+            f"        where user_id in ({_synthetic_users_sql()})) d\n"
+            ") recomputed;\n",
+        ),
+        ("soreness_reports", len(dataset.rows("public.soreness_reports")), copies("public.soreness_reports")),
+        (
+            "analysis_reports",
+            len(report_rows),
+            (
+                f"select public.ensure_analysis_reports_partitions('{first_report.date().isoformat()}');\n"
+                if first_report
+                else ""
+            )
+            + copies("public.analysis_reports"),
+        ),
+        ("analyze", 0, "analyze;\n"),
+    ]
+
+
+@dataclass
+class Workload:
+    name: str
+    object: str
+    kind: str
+    # ``$1`` is the acting user's id. Runs as ``authenticated`` with that user's JWT
+    # claims (RLS on, like PostgREST) unless ``service`` is set.
+    sql: str
+    service: bool = False
+
+
+WORKLOADS: tuple[Workload, ...] = (
+    Workload("history_all", "sets", "read", "select * from public.sets order by logged_at"),
+    Workload(
+        "pending_soreness_window",
+        "sets",
+        "read",
+        "select training_bucket_id, training_date, logged_at, machine_id from public.sets "
+        "where user_id = $1 and logged_at >= now() - interval '3 days' and logged_at <= now() - interval '1 day' "
+        "order by logged_at",
+    ),
+    Workload(
+        "export_page",
+        "sets",
+        "read",
+        "select s.*, to_jsonb(m) as machine from public.sets s left join public.machines m on m.id = s.machine_id "
+        "where s.user_id = $1 order by s.logged_at desc, s.id desc limit 500",
+        service=True,
+    ),
+    Workload(
+        "reported_buckets",
+        "soreness_reports",
+        "read",
+        "select training_bucket_id from public.soreness_reports where training_bucket_id in ("
+        "select training_bucket_id from public.session_summaries order by training_date desc limit 3)",
+    ),
+    Workload("list", "machines", "read", "select * from public.machines order by created_at desc"),
+    Workload(
+        "favorites_30d",
+        "equipment_set_counts",
+        "read",
+        "select c.machine_id, c.sets_30d, c.sets_90d, c.sets_all, c.rank_30d, to_jsonb(m) as equipment "
+        "from public.equipment_set_counts c left join public.machines m on m.id = c.machine_id order by c.rank_30d",
+    ),
+    Workload("history", "session_summaries", "read", "select * from public.session_summaries order by training_date desc"),
+    Workload(
+        "today_suggestions",
+        "plans",
+        "read",
+        "select p.*, d.*, i.*, to_jsonb(m) as equipment from public.plans p "
+        "join public.plan_days d on d.plan_id = p.id "
+        "left join public.plan_items i on i.plan_day_id = d.id "
+        "left join public.machines m on m.id = i.machine_id "
+        "where p.is_active and d.weekday = extract(dow from now())::int "
+        "order by p.updated_at desc, i.order_index",
+    ),
+    Workload(
+        "latest_weekly_trend",
+        "analysis_reports",
+        "read",
+        "select id, metadata ->> 'fingerprint' as fingerprint from public.analysis_reports "
+        "where user_id = $1 and report_type = 'weekly_trend' order by created_at desc limit 1",
+        service=True,
+    ),
+    Workload(
+        "insert_single",
+        "sets",
+        "write",
+        "insert into public.sets (user_id, machine_id, reps, weight, set_type) "
+        "select $1, m.id, 10, 50, 'working' from public.machines m where m.user_id = $1 order by m.created_at limit 1",
+    ),
+    Workload(
+        "insert_workout_20",
+        "sets",
+        "write",
+        "insert into public.sets (user_id, machine_id, reps, weight, set_type, logged_at) "
+        "select $1, m.id, 10, 50, 'working', now() - make_interval(mins => g * 3) "
+        "from generate_series(1, 20) g cross join lateral ("
+        "select id from public.machines where user_id = $1 order by created_at offset g % 5 limit 1) m",
+    ),
+    Workload(
+        "update_weight",
+        "sets",
+        "write",
+        "update public.sets set weight = weight + 2.5 "
+        "where id = (select id from public.sets where user_id = $1 order by logged_at desc limit 1)",
+    ),
+    Workload(
+        "move_to_previous_day",
+        "sets",
+        "write",
+        "update public.sets set logged_at = logged_at - interval '1 day' "
+        "where id = (select id from public.sets where user_id = $1 order by logged_at desc limit 1)",
+    ),
+    Workload(
+        "delete_single",
+        "sets",
+        "write",
+        "delete from public.sets where id = (select id from public.sets where user_id = $1 order by logged_at desc limit 1)",
+    ),
+    Workload(
+        "toggle_secondary_group",
+        "machines",
+        "write",
+        "update public.machines set muscle_profile = case "
+        "when muscle_profile @> '[{\"group\": \"Forearms\"}]' then "
+        "(select jsonb_agg(entry) from jsonb_array_elements(muscle_profile) entry where entry ->> 'group' <> 'Forearms') "
+        "else muscle_profile || '[{\"group\": \"Forearms\", \"role\": \"secondary\", \"percent\": 30}]'::jsonb end "
+        "where id = (select id from public.machines where user_id = $1 order by created_at limit 1)",
+    ),
+    Workload(
+        "upsert_report",
+        "soreness_reports",
+        "write",
+        "insert into public.soreness_reports (user_id, training_bucket_id, muscle_group, level) "
+        "values ($1, 'training_day:' || current_date, 'Legs', 2) "
+        "on conflict (user_id, training_bucket_id, muscle_group) do update set level = excluded.level",
+    ),
+    Workload(
+        "recompute_latest_day",
+        "workout_clusters",
+        "write",
+        "select public.recompute_workout_clusters($1, "
+        "(select training_date from public.sets where user_id = $1 order by logged_at desc limit 1))",
+    ),
+    Workload(
+        "prune_batch",
+        "analysis_reports",
+        "write",
+        "select public.prune_analysis_reports(20, 12, 1000) where $1 is not null",
+        service=True,
+    ),
+)
+
+
+def _dollar_quote(sql: str) -> str:
+    if "$q$" in sql:
+        raise ValueError("workload SQL must not contain $q$")
+    return f"$q${sql}$q$"
+
+
+def workload_script(workloads: Iterable[Workload], iterations: int, warmup: int) -> str:
+    """One transaction that times every workload, prints the results as JSON and rolls back."""
+    blocks = [
+        "begin;",
+        "grant usage on schema public to authenticated;",
+        "grant select, insert, update, delete on all tables in schema public to authenticated;",
+        "create temporary table bench_results (name text, object text, kind text, samples_ms float8[], plan json)"
+        " on commit drop;",
+    ]
+    for workload in workloads:
+        query = _dollar_quote(workload.sql)
+        become_user = "" if workload.service else "perform set_config('role', 'authenticated', true);"
+        blocks.append(
+            f"""do $bench$
+declare
+  v_users uuid[] := array({_synthetic_users_sql()} order by id);
+  v_user uuid;
+  v_started timestamptz;
+  v_samples float8[] := '{{}}';
+  v_plan json;
+begin
+  if coalesce(cardinality(v_users), 0) = 0 then
+    raise exception 'no synthetic users loaded; run without --skip-load first';
+  end if;
+  for v_run in 0..{warmup + iterations} loop
+    v_user := v_users[1 + v_run % cardinality(v_users)];
+    perform set_config('request.jwt.claim.sub', v_user::text, true);
+    perform set_config('request.jwt.claims', json_build_object('sub', v_user, 'role', 'authenticated')::text, true);
+    {become_user}
+    v_started := clock_timestamp();
+    if v_run = {warmup + iterations} then
+      execute 'explain (analyze, buffers, format json) ' || {query} into v_plan using v_user;
+    else
+      execute {query} using v_user;
+    end if;
+    if v_run >= {warmup} and v_run < {warmup + iterations} then
+      v_samples := v_samples || (extract(epoch from clock_timestamp() - v_started) * 1000)::float8;
+    end if;
+    perform set_config('role', 'none', true);
+  end loop;
+  insert into bench_results values ({_sql_literal(workload.name)}, {_sql_literal(workload.object)}, {_sql_literal(workload.kind)}, v_samples, v_plan);
+end;
+$bench$;"""
+        )
+    blocks.append(
+        "select json_agg(json_build_object('name', name, 'object', object, 'kind', kind, "
+        "'samples_ms', samples_ms, 'plan', plan)) from bench_results;"
+    )
+    blocks.append("rollback;")
+    return "\n".join(blocks) + "\n"
+
+
+def _sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def run_psql(dsn: str | None, script: str) -> str:
+    psql = shutil.which("psql")
+    if not psql:
+        raise SystemExit("psql not found on PATH")
+    command = [psql, "-X", "-q", "-A", "-t", "-v", "ON_ERROR_STOP=1", "-f", "-"]
+    if dsn:
+        command.insert(1, dsn)
+    completed = subprocess.run(command, input=script, text=True, capture_output=True, check=False)
+    if completed.returncode != 0:
+        raise SystemExit(completed.stderr.strip() or f"psql exited with {completed.returncode}")
+    return completed.stdout
+
+
+def _plan_summary(plan: Any) -> dict[str, Any]:
+    if not plan:
+        return {}
+    root = plan[0]
+    top = root.get("Plan", {})
+    nodes: list[str] = []
+
+    def walk(node: dict) -> None:
+        label = node.get("Node Type", "?")
+        if node.get("Relation Name"):
+            label += f" on {node['Relation Name']}"
+        if node.get("Index Name"):
+            label += f" using {node['Index Name']}"
+        nodes.append(label)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(top)
+    scans = list(dict.fromkeys(label for label in nodes if "Scan" in label))
+    if len(scans) > 4:
+        # Partition-wise scans of analysis_reports would otherwise flood the table output.
+        scans = scans[:3] + [f"+{len(scans) - 3} more"]
+    return {
+        "execution_ms": round(root.get("Execution Time", 0.0), 3),
+        "planning_ms": round(root.get("Planning Time", 0.0), 3),
+        "rows": top.get("Actual Rows"),
+        "shared_hit_blocks": top.get("Shared Hit Blocks"),
+        "shared_read_blocks": top.get("Shared Read Blocks"),
+        "scans": scans,
+    }
+
+
+def summarize(results: list[dict]) -> list[dict]:
+    rows = []
+    for result in results:
+        ordered = sorted(result["samples_ms"] or [])
+        rows.append(
+            {
+                "object": result["object"],
+                "workload": result["name"],
+                "kind": result["kind"],
+                "runs": len(ordered),
+                "p50_ms": round(percentile(ordered, 50), 3),
+                "p95_ms": round(percentile(ordered, 95), 3),
+                "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+                "mean_ms": round(statistics.fmean(ordered), 3) if ordered else 0.0,
+                "plan": _plan_summary(result["plan"]),
+            }
+        )
+    return rows
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="libpq connection string (default: $DATABASE_URL / PG* env)")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--years", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=30, help="timed runs per workload")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--workloads", default="", help="comma-separated object or object.workload filters")
+    parser.add_argument("--apply-schema", action="store_true", help="apply local_supabase.sql and supabase_schema.sql first (destructive)")
+    parser.add_argument("--schema", type=Path, default=SCHEMA_PATH)
+    parser.add_argument("--skip-load", action="store_true", help="reuse previously loaded synthetic data")
+    parser.add_argument("--dump", type=Path, help="write the load script to this path and exit")
+    parser.add_argument("--json", action="store_true", help="print the full report (including plans) as JSON")
+    args = parser.parse_args()
+
+    load_report: list[dict] = []
+    if not args.skip_load:
+        started = time.perf_counter()
+        dataset = generate_dataset(args.users, args.years, args.seed)
+        print(
+            f"generated {len(dataset.rows('public.sets'))} sets for {args.users} users in "
+            f"{time.perf_counter() - started:.1f}s",
+            file=sys.stderr,
+        )
+        phases = load_phases(dataset)
+        if args.dump:
+            args.dump.write_text("\\set ON_ERROR_STOP on\n" + "".join(script for _, _, script in phases))
+            print(f"wrote {args.dump}", file=sys.stderr)
+            return
+
+    if args.apply_schema:
+        run_psql(args.dsn, SHIM_PATH.read_text() + args.schema.read_text())
+
+    if not args.skip_load:
+        for name, row_count, script in phases:
+            started = time.perf_counter()
+            run_psql(args.dsn, script)
+            seconds = time.perf_counter() - started
+            load_report.append(
+                {
+                    "phase": name,
+                    "rows": row_count,
+                    "seconds": round(seconds, 2),
+                    "rows_per_second": round(row_count / seconds) if row_count and seconds else None,
+                }
+            )
+            print(f"loaded {name}: {row_count} rows in {seconds:.1f}s", file=sys.stderr)
+
+    filters = {value.strip() for value in args.workloads.split(",") if value.strip()}
+    selected = [
+        workload
+        for workload in WORKLOADS
+        if not filters or workload.object in filters or f"{workload.object}.{workload.name}" in filters
+    ]
+    output = run_psql(args.dsn, workload_script(selected, args.iterations, args.warmup)).strip()
+    results = summarize(json.loads(output) if output else [])
+
+    if args.json:
+        print(json.dumps({"load": load_report, "workloads": results}, indent=2, default=str))
+        return
+    print(f"{'object':<22} {'workload':<26} {'kind':<6} {'p50_ms':>9} {'p95_ms':>9} {'max_ms':>9} {'plan_ms':>9}  scans")
+    for row in results:
+        plan = row["plan"]
+        print(
+            f"{row['object']:<22} {row['workload']:<26} {row['kind']:<6} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+            f"{row['max_ms']:>9} {plan.get('execution_ms', ''):>9}  {', '.join(plan.get('scans', []))}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
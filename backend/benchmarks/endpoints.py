@@ -0,0 +1,311 @@
+"""Endpoint throughput/latency benchmark.
+
+Runs the FastAPI app in-process against local Anthropic and PostgREST stubs and
+drives ``/api/recommendations``, ``/api/identify-machine`` and the weekly trend
+job at fixed concurrency levels.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.endpoints --concurrency 1,8,32 --requests 200
+    python -m benchmarks.endpoints --save-baseline benchmarks/baselines/endpoints.json
+    python -m benchmarks.endpoints --compare benchmarks/baselines/endpoints.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+import httpx
+import jwt
+
+from benchmarks.stubs import StubServer, create_anthropic_stub, create_postgrest_stub
+
+JWT_SECRET = "benchmark-jwt-secret"
+CRON_SECRET = "benchmark-cron-secret"
+BENCH_USER_ID = "00000000-0000-0000-0000-0000000000aa"
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "endpoints.json"
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    body: Callable[[], dict[str, Any]]
+    auth: str = "user"
+
+
+@dataclass
+class RunResult:
+    scenario: str
+    concurrency: int
+    latencies_ms: list[float] = field(default_factory=list)
+    errors: int = 0
+    wall_seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+
+    def summary(self) -> dict[str, Any]:
+        ordered = sorted(self.latencies_ms)
+        return {
+            "scenario": self.scenario,
+            "concurrency": self.concurrency,
+            "requests": len(ordered) + self.errors,
+            "errors": self.errors,
+            "p50_ms": round(percentile(ordered, 50), 2),
+            "p95_ms": round(percentile(ordered, 95), 2),
+            "p99_ms": round(percentile(ordered, 99), 2),
+            "mean_ms": round(statistics.fmean(ordered), 2) if ordered else 0.0,
+            "rps": round(len(ordered) / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+        }
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # ru_maxrss is reported in KiB on Linux and bytes on macOS.
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+
+
+def recommendation_body(bucket_count: int = 24, sets_per_bucket: int = 18) -> dict[str, Any]:
+    machine = {
+        "id": "machine-1",
+        "user_id": BENCH_USER_ID,
+        "name": "Seated Row",
+        "movement": "Horizontal Pull",
+        "equipment_type": "machine",
+        "muscle_groups": ["Back", "Biceps"],
+    }
+    grouped = [
+        {
+            "training_bucket_id": f"training_day:2026-01-{day + 1:02d}",
+            "training_date": f"2026-01-{day + 1:02d}",
+            "sets": [
+                {"machine_id": "machine-1", "reps": 10, "weight": 40 + index, "set_type": "working"}
+                for index in range(sets_per_bucket)
+            ],
+        }
+        for day in range(bucket_count)
+    ]
+    return {
+        "scope": {"grouping": "training_day", "included_set_types": ["working"], "goals": ["hypertrophy"]},
+        "scope_id": "11111111-1111-1111-1111-111111111111",
+        "grouped_training": grouped,
+        "equipment": {"machine-1": machine},
+        "soreness_data": [],
+    }
+
+
+def identify_body(image_bytes: int = 48_000) -> dict[str, Any]:
+    image = base64.b64encode(os.urandom(image_bytes)).decode()
+    return {"images": [{"data": image, "media_type": "image/jpeg"}], "enrich_with_web_search": False}
+
+
+SCENARIOS = {
+    "recommendations": Scenario("recommendations", "POST", "/api/recommendations", recommendation_body),
+    "identify": Scenario("identify", "POST", "/api/identify-machine", identify_body),
+    "weekly_job": Scenario("weekly_job", "POST", "/api/jobs/generate-weekly-trends", dict, auth="cron"),
+}
+
+
+def configure_environment(anthropic_url: str, postgrest_url: str) -> None:
+    # Settings are read once at import time, so this must run before importing main.
+    os.environ.update(
+        {
+            "ANTHROPIC_API_KEY": "sk-ant-benchmark",
+            "ANTHROPIC_API_URL": anthropic_url,
+            "SUPABASE_URL": postgrest_url,
+            "SUPABASE_SERVICE_ROLE_KEY": "benchmark-service-role",
+            "SUPABASE_JWT_SECRET": JWT_SECRET,
+            "CRON_SHARED_SECRET": CRON_SECRET,
+        }
+    )
+
+
+def auth_headers(scenario: Scenario, postgrest_url: str) -> dict[str, str]:
+    if scenario.auth == "cron":
+        return {"x-cron-secret": CRON_SECRET}
+    token = jwt.encode(
+        {"sub": BENCH_USER_ID, "exp": int(time.time()) + 3600, "iss": f"{postgrest_url}/auth/v1"},
+        JWT_SECRET,
+        algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    headers: dict[str, str],
+    concurrency: int,
+    total_requests: int,
+) -> RunResult:
+    result = RunResult(scenario=scenario.name, concurrency=concurrency)
+    body = json.dumps(scenario.body()).encode()
+    request_headers = {**headers, "Content-Type": "application/json"}
+    remaining = total_requests
+    peak_rss = current_rss_mb()
+    done = asyncio.Event()
+
+    async def sample_rss() -> None:
+        nonlocal peak_rss
+        while not done.is_set():
+            peak_rss = max(peak_rss, current_rss_mb())
+            await asyncio.sleep(0.05)
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await client.request(scenario.method, scenario.path, content=body, headers=request_headers)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if response.status_code >= 400:
+                result.errors += 1
+            else:
+                result.latencies_ms.append(elapsed_ms)
+
+    sampler = asyncio.create_task(sample_rss())
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.wall_seconds = time.perf_counter() - started
+    done.set()
+    await sampler
+    result.peak_rss_mb = max(peak_rss, current_rss_mb())
+    return result
+
+
+def compare_to_baseline(results: list[dict[str, Any]], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    regressions = []
+    for summary in results:
+        key = f"{summary['scenario']}@c{summary['concurrency']}"
+        expected = baseline.get("results", {}).get(key)
+        if not expected:
+            continue
+        if summary["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {summary['p95_ms']}ms vs baseline {expected['p95_ms']}ms")
+        if summary["rps"] < expected["rps"] * (1 - tolerance):
+            regressions.append(f"{key}: rps {summary['rps']} vs baseline {expected['rps']}")
+        if summary["errors"] > expected["errors"]:
+            regressions.append(f"{key}: errors {summary['errors']} vs baseline {expected['errors']}")
+    return regressions
+
+
+def print_table(results: list[dict[str, Any]]) -> None:
+    columns = ("scenario", "concurrency", "requests", "errors", "p50_ms", "p95_ms", "p99_ms", "rps", "peak_rss_mb")
+    print(" ".join(f"{column:>15}" for column in columns))
+    for summary in results:
+        print(" ".join(f"{summary[column]!s:>15}" for column in columns))
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    anthropic_stub = create_anthropic_stub(latency_ms=args.anthropic_latency_ms, jitter_ms=args.anthropic_jitter_ms)
+    postgrest_stub = create_postgrest_stub(
+        user_count=args.job_users,
+        sets_per_user=args.job_sets_per_user,
+        latency_ms=args.postgrest_latency_ms,
+    )
+    with StubServer(anthropic_stub) as anthropic, StubServer(postgrest_stub) as postgrest:
+        configure_environment(anthropic.url, postgrest.url)
+        import main
+
+        results: list[dict[str, Any]] = []
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name in args.scenarios:
+                scenario = SCENARIOS[name]
+                headers = auth_headers(scenario, postgrest.url)
+                total = args.job_requests if name == "weekly_job" else args.requests
+                await run_scenario(client, scenario, headers, concurrency=1, total_requests=args.warmup)
+                for concurrency in args.concurrency:
+                    result = await run_scenario(client, scenario, headers, concurrency, total)
+                    results.append(result.summary())
+        return results
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--job-requests", type=int, default=10, help="weekly job runs per concurrency level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--anthropic-latency-ms", type=float, default=200.0)
+    parser.add_argument("--anthropic-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--postgrest-latency-ms", type=float, default=5.0)
+    parser.add_argument("--job-users", type=int, default=20)
+    parser.add_argument("--job-sets-per-user", type=int, default=400)
+    parser.add_argument("--save-baseline", type=Path, nargs="?", const=DEFAULT_BASELINE)
+    parser.add_argument("--compare", type=Path, nargs="?", const=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression (0.15 = 15%%)")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline = {
+            "config": {
+                "anthropic_latency_ms": args.anthropic_latency_ms,
+                "postgrest_latency_ms": args.postgrest_latency_ms,
+                "requests": args.requests,
+                "job_requests": args.job_requests,
+                "job_users": args.job_users,
+                "python": sys.version.split()[0],
+            },
+            "results": {f"{r['scenario']}@c{r['concurrency']}": r for r in results},
+        }
+        args.save_baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.compare:
+        regressions = compare_to_baseline(results, json.loads(args.compare.read_text()), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
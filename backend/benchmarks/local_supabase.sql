@@ -0,0 +1,46 @@
+-- Minimal stand-ins for the Supabase-managed objects supabase_schema.sql expects, so the
+-- schema can be applied to a plain local Postgres for benchmarks/database.py.
+-- Every statement is a no-op when the real objects already exist (e.g. `supabase start`).
+
+do $$
+begin
+  if not exists (select 1 from pg_roles where rolname = 'anon') then
+    create role anon nologin;
+  end if;
+  if not exists (select 1 from pg_roles where rolname = 'authenticated') then
+    create role authenticated nologin;
+  end if;
+  if not exists (select 1 from pg_roles where rolname = 'service_role') then
+    create role service_role nologin bypassrls;
+  end if;
+end;
+$$;
+
+create schema if not exists auth;
+
+create table if not exists auth.users (
+  id uuid primary key,
+  email text,
+  created_at timestamptz not null default now()
+);
+
+do $$
+begin
+  if to_regprocedure('auth.uid()') is null then
+    -- Same lookup order as Supabase: the legacy per-claim setting, then the claims JSON.
+    create function auth.uid()
+    returns uuid
+    language sql
+    stable
+    as $fn$
+      select coalesce(
+        nullif(current_setting('request.jwt.claim.sub', true), ''),
+        (nullif(current_setting('request.jwt.claims', true), '')::jsonb ->> 'sub')
+      )::uuid
+    $fn$;
+  end if;
+end;
+$$;
+
+grant usage on schema auth to anon, authenticated, service_role;
+grant execute on function auth.uid() to anon, authenticated, service_role;
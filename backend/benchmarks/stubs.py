@@ -0,0 +1,177 @@
+"""In-process stub upstreams used by the benchmark harness.
+
+Both stubs are tiny FastAPI apps served by uvicorn on a background thread, so the
+API under test talks to them over real loopback HTTP exactly as it would talk to
+Anthropic and Supabase/PostgREST in production.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+IDENTIFY_RESPONSE = """{
+  "name": "Seated Cable Row",
+  "exerciseType": "Pull",
+  "movement": "Neutral-grip seated row",
+  "muscleGroups": ["Back", "Biceps"],
+  "variations": ["Single-arm row", "Wide-grip row"],
+  "defaultWeight": 40,
+  "defaultReps": 10,
+  "notes": "Keep the torso still and drive elbows back."
+}"""
+
+RECOMMENDATION_RESPONSE = """{
+  "summary": "Training volume is stable with consistent pulling work.",
+  "highlights": ["Consistent weekly frequency", "Progressive row loading"],
+  "suggestions": ["Add one vertical pull", "Extend rest on top sets"],
+  "nextSession": "Lower body emphasis",
+  "progressNotes": "Row volume up 8% over four weeks.",
+  "evidence": [
+    {
+      "claim": "Row volume increased.",
+      "metric": "total_volume",
+      "period": "last 4 weeks",
+      "delta": 8.0,
+      "source": {"grouping": "training_day", "included_set_types": ["working"], "sample_size": 24}
+    }
+  ]
+}"""
+
+
+def create_anthropic_stub(latency_ms: float = 0.0, jitter_ms: float = 0.0) -> FastAPI:
+    """Emulate ``POST /v1/messages`` with a configurable response latency."""
+    stub = FastAPI()
+
+    @stub.post("/v1/messages")
+    async def messages(request: Request) -> dict[str, Any]:
+        body = await request.json()
+        delay = latency_ms + (random.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        content = body["messages"][-1]["content"]
+        prompt = content if isinstance(content, str) else content[-1].get("text", "")
+        text = IDENTIFY_RESPONSE if "gym equipment expert" in prompt else RECOMMENDATION_RESPONSE
+        return {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": max(1, len(str(body)) // 4), "output_tokens": len(text) // 4},
+        }
+
+    return stub
+
+
+def _synthetic_sets(user_id: str, count: int) -> list[dict[str, Any]]:
+    start = date(2026, 1, 5)
+    rows = []
+    for index in range(count):
+        training_date = start - timedelta(days=index // 12)
+        rows.append(
+            {
+                "user_id": user_id,
+                "training_date": training_date.isoformat(),
+                "reps": 8 + index % 5,
+                "weight": 20 + (index % 9) * 5,
+                "set_type": "working",
+            }
+        )
+    return rows
+
+
+def create_postgrest_stub(user_count: int = 20, sets_per_user: int = 400, latency_ms: float = 0.0) -> FastAPI:
+    """Emulate the PostgREST routes the API uses against ``/rest/v1``."""
+    stub = FastAPI()
+    user_ids = [str(uuid.UUID(int=index + 1)) for index in range(user_count)]
+    sets_by_user = {user_id: _synthetic_sets(user_id, sets_per_user) for user_id in user_ids}
+
+    async def _delay() -> None:
+        if latency_ms > 0:
+            await asyncio.sleep(latency_ms / 1000)
+
+    @stub.get("/rest/v1/sets")
+    async def list_sets(request: Request) -> list[dict[str, Any]]:
+        await _delay()
+        params = request.query_params
+        limit = int(params.get("limit", "1000"))
+        offset = int(params.get("offset", "0"))
+        user_filter = params.get("user_id", "")
+        if user_filter.startswith("eq."):
+            rows = sets_by_user.get(user_filter[3:], [])
+        else:
+            rows = [{"user_id": user_id} for user_id in user_ids for _ in range(3)]
+        return rows[offset : offset + limit]
+
+    @stub.get("/rest/v1/recommendation_scopes")
+    async def list_scopes(request: Request) -> list[dict[str, Any]]:
+        await _delay()
+        scope_filter = request.query_params.get("id", "")
+        return [{"id": scope_filter[3:]}] if scope_filter.startswith("eq.") else []
+
+    # No previous weekly report, so every weekly job run writes (and measures) a fresh one.
+    @stub.get("/rest/v1/analysis_reports")
+    async def list_reports(request: Request) -> list[dict[str, Any]]:
+        await _delay()
+        return []
+
+    @stub.post("/rest/v1/analysis_reports")
+    async def insert_reports(request: Request) -> list[dict[str, Any]]:
+        await _delay()
+        rows = await request.json()
+        return [{"id": str(uuid.uuid4())} for _ in rows]
+
+    # Checkpoints are accepted but never returned, so repeated weekly job runs redo the full work.
+    @stub.get("/rest/v1/weekly_trend_job_checkpoints")
+    async def list_checkpoints(request: Request) -> list[dict[str, Any]]:
+        await _delay()
+        return []
+
+    @stub.post("/rest/v1/weekly_trend_job_checkpoints", status_code=201)
+    async def insert_checkpoints(request: Request) -> Response:
+        await _delay()
+        return Response(status_code=201)
+
+    return stub
+
+
+class StubServer:
+    """Run an ASGI app with uvicorn on an ephemeral loopback port in a daemon thread."""
+
+    def __init__(self, app: FastAPI) -> None:
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self.port = self._socket.getsockname()[1]
+        config = uvicorn.Config(app, log_level="warning", access_log=False, lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [self._socket]}, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Stub server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+        self._socket.close()
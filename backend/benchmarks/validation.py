@@ -0,0 +1,144 @@
+"""Recommendation payload validation benchmark.
+
+Measures the request-side work ``/api/recommendations`` does before the LLM call for a
+client-assembled payload: JSON decoding, ``RecommendationRequest`` validation,
+``normalize_recommendation_request`` and ``build_recommendation_prompt``. Each size is
+reported as median CPU time (``time.process_time``) and peak traced allocation
+(``tracemalloc``) per stage.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.validation
+    python -m benchmarks.validation --sets 1000,10000,50000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable
+
+os.environ.setdefault("ENV", "development")
+
+import main  # noqa: E402
+from schemas.api import RecommendationRequest  # noqa: E402
+
+SETS_PER_BUCKET = 20
+MACHINES = 40
+
+
+def build_payload(set_count: int) -> bytes:
+    rng = random.Random(set_count)
+    equipment = {
+        f"machine-{index}": {
+            "id": f"machine-{index}",
+            "user_id": "user-1",
+            "name": f"Station {index}",
+            "movement": rng.choice(["Leg press", "Seated row", "Chest press", "Lat pulldown"]),
+            "equipment_type": "machine",
+            "muscle_groups": ["Legs", "Glutes"],
+        }
+        for index in range(MACHINES)
+    }
+    buckets = []
+    for bucket_index in range(max(1, set_count // SETS_PER_BUCKET)):
+        day = f"2026-{bucket_index // 28 % 12 + 1:02d}-{bucket_index % 28 + 1:02d}"
+        buckets.append(
+            {
+                "training_bucket_id": f"training_day:{day}",
+                "training_date": day,
+                "sets": [
+                    {
+                        "id": f"set-{bucket_index}-{index}",
+                        "machine_id": f"machine-{rng.randrange(MACHINES)}",
+                        "machine_name": "Leg press",
+                        "reps": rng.randint(5, 15),
+                        "weight": rng.choice([20, 22.5, 40, 55, 60, 80]),
+                        "set_type": "working",
+                        "duration_seconds": rng.choice([None, 35, 40]),
+                        "rest_seconds": rng.choice([None, 90, 120]),
+                        "logged_at": f"{day}T10:{index:02d}:00+00:00",
+                    }
+                    for index in range(SETS_PER_BUCKET)
+                ],
+            }
+        )
+    return json.dumps(
+        {
+            "scope": {"grouping": "training_day", "included_set_types": ["working"], "goals": ["strength"]},
+            "scope_id": "scope-1",
+            "grouped_training": buckets,
+            "equipment": equipment,
+            "soreness_data": [{"training_bucket_id": buckets[0]["training_bucket_id"], "muscle_group": "Legs", "level": 2}],
+        }
+    ).encode()
+
+
+def _measure(action: Callable[[], Any], repeat: int) -> tuple[float, float]:
+    cpu_samples = []
+    for _ in range(repeat):
+        started = time.process_time()
+        action()
+        cpu_samples.append((time.process_time() - started) * 1000)
+    # tracemalloc slows allocation-heavy code down, so peak memory gets its own pass.
+    tracemalloc.start()
+    action()
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+    return statistics.median(cpu_samples), peak
+
+
+def run(set_counts: list[int], repeat: int) -> list[dict]:
+    rows = []
+    for set_count in set_counts:
+        body = build_payload(set_count)
+        data = json.loads(body)
+        request = RecommendationRequest.model_validate(data)
+        normalized = main.normalize_recommendation_request(request)
+
+        stages: dict[str, Callable[[], Any]] = {
+            "validate": lambda: RecommendationRequest.model_validate(data),
+            "normalize": lambda: main.normalize_recommendation_request(request),
+            "prompt_build": lambda: main.build_recommendation_prompt(*normalized, request.soreness_data),
+            "total": lambda: main.build_recommendation_prompt(
+                *main.normalize_recommendation_request(RecommendationRequest.model_validate(json.loads(body))),
+                request.soreness_data,
+            ),
+        }
+        for stage, action in stages.items():
+            cpu_ms, peak_mb = _measure(action, repeat)
+            rows.append(
+                {
+                    "sets": set_count,
+                    "payload_kb": round(len(body) / 1024, 1),
+                    "stage": stage,
+                    "cpu_ms": round(cpu_ms, 2),
+                    "peak_mb": round(peak_mb, 2),
+                }
+            )
+    return rows
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", default="1000,10000", help="comma-separated set counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print rows as JSON")
+    args = parser.parse_args()
+
+    rows = run([int(value) for value in args.sets.split(",")], args.repeat)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'sets':>8} {'payload_kb':>11} {'stage':>13} {'cpu_ms':>10} {'peak_mb':>9}")
+    for row in rows:
+        print(f"{row['sets']:>8} {row['payload_kb']:>11} {row['stage']:>13} {row['cpu_ms']:>10} {row['peak_mb']:>9}")
+
+
+if __name__ == "__main__":
+    main_cli()
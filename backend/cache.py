@@ -0,0 +1,407 @@
+"""Pluggable cache shared by auth, LLM-result and analytics code paths.
+
+Backends store opaque strings with a TTL:
+
+- ``MemoryCache``: per-process LRU, bounded by ``max_entries``.
+- ``SQLiteCache``: a WAL-mode SQLite file that every uvicorn worker on the host can
+  share; least-recently-used rows are evicted beyond ``max_entries``.
+- ``RedisCache``: a Redis server via ``redis.asyncio`` (optional dependency), shared
+  across instances; size eviction is left to the server's ``maxmemory-policy``.
+
+``Cache`` wraps a backend with a key namespace, JSON encoding and ``get_or_set``,
+which collapses concurrent misses for the same key into a single loader call
+(in-process single-flight plus a short-lived lock key for other workers).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from metrics import CACHE_REQUESTS
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - optional dependency
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+
+class CacheError(Exception):
+    pass
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Store ``value`` only if ``key`` is absent; return whether it was stored."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def delete_if(self, key: str, value: str) -> bool:
+        """Delete ``key`` only while it still holds ``value``; return whether it was deleted."""
+
+    async def close(self) -> None:
+        return None
+
+
+class MemoryCache(CacheBackend):
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Optional[float], str]] = OrderedDict()
+
+    def _live_entry(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._live_entry(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        if self._live_entry(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def delete_if(self, key: str, value: str) -> bool:
+        if self._live_entry(key) != value:
+            return False
+        del self._entries[key]
+        return True
+
+
+class SQLiteCache(CacheBackend):
+    def __init__(self, path: str, max_entries: int = 10_000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+        conn.execute("pragma journal_mode=wal")
+        conn.execute("pragma synchronous=normal")
+        conn.execute(
+            "create table if not exists cache_entries ("
+            " key text primary key, value text not null, expires_at real, accessed_at real not null)"
+        )
+        conn.execute("create index if not exists idx_cache_entries_accessed on cache_entries(accessed_at)")
+        return conn
+
+    def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            return fn(self._conn)
+
+    def _get(self, conn: sqlite3.Connection, key: str) -> Optional[str]:
+        now = time.time()
+        row = conn.execute(
+            "select value from cache_entries where key = ? and (expires_at is null or expires_at > ?)",
+            (key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("update cache_entries set accessed_at = ? where key = ?", (now, key))
+        return row[0]
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        now = time.time()
+        conn.execute("delete from cache_entries where expires_at is not null and expires_at <= ?", (now,))
+        (count,) = conn.execute("select count(*) from cache_entries").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "delete from cache_entries where key in ("
+                " select key from cache_entries order by accessed_at asc limit ?)",
+                (count - self.max_entries,),
+            )
+
+    def _set(self, conn: sqlite3.Connection, key: str, value: str, ttl: Optional[float]) -> None:
+        now = time.time()
+        conn.execute(
+            "insert into cache_entries(key, value, expires_at, accessed_at) values (?, ?, ?, ?)"
+            " on conflict(key) do update set value = excluded.value, expires_at = excluded.expires_at,"
+            " accessed_at = excluded.accessed_at",
+            (key, value, now + ttl if ttl else None, now),
+        )
+        self._evict(conn)
+
+    def _add(self, conn: sqlite3.Connection, key: str, value: str, ttl: Optional[float]) -> bool:
+        now = time.time()
+        conn.execute("begin immediate")
+        try:
+            conn.execute(
+                "delete from cache_entries where key = ? and expires_at is not null and expires_at <= ?",
+                (key, now),
+            )
+            cursor = conn.execute(
+                "insert or ignore into cache_entries(key, value, expires_at, accessed_at) values (?, ?, ?, ?)",
+                (key, value, now + ttl if ttl else None, now),
+            )
+            conn.execute("commit")
+        except Exception:
+            conn.execute("rollback")
+            raise
+        return cursor.rowcount == 1
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._run, lambda conn: self._get(conn, key))
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(self._run, lambda conn: self._set(conn, key, value, ttl))
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return await asyncio.to_thread(self._run, lambda conn: self._add(conn, key, value, ttl))
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._run, lambda conn: conn.execute("delete from cache_entries where key = ?", (key,)))
+
+    async def delete_if(self, key: str, value: str) -> bool:
+        cursor = await asyncio.to_thread(
+            self._run,
+            lambda conn: conn.execute(
+                "delete from cache_entries where key = ? and value = ? and (expires_at is null or expires_at > ?)",
+                (key, value, time.time()),
+            ),
+        )
+        return cursor.rowcount == 1
+
+    async def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# GET and DEL run atomically inside the script, so another client's value is never deleted.
+REDIS_DELETE_IF_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+  return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCache(CacheBackend):
+    """``redis.asyncio`` client; its pool bounds connections per process."""
+
+    def __init__(self, url: str, max_connections: int = 10, timeout: float = 2.0) -> None:
+        if redis_asyncio is None:
+            raise CacheError("The redis cache backend requires the redis package")
+        self._client = redis_asyncio.from_url(
+            url,
+            max_connections=max_connections,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+            decode_responses=True,
+            # RESP2 is all GET/SET/DEL need, and every Redis-compatible server speaks it.
+            protocol=2,
+        )
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._client.set(key, value, px=max(1, int(ttl * 1000)) if ttl else None)
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(await self._client.set(key, value, nx=True, px=max(1, int(ttl * 1000)) if ttl else None))
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(key)
+
+    async def delete_if(self, key: str, value: str) -> bool:
+        return bool(await self._client.eval(REDIS_DELETE_IF_SCRIPT, 1, key, value))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_cache_backend(kind: str, url: Optional[str] = None, max_entries: int = 10_000) -> CacheBackend:
+    if kind == "memory":
+        return MemoryCache(max_entries=max_entries)
+    if kind == "sqlite":
+        return SQLiteCache(url or "gym-tracker-cache.sqlite3", max_entries=max_entries)
+    if kind == "redis":
+        if not url:
+            raise CacheError("CACHE_URL is required for the redis cache backend")
+        return RedisCache(url)
+    raise CacheError(f"Unknown cache backend: {kind}")
+
+
+class Cache:
+    """JSON-valued, namespaced view over a backend with stampede-protected ``get_or_set``."""
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        namespace: str,
+        key_prefix: str = "",
+        lock_ttl: float = 30.0,
+        lock_wait: float = 10.0,
+    ) -> None:
+        self.backend = backend
+        self.namespace = namespace
+        self.key_prefix = key_prefix
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _key(self, key: str) -> str:
+        return f"{self.key_prefix}{self.namespace}:{key}"
+
+    async def _read(self, full_key: str) -> tuple[bool, Any]:
+        try:
+            raw = await self.backend.get(full_key)
+        except Exception:
+            # A broken shared cache must degrade to recomputation, never to request failures.
+            logger.warning("Cache read failed: namespace=%s", self.namespace, exc_info=True)
+            return False, None
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)["v"]
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        found, value = await self._read(self._key(key))
+        CACHE_REQUESTS.labels(self.namespace, "hit" if found else "miss").inc()
+        return value if found else default
+
+    async def lookup(self, key: str) -> tuple[bool, Any]:
+        """``(found, value)`` like ``get``, but backend errors propagate so callers can tell an outage from a miss."""
+        raw = await self.backend.get(self._key(key))
+        CACHE_REQUESTS.labels(self.namespace, "miss" if raw is None else "hit").inc()
+        return (False, None) if raw is None else (True, json.loads(raw)["v"])
+
+    async def _write(self, full_key: str, value: Any, ttl: Optional[float]) -> None:
+        try:
+            await self.backend.set(full_key, json.dumps({"v": value}), ttl)
+        except Exception:
+            logger.warning("Cache write failed: namespace=%s", self.namespace, exc_info=True)
+
+    async def _remove(self, full_key: str) -> None:
+        try:
+            await self.backend.delete(full_key)
+        except Exception:
+            logger.warning("Cache delete failed: namespace=%s", self.namespace, exc_info=True)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._write(self._key(key), value, ttl)
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return await self.backend.add(self._key(key), json.dumps({"v": value}), ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._remove(self._key(key))
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        full_key = self._key(key)
+        found, value = await self._read(full_key)
+        if found:
+            CACHE_REQUESTS.labels(self.namespace, "hit").inc()
+            return value
+        CACHE_REQUESTS.labels(self.namespace, "miss").inc()
+
+        inflight = self._inflight.get(full_key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await self._load_with_lock(full_key, loader, ttl)
+        except BaseException as exc:
+            if not future.done():
+                future.set_exception(exc)
+                # Mark the exception retrieved when nobody else was waiting on it.
+                future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(full_key, None)
+
+    async def _release(self, lock_key: str, token: str) -> None:
+        # A loader that outlived lock_ttl may find the lock taken over by another worker; keep theirs.
+        try:
+            await self.backend.delete_if(lock_key, token)
+        except Exception:
+            logger.warning("Cache lock release failed: namespace=%s", self.namespace, exc_info=True)
+
+    async def _held(self, lock_key: str) -> bool:
+        try:
+            return await self.backend.get(lock_key) is not None
+        except Exception:
+            # Same as a failed value read: stop waiting and load.
+            return False
+
+    async def _load_with_lock(self, full_key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        lock_key = f"{full_key}:lock"
+        token = secrets.token_hex(8)
+        locked_elsewhere = False
+        try:
+            acquired = await self.backend.add(lock_key, token, self.lock_ttl)
+            locked_elsewhere = not acquired
+        except Exception:
+            logger.warning("Cache lock failed: namespace=%s", self.namespace, exc_info=True)
+            acquired = False
+
+        if locked_elsewhere:
+            # Another worker is loading this key; wait for its result before loading ourselves.
+            # A released lock without a value means that loader failed, so stop waiting then.
+            deadline = time.monotonic() + self.lock_wait
+            delay = 0.05
+            while time.monotonic() < deadline:
+                await asyncio.sleep(delay)
+                released = not await self._held(lock_key)
+                found, value = await self._read(full_key)
+                if found:
+                    return value
+                if released:
+                    break
+                delay = min(delay * 2, 0.5)
+
+        try:
+            value = await loader()
+            await self._write(full_key, value, ttl)
+            return value
+        finally:
+            if acquired:
+                await self._release(lock_key, token)
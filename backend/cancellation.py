@@ -0,0 +1,90 @@
+"""Stop request work that no client is waiting for any more.
+
+Starlette keeps running an endpoint after the client hangs up, so a request the browser has
+already aborted still waits on Anthropic and then persists a report nobody reads.
+``run_cancellable`` runs the endpoint work next to a watcher on the ASGI receive channel. It
+cancels the work, including any in-flight upstream call and the persistence that would
+follow, in two cases:
+
+* the server sees ``http.disconnect``; the response is 499, which only metrics and logs see;
+* the client's ``X-Request-Deadline`` budget runs out; the response is 504.
+
+``X-Request-Deadline`` is the number of milliseconds the client will wait, measured from
+when the server receives the request. A relative budget avoids clock skew between the
+browser and the server.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from metrics import REQUEST_CANCELLATIONS
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DEADLINE_HEADER = "X-Request-Deadline"
+# Non-standard (nginx) status for "client closed request"; only metrics and logs ever see it.
+CLIENT_CLOSED_REQUEST_STATUS = 499
+
+
+def parse_request_deadline(value: Optional[str]) -> Optional[float]:
+    """Return the client's remaining budget in seconds, or None when no deadline was sent."""
+    if value is None:
+        return None
+    try:
+        milliseconds = int(value)
+    except ValueError:
+        milliseconds = -1
+    if milliseconds < 0:
+        raise HTTPException(400, f"Invalid {REQUEST_DEADLINE_HEADER} header")
+    return milliseconds / 1000
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body has already been read for the endpoint's DTO, so the next message is the disconnect.
+    try:
+        while True:
+            message = await request.receive()
+            if message["type"] == "http.disconnect":
+                return
+    except Exception:
+        # A broken receive channel says nothing about the client; keep waiting on the work alone.
+        logger.debug("Receive channel failed; client disconnects will not be detected", exc_info=True)
+        await asyncio.Event().wait()
+
+
+async def run_cancellable(
+    request: Request,
+    route: str,
+    handler: Callable[[], Awaitable[Any]],
+    deadline: Optional[str] = None,
+) -> Any:
+    timeout = parse_request_deadline(deadline)
+    work = asyncio.create_task(handler())
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({work, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+
+    if work in done:
+        return work.result()
+
+    work.cancel()
+    with contextlib.suppress(asyncio.CancelledError, Exception):
+        await work
+    reason = "client_disconnected" if watcher in done else "deadline_exceeded"
+    REQUEST_CANCELLATIONS.labels(route, reason).inc()
+    logger.info("Cancelled request work: route=%s reason=%s", route, reason)
+    if reason == "client_disconnected":
+        return Response(status_code=CLIENT_CLOSED_REQUEST_STATUS)
+    raise HTTPException(504, "Request deadline exceeded")
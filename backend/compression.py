@@ -0,0 +1,313 @@
+"""Request body decompression and negotiated response compression.
+
+``CompressionMiddleware`` is a pure ASGI middleware that
+
+- decodes ``Content-Encoding: gzip | zstd | br`` request bodies before FastAPI parses
+  them, rejecting bodies that inflate beyond ``max_decompressed_bytes`` (413) or use
+  an unsupported coding (415);
+- compresses responses with the best coding the client accepts, once the body reaches
+  ``minimum_size`` bytes. Streaming responses are compressed chunk by chunk and
+  flushed so NDJSON/CSV exports still arrive incrementally.
+
+``zstd`` and ``br`` need the optional ``zstandard`` / ``brotli`` packages; without
+them only gzip is offered.
+"""
+
+from __future__ import annotations
+
+import json
+import zlib
+from typing import Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+BROTLI_QUALITY = 4
+BROTLI_INPUT_SLICE = 1024
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/csv",
+    "text/plain",
+    "text/html",
+)
+
+
+def available_encodings() -> tuple[str, ...]:
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+class RequestBodyTooLarge(Exception):
+    pass
+
+
+class UnsupportedEncoding(Exception):
+    pass
+
+
+def decompress_body(body: bytes, encoding: str, limit: int) -> bytes:
+    """Decode ``body``, raising ``RequestBodyTooLarge`` once output would exceed ``limit`` bytes."""
+    if encoding in {"gzip", "x-gzip"}:
+        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        try:
+            output = decompressor.decompress(body, limit + 1)
+        except zlib.error as exc:
+            raise ValueError("Malformed gzip body") from exc
+        if len(output) > limit or decompressor.unconsumed_tail:
+            raise RequestBodyTooLarge()
+        if not decompressor.eof:
+            raise ValueError("Malformed gzip body")
+        return output
+    if encoding == "zstd" and zstandard is not None:
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                output = reader.read(limit + 1)
+        except zstandard.ZstdError as exc:
+            raise ValueError("Malformed zstd body") from exc
+        if len(output) > limit:
+            raise RequestBodyTooLarge()
+        return output
+    if encoding == "br" and brotli is not None:
+        decompressor = brotli.Decompressor()
+        chunks: list[bytes] = []
+        size = 0
+        try:
+            # Feeding small input slices bounds how far one call can inflate past the limit.
+            for start in range(0, len(body), BROTLI_INPUT_SLICE):
+                chunk = decompressor.process(body[start : start + BROTLI_INPUT_SLICE])
+                size += len(chunk)
+                if size > limit:
+                    raise RequestBodyTooLarge()
+                chunks.append(chunk)
+        except brotli.error as exc:
+            raise ValueError("Malformed brotli body") from exc
+        if not decompressor.is_finished():
+            raise ValueError("Truncated brotli body")
+        return b"".join(chunks)
+    raise UnsupportedEncoding(encoding)
+
+
+def negotiate_encoding(accept_encoding: str, supported: Iterable[str]) -> Optional[str]:
+    """Pick the server-preferred coding among those the client accepts with q > 0."""
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    wildcard = accepted.get("*")
+    for encoding in supported:
+        quality = accepted.get(encoding, wildcard)
+        if quality:
+            return encoding
+    return None
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "zstd":
+            return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    compressor = _StreamCompressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+async def _send_error(send: Send, status_code: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        encodings: Iterable[str] = ("zstd", "br", "gzip"),
+        max_decompressed_bytes: int = 20 * 1024 * 1024,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.max_decompressed_bytes = max_decompressed_bytes
+        supported = set(available_encodings())
+        self.encodings = tuple(encoding for encoding in encodings if encoding in supported)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "").strip().lower()
+        if content_encoding and content_encoding != "identity":
+            receive = await self._decoded_receive(receive, content_encoding, send)
+            if receive is None:
+                return
+            # Rewritten in place: outer middleware reads keys the router adds (e.g. "route").
+            scope["headers"] = [
+                (key, value)
+                for key, value in scope["headers"]
+                if key not in {b"content-encoding", b"content-length"}
+            ]
+
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""), self.encodings) if self.encodings else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+    async def _decoded_receive(self, receive: Receive, encoding: str, send: Send) -> Optional[Receive]:
+        chunks: list[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            # A compressed body larger than the inflated limit cannot be valid.
+            if size > self.max_decompressed_bytes:
+                await _send_error(send, 413, "Request body too large")
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+
+        try:
+            body = decompress_body(b"".join(chunks), encoding, self.max_decompressed_bytes)
+        except RequestBodyTooLarge:
+            await _send_error(send, 413, "Decompressed request body too large")
+            return None
+        except UnsupportedEncoding:
+            await _send_error(send, 415, f"Unsupported Content-Encoding: {encoding}")
+            return None
+        except ValueError as exc:
+            await _send_error(send, 400, str(exc))
+            return None
+
+        delivered = False
+
+        async def decoded_receive() -> Message:
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return decoded_receive
+
+
+class _CompressingSend:
+    def __init__(self, send: Send, encoding: str, minimum_size: int) -> None:
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_StreamCompressor] = None
+        self.passthrough = False
+
+    def _should_compress(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        return content_type.startswith(COMPRESSIBLE_CONTENT_TYPES)
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = MutableHeaders(raw=message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            self.passthrough = not self._should_compress(headers)
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.compressor = _StreamCompressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            if not more_body:
+                compressed = compress_bytes(body, self.encoding)
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            if "content-length" in headers:
+                del headers["content-length"]
+            await self.send(start)
+
+        assert self.compressor is not None
+        if more_body:
+            chunk = self.compressor.compress(body) + self.compressor.flush()
+        else:
+            chunk = self.compressor.compress(body) + self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,199 @@
+"""Optional direct Postgres data path for the backend jobs.
+
+PostgREST (``main.supabase_admin_request``) stays the default and the fallback. When
+``DATABASE_URL`` is set and asyncpg is installed, the weekly trend job and report
+persistence talk to Postgres over a pooled connection instead, which skips the HTTP round
+trip and JSON envelope per query:
+
+* user enumeration walks ``idx_sets_user_logged`` one distinct ``user_id`` at a time
+  (a loose index scan) instead of paging every set row through PostgREST;
+* weekly reports and run checkpoints are written in batches, reports with ``COPY``.
+
+Callers treat :func:`connection_errors` as "Postgres is unreachable" and retry over
+PostgREST. Statement errors are not in it: they point at a schema or query bug that a
+silent fallback would hide. asyncpg is only imported when the pool is first created, so
+deployments without ``DATABASE_URL`` never load it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import importlib.util
+import json
+import logging
+import uuid
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_REPORT_COLUMNS = (
+    "id",
+    "user_id",
+    "report_type",
+    "recommendation_scope_id",
+    "status",
+    "title",
+    "summary",
+    "payload",
+    "evidence",
+    "metadata",
+)
+ANALYSIS_REPORT_JSON_COLUMNS = frozenset({"payload", "evidence", "metadata"})
+# Lower bound for the first page of users; never a real auth.users id.
+NIL_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+class DatabaseUnavailableError(ConnectionError):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def asyncpg_installed() -> bool:
+    return importlib.util.find_spec("asyncpg") is not None
+
+
+@functools.lru_cache(maxsize=None)
+def connection_errors() -> tuple[type[BaseException], ...]:
+    """Exceptions meaning "Postgres is unreachable"; usable as ``except connection_errors():``."""
+    errors: tuple[type[BaseException], ...] = (OSError, asyncio.TimeoutError)
+    if not asyncpg_installed():
+        return errors
+    import asyncpg
+
+    return errors + (
+        asyncpg.InterfaceError,
+        asyncpg.PostgresConnectionError,
+        asyncpg.CannotConnectNowError,
+        asyncpg.TooManyConnectionsError,
+    )
+
+
+def new_report_id() -> str:
+    # COPY cannot return generated keys, so batched reports get their ids up front.
+    return str(uuid.uuid4())
+
+
+def _report_record(row: dict) -> tuple:
+    return tuple(
+        json.dumps(row.get(column)) if column in ANALYSIS_REPORT_JSON_COLUMNS else row.get(column)
+        for column in ANALYSIS_REPORT_COLUMNS
+    )
+
+
+class PostgresDataLayer:
+    """Lazily created asyncpg pool plus the handful of queries the jobs need."""
+
+    def __init__(self, dsn: Optional[str], min_size: int = 1, max_size: int = 10, command_timeout: float = 30.0) -> None:
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.command_timeout = command_timeout
+        self._pool: Optional[Any] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.dsn) and asyncpg_installed()
+
+    async def pool(self) -> Any:
+        if self._pool is not None:
+            return self._pool
+        if not self.configured:
+            raise DatabaseUnavailableError("DATABASE_URL is not set or asyncpg is not installed")
+        async with self._lock:
+            if self._pool is None:
+                import asyncpg
+
+                # Pool creation failures surface as connection_errors() and are retried on the next call.
+                self._pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    command_timeout=self.command_timeout,
+                )
+        return self._pool
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    async def fetch_weekly_trend_sets(self, user_id: str, limit: int) -> list[dict]:
+        # Same shape as the PostgREST rows: ISO date strings, numeric weights.
+        rows = await (await self.pool()).fetch(
+            """
+            select training_date::text as training_date, reps, weight, set_type
+            from sets
+            where user_id = $1
+            order by training_date desc
+            limit $2
+            """,
+            user_id,
+            limit,
+        )
+        return [dict(row) for row in rows]
+
+    async def fetch_latest_report(self, user_id: str, report_type: str) -> Optional[dict]:
+        row = await (await self.pool()).fetchrow(
+            """
+            select id::text as id, metadata->>'fingerprint' as fingerprint
+            from analysis_reports
+            where user_id = $1 and report_type = $2
+            order by created_at desc
+            limit 1
+            """,
+            user_id,
+            report_type,
+        )
+        return dict(row) if row else None
+
+    async def list_user_ids_with_sets(self, after_user_id: Optional[str] = None) -> list[str]:
+        rows = await (await self.pool()).fetch(
+            """
+            with recursive users as (
+              (select user_id from sets where user_id > $1::uuid order by user_id limit 1)
+              union all
+              select (select s.user_id from sets s where s.user_id > users.user_id order by s.user_id limit 1)
+              from users
+              where users.user_id is not null
+            )
+            select user_id::text as user_id from users where user_id is not null
+            """,
+            after_user_id or NIL_UUID,
+        )
+        return [row["user_id"] for row in rows]
+
+    async def insert_analysis_report(self, row: dict) -> str:
+        columns = [column for column in ANALYSIS_REPORT_COLUMNS if column != "id"]
+        placeholders = ", ".join(f"${index}" for index in range(1, len(columns) + 1))
+        return await (await self.pool()).fetchval(
+            f"insert into analysis_reports ({', '.join(columns)}) values ({placeholders}) returning id::text",
+            *_report_record(row)[1:],
+        )
+
+    async def write_weekly_trend_batch(self, reports: list[dict], checkpoints: list[dict]) -> None:
+        """Write a batch of reports (``COPY``) and their run checkpoints in one transaction."""
+        if not reports and not checkpoints:
+            return
+        async with (await self.pool()).acquire() as connection:
+            async with connection.transaction():
+                if reports:
+                    await connection.copy_records_to_table(
+                        "analysis_reports",
+                        records=[_report_record(row) for row in reports],
+                        columns=ANALYSIS_REPORT_COLUMNS,
+                    )
+                if checkpoints:
+                    # COPY has no conflict handling, and a retried run may re-record a user.
+                    await connection.executemany(
+                        """
+                        insert into weekly_trend_job_checkpoints (run_id, user_id, shard_index, report_id)
+                        values ($1, $2, $3, $4)
+                        on conflict (run_id, user_id) do nothing
+                        """,
+                        [
+                            (item["run_id"], item["user_id"], item["shard_index"], item["report_id"])
+                            for item in checkpoints
+                        ],
+                    )
@@ -0,0 +1,123 @@
+"""``Idempotency-Key`` support for POST endpoints that must not run twice.
+
+The first request carrying a key claims it with an ``in_progress`` record. When the
+handler succeeds, the response body and status replace the record for ``ttl_seconds``.
+A retry with the same key and payload replays the stored response (marked with
+``Idempotency-Replayed: true``) instead of running the handler again. A retry that
+arrives while the first request is still running waits up to ``wait_seconds`` for it
+and then answers 409. Reusing a key with a different payload is rejected with 422, and
+a failed request releases its key so the client can retry.
+
+Records live in the shared ``Cache``, so retries that land on another worker or
+instance are recognised when ``CACHE_BACKEND`` is sqlite or redis. If the cache is
+unreachable, requests run without idempotency rather than failing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from cache import Cache
+from metrics import IDEMPOTENCY_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_REPLAYED_HEADER = "Idempotency-Replayed"
+# Visible ASCII only: keys are embedded in cache keys and echoed in logs.
+IDEMPOTENCY_KEY_PATTERN = re.compile(r"[\x21-\x7e]{1,255}")
+IN_PROGRESS_RETRY_AFTER_SECONDS = 2
+
+
+def request_fingerprint(payload: str | bytes) -> str:
+    data = payload.encode() if isinstance(payload, str) else payload
+    return hashlib.sha256(data).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        cache: Cache,
+        ttl_seconds: float,
+        in_progress_ttl_seconds: float,
+        wait_seconds: float,
+    ) -> None:
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        # Bounds how long a crashed worker's claim blocks retries.
+        self.in_progress_ttl_seconds = in_progress_ttl_seconds
+        self.wait_seconds = wait_seconds
+
+    async def run(
+        self,
+        endpoint: str,
+        user_id: str,
+        key: Optional[str],
+        fingerprint: str,
+        handler: Callable[[], Awaitable[Any]],
+        status_code: int = 200,
+    ) -> Any:
+        if key is None:
+            return await handler()
+        if not IDEMPOTENCY_KEY_PATTERN.fullmatch(key):
+            raise HTTPException(400, f"Invalid {IDEMPOTENCY_KEY_HEADER} header")
+
+        cache_key = f"{endpoint}:{user_id}:{key}"
+        deadline = time.monotonic() + self.wait_seconds
+        delay = 0.05
+        while True:
+            try:
+                claimed = await self.cache.add(
+                    cache_key, {"state": "in_progress", "fingerprint": fingerprint}, self.in_progress_ttl_seconds
+                )
+                found, record = (False, None) if claimed else await self.cache.lookup(cache_key)
+            except Exception:
+                logger.warning("Idempotency store unavailable: endpoint=%s", endpoint, exc_info=True)
+                IDEMPOTENCY_REQUESTS.labels(endpoint, "unavailable").inc()
+                return await handler()
+            if claimed:
+                break
+
+            if not found:
+                # Released by a failed request (or expired) between our claim and read: claim again.
+                continue
+            if record.get("fingerprint") != fingerprint:
+                IDEMPOTENCY_REQUESTS.labels(endpoint, "mismatch").inc()
+                raise HTTPException(422, f"{IDEMPOTENCY_KEY_HEADER} was already used with a different request")
+            if record.get("state") == "completed":
+                IDEMPOTENCY_REQUESTS.labels(endpoint, "replayed").inc()
+                return JSONResponse(
+                    record["body"],
+                    status_code=record.get("status_code", status_code),
+                    headers={IDEMPOTENCY_REPLAYED_HEADER: "true"},
+                )
+            if time.monotonic() >= deadline:
+                IDEMPOTENCY_REQUESTS.labels(endpoint, "in_progress").inc()
+                raise HTTPException(
+                    409,
+                    f"A request with this {IDEMPOTENCY_KEY_HEADER} is still in progress",
+                    headers={"Retry-After": str(IN_PROGRESS_RETRY_AFTER_SECONDS)},
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        IDEMPOTENCY_REQUESTS.labels(endpoint, "new").inc()
+        try:
+            result = await handler()
+        except BaseException:
+            await self.cache.delete(cache_key)
+            raise
+        await self.cache.set(
+            cache_key,
+            {"state": "completed", "fingerprint": fingerprint, "status_code": status_code, "body": result},
+            self.ttl_seconds,
+        )
+        return result
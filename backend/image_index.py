@@ -0,0 +1,224 @@
+"""Perceptual-hash index of known equipment images, consulted before the identify LLM call.
+
+Every image is reduced to a 64-bit difference hash (dHash). The hash survives re-encoding,
+resizing and small exposure changes, so a photo close to one the index already holds lands
+within a few bits of it. Each user's index has two parts:
+
+* library: hashes of their ``machines.thumbnails``, including the seeded catalog rows.
+  Rebuilt from Supabase when the cached copy expires, so edits show up within
+  ``library_ttl_seconds``.
+* identified: hashes of photos that went through the LLM, with the profile it returned.
+  Kept for ``identified_ttl_seconds``.
+
+Thumbnails are either data URLs or remote catalog images. Remote images are fetched only
+from ``remote_hosts``, because thumbnail strings are user-controlled, and their hashes are
+cached across users. Pillow is an optional dependency, imported on first hash so that
+startup does not pay for it; without it the index is inactive.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import functools
+import hashlib
+import importlib.util
+import io
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from urllib.parse import urlsplit
+
+from cache import Cache
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+_DHASH_WIDTH = 9
+_DHASH_HEIGHT = 8
+# Thumbnails beyond this per machine add little and slow down library rebuilds.
+MAX_THUMBNAILS_PER_MACHINE = 4
+
+LibraryLoader = Callable[[str], Awaitable[list[dict]]]
+RemoteFetcher = Callable[[str], Awaitable[bytes]]
+
+
+@functools.lru_cache(maxsize=None)
+def image_index_available() -> bool:
+    return importlib.util.find_spec("PIL") is not None
+
+
+def dhash(data: bytes) -> Optional[int]:
+    """64-bit difference hash of an encoded image, or None if it cannot be decoded or is featureless."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:  # pragma: no cover - optional dependency
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEG decoders can downscale while decoding, which skips most of the work.
+            image.draft("L", (_DHASH_WIDTH * 8, _DHASH_HEIGHT * 8))
+            small = (
+                ImageOps.exif_transpose(image)
+                .convert("L")
+                .resize((_DHASH_WIDTH, _DHASH_HEIGHT), Image.Resampling.LANCZOS)
+            )
+            pixels = small.tobytes()
+    except Exception:
+        logger.debug("Could not decode image for hashing", exc_info=True)
+        return None
+    value = 0
+    for row in range(_DHASH_HEIGHT):
+        offset = row * _DHASH_WIDTH
+        for col in range(_DHASH_WIDTH - 1):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    # Flat images (blank frames, solid placeholders) would all match each other.
+    if value in (0, (1 << HASH_BITS) - 1):
+        return None
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def decode_data_url(value: str) -> Optional[bytes]:
+    header, sep, payload = value.partition(",")
+    if not sep or not header.startswith("data:") or not header.endswith(";base64"):
+        return None
+    try:
+        return base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def machine_profile(machine: dict) -> dict[str, Any]:
+    """Identify-response shaped profile of a ``machines`` row."""
+    return {
+        "name": machine.get("name") or "",
+        "exerciseType": machine.get("exercise_type"),
+        "movement": machine.get("movement") or "",
+        "muscleGroups": machine.get("muscle_groups") or [],
+        "variations": machine.get("variations") or [],
+        "defaultWeight": machine.get("default_weight"),
+        "defaultReps": machine.get("default_reps"),
+        "notes": machine.get("notes") or "",
+    }
+
+
+@dataclass(frozen=True)
+class IndexMatch:
+    profile: dict[str, Any]
+    source: str
+    machine_id: Optional[str]
+    distance: int
+
+    @property
+    def confidence(self) -> float:
+        return 1 - self.distance / HASH_BITS
+
+
+class EquipmentImageIndex:
+    def __init__(
+        self,
+        cache: Cache,
+        remote_hash_cache: Cache,
+        min_confidence: float,
+        library_ttl_seconds: float,
+        identified_ttl_seconds: float,
+        remote_hash_ttl_seconds: float,
+        max_identified_entries: int,
+        remote_hosts: Iterable[str] = (),
+        fetch_remote: Optional[RemoteFetcher] = None,
+    ) -> None:
+        self.cache = cache
+        self.remote_hash_cache = remote_hash_cache
+        self.max_distance = int((1 - min_confidence) * HASH_BITS)
+        self.library_ttl_seconds = library_ttl_seconds
+        self.identified_ttl_seconds = identified_ttl_seconds
+        self.remote_hash_ttl_seconds = remote_hash_ttl_seconds
+        self.max_identified_entries = max_identified_entries
+        self.remote_hosts = frozenset(host.lower() for host in remote_hosts)
+        self.fetch_remote = fetch_remote
+
+    async def hash_images(self, images: list[bytes]) -> list[int]:
+        if not image_index_available() or not images:
+            return []
+        hashes = await asyncio.to_thread(lambda: [dhash(data) for data in images])
+        return [value for value in hashes if value is not None]
+
+    async def hash_image(self, data: bytes) -> Optional[int]:
+        if not image_index_available():
+            return None
+        return await asyncio.to_thread(dhash, data)
+
+    async def lookup(self, user_id: str, hashes: list[int], load_library: LibraryLoader) -> Optional[IndexMatch]:
+        if not hashes:
+            return None
+        best: Optional[IndexMatch] = None
+        for entry in await self._entries(user_id, load_library):
+            distance = min(hamming_distance(value, entry["hash"]) for value in hashes)
+            if distance <= self.max_distance and (best is None or distance < best.distance):
+                best = IndexMatch(entry["profile"], entry["source"], entry.get("machine_id"), distance)
+        return best
+
+    async def remember(self, user_id: str, hashes: list[int], profile: dict[str, Any]) -> None:
+        if not hashes:
+            return
+        key = f"identified:{user_id}"
+        entries = [entry for entry in await self.cache.get(key) or [] if entry["hash"] not in hashes]
+        entries.extend({"hash": value, "source": "identify", "profile": profile} for value in hashes)
+        await self.cache.set(key, entries[-self.max_identified_entries :], self.identified_ttl_seconds)
+
+    async def _entries(self, user_id: str, load_library: LibraryLoader) -> list[dict]:
+        library_key = f"library:{user_id}"
+        library, identified = await asyncio.gather(
+            self.cache.get(library_key), self.cache.get(f"identified:{user_id}")
+        )
+        if library is None:
+            library = await self._library_entries(await load_library(user_id))
+            await self.cache.set(library_key, library, self.library_ttl_seconds)
+        # Library entries first: on equal distance a saved machine beats a past identification.
+        return [*library, *(identified or [])]
+
+    async def _library_entries(self, machines: list[dict]) -> list[dict]:
+        thumbnails = [
+            (machine, thumbnail)
+            for machine in machines
+            for thumbnail in (machine.get("thumbnails") or [])[:MAX_THUMBNAILS_PER_MACHINE]
+            if isinstance(thumbnail, str)
+        ]
+        hashes = await asyncio.gather(*(self._thumbnail_hash(thumbnail) for _, thumbnail in thumbnails))
+        return [
+            {
+                "hash": value,
+                "source": "catalog" if machine.get("source") == "default_catalog" or not thumbnail.startswith("data:") else "library",
+                "machine_id": machine.get("id"),
+                "profile": machine_profile(machine),
+            }
+            for (machine, thumbnail), value in zip(thumbnails, hashes)
+            if value is not None
+        ]
+
+    async def _thumbnail_hash(self, thumbnail: str) -> Optional[int]:
+        if thumbnail.startswith("data:"):
+            data = decode_data_url(thumbnail)
+            return await self.hash_image(data) if data else None
+
+        parts = urlsplit(thumbnail)
+        if self.fetch_remote is None or parts.scheme != "https" or (parts.hostname or "").lower() not in self.remote_hosts:
+            return None
+        key = hashlib.sha256(thumbnail.encode()).hexdigest()
+        cached = await self.remote_hash_cache.get(key)
+        if cached is not None:
+            return cached["hash"]
+        try:
+            data = await self.fetch_remote(thumbnail)
+        except Exception:
+            logger.warning("Could not fetch catalog thumbnail for hashing: %s", thumbnail, exc_info=True)
+            return None
+        value = await self.hash_image(data)
+        # Undecodable images are remembered too so every library rebuild does not refetch them.
+        await self.remote_hash_cache.set(key, {"hash": value}, self.remote_hash_ttl_seconds)
+        return value
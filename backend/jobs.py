@@ -0,0 +1,229 @@
+"""Bounded in-process pool for long-running background jobs.
+
+Jobs are queued onto an ``asyncio.Queue`` and executed by a fixed number of worker
+tasks, so a burst of submissions can never run more than ``worker_count`` pipelines
+at once. Job state is kept per process with a TTL after completion (expired jobs are
+dropped on every lookup and by a sweeper task started with the workers) and, when a
+shared ``store`` cache is configured, mirrored there so that any worker can answer
+polls for a job running elsewhere. Clients poll ``get`` or wait for changes with
+``wait_for_update``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+
+from cache import Cache
+from metrics import BACKGROUND_JOB_QUEUE_DEPTH, BACKGROUND_JOBS
+from tracing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+JobRunner = Callable[[StageTimer], Awaitable[dict]]
+
+TERMINAL_STATUSES = frozenset({"succeeded", "failed"})
+REMOTE_POLL_INTERVAL_SECONDS = 0.5
+MAX_SWEEP_INTERVAL_SECONDS = 60.0
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+class BackgroundJobPool:
+    def __init__(
+        self,
+        name: str,
+        worker_count: int,
+        queue_size: int,
+        ttl_seconds: int,
+        log_traces: bool = True,
+        store: Optional[Cache] = None,
+    ) -> None:
+        self.name = name
+        self.worker_count = worker_count
+        self.queue_size = queue_size
+        self.ttl_seconds = ttl_seconds
+        self.log_traces = log_traces
+        self.store = store
+        self._jobs: dict[str, dict[str, Any]] = {}
+        self._updated: dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_started(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._workers = [
+                loop.create_task(self._worker(), name=f"{self.name}-worker-{index}")
+                for index in range(self.worker_count)
+            ]
+            self._sweeper = loop.create_task(self._sweep(), name=f"{self.name}-sweeper")
+        return self._queue
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job["status"] in TERMINAL_STATUSES and job["updated_at"] < cutoff
+        ]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._updated.pop(job_id, None)
+
+    async def _sweep(self) -> None:
+        # Without this, finished jobs of an idle pool would stay in memory until the next call.
+        interval = min(float(self.ttl_seconds), MAX_SWEEP_INTERVAL_SECONDS)
+        while True:
+            await asyncio.sleep(interval)
+            self._purge_expired()
+
+    async def _publish(self, job: dict[str, Any]) -> None:
+        if self.store is not None:
+            await self.store.set(job["job_id"], job, ttl=self.ttl_seconds)
+
+    async def _update(self, job_id: str, **changes: Any) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        job.update(changes)
+        job["updated_at"] = time.time()
+        job["version"] += 1
+        await self._publish(job)
+        event = self._updated.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def submit(self, owner_id: str, runner: JobRunner, kind: str) -> dict[str, Any]:
+        queue = self._ensure_started()
+        self._purge_expired()
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "kind": kind,
+            "owner_id": owner_id,
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now,
+            "version": 0,
+            "result": None,
+            "error": None,
+            "stage_timings_ms": {},
+        }
+        try:
+            queue.put_nowait((job_id, runner))
+        except asyncio.QueueFull as exc:
+            self._jobs.pop(job_id, None)
+            BACKGROUND_JOBS.labels(self.name, "rejected").inc()
+            raise JobQueueFullError(f"{self.name} queue is full") from exc
+        BACKGROUND_JOB_QUEUE_DEPTH.labels(self.name).set(queue.qsize())
+        await self._publish(self._jobs[job_id])
+        return self.public_view(self._jobs[job_id])
+
+    async def _lookup(self, job_id: str) -> Optional[dict[str, Any]]:
+        self._purge_expired()
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = await self.store.get(job_id)
+        return job
+
+    async def get(self, job_id: str, owner_id: str) -> Optional[dict[str, Any]]:
+        job = await self._lookup(job_id)
+        if job is None or job["owner_id"] != owner_id:
+            return None
+        return self.public_view(job)
+
+    async def wait_for_update(self, job_id: str, owner_id: str, seen_version: int, timeout: float) -> Optional[dict[str, Any]]:
+        """Return the job once its version exceeds ``seen_version`` or ``timeout`` elapses."""
+        job = await self._lookup(job_id)
+        if job is None or job["owner_id"] != owner_id:
+            return None
+        if job["version"] > seen_version or job["status"] in TERMINAL_STATUSES:
+            return self.public_view(job)
+        if job_id in self._jobs:
+            event = self._updated.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await self.get(job_id, owner_id)
+
+        # The job runs in another worker; poll the shared store until it changes.
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(REMOTE_POLL_INTERVAL_SECONDS, max(0.0, deadline - time.monotonic())))
+            job = await self._lookup(job_id)
+            if job is None or job["version"] > seen_version:
+                break
+        return await self.get(job_id, owner_id)
+
+    @staticmethod
+    def public_view(job: dict[str, Any]) -> dict[str, Any]:
+        return {key: value for key, value in job.items() if key != "owner_id"}
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            job_id, runner = await queue.get()
+            BACKGROUND_JOB_QUEUE_DEPTH.labels(self.name).set(queue.qsize())
+            try:
+                await self._run(job_id, runner)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job_id: str, runner: JobRunner) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        timer = StageTimer(f"{self.name}:{job['kind']}")
+        timer.attributes["job_id"] = job_id
+        await self._update(job_id, status="running")
+        try:
+            result = await runner(timer)
+        except HTTPException as exc:
+            BACKGROUND_JOBS.labels(self.name, "failed").inc()
+            await self._update(
+                job_id,
+                status="failed",
+                error={"status_code": exc.status_code, "detail": exc.detail},
+                stage_timings_ms=timer.stage_totals_ms(),
+            )
+        except Exception:
+            logger.exception("Background job failed: pool=%s job_id=%s", self.name, job_id)
+            BACKGROUND_JOBS.labels(self.name, "failed").inc()
+            await self._update(
+                job_id,
+                status="failed",
+                error={"status_code": 500, "detail": "Internal error"},
+                stage_timings_ms=timer.stage_totals_ms(),
+            )
+        else:
+            BACKGROUND_JOBS.labels(self.name, "succeeded").inc()
+            await self._update(job_id, status="succeeded", result=result, stage_timings_ms=timer.stage_totals_ms())
+        finally:
+            if self.log_traces:
+                timer.log()
+
+    async def shutdown(self) -> None:
+        tasks = [*self._workers, *([self._sweeper] if self._sweeper is not None else [])]
+        for task in tasks:
+            task.cancel()
+        if tasks and self._loop is asyncio.get_running_loop():
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._sweeper = None
+        self._queue = None
+        self._loop = None
@@ -0,0 +1,109 @@
+"""Per-endpoint Anthropic model tiers with fallback to a faster model.
+
+Each LLM-backed route has a primary model and, optionally, a faster fallback model:
+
+* if the primary answers with an overload status (429, 503, 529), the call is retried on
+  the fallback straight away;
+* if the primary is still running when the latency budget runs out, the fallback call is
+  started alongside it and the first successful answer wins. The slower call is cancelled.
+
+``LLMResult.model`` is the model that produced the text, so callers can record it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+
+from metrics import LLM_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+# 529 is Anthropic's "overloaded"; 429 and 503 are rate limiting and temporary unavailability.
+OVERLOAD_STATUSES = frozenset({429, 503, 529})
+
+
+class ModelOverloadedError(HTTPException):
+    """Anthropic turned the call away for capacity reasons; surfaces as a plain 502 if not retried."""
+
+    def __init__(self, model: str, upstream_status: int) -> None:
+        super().__init__(502, "LLM service error")
+        self.model = model
+        self.upstream_status = upstream_status
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    primary: str
+    fallback: Optional[str] = None
+    latency_budget_seconds: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class LLMResult:
+    text: str
+    model: str
+    # "overloaded" or "latency_budget" when the fallback model produced the text.
+    fallback_reason: Optional[str] = None
+
+
+async def call_with_fallback(
+    tier: ModelTier,
+    route: str,
+    send: Callable[[str], Awaitable[str]],
+) -> LLMResult:
+    if not tier.fallback or tier.fallback == tier.primary:
+        return LLMResult(await send(tier.primary), tier.primary)
+
+    primary = asyncio.create_task(send(tier.primary))
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=tier.latency_budget_seconds)
+    except BaseException:
+        primary.cancel()
+        raise
+
+    if done:
+        try:
+            return LLMResult(primary.result(), tier.primary)
+        except ModelOverloadedError as exc:
+            logger.warning(
+                "Primary model overloaded, falling back: route=%s model=%s status=%s fallback=%s",
+                route,
+                tier.primary,
+                exc.upstream_status,
+                tier.fallback,
+            )
+            LLM_FALLBACKS.labels(route, "overloaded").inc()
+            return LLMResult(await send(tier.fallback), tier.fallback, "overloaded")
+
+    logger.info(
+        "Primary model exceeded latency budget, racing fallback: route=%s model=%s budget=%ss fallback=%s",
+        route,
+        tier.primary,
+        tier.latency_budget_seconds,
+        tier.fallback,
+    )
+    LLM_FALLBACKS.labels(route, "latency_budget").inc()
+    fallback = asyncio.create_task(send(tier.fallback))
+    models = {primary: tier.primary, fallback: tier.fallback}
+    pending = {primary, fallback}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Prefer the primary's answer when both land in the same iteration.
+            for task in sorted(done, key=lambda task: task is not primary):
+                if task.exception() is None:
+                    model = models[task]
+                    return LLMResult(task.result(), model, None if task is primary else "latency_budget")
+                error = task.exception()
+        assert error is not None
+        raise error
+    finally:
+        for task in (primary, fallback):
+            if not task.done():
+                task.cancel()
@@ -4,31 +4,140 @@ Only handles LLM calls (Anthropic API) to keep the API key server-side.
 All CRUD goes directly from frontend -> Supabase.
 """
 
+import time
+
+# Taken before the heavier imports below so the startup report can attribute import time.
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import base64
+import binascii
+import csv
+import hashlib
+import io
 import json
 import logging
-import time
-from typing import Any, Optional
-from fastapi import FastAPI, HTTPException, Header, Depends, Request
+import secrets
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import Any, AsyncIterator, Awaitable, Callable, Literal, Optional, TypeVar
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 import httpx
 import jwt
-from jwt import PyJWKClient
-from jwt.exceptions import InvalidTokenError, PyJWKClientError
-
-from schemas.api import IdentifyRequest, RecommendationRequest, WeeklyTrendJobRequest
-from settings import settings
+from jwt.exceptions import InvalidTokenError, PyJWKError
+from prometheus_client.exposition import choose_encoder
+
+from adherence import (
+    DEFAULT_DAY_START_HOUR,
+    compute_plan_day,
+    effective_day_key,
+    parse_day_key,
+    plan_day_by_weekday,
+    plan_items_by_day_id,
+    summarize_plan_progress,
+    week_day_keys,
+    weekday_for_day_key,
+)
+from cache import Cache, create_cache_backend
+from cancellation import run_cancellable
+from compression import CompressionMiddleware
+from database import PostgresDataLayer, connection_errors as database_connection_errors, new_report_id
+from idempotency import IDEMPOTENCY_REPLAYED_HEADER, IdempotencyStore, request_fingerprint
+from image_index import EquipmentImageIndex
+from jobs import TERMINAL_STATUSES, BackgroundJobPool, JobQueueFullError
+from llm_tiers import OVERLOAD_STATUSES, LLMResult, ModelOverloadedError, ModelTier, call_with_fallback
+from metrics import (
+    ANALYSIS_REPORTS_PRUNED,
+    DATABASE_FALLBACKS,
+    IDENTIFY_INDEX_LOOKUPS,
+    LLM_JSON_PARSE_FAILURES,
+    LLM_STRUCTURED_OUTPUTS,
+    PROFILING_SESSIONS,
+    REGISTRY,
+    WEEKLY_JOB_LAST_COMPLETED,
+    WEEKLY_JOB_PROGRESS,
+    WEEKLY_JOB_USERS,
+    MetricsMiddleware,
+    observe_upstream,
+    record_llm_usage,
+)
+from profiling import Profiler, ProfilerBusyError
+from pydantic import ValidationError
+
+from schemas.api import (
+    AnalysisReportRetentionJobRequest,
+    EnrichedMachineIdentification,
+    IdentifyRequest,
+    LLMOutput,
+    MachineDTO,
+    MachineIdentification,
+    ProfilingSessionRequest,
+    RecommendationReportPayload,
+    RecommendationRequest,
+    RecommendationScope,
+    WeeklyTrendJobRequest,
+    equipment_catalog_adapter,
+    llm_tool,
+)
+from settings import SETTINGS_LOAD_SECONDS, settings
+from startup import StartupReport, UpstreamClients
+from tracing import StageTimer, StageTimingMiddleware, request_stage_timer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+startup_report = StartupReport()
+startup_report.record("settings_load", SETTINGS_LOAD_SECONDS)
+startup_report.record("imports", time.perf_counter() - IMPORT_STARTED - SETTINGS_LOAD_SECONDS)
+APP_SETUP_STARTED = time.perf_counter()
+
 app = FastAPI(title="Gym Tracker API")
 
 supabase_settings = settings.supabase
 
-_jwks_client: Optional[PyJWKClient] = None
-_jwks_client_url: Optional[str] = None
-_last_jwks_refresh = 0.0
+# Shared across uvicorn workers/instances when CACHE_BACKEND is sqlite or redis.
+cache_backend = create_cache_backend(settings.cache_backend, settings.cache_url, settings.cache_max_entries)
+jwks_cache = Cache(cache_backend, "jwks", key_prefix=settings.cache_key_prefix)
 JWKS_REFRESH_SECONDS = 300
+JWKS_MIN_REFETCH_SECONDS = 30
+# Only successful ownership checks are cached; the short TTL bounds how long a deleted scope stays usable.
+scope_ownership_cache = Cache(cache_backend, "scope_ownership", key_prefix=settings.cache_key_prefix)
+SCOPE_OWNERSHIP_TTL_SECONDS = 60
+# Retried LLM-backed POSTs replay the first response instead of paying for a second model call.
+idempotency_store = IdempotencyStore(
+    Cache(cache_backend, "idempotency", key_prefix=settings.cache_key_prefix),
+    ttl_seconds=settings.idempotency_ttl_seconds,
+    in_progress_ttl_seconds=settings.idempotency_in_progress_ttl_seconds,
+    wait_seconds=settings.idempotency_wait_seconds,
+)
+STARTUP_CONNECT_TIMEOUT_SECONDS = 5
+
+upstream_clients = UpstreamClients({"anthropic": 60, "supabase": 30, "images": 10})
+# Direct Postgres for the jobs when DATABASE_URL is set; see database.py.
+database = PostgresDataLayer(settings.database_url, max_size=settings.database_pool_max_size)
+IDENTIFY_INDEX_LIBRARY_TTL_SECONDS = 3600
+IDENTIFY_INDEX_IDENTIFIED_TTL_SECONDS = 30 * 86400
+IDENTIFY_INDEX_REMOTE_HASH_TTL_SECONDS = 7 * 86400
+IDENTIFY_INDEX_MAX_IDENTIFIED_ENTRIES = 200
+IDENTIFY_INDEX_MAX_REMOTE_IMAGE_BYTES = 5 * 1024 * 1024
+# Near-duplicate photos of known stations are answered from here instead of the LLM.
+equipment_image_index = EquipmentImageIndex(
+    Cache(cache_backend, "identify_index", key_prefix=settings.cache_key_prefix),
+    Cache(cache_backend, "catalog_image_hashes", key_prefix=settings.cache_key_prefix),
+    min_confidence=settings.identify_index_min_confidence,
+    library_ttl_seconds=IDENTIFY_INDEX_LIBRARY_TTL_SECONDS,
+    identified_ttl_seconds=IDENTIFY_INDEX_IDENTIFIED_TTL_SECONDS,
+    remote_hash_ttl_seconds=IDENTIFY_INDEX_REMOTE_HASH_TTL_SECONDS,
+    max_identified_entries=IDENTIFY_INDEX_MAX_IDENTIFIED_ENTRIES,
+    remote_hosts=settings.identify_index_remote_hosts,
+    fetch_remote=lambda url: fetch_catalog_thumbnail(url),
+)
+# Closed training days never expire here; their keys change when the plan or the day's sets do.
+plan_adherence_cache = Cache(cache_backend, "plan_adherence", key_prefix=settings.cache_key_prefix)
+_warmup_task: Optional[asyncio.Task] = None
+profiler = Profiler()
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,40 +145,143 @@ app.add_middleware(
     allow_credentials=False if settings.allow_all_origins else True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", IDEMPOTENCY_REPLAYED_HEADER],
+)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.response_compression_min_bytes,
+    encodings=settings.response_compression_encodings,
+    max_decompressed_bytes=settings.request_max_decompressed_bytes,
+)
+app.add_middleware(StageTimingMiddleware, log_traces=settings.stage_trace_logging)
+app.add_middleware(MetricsMiddleware)
+
+recommendation_jobs = BackgroundJobPool(
+    "recommendation_jobs",
+    worker_count=settings.recommendation_job_workers,
+    queue_size=settings.recommendation_job_queue_size,
+    ttl_seconds=settings.recommendation_job_ttl_seconds,
+    log_traces=settings.stage_trace_logging,
+    store=(
+        Cache(cache_backend, "recommendation_jobs", key_prefix=settings.cache_key_prefix)
+        if settings.cache_backend != "memory"
+        else None
+    ),
 )
 
 
 @app.on_event("startup")
 async def validate_settings_on_startup() -> None:
     try:
-        settings.validate_startup_requirements()
+        with startup_report.phase("settings_validation"):
+            settings.validate_startup_requirements()
     except ValueError as exc:
         logger.error("Startup settings validation failed: %s", str(exc))
         raise RuntimeError(str(exc)) from exc
 
 
-def _get_jwks_client() -> PyJWKClient:
-    global _jwks_client, _jwks_client_url, _last_jwks_refresh
+@app.on_event("startup")
+async def start_warm_up() -> None:
+    global _warmup_task
+    # Warm-up runs in the background so the port opens immediately; /api/ready reports progress.
+    startup_report.state = "warming"
+    _warmup_task = asyncio.create_task(warm_up_upstreams())
+
+
+async def _open_connection(upstream: str, url: str) -> None:
+    # Any response will do: the point is a pooled keep-alive connection with TLS already negotiated.
+    await upstream_clients.get(upstream).head(url, timeout=STARTUP_CONNECT_TIMEOUT_SECONDS)
+
+
+async def _prefetch_jwks() -> None:
     jwks_url = supabase_settings.resolved_jwks_url
-    if not jwks_url:
-        raise HTTPException(500, "SUPABASE_JWKS_URL or SUPABASE_URL must be configured")
-    now = time.time()
-    if (
-        _jwks_client is None
-        or _jwks_client_url != jwks_url
-        or now - _last_jwks_refresh > JWKS_REFRESH_SECONDS
-    ):
-        _jwks_client = PyJWKClient(jwks_url)
-        _jwks_client_url = jwks_url
-        _last_jwks_refresh = now
-    return _jwks_client
-
-
-def verify_auth(authorization: Optional[str]) -> str:
+    jwks = await jwks_cache.get_or_set(jwks_url, lambda: fetch_jwks(jwks_url), ttl=JWKS_REFRESH_SECONDS)
+    # Building the keys once also loads the crypto backends before the first request needs them.
+    for key_data in jwks["keys"]:
+        _find_signing_jwk({"keys": [key_data]}, key_data.get("kid"))
+
+
+async def warm_up_upstreams() -> None:
+    if settings.startup_warmup:
+        phases = [
+            startup_report.run_phase("connect_anthropic", lambda: _open_connection("anthropic", settings.anthropic_api_url))
+        ]
+        if supabase_settings.url:
+            phases.append(
+                startup_report.run_phase(
+                    "connect_supabase", lambda: _open_connection("supabase", f"{supabase_settings.url}/rest/v1/")
+                )
+            )
+        if supabase_settings.resolved_jwks_url and not supabase_settings.jwt_secret:
+            phases.append(startup_report.run_phase("jwks_prefetch", _prefetch_jwks))
+        if database.configured:
+            phases.append(startup_report.run_phase("connect_postgres", database.pool))
+        await asyncio.gather(*phases)
+    startup_report.mark_ready()
+    logger.info("Startup timing: %s", json.dumps(startup_report.as_dict()))
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs() -> None:
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+    await recommendation_jobs.shutdown()
+    await upstream_clients.aclose()
+    await database.close()
+    await cache_backend.close()
+
+
+def _bearer_token(authorization: Optional[str]) -> Optional[str]:
     if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(401, "Unauthorized")
+        return None
+    return authorization.split(" ", 1)[1].strip() or None
+
+
+async def fetch_jwks(jwks_url: str) -> dict:
+    started = time.perf_counter()
+    status: object = "error"
+    try:
+        resp = await upstream_clients.get("supabase").get(jwks_url, timeout=10)
+        status = resp.status_code
+        resp.raise_for_status()
+    finally:
+        observe_upstream("supabase_auth", "GET jwks", status, started)
+    return {"keys": resp.json().get("keys", []), "fetched_at": time.time()}
+
+
+def _find_signing_jwk(jwks: dict, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+    for key_data in jwks.get("keys", []):
+        if key_data.get("use", "sig") != "sig" or key_data.get("kid") != kid:
+            continue
+        try:
+            return jwt.PyJWK(key_data)
+        except PyJWKError:
+            continue
+    return None
+
+
+async def resolve_jwks_signing_key(authorization: Optional[str]) -> Optional[jwt.PyJWK]:
+    """Look up the token's signing key in the shared JWKS cache, refetching once on key rotation."""
+    jwks_url = supabase_settings.resolved_jwks_url
+    token = _bearer_token(authorization)
+    if supabase_settings.jwt_secret or not jwks_url or not token:
+        return None
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except InvalidTokenError:
+        return None
+
+    jwks = await jwks_cache.get_or_set(jwks_url, lambda: fetch_jwks(jwks_url), ttl=JWKS_REFRESH_SECONDS)
+    signing_key = _find_signing_jwk(jwks, kid)
+    if signing_key is None and time.time() - jwks["fetched_at"] > JWKS_MIN_REFETCH_SECONDS:
+        await jwks_cache.delete(jwks_url)
+        jwks = await jwks_cache.get_or_set(jwks_url, lambda: fetch_jwks(jwks_url), ttl=JWKS_REFRESH_SECONDS)
+        signing_key = _find_signing_jwk(jwks, kid)
+    return signing_key
+
 
-    token = authorization.split(" ", 1)[1].strip()
+def verify_auth(authorization: Optional[str], signing_key: Optional[jwt.PyJWK] = None) -> str:
+    token = _bearer_token(authorization)
     if not token:
         raise HTTPException(401, "Unauthorized")
 
@@ -91,8 +303,8 @@ def verify_auth(authorization: Optional[str]) -> str:
     if supabase_settings.jwt_secret:
         payload = jwt.decode(token, supabase_settings.jwt_secret, **decode_kwargs)
     elif supabase_settings.resolved_jwks_url:
-        jwks_client = _get_jwks_client()
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
+        if signing_key is None:
+            raise HTTPException(401, "Unauthorized")
         decode_kwargs["algorithms"] = ["RS256", "ES256"]
         payload = jwt.decode(
             token,
@@ -121,45 +333,108 @@ def verify_auth(authorization: Optional[str]) -> str:
     return str(user_id)
 
 
-def get_current_user_id(request: Request, authorization: str = Header(None)) -> str:
-    try:
-        user_id = verify_auth(authorization)
-    except HTTPException:
-        raise
-    except (InvalidTokenError, PyJWKClientError, ValueError):
-        raise HTTPException(401, "Unauthorized")
+async def get_current_user_id(request: Request, authorization: str = Header(None)) -> str:
+    with request_stage_timer(request).stage("auth"):
+        try:
+            signing_key = await resolve_jwks_signing_key(authorization)
+            user_id = verify_auth(authorization, signing_key)
+        except HTTPException:
+            raise
+        except (InvalidTokenError, PyJWKError, ValueError, httpx.HTTPError):
+            raise HTTPException(401, "Unauthorized")
     request.state.user_id = user_id
     return user_id
 
 
-async def call_anthropic(messages: list, max_tokens: int = 1000) -> str:
-    async with httpx.AsyncClient(timeout=60) as client:
-        resp = await client.post(
-            "https://api.anthropic.com/v1/messages",
+async def call_anthropic(
+    messages: list,
+    max_tokens: int = 1000,
+    model: Optional[str] = None,
+    tool: Optional[dict] = None,
+) -> str:
+    """Return the response text, or the JSON-encoded input of the forced ``tool`` call."""
+    model = model or settings.anthropic_model
+    body: dict[str, Any] = {"model": model, "max_tokens": max_tokens, "messages": messages}
+    if tool is not None:
+        body["tools"] = [tool]
+        body["tool_choice"] = {"type": "tool", "name": tool["name"]}
+    started = time.perf_counter()
+    try:
+        resp = await upstream_clients.get("anthropic").post(
+            f"{settings.anthropic_api_url}/v1/messages",
             headers={
                 "x-api-key": settings.require_anthropic_api_key(),
                 "content-type": "application/json",
                 "anthropic-version": "2023-06-01",
             },
-            json={
-                "model": settings.anthropic_model,
-                "max_tokens": max_tokens,
-                "messages": messages,
-            },
+            json=body,
         )
+    except httpx.HTTPError:
+        observe_upstream("anthropic", "messages", "error", started)
+        raise
+    observe_upstream("anthropic", "messages", resp.status_code, started)
     if resp.status_code != 200:
         logger.error(f"Anthropic API error: {resp.status_code} {resp.text}")
+        if resp.status_code in OVERLOAD_STATUSES:
+            raise ModelOverloadedError(model, resp.status_code)
         raise HTTPException(502, "LLM service error")
     data = resp.json()
-    text = "".join(b.get("text", "") for b in data.get("content", []))
+    record_llm_usage(data.get("model") or model, data.get("usage"))
+    content = data.get("content", [])
+    if tool is not None:
+        for block in content:
+            if block.get("type") == "tool_use" and block.get("name") == tool["name"]:
+                return json.dumps(block.get("input"))
+    text = "".join(b.get("text", "") for b in content)
     return text
 
 
+LLMRoute = Literal["identify", "identify_enriched", "recommendation"]
+
+
+def llm_model_tier(route: LLMRoute) -> ModelTier:
+    primary = {
+        "identify": settings.anthropic_identify_model,
+        "identify_enriched": settings.anthropic_identify_enriched_model,
+        "recommendation": settings.anthropic_recommendation_model,
+    }[route] or settings.anthropic_model
+    budget = (
+        settings.anthropic_recommendation_latency_budget_seconds
+        if route == "recommendation"
+        else settings.anthropic_identify_latency_budget_seconds
+    )
+    return ModelTier(primary, settings.anthropic_fallback_model, budget)
+
+
+async def call_llm(
+    messages: list,
+    route: LLMRoute,
+    timer: StageTimer,
+    max_tokens: int = 1000,
+    tool: Optional[dict] = None,
+) -> LLMResult:
+    result = await call_with_fallback(
+        llm_model_tier(route),
+        route,
+        lambda model: call_anthropic(messages, max_tokens=max_tokens, model=model, tool=tool),
+    )
+    timer.attributes["llm.model"] = result.model
+    if result.fallback_reason:
+        timer.attributes["llm.fallback_reason"] = result.fallback_reason
+    return result
+
+
 def is_supabase_admin_configured() -> bool:
     return bool(supabase_settings.url and supabase_settings.service_role_key)
 
 
-async def supabase_admin_request(method: str, path: str, payload: Optional[Any] = None, params: Optional[dict] = None) -> Any:
+async def supabase_admin_request(
+    method: str,
+    path: str,
+    payload: Optional[Any] = None,
+    params: Optional[dict] = None,
+    prefer: Optional[str] = None,
+) -> Any:
     try:
         base_url, service_key = settings.require_supabase_admin()
     except ValueError as exc:
@@ -170,8 +445,18 @@ async def supabase_admin_request(method: str, path: str, payload: Optional[Any]
         "Authorization": f"Bearer {service_key}",
         "Content-Type": "application/json",
     }
-    async with httpx.AsyncClient(timeout=30) as client:
-        response = await client.request(method, url, headers=headers, json=payload, params=params)
+    if prefer:
+        headers["Prefer"] = prefer
+    operation = f"{method} {path.lstrip('/').split('?', 1)[0]}"
+    started = time.perf_counter()
+    try:
+        response = await upstream_clients.get("supabase").request(
+            method, url, headers=headers, json=payload, params=params
+        )
+    except httpx.HTTPError:
+        observe_upstream("supabase", operation, "error", started)
+        raise
+    observe_upstream("supabase", operation, response.status_code, started)
     if response.status_code >= 400:
         logger.error("Supabase admin request failed: %s %s -> %s %s", method, path, response.status_code, response.text)
         raise HTTPException(502, "Database persistence error")
@@ -180,6 +465,108 @@ async def supabase_admin_request(method: str, path: str, payload: Optional[Any]
     return response.json()
 
 
+T = TypeVar("T")
+
+
+async def query_database(
+    operation: str,
+    direct: Callable[[PostgresDataLayer], Awaitable[T]],
+    fallback: Callable[[], Awaitable[T]],
+) -> T:
+    """Run ``direct`` over the asyncpg pool, or ``fallback`` over PostgREST when it is not configured or unreachable."""
+    if not database.configured:
+        return await fallback()
+    started = time.perf_counter()
+    try:
+        result = await direct(database)
+    except database_connection_errors():
+        observe_upstream("postgres", operation, "error", started)
+        DATABASE_FALLBACKS.labels(operation).inc()
+        logger.warning("Direct Postgres %s failed; falling back to PostgREST", operation, exc_info=True)
+        return await fallback()
+    observe_upstream("postgres", operation, "ok", started)
+    return result
+
+
+LLM_REPAIR_PROMPT = """Your {tool} input did not match its schema:
+{errors}
+Call {tool} again with the complete, corrected input."""
+LLM_REPAIR_MAX_ERRORS = 10
+
+
+def describe_llm_output_error(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        errors = exc.errors(include_url=False)
+        lines = [
+            f"- {'.'.join(str(part) for part in error['loc']) or '(root)'}: {error['msg']}"
+            for error in errors[:LLM_REPAIR_MAX_ERRORS]
+        ]
+        if len(errors) > LLM_REPAIR_MAX_ERRORS:
+            lines.append(f"- ... and {len(errors) - LLM_REPAIR_MAX_ERRORS} more")
+        return "\n".join(lines)
+    return f"- (root): not valid JSON ({exc})"
+
+
+async def call_llm_structured(
+    messages: list,
+    route: LLMRoute,
+    timer: StageTimer,
+    output_model: type[LLMOutput],
+    tool: dict,
+) -> tuple[LLMOutput, LLMResult]:
+    """Call the LLM with a forced tool and validate the input once against ``output_model``.
+
+    An invalid answer gets exactly one repair call that shows the model its validation
+    errors. If the repaired answer is still invalid, the request fails with a 502.
+    """
+    with timer.stage("llm"):
+        result = await call_llm(messages, route, timer, tool=tool)
+    try:
+        with timer.stage("parse"):
+            output = output_model.model_validate(parse_json_response(result.text))
+        LLM_STRUCTURED_OUTPUTS.labels(route, "valid").inc()
+        return output, result
+    except (json.JSONDecodeError, ValidationError) as exc:
+        errors = describe_llm_output_error(exc)
+
+    logger.warning("LLM output failed validation, attempting repair: route=%s model=%s\n%s", route, result.model, errors)
+    repair_messages = [
+        *messages,
+        {"role": "assistant", "content": result.text or "(empty)"},
+        {"role": "user", "content": LLM_REPAIR_PROMPT.format(tool=tool["name"], errors=errors)},
+    ]
+    with timer.stage("llm_repair"):
+        result = await call_llm(repair_messages, route, timer, tool=tool)
+    try:
+        with timer.stage("parse"):
+            output = output_model.model_validate(parse_json_response(result.text))
+    except (json.JSONDecodeError, ValidationError) as exc:
+        LLM_STRUCTURED_OUTPUTS.labels(route, "repair_failed").inc()
+        logger.error(
+            "LLM output still invalid after repair: route=%s model=%s\n%s", route, result.model, describe_llm_output_error(exc)
+        )
+        raise HTTPException(502, "Failed to parse LLM response")
+    LLM_STRUCTURED_OUTPUTS.labels(route, "repaired").inc()
+    return output, result
+
+
+IDENTIFY_TOOL = llm_tool(
+    "record_machine_identification",
+    "Record the identified gym machine or exercise station.",
+    MachineIdentification,
+)
+ENRICHED_IDENTIFY_TOOL = llm_tool(
+    "record_machine_identification",
+    "Record the identified gym machine or exercise station, with catalog-style enrichment.",
+    EnrichedMachineIdentification,
+)
+RECOMMENDATION_TOOL = llm_tool(
+    "record_training_recommendation",
+    "Record the training analysis and recommendations.",
+    RecommendationReportPayload,
+)
+
+
 def parse_json_response(text: str) -> Any:
     cleaned = text.strip()
     if cleaned.startswith("```"):
@@ -187,10 +574,14 @@ def parse_json_response(text: str) -> Any:
     if cleaned.endswith("```"):
         cleaned = cleaned.rsplit("```", 1)[0]
     cleaned = cleaned.replace("```json", "").replace("```", "").strip()
-    return json.loads(cleaned)
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        LLM_JSON_PARSE_FAILURES.inc()
+        raise
 
 
-async def persist_analysis_report(
+def analysis_report_row(
     user_id: str,
     report_type: str,
     payload: dict,
@@ -199,8 +590,8 @@ async def persist_analysis_report(
     metadata: Optional[dict] = None,
     title: Optional[str] = None,
     summary: Optional[str] = None,
-) -> Optional[str]:
-    report_row = {
+) -> dict:
+    return {
         "user_id": user_id,
         "report_type": report_type,
         "recommendation_scope_id": scope_id,
@@ -211,27 +602,137 @@ async def persist_analysis_report(
         "evidence": evidence if isinstance(evidence, list) else [],
         "metadata": metadata or {},
     }
-    rows = await supabase_admin_request(
-        "POST",
-        "analysis_reports",
-        payload=[report_row],
-        params={"select": "id"},
+
+
+async def persist_analysis_report(
+    user_id: str,
+    report_type: str,
+    payload: dict,
+    evidence: Any,
+    scope_id: Optional[str] = None,
+    metadata: Optional[dict] = None,
+    title: Optional[str] = None,
+    summary: Optional[str] = None,
+) -> Optional[str]:
+    return await insert_analysis_report(
+        analysis_report_row(user_id, report_type, payload, evidence, scope_id, metadata, title, summary)
+    )
+
+
+async def insert_analysis_report(report_row: dict) -> Optional[str]:
+    async def via_postgrest() -> Optional[str]:
+        rows = await supabase_admin_request(
+            "POST",
+            "analysis_reports",
+            payload=[report_row],
+            params={"select": "id"},
+        )
+        if isinstance(rows, list) and rows:
+            return rows[0].get("id")
+        return None
+
+    return await query_database(
+        "insert_analysis_report", lambda db: db.insert_analysis_report(report_row), via_postgrest
     )
-    if isinstance(rows, list) and rows:
-        return rows[0].get("id")
-    return None
 
 
 @app.post("/api/identify-machine")
-async def identify_machine(req: IdentifyRequest, user_id: str = Depends(get_current_user_id)):
+async def identify_machine(
+    request: Request,
+    req: IdentifyRequest,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    request_deadline: Optional[str] = Header(None, alias="X-Request-Deadline"),
+):
     # Request DTO contract is defined in schemas/forms.py:IdentifyRequest.
     logger.debug("identify-machine request authorized for user_id=%s", user_id)
+    timer = request_stage_timer(request)
+    return await run_cancellable(
+        request,
+        "identify-machine",
+        lambda: idempotency_store.run(
+            "identify-machine",
+            user_id,
+            idempotency_key,
+            request_fingerprint(req.model_dump_json()),
+            lambda: identify_machine_from_images(req, user_id, timer),
+        ),
+        request_deadline,
+    )
+
+
+IDENTIFY_INDEX_MACHINE_SELECT = (
+    "id,name,movement,muscle_groups,variations,exercise_type,default_weight,default_reps,notes,thumbnails,source"
+)
+
+
+async def fetch_identify_index_library(user_id: str) -> list[dict]:
+    rows = await supabase_admin_request(
+        "GET",
+        "machines",
+        params={"select": IDENTIFY_INDEX_MACHINE_SELECT, "user_id": f"eq.{user_id}"},
+    )
+    return rows if isinstance(rows, list) else []
+
+
+async def fetch_catalog_thumbnail(url: str) -> bytes:
+    limit = IDENTIFY_INDEX_MAX_REMOTE_IMAGE_BYTES
+    async with upstream_clients.get("images").stream("GET", url) as response:
+        response.raise_for_status()
+        declared = response.headers.get("content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            raise ValueError(f"Catalog thumbnail too large: {declared} bytes")
+        # Content-Length can be absent or wrong, so the body is capped as it arrives.
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+            if len(body) > limit:
+                raise ValueError(f"Catalog thumbnail too large: over {limit} bytes")
+    return bytes(body)
+
+
+def decode_identify_images(req: IdentifyRequest) -> list[bytes]:
+    images = []
+    for img in req.images:
+        try:
+            images.append(base64.b64decode(img.data))
+        except (binascii.Error, ValueError):
+            continue
+    return images
+
+
+async def identify_machine_from_images(req: IdentifyRequest, user_id: str, timer: StageTimer) -> dict:
+    timer.attributes.update({"identify.mode": "enriched" if req.enrich_with_web_search else "base"})
+
+    hashes: list[int] = []
+    if settings.identify_index_enabled:
+        try:
+            with timer.stage("index_lookup"):
+                hashes = await equipment_image_index.hash_images(decode_identify_images(req))
+                match = await equipment_image_index.lookup(user_id, hashes, fetch_identify_index_library)
+        except Exception:
+            logger.warning("Identify index lookup failed: user_id=%s", user_id, exc_info=True)
+            IDENTIFY_INDEX_LOOKUPS.labels("error").inc()
+            match = None
+        else:
+            IDENTIFY_INDEX_LOOKUPS.labels("hit" if match else "miss" if hashes else "unhashable").inc()
+        if match is not None:
+            timer.attributes.update({"identify.index_source": match.source, "identify.index_distance": match.distance})
+            return {
+                **match.profile,
+                "fromIndex": True,
+                "indexMatch": {
+                    "source": match.source,
+                    "machineId": match.machine_id,
+                    "confidence": round(match.confidence, 3),
+                },
+            }
 
     base_prompt = """You are a gym equipment expert. Analyze these photos of a gym machine or exercise station.
 Identify the machine and the specific exercise/movement it's set up for.
 Look for details like grip position, seat adjustment, cable angle, etc.
 
-Return ONLY valid JSON (no markdown, no backticks):
+Record your answer with the record_machine_identification tool:
 {
   "name": "short machine name",
   "exerciseType": "Push | Pull | Legs | Core",
@@ -248,7 +749,7 @@ Use an enriched lookup approach (as if cross-checking common gym catalogs and we
 Identify the machine and the specific exercise/movement it's set up for.
 Look for details like grip position, seat adjustment, cable angle, and foot/seat/chest-pad positioning.
 
-Return ONLY valid JSON (no markdown, no backticks):
+Record your answer with the record_machine_identification tool:
 {
   "name": "short machine name",
   "exerciseType": "Push | Pull | Legs | Core",
@@ -266,26 +767,30 @@ Return ONLY valid JSON (no markdown, no backticks):
   "notes": "brief form tips including confidence caveats"
 }"""
 
-    content = []
-    for img in req.images:
+    with timer.stage("prompt_build"):
+        content = []
+        for img in req.images:
+            content.append({
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": img.media_type,
+                    "data": img.data,
+                },
+            })
         content.append({
-            "type": "image",
-            "source": {
-                "type": "base64",
-                "media_type": img.media_type,
-                "data": img.data,
-            },
+            "type": "text",
+            "text": enriched_prompt if req.enrich_with_web_search else base_prompt,
         })
-    content.append({
-        "type": "text",
-        "text": enriched_prompt if req.enrich_with_web_search else base_prompt,
-    })
 
-    try:
-        text = await call_anthropic([{"role": "user", "content": content}])
-        return parse_json_response(text)
-    except json.JSONDecodeError:
-        raise HTTPException(502, "Failed to parse LLM response")
+    if req.enrich_with_web_search:
+        output_model, tool, route = EnrichedMachineIdentification, ENRICHED_IDENTIFY_TOOL, "identify_enriched"
+    else:
+        output_model, tool, route = MachineIdentification, IDENTIFY_TOOL, "identify"
+    identification, _ = await call_llm_structured([{"role": "user", "content": content}], route, timer, output_model, tool)
+    result = identification.model_dump(mode="json")
+    await equipment_image_index.remember(user_id, hashes, result)
+    return {**result, "fromIndex": False}
 
 
 def trim_history_to_token_budget(items: list[dict], budget: int) -> list[dict]:
@@ -296,15 +801,17 @@ def trim_history_to_token_budget(items: list[dict], budget: int) -> list[dict]:
         est_tokens = len(text) // 4
         if used + est_tokens > budget:
             break
-        result.insert(0, item)
+        result.append(item)
         used += est_tokens
+    result.reverse()
     return result
 
 
 def normalize_recommendation_request(req: RecommendationRequest) -> tuple[dict, list[dict], dict]:
     if req.scope and req.grouped_training is not None:
         scope = req.scope.model_dump()
-        grouped_training = [bucket.model_dump() for bucket in req.grouped_training]
+        # Validated buckets are already plain dicts; the prompt builder only reads them.
+        grouped_training = req.grouped_training
         equipment = req.equipment or {}
         return scope, grouped_training, equipment
 
@@ -337,7 +844,216 @@ def normalize_recommendation_request(req: RecommendationRequest) -> tuple[dict,
     return scope, grouped, equipment
 
 
+def needs_server_side_assembly(req: RecommendationRequest) -> bool:
+    """True when the client sent only ``scope``/``scope_id`` and expects the backend to load the history."""
+    return (
+        req.grouped_training is None
+        and req.current_session is None
+        and req.past_sessions is None
+        and (req.scope is not None or req.scope_id is not None)
+    )
+
+
+RECOMMENDATION_SET_COLUMNS = (
+    "id,machine_id,reps,weight,set_type,duration_seconds,rest_seconds,"
+    "logged_at,training_date,training_bucket_id,workout_cluster_id"
+)
+# Keys match idx_sets_bucket / idx_sets_cluster so PostgREST can walk the index newest-first;
+# all columns are descending and ``id`` breaks ties so pages can resume after the last row.
+RECOMMENDATION_SET_KEYS = {
+    "training_day": ("training_bucket_id", "logged_at", "id"),
+    "training_week": ("training_bucket_id", "logged_at", "id"),
+    "cluster": ("training_date", "workout_cluster_id", "logged_at", "id"),
+}
+RECOMMENDATION_SORENESS_LIMIT = 500
+
+
+def keyset_after(row: dict, keys: tuple[str, ...]) -> str:
+    """PostgREST ``or`` value for rows after ``row`` in ``keys`` order (all descending, nulls first)."""
+    column, rest = keys[0], keys[1:]
+    value = row.get(column)
+    if value is None:
+        after, tie = f"{column}.not.is.null", f"{column}.is.null"
+    else:
+        after, tie = f'{column}.lt."{value}"', f'{column}.eq."{value}"'
+    if not rest:
+        return f"({after})"
+    return f"({after},and({tie},or{keyset_after(row, rest)}))"
+
+
+async def fetch_scope_sets(user_id: str, scope: dict) -> tuple[list[dict], bool]:
+    """Newest sets of a scope, up to the assembly cap, and whether older sets were left out."""
+    keys = RECOMMENDATION_SET_KEYS.get(scope["grouping"], RECOMMENDATION_SET_KEYS["training_day"])
+    params = {
+        "user_id": f"eq.{user_id}",
+        "set_type": f"in.({','.join(scope['included_set_types'])})",
+        "select": RECOMMENDATION_SET_COLUMNS,
+        "order": ",".join(f"{key}.desc" for key in keys),
+    }
+    date_filters = []
+    if scope.get("date_start"):
+        date_filters.append(f"training_date.gte.{scope['date_start']}")
+    if scope.get("date_end"):
+        date_filters.append(f"training_date.lte.{scope['date_end']}")
+    if date_filters:
+        params["and"] = f"({','.join(date_filters)})"
+
+    # The newest sets are kept when the cap is hit, matching trim_history_to_token_budget.
+    # The last page asks for one extra row so a truncated scope can be told apart from one
+    # that holds exactly ``max_sets`` sets.
+    max_sets = settings.recommendation_assembly_max_sets
+    rows: list[dict] = []
+    while True:
+        remaining = max_sets - len(rows)
+        limit = min(settings.export_page_size, remaining + 1)
+        page_params = {**params, "limit": str(limit)}
+        if rows:
+            page_params["or"] = keyset_after(rows[-1], keys)
+        page = await supabase_admin_request("GET", "sets", params=page_params) or []
+        if len(page) > remaining:
+            rows.extend(page[:remaining])
+            return rows, True
+        rows.extend(page)
+        if len(page) < limit:
+            return rows, False
+
+
+async def fetch_equipment_catalog(user_id: str) -> dict[str, dict]:
+    rows = await supabase_admin_request(
+        "GET",
+        "machines",
+        params={"user_id": f"eq.{user_id}", "select": "id,name,movement,muscle_groups,equipment_type"},
+    ) or []
+    return {
+        row["id"]: {
+            "name": row.get("name"),
+            "movement": row.get("movement"),
+            "muscle_groups": row.get("muscle_groups") or [],
+            "equipment_type": row.get("equipment_type") or "other",
+        }
+        for row in rows
+    }
+
+
+async def fetch_scope_soreness(user_id: str, scope: dict) -> list[dict]:
+    params = {
+        "user_id": f"eq.{user_id}",
+        "select": "training_bucket_id,muscle_group,level,reported_at",
+        "order": "reported_at.desc",
+        "limit": str(RECOMMENDATION_SORENESS_LIMIT),
+    }
+    date_filters = []
+    if scope.get("date_start"):
+        date_filters.append(f"reported_at.gte.{scope['date_start']}")
+    if scope.get("date_end"):
+        end_exclusive = date.fromisoformat(scope["date_end"]) + timedelta(days=1)
+        date_filters.append(f"reported_at.lt.{end_exclusive.isoformat()}")
+    if date_filters:
+        params["and"] = f"({','.join(date_filters)})"
+    rows = await supabase_admin_request("GET", "soreness_reports", params=params) or []
+    return list(reversed(rows))
+
+
+def _training_bucket_key(row: dict, grouping: str) -> str:
+    training_date = row.get("training_date") or (row.get("logged_at") or "")[:10]
+    bucket_id = row.get("training_bucket_id") or f"training_day:{training_date}"
+    if grouping == "cluster" and row.get("workout_cluster_id"):
+        return f"cluster:{row['workout_cluster_id']}"
+    if grouping == "training_week":
+        week_start = _bucket_week_start(training_date)
+        return f"training_week:{week_start}" if week_start else bucket_id
+    return bucket_id
+
+
+def group_sets_into_buckets(rows: list[dict], equipment: dict[str, dict], grouping: str) -> list[dict]:
+    """Server-side port of frontend/src/lib/trainingBuckets.js, extended to cluster/week grouping."""
+    buckets: dict[str, dict] = {}
+    for row in rows:
+        bucket_id = _training_bucket_key(row, grouping)
+        logged_at = row.get("logged_at")
+        bucket = buckets.get(bucket_id)
+        if bucket is None:
+            bucket = buckets[bucket_id] = {
+                "training_bucket_id": bucket_id,
+                "training_date": row.get("training_date") or bucket_id.replace("training_day:", ""),
+                "workout_cluster_id": None,
+                "workout_cluster_ids": [],
+                "started_at": logged_at,
+                "ended_at": logged_at,
+                "sets": [],
+            }
+        cluster_id = row.get("workout_cluster_id")
+        if cluster_id and cluster_id not in bucket["workout_cluster_ids"]:
+            bucket["workout_cluster_ids"].append(cluster_id)
+        bucket["workout_cluster_id"] = (
+            bucket["workout_cluster_ids"][0] if len(bucket["workout_cluster_ids"]) == 1 else None
+        )
+        bucket["sets"].append(
+            {
+                "machine_id": row.get("machine_id"),
+                "machine_name": (equipment.get(row.get("machine_id")) or {}).get("movement") or "Unknown",
+                "reps": row.get("reps"),
+                "weight": row.get("weight"),
+                "set_type": row.get("set_type") or "working",
+                "duration_seconds": row.get("duration_seconds"),
+                "rest_seconds": row.get("rest_seconds"),
+                "logged_at": logged_at,
+                "workout_cluster_id": cluster_id,
+            }
+        )
+        if logged_at and (not bucket["started_at"] or logged_at < bucket["started_at"]):
+            bucket["started_at"] = logged_at
+        if logged_at and (not bucket["ended_at"] or logged_at > bucket["ended_at"]):
+            bucket["ended_at"] = logged_at
+
+    for bucket in buckets.values():
+        bucket["sets"].sort(key=lambda entry: entry["logged_at"] or "")
+    return sorted(buckets.values(), key=lambda bucket: bucket["started_at"] or "")
+
+
+async def assemble_recommendation_inputs(
+    req: RecommendationRequest, user_id: str, timer: StageTimer
+) -> tuple[dict, list[dict], dict, list[dict], bool]:
+    """Load sets, equipment and soreness for a scope directly from Supabase.
+
+    The last item is True when the scope held more sets than ``RECOMMENDATION_ASSEMBLY_MAX_SETS``
+    and only the newest ones were loaded.
+    """
+    equipment_task = asyncio.create_task(fetch_equipment_catalog(user_id))
+    try:
+        if req.scope is not None:
+            scope = req.scope.model_dump(mode="json")
+        else:
+            scope_row = await fetch_owned_scope(user_id, req.scope_id, timer)
+            scope = RecommendationScope.model_validate(
+                {key: scope_row.get(key) for key in ("grouping", "date_start", "date_end", "included_set_types")}
+            ).model_dump(mode="json")
+
+        with timer.stage("fetch_training"):
+            (set_rows, sets_truncated), soreness, equipment = await asyncio.gather(
+                fetch_scope_sets(user_id, scope),
+                fetch_scope_soreness(user_id, scope),
+                equipment_task,
+            )
+    except BaseException:
+        equipment_task.cancel()
+        raise
+
+    if sets_truncated:
+        timer.attributes["recommendation.sets_truncated"] = True
+        logger.warning(
+            "Recommendation scope truncated to the newest %s sets: user_id=%s",
+            settings.recommendation_assembly_max_sets,
+            user_id,
+        )
+    with timer.stage("group_training", set_count=len(set_rows)):
+        grouped_training = group_sets_into_buckets(set_rows, equipment, scope["grouping"])
+    return scope, grouped_training, equipment, soreness, sets_truncated
+
+
 def serialize_equipment_catalog(equipment: dict[str, Any]) -> dict[str, Any]:
+    if equipment and all(isinstance(machine, MachineDTO) for machine in equipment.values()):
+        return equipment_catalog_adapter.dump_python(equipment)
     serialized: dict[str, Any] = {}
     for machine_id, machine in equipment.items():
         if hasattr(machine, "model_dump"):
@@ -347,49 +1063,20 @@ def serialize_equipment_catalog(equipment: dict[str, Any]) -> dict[str, Any]:
     return serialized
 
 
-@app.post("/api/recommendations")
-async def get_recommendations(req: RecommendationRequest, user_id: str = Depends(get_current_user_id)):
-    # Request DTO contract is defined in schemas/forms.py:RecommendationRequest.
-
-    logger.debug("recommendations request authorized for user_id=%s", user_id)
-
-    validated_scope_id: Optional[str] = None
-    if req.scope_id:
-        if is_supabase_admin_configured():
-            scope_rows = await supabase_admin_request(
-                "GET",
-                "recommendation_scopes",
-                params={
-                    "id": f"eq.{req.scope_id}",
-                    "user_id": f"eq.{user_id}",
-                    "select": "id",
-                    "limit": "1",
-                },
-            )
-            if not scope_rows:
-                logger.warning(
-                    "Rejected recommendation request with invalid scope ownership: user_id=%s scope_id=%s",
-                    user_id,
-                    req.scope_id,
-                )
-                raise HTTPException(400, "Invalid scope_id")
-            validated_scope_id = req.scope_id
-        else:
-            logger.warning(
-                "Skipping scope validation because supabase admin credentials are not configured: user_id=%s scope_id=%s",
-                user_id,
-                req.scope_id,
-            )
-
-    scope, grouped_training, equipment = normalize_recommendation_request(req)
+def build_recommendation_prompt(
+    scope: dict,
+    grouped_training: list[dict],
+    equipment: dict[str, Any],
+    soreness_data: list,
+) -> str:
     serialized_equipment = serialize_equipment_catalog(equipment)
     trimmed_training = trim_history_to_token_budget(grouped_training, settings.max_history_tokens)
 
     soreness_ctx = ""
-    if req.soreness_data:
+    if soreness_data:
         soreness_ctx = (
             "\n\nRECENT SORENESS REPORTS:\n"
-            f"{json.dumps([entry.model_dump() for entry in req.soreness_data], indent=2)}"
+            f"{json.dumps([entry.model_dump() if hasattr(entry, 'model_dump') else entry for entry in soreness_data], indent=2)}"
         )
 
     goals = scope.get("goals", [])
@@ -415,7 +1102,7 @@ When trade-offs are required, call them out and explain how each suggestion serv
 Consider volume progression, muscle balance, rest patterns, soreness feedback, and exercise variety.
 Do not infer set duration if duration_seconds is missing.
 
-Return ONLY valid JSON:
+Record your answer with the record_training_recommendation tool:
 {{
   "summary": "2-3 sentence summary",
   "highlights": ["2-3 positives"],
@@ -436,16 +1123,113 @@ Return ONLY valid JSON:
     }}
   ]
 }}"""
+    return prompt
+
+
+RECOMMENDATION_SCOPE_SELECT = "id,grouping,date_start,date_end,included_set_types"
+
+
+async def fetch_owned_scope(user_id: str, scope_id: str, timer: StageTimer) -> dict:
+    """Return the scope row if ``user_id`` owns it; raise 400 otherwise.
 
+    Owned scopes are cached briefly and concurrent lookups share one request; rejections
+    are never cached.
+    """
+
+    async def load() -> dict:
+        with timer.stage("scope_validation"):
+            scope_rows = await supabase_admin_request(
+                "GET",
+                "recommendation_scopes",
+                params={
+                    "id": f"eq.{scope_id}",
+                    "user_id": f"eq.{user_id}",
+                    "select": RECOMMENDATION_SCOPE_SELECT,
+                    "limit": "1",
+                },
+            )
+        if not scope_rows:
+            logger.warning(
+                "Rejected recommendation request with invalid scope ownership: user_id=%s scope_id=%s",
+                user_id,
+                scope_id,
+            )
+            raise HTTPException(400, "Invalid scope_id")
+        return scope_rows[0]
+
+    return await scope_ownership_cache.get_or_set(f"{user_id}:{scope_id}", load, ttl=SCOPE_OWNERSHIP_TTL_SECONDS)
+
+
+async def validate_recommendation_scope(req: RecommendationRequest, user_id: str, timer: StageTimer) -> Optional[str]:
+    if not req.scope_id:
+        return None
+    if not is_supabase_admin_configured():
+        logger.warning(
+            "Skipping scope validation because supabase admin credentials are not configured: user_id=%s scope_id=%s",
+            user_id,
+            req.scope_id,
+        )
+        return None
+
+    await fetch_owned_scope(user_id, req.scope_id, timer)
+    return req.scope_id
+
+
+async def _await_scope_and_llm(
+    scope_task: asyncio.Task, llm_task: asyncio.Task
+) -> tuple[Optional[str], tuple[LLMOutput, LLMResult]]:
+    """Wait for both tasks; an ownership failure wins and cancels the in-flight LLM call."""
     try:
-        text = await call_anthropic([{"role": "user", "content": prompt}])
-        response = parse_json_response(text)
-        if not isinstance(response, dict):
-            raise HTTPException(502, "LLM response must be a JSON object")
+        await asyncio.wait({scope_task, llm_task}, return_when=asyncio.FIRST_EXCEPTION)
+        validated_scope_id = await scope_task
+        return validated_scope_id, await llm_task
+    finally:
+        for task in (scope_task, llm_task):
+            if not task.done():
+                task.cancel()
 
-        report_persisted = True
-        report_id: Optional[str] = None
-        try:
+
+async def generate_recommendation(
+    req: RecommendationRequest,
+    user_id: str,
+    timer: StageTimer,
+    source: str = "api/recommendations",
+) -> dict:
+    # Scope ownership is checked concurrently with prompt assembly and the LLM call
+    # instead of serializing a Supabase round trip in front of them.
+    scope_task = asyncio.create_task(validate_recommendation_scope(req, user_id, timer))
+    # Let the ownership request go out before the CPU-bound prompt build.
+    await asyncio.sleep(0)
+    server_assembled = needs_server_side_assembly(req)
+    try:
+        if server_assembled:
+            scope, grouped_training, equipment, soreness_data, sets_truncated = await assemble_recommendation_inputs(
+                req, user_id, timer
+            )
+        else:
+            scope, grouped_training, equipment = normalize_recommendation_request(req)
+            soreness_data = req.soreness_data
+            sets_truncated = False
+        with timer.stage("prompt_build"):
+            prompt = build_recommendation_prompt(scope, grouped_training, equipment, soreness_data)
+    except BaseException:
+        scope_task.cancel()
+        raise
+
+    async def structured_llm_call() -> tuple[LLMOutput, LLMResult]:
+        return await call_llm_structured(
+            [{"role": "user", "content": prompt}], "recommendation", timer, RecommendationReportPayload, RECOMMENDATION_TOOL
+        )
+
+    validated_scope_id, (payload, llm_result) = await _await_scope_and_llm(
+        scope_task, asyncio.create_task(structured_llm_call())
+    )
+    response = payload.model_dump(mode="json")
+
+    report_persisted = True
+    report_id: Optional[str] = None
+    try:
+        with timer.stage("persist"):
             report_id = await persist_analysis_report(
                 user_id=user_id,
                 report_type="recommendation",
@@ -457,44 +1241,152 @@ Return ONLY valid JSON:
                 metadata={
                     "grouping": scope.get("grouping"),
                     "included_set_types": scope.get("included_set_types", []),
-                    "source": "api/recommendations",
+                    "source": source,
+                    "input_assembly": "server" if server_assembled else "client",
+                    "sets_truncated": sets_truncated,
+                    "model": llm_result.model,
+                    "model_fallback": llm_result.fallback_reason,
                 },
             )
-        except HTTPException as exc:
-            report_persisted = False
-            logger.error(
-                "Failed to persist recommendation report: user_id=%s scope_id=%s reason=%s",
-                user_id,
-                validated_scope_id,
-                exc.detail,
-            )
-        except Exception as exc:
-            report_persisted = False
-            logger.exception(
-                "Unexpected recommendation report persistence failure: user_id=%s scope_id=%s reason=%s",
-                user_id,
-                validated_scope_id,
-                str(exc),
-            )
+    except HTTPException as exc:
+        report_persisted = False
+        logger.error(
+            "Failed to persist recommendation report: user_id=%s scope_id=%s reason=%s",
+            user_id,
+            validated_scope_id,
+            exc.detail,
+        )
+    except Exception as exc:
+        report_persisted = False
+        logger.exception(
+            "Unexpected recommendation report persistence failure: user_id=%s scope_id=%s reason=%s",
+            user_id,
+            validated_scope_id,
+            str(exc),
+        )
 
-        if validated_scope_id:
-            response["scope_id"] = validated_scope_id
-        if report_persisted and report_id:
-            response["report_id"] = report_id
-        elif not report_persisted:
-            response.pop("report_id", None)
-        response["report_persisted"] = report_persisted
-        return response
-    except json.JSONDecodeError:
-        raise HTTPException(502, "Failed to parse LLM response")
+    if validated_scope_id:
+        response["scope_id"] = validated_scope_id
+    if report_persisted and report_id:
+        response["report_id"] = report_id
+    elif not report_persisted:
+        response.pop("report_id", None)
+    response["report_persisted"] = report_persisted
+    response["sets_truncated"] = sets_truncated
+    return response
+
+
+@app.post("/api/recommendations")
+async def get_recommendations(
+    request: Request,
+    req: RecommendationRequest,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    request_deadline: Optional[str] = Header(None, alias="X-Request-Deadline"),
+):
+    # Request DTO contract is defined in schemas/forms.py:RecommendationRequest.
+
+    logger.debug("recommendations request authorized for user_id=%s", user_id)
+    # Cancelling before the LLM call returns also skips persisting a report nobody will read.
+    return await run_cancellable(
+        request,
+        "recommendations",
+        lambda: idempotency_store.run(
+            "recommendations",
+            user_id,
+            idempotency_key,
+            request_fingerprint(req.model_dump_json()),
+            lambda: generate_recommendation(req, user_id, request_stage_timer(request)),
+        ),
+        request_deadline,
+    )
+
+
+RECOMMENDATION_JOB_EVENTS_KEEPALIVE_SECONDS = 15.0
+
+
+@app.post("/api/recommendations/jobs", status_code=202)
+async def submit_recommendation_job(
+    request: Request,
+    req: RecommendationRequest,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    # Scope ownership is checked up front so invalid requests fail fast instead of as a failed job;
+    # the job re-checks it from the ownership cache.
+    await validate_recommendation_scope(req, user_id, request_stage_timer(request))
+
+    async def run(job_timer: StageTimer) -> dict:
+        return await generate_recommendation(req, user_id, job_timer, source="api/recommendations/jobs")
+
+    async def submit() -> dict:
+        try:
+            job = await recommendation_jobs.submit(user_id, run, kind="recommendation")
+        except JobQueueFullError:
+            raise HTTPException(503, "Recommendation queue is full", headers={"Retry-After": "5"})
+        return {**job, "poll_url": f"/api/recommendations/jobs/{job['job_id']}"}
+
+    # A replay returns the original job descriptor, so a retried submit polls the same job.
+    return await idempotency_store.run(
+        "recommendations/jobs",
+        user_id,
+        idempotency_key,
+        request_fingerprint(req.model_dump_json()),
+        submit,
+        status_code=202,
+    )
+
+
+@app.get("/api/recommendations/jobs/{job_id}")
+async def get_recommendation_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    after_version: int = Query(-1),
+    user_id: str = Depends(get_current_user_id),
+):
+    # wait > 0 turns the poll into a long-poll that returns as soon as the job changes.
+    if wait:
+        job = await recommendation_jobs.wait_for_update(job_id, user_id, after_version, wait)
+    else:
+        job = await recommendation_jobs.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+async def stream_recommendation_job_events(job_id: str, user_id: str) -> AsyncIterator[str]:
+    seen_version = -1
+    while True:
+        job = await recommendation_jobs.wait_for_update(
+            job_id, user_id, seen_version, RECOMMENDATION_JOB_EVENTS_KEEPALIVE_SECONDS
+        )
+        if job is None:
+            yield "event: error\ndata: {\"detail\": \"Job not found\"}\n\n"
+            return
+        if job["version"] == seen_version:
+            yield ": keepalive\n\n"
+            continue
+        seen_version = job["version"]
+        yield f"event: status\ndata: {json.dumps(job)}\n\n"
+        if job["status"] in TERMINAL_STATUSES:
+            return
+
+
+@app.get("/api/recommendations/jobs/{job_id}/events")
+async def recommendation_job_events(job_id: str, user_id: str = Depends(get_current_user_id)):
+    if await recommendation_jobs.get(job_id, user_id) is None:
+        raise HTTPException(404, "Job not found")
+    return StreamingResponse(
+        stream_recommendation_job_events(job_id, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 def _bucket_week_start(training_date: str) -> Optional[str]:
     if not training_date:
         return None
     try:
-        from datetime import date, timedelta
-
         date_obj = date.fromisoformat(training_date)
         week_start = date_obj - timedelta(days=date_obj.weekday())
         return week_start.isoformat()
@@ -502,18 +1394,75 @@ def _bucket_week_start(training_date: str) -> Optional[str]:
         return None
 
 
-async def build_weekly_trend_report(user_id: str) -> dict:
-    set_rows = await supabase_admin_request(
-        "GET",
-        "sets",
-        params={
-            "user_id": f"eq.{user_id}",
-            "select": "training_date,reps,weight,set_type",
-            "order": "training_date.desc",
-            "limit": "800",
-        },
+WEEKLY_TREND_FINGERPRINT_VERSION = 1
+
+
+def weekly_trend_fingerprint(trend_points: list[dict], evidence: list[dict], summary: str) -> str:
+    canonical = json.dumps(
+        {"version": WEEKLY_TREND_FINGERPRINT_VERSION, "weeks": trend_points, "evidence": evidence, "summary": summary},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+async def fetch_latest_weekly_trend_report(user_id: str) -> Optional[dict]:
+    # Served by idx_analysis_reports_user_type_created.
+    async def via_postgrest() -> Optional[dict]:
+        rows = await supabase_admin_request(
+            "GET",
+            "analysis_reports",
+            params={
+                "select": "id,fingerprint:metadata->>fingerprint",
+                "user_id": f"eq.{user_id}",
+                "report_type": "eq.weekly_trend",
+                "order": "created_at.desc",
+                "limit": "1",
+            },
+        )
+        return rows[0] if rows else None
+
+    return await query_database(
+        "fetch_latest_report", lambda db: db.fetch_latest_report(user_id, "weekly_trend"), via_postgrest
+    )
+
+
+WEEKLY_TREND_MAX_SETS = 800
+
+
+async def fetch_weekly_trend_sets(user_id: str) -> list[dict]:
+    async def via_postgrest() -> list[dict]:
+        rows = await supabase_admin_request(
+            "GET",
+            "sets",
+            params={
+                "user_id": f"eq.{user_id}",
+                "select": "training_date,reps,weight,set_type",
+                "order": "training_date.desc",
+                "limit": str(WEEKLY_TREND_MAX_SETS),
+            },
+        )
+        return rows or []
+
+    return await query_database(
+        "fetch_weekly_trend_sets", lambda db: db.fetch_weekly_trend_sets(user_id, WEEKLY_TREND_MAX_SETS), via_postgrest
     )
 
+
+async def build_weekly_trend_report(
+    user_id: str, parent_timer: Optional[StageTimer] = None, report_batch: Optional[list[dict]] = None
+) -> dict:
+    """Build (and persist, unless changed-report rows are collected in ``report_batch``) a user's weekly trends."""
+    timer = StageTimer("weekly_trend_report", parent_timer.traceparent() if parent_timer else None)
+    timer.attributes["user_id"] = user_id
+
+    with timer.stage("fetch_sets"):
+        set_rows, latest_report = await asyncio.gather(
+            fetch_weekly_trend_sets(user_id),
+            fetch_latest_weekly_trend_report(user_id),
+        )
+
+    aggregate_started = time.perf_counter()
     weekly = {}
     for row in set_rows or []:
         week_start = _bucket_week_start(row.get("training_date"))
@@ -606,7 +1555,18 @@ async def build_weekly_trend_report(user_id: str) -> dict:
             f"{latest['total_reps']} reps, {round(latest['total_volume'], 1)} volume."
         )
 
-    report_id = await persist_analysis_report(
+    timer.record("aggregate", time.perf_counter() - aggregate_started, set_count=len(set_rows or []))
+
+    fingerprint = weekly_trend_fingerprint(trend_points, evidence, summary)
+    if latest_report and latest_report.get("fingerprint") == fingerprint:
+        timer.attributes["unchanged"] = True
+        if settings.stage_trace_logging:
+            timer.log()
+        if parent_timer is not None:
+            parent_timer.absorb(timer)
+        return {"user_id": user_id, "report_id": latest_report.get("id"), "weeks": trend_points, "unchanged": True}
+
+    report_row = analysis_report_row(
         user_id=user_id,
         report_type="weekly_trend",
         payload={"weeks": trend_points},
@@ -619,44 +1579,127 @@ async def build_weekly_trend_report(user_id: str) -> dict:
             "week_start_min": week_start_min,
             "week_start_max": week_start_max,
             "included_set_types": ["all"],
+            "fingerprint": fingerprint,
         },
     )
+    if report_batch is not None:
+        report_id = new_report_id()
+        report_batch.append({"id": report_id, **report_row})
+    else:
+        with timer.stage("persist"):
+            report_id = await insert_analysis_report(report_row)
 
-    return {"user_id": user_id, "report_id": report_id, "weeks": trend_points}
+    if settings.stage_trace_logging:
+        timer.log()
+    if parent_timer is not None:
+        parent_timer.absorb(timer)
+    return {"user_id": user_id, "report_id": report_id, "weeks": trend_points, "unchanged": False}
 
 
-async def list_all_user_ids_with_sets(page_size: int = 1000) -> list[str]:
-    user_ids: set[str] = set()
-    offset = 0
+async def list_all_user_ids_with_sets(page_size: int = 1000, after_user_id: Optional[str] = None) -> list[str]:
+    async def via_postgrest() -> list[str]:
+        user_ids: set[str] = set()
+        offset = 0
+
+        while True:
+            rows = await supabase_admin_request(
+                "GET",
+                "sets",
+                params={
+                    "select": "user_id",
+                    "user_id": f"gt.{after_user_id}" if after_user_id else "not.is.null",
+                    "order": "user_id.asc",
+                    "limit": str(page_size),
+                    "offset": str(offset),
+                },
+            )
+
+            if not rows:
+                break
+
+            user_ids.update(str(row["user_id"]) for row in rows if row.get("user_id"))
+
+            if len(rows) < page_size:
+                break
+
+            offset += page_size
+
+        return sorted(user_ids)
+
+    return await query_database(
+        "list_user_ids", lambda db: db.list_user_ids_with_sets(after_user_id), via_postgrest
+    )
+
+
+WEEKLY_TREND_CHECKPOINTS = "weekly_trend_job_checkpoints"
+
 
+def default_weekly_trend_run_id(today: Optional[date] = None) -> str:
+    today = today or datetime.now(timezone.utc).date()
+    return f"weekly-{(today - timedelta(days=today.weekday())).isoformat()}"
+
+
+def weekly_trend_shard(user_id: str, shard_count: int) -> int:
+    # Stable across processes and deploys, unlike the salted built-in hash().
+    digest = hashlib.sha256(user_id.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+async def fetch_completed_weekly_trend_users(run_id: str, page_size: int = 1000) -> set[str]:
+    completed: set[str] = set()
+    offset = 0
     while True:
         rows = await supabase_admin_request(
             "GET",
-            "sets",
+            WEEKLY_TREND_CHECKPOINTS,
             params={
                 "select": "user_id",
-                "user_id": "not.is.null",
+                "run_id": f"eq.{run_id}",
                 "order": "user_id.asc",
                 "limit": str(page_size),
                 "offset": str(offset),
             },
         )
+        completed.update(str(row["user_id"]) for row in rows or [] if row.get("user_id"))
+        if not rows or len(rows) < page_size:
+            return completed
+        offset += page_size
 
-        if not rows:
-            break
 
-        user_ids.update(str(row["user_id"]) for row in rows if row.get("user_id"))
+async def record_weekly_trend_checkpoint(run_id: str, user_id: str, shard_index: int, report_id: Optional[str]) -> None:
+    await supabase_admin_request(
+        "POST",
+        WEEKLY_TREND_CHECKPOINTS,
+        payload=[{"run_id": run_id, "user_id": user_id, "shard_index": shard_index, "report_id": report_id}],
+        params={"on_conflict": "run_id,user_id"},
+        prefer="resolution=ignore-duplicates,return=minimal",
+    )
 
-        if len(rows) < page_size:
-            break
 
-        offset += page_size
+async def write_weekly_trend_batch(reports: list[dict], checkpoints: list[dict]) -> None:
+    """Persist buffered weekly reports and checkpoints, with COPY when Postgres is reachable."""
+
+    async def via_postgrest() -> None:
+        # The ids generated for COPY are kept, so checkpoints still point at their reports.
+        if reports:
+            await supabase_admin_request("POST", "analysis_reports", payload=reports, prefer="return=minimal")
+        if checkpoints:
+            await supabase_admin_request(
+                "POST",
+                WEEKLY_TREND_CHECKPOINTS,
+                payload=checkpoints,
+                params={"on_conflict": "run_id,user_id"},
+                prefer="resolution=ignore-duplicates,return=minimal",
+            )
 
-    return sorted(user_ids)
+    await query_database(
+        "write_weekly_trend_batch", lambda db: db.write_weekly_trend_batch(reports, checkpoints), via_postgrest
+    )
+    reports.clear()
+    checkpoints.clear()
 
 
-@app.post("/api/jobs/generate-weekly-trends")
-async def generate_weekly_trends(req: WeeklyTrendJobRequest, x_cron_secret: Optional[str] = Header(None)):
+def require_cron_secret(x_cron_secret: Optional[str]) -> None:
     try:
         cron_secret = settings.require_cron_shared_secret()
     except ValueError as exc:
@@ -665,20 +1708,474 @@ async def generate_weekly_trends(req: WeeklyTrendJobRequest, x_cron_secret: Opti
     if x_cron_secret != cron_secret:
         raise HTTPException(401, "Unauthorized")
 
+
+@app.post("/api/jobs/generate-weekly-trends")
+async def generate_weekly_trends(
+    request: Request,
+    req: WeeklyTrendJobRequest,
+    x_cron_secret: Optional[str] = Header(None),
+):
+    require_cron_secret(x_cron_secret)
+
+    timer = request_stage_timer(request)
+    # Single-user runs are manual re-generations and only checkpoint when given a run_id.
+    run_id = req.run_id or (None if req.user_id else default_weekly_trend_run_id())
     user_ids: list[str] = []
     if req.user_id:
         user_ids = [req.user_id]
     else:
-        user_ids = await list_all_user_ids_with_sets()
-
-    if not user_ids:
-        return {"ok": True, "processed_users": 0, "reports": []}
+        with timer.stage("list_users"):
+            user_ids = await list_all_user_ids_with_sets(after_user_id=req.after_user_id)
+        if req.shard_count > 1:
+            user_ids = [user_id for user_id in user_ids if weekly_trend_shard(user_id, req.shard_count) == req.shard_index]
+
+    skipped_users = 0
+    if run_id and user_ids:
+        with timer.stage("load_checkpoints"):
+            completed = await fetch_completed_weekly_trend_users(run_id)
+        pending = [user_id for user_id in user_ids if user_id not in completed]
+        skipped_users = len(user_ids) - len(pending)
+        user_ids = pending
+
+    remaining_users = 0
+    if req.max_users is not None and len(user_ids) > req.max_users:
+        remaining_users = len(user_ids) - req.max_users
+        user_ids = user_ids[: req.max_users]
+
+    WEEKLY_JOB_PROGRESS.labels("total").set(len(user_ids))
+    WEEKLY_JOB_PROGRESS.labels("completed").set(0)
+    WEEKLY_JOB_PROGRESS.labels("failed").set(0)
+    WEEKLY_JOB_USERS.labels("skipped").inc(skipped_users)
 
     reports = []
-    for user_id in user_ids:
-        reports.append(await build_weekly_trend_report(user_id))
+    unchanged_reports = 0
+    # With a direct database, new reports and checkpoints are buffered and written in batches.
+    batched = database.configured
+    pending_reports: list[dict] = []
+    pending_checkpoints: list[dict] = []
+    try:
+        for user_id in user_ids:
+            try:
+                report = await build_weekly_trend_report(
+                    user_id, parent_timer=timer, report_batch=pending_reports if batched else None
+                )
+                if run_id and batched:
+                    pending_checkpoints.append(
+                        {"run_id": run_id, "user_id": user_id, "shard_index": req.shard_index, "report_id": report["report_id"]}
+                    )
+                elif run_id:
+                    await record_weekly_trend_checkpoint(run_id, user_id, req.shard_index, report["report_id"])
+                if max(len(pending_reports), len(pending_checkpoints)) >= settings.database_write_batch_size:
+                    with timer.stage("persist_batch"):
+                        await write_weekly_trend_batch(pending_reports, pending_checkpoints)
+            except Exception:
+                WEEKLY_JOB_USERS.labels("failed").inc()
+                WEEKLY_JOB_PROGRESS.labels("failed").inc()
+                raise
+            reports.append(report)
+            if report["unchanged"]:
+                unchanged_reports += 1
+                WEEKLY_JOB_USERS.labels("unchanged").inc()
+            WEEKLY_JOB_USERS.labels("processed").inc()
+            WEEKLY_JOB_PROGRESS.labels("completed").inc()
+    finally:
+        # Users finished before a failure are still written, so a retried run skips them.
+        if pending_reports or pending_checkpoints:
+            with timer.stage("persist_batch"):
+                await write_weekly_trend_batch(pending_reports, pending_checkpoints)
+
+    if not remaining_users:
+        WEEKLY_JOB_LAST_COMPLETED.set(time.time())
+    return {
+        "ok": True,
+        "run_id": run_id,
+        "shard_index": req.shard_index,
+        "shard_count": req.shard_count,
+        "processed_users": len(reports),
+        "skipped_users": skipped_users,
+        # Users whose trends matched their latest report; no new row was written.
+        "unchanged_reports": unchanged_reports,
+        "remaining_users": remaining_users,
+        # Users are handled in ascending id order, so the last one is a valid resume cursor.
+        "next_cursor": user_ids[-1] if remaining_users else None,
+        "done": remaining_users == 0,
+        "reports": reports,
+    }
+
+
+ANALYSIS_REPORT_PARTITION_MONTHS_AHEAD = 3
+
 
-    return {"ok": True, "processed_users": len(reports), "reports": reports}
+@app.post("/api/jobs/prune-analysis-reports")
+async def prune_analysis_reports(
+    request: Request,
+    req: AnalysisReportRetentionJobRequest,
+    x_cron_secret: Optional[str] = Header(None),
+):
+    """Enforce the analysis_reports retention policy (see the partitioning migration)."""
+    require_cron_secret(x_cron_secret)
+    timer = request_stage_timer(request)
+    policy = {
+        "p_keep_latest": settings.analysis_reports_keep_latest,
+        "p_snapshot_months": settings.analysis_reports_snapshot_months,
+    }
+    batch_size = settings.analysis_reports_prune_batch_size
+
+    with timer.stage("ensure_partitions"):
+        created_partitions = await supabase_admin_request(
+            "POST",
+            "rpc/ensure_analysis_reports_partitions",
+            payload={"p_months_ahead": ANALYSIS_REPORT_PARTITION_MONTHS_AHEAD},
+        )
+    # Whole expired months go first: dropping a partition is far cheaper than deleting its rows.
+    with timer.stage("drop_partitions"):
+        dropped_partitions = await supabase_admin_request(
+            "POST", "rpc/drop_expired_analysis_report_partitions", payload=policy
+        )
+    ANALYSIS_REPORTS_PRUNED.labels("partitions").inc(dropped_partitions or 0)
+
+    deleted_reports = 0
+    batches = 0
+    done = False
+    with timer.stage("delete_batches"):
+        while batches < req.max_batches:
+            deleted = await supabase_admin_request(
+                "POST", "rpc/prune_analysis_reports", payload={**policy, "p_batch_size": batch_size}
+            )
+            batches += 1
+            deleted_reports += deleted or 0
+            ANALYSIS_REPORTS_PRUNED.labels("rows").inc(deleted or 0)
+            if (deleted or 0) < batch_size:
+                done = True
+                break
+
+    return {
+        "ok": True,
+        "created_partitions": created_partitions or 0,
+        "dropped_partitions": dropped_partitions or 0,
+        "deleted_reports": deleted_reports,
+        "batches": batches,
+        "done": done,
+    }
+
+
+EXPORT_SET_COLUMNS = (
+    "id",
+    "logged_at",
+    "training_date",
+    "training_bucket_id",
+    "workout_cluster_id",
+    "machine_id",
+    "machine_name",
+    "movement",
+    "set_type",
+    "reps",
+    "weight",
+    "duration_seconds",
+    "rest_seconds",
+)
+EXPORT_SET_SELECT = (
+    "id,logged_at,training_date,training_bucket_id,workout_cluster_id,machine_id,"
+    "set_type,reps,weight,duration_seconds,rest_seconds,machine:machines(name,movement)"
+)
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+async def fetch_export_sets_page(
+    user_id: str,
+    page_size: int,
+    cursor: Optional[tuple[str, str]] = None,
+) -> list[dict]:
+    # Keyset pagination over idx_sets_user_logged (user_id, logged_at desc); id breaks
+    # ties between sets logged in the same instant so no row is skipped or repeated.
+    params = {
+        "user_id": f"eq.{user_id}",
+        "select": EXPORT_SET_SELECT,
+        "order": "logged_at.desc,id.desc",
+        "limit": str(page_size),
+    }
+    if cursor:
+        logged_at, set_id = cursor
+        params["or"] = f'(logged_at.lt."{logged_at}",and(logged_at.eq."{logged_at}",id.lt.{set_id}))'
+    rows = await supabase_admin_request("GET", "sets", params=params)
+    return rows or []
+
+
+def flatten_export_row(row: dict) -> dict:
+    machine = row.get("machine") or {}
+    flattened = {column: row.get(column) for column in EXPORT_SET_COLUMNS}
+    flattened["machine_name"] = machine.get("name")
+    flattened["movement"] = machine.get("movement")
+    return flattened
+
+
+async def iter_export_set_pages(user_id: str, page_size: int, first_page: list[dict]) -> AsyncIterator[list[dict]]:
+    page = first_page
+    while page:
+        yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+        page = await fetch_export_sets_page(user_id, page_size, (last["logged_at"], last["id"]))
+
+
+def encode_export_page(rows: list[dict], export_format: str, include_header: bool = False) -> str:
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_SET_COLUMNS, lineterminator="\n")
+        if include_header:
+            writer.writeheader()
+        writer.writerows(flatten_export_row(row) for row in rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(flatten_export_row(row)) + "\n" for row in rows)
+
+
+async def stream_export_sets(user_id: str, export_format: str, page_size: int, first_page: list[dict]) -> AsyncIterator[str]:
+    if export_format == "csv":
+        yield encode_export_page([], export_format, include_header=True)
+    exported = 0
+    try:
+        async for page in iter_export_set_pages(user_id, page_size, first_page):
+            exported += len(page)
+            yield encode_export_page(page, export_format)
+    except Exception:
+        # Headers are already sent, so the only signal left is an aborted chunked body.
+        logger.exception("Set export aborted: user_id=%s exported_rows=%s", user_id, exported)
+        raise
+
+
+@app.get("/api/export/sets")
+async def export_sets(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    user_id: str = Depends(get_current_user_id),
+):
+    page_size = settings.export_page_size
+    # Fetch the first page before streaming so configuration and upstream errors
+    # still surface as regular HTTP error responses.
+    first_page = await fetch_export_sets_page(user_id, page_size)
+    return StreamingResponse(
+        stream_export_sets(user_id, export_format, page_size, first_page),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="sets-export.{export_format}"'},
+    )
+
+
+PLAN_ADHERENCE_SELECT = (
+    "id,name,plan_days(id,plan_id,weekday,label,"
+    "plan_items(id,plan_day_id,machine_id,target_set_type,target_sets,"
+    "target_rep_range,target_weight_range,notes,order_index))"
+)
+PLAN_ADHERENCE_CACHE_VERSION = 2
+
+
+def normalize_plan_day_row(row: dict) -> dict:
+    # Same fields as normalizePlanDay / normalizePlanItem in frontend/src/lib/supabase.js.
+    return {
+        "id": row.get("id"),
+        "planId": row.get("plan_id"),
+        "weekday": row.get("weekday") if isinstance(row.get("weekday"), int) else None,
+        "label": row.get("label") or "",
+    }
+
+
+def normalize_plan_item_row(row: dict) -> dict:
+    return {
+        "id": row.get("id"),
+        "planDayId": row.get("plan_day_id"),
+        "equipmentId": row.get("machine_id") or None,
+        "targetSetType": row.get("target_set_type") or "working",
+        "targetSets": row.get("target_sets"),
+        "targetRepRange": row.get("target_rep_range"),
+        "targetWeightRange": row.get("target_weight_range"),
+        "notes": row.get("notes") or "",
+        "orderIndex": row.get("order_index") if isinstance(row.get("order_index"), int) else 0,
+    }
+
+
+async def fetch_plan_for_adherence(user_id: str, plan_id: Optional[str]) -> Optional[dict]:
+    # Served by idx_plans_user_active_updated, idx_plan_days_plan_weekday and idx_plan_items_day_order.
+    params = {"user_id": f"eq.{user_id}", "select": PLAN_ADHERENCE_SELECT, "limit": "1"}
+    if plan_id:
+        params["id"] = f"eq.{plan_id}"
+    else:
+        params.update({"is_active": "eq.true", "order": "updated_at.desc"})
+    rows = await supabase_admin_request("GET", "plans", params=params)
+    return rows[0] if rows else None
+
+
+async def fetch_training_day_set_digests(user_id: str, first_day: str, last_day: str) -> dict[str, str]:
+    # One digest of the (machine_id, set_type) counts per training day, i.e. everything
+    # adherence matches sets on; see migration 202610190006.
+    rows = await supabase_admin_request(
+        "POST",
+        "rpc/training_day_set_digests",
+        payload={"p_user_id": user_id, "p_first_day": first_day, "p_last_day": last_day},
+    ) or []
+    return {row["training_date"]: row["set_digest"] for row in rows}
+
+
+async def fetch_adherence_sets(user_id: str, day_keys: list[str]) -> list[dict]:
+    # Keyset pagination on (training_date, id), like the export, so concurrent writes
+    # cannot shift a page boundary and later pages cost the same as the first.
+    params = {
+        "user_id": f"eq.{user_id}",
+        "training_date": f"in.({','.join(day_keys)})",
+        "select": "id,machine_id,set_type,training_date",
+        "order": "training_date.asc,id.asc",
+        "limit": str(settings.export_page_size),
+    }
+    rows: list[dict] = []
+    while True:
+        page = await supabase_admin_request("GET", "sets", params=params) or []
+        rows.extend(page)
+        if len(page) < settings.export_page_size:
+            return rows
+        training_date, set_id = page[-1]["training_date"], page[-1]["id"]
+        params["or"] = f"(training_date.gt.{training_date},and(training_date.eq.{training_date},id.gt.{set_id}))"
+
+
+def plan_adherence_cache_key(
+    user_id: str,
+    day_key: str,
+    plan_day: Optional[dict],
+    items: list[dict],
+    set_digest: Optional[str],
+    day_start_hour: int,
+) -> str:
+    """Key for a closed day's result; it changes whenever an input to that day's adherence does.
+
+    Set writes are tracked through the day's ``training_day_set_digests`` value, which covers
+    inserts, deletes, moves between days and machine_id or set_type edits.
+    """
+    fingerprint = hashlib.sha256(
+        json.dumps(
+            {
+                "version": PLAN_ADHERENCE_CACHE_VERSION,
+                "dayStartHour": day_start_hour,
+                "planDay": plan_day,
+                "items": items,
+                "setDigest": set_digest,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+        ).encode()
+    ).hexdigest()
+    return f"{user_id}:{day_key}:{fingerprint}"
+
+
+@app.get("/api/plans/adherence")
+async def plan_adherence(
+    request: Request,
+    plan_id: Optional[str] = Query(None),
+    today: Optional[str] = Query(None, description="The client's current training day (YYYY-MM-DD)."),
+    tz: str = Query("UTC", description="IANA time zone used to derive the training day when today is omitted."),
+    day_start_hour: int = Query(DEFAULT_DAY_START_HOUR, ge=0, le=23),
+    user_id: str = Depends(get_current_user_id),
+):
+    """Per-day and per-week adherence for the active (or given) plan, as computeWeekAdherence returns it.
+
+    Days before ``today`` are closed: each is computed once and then served from the cache
+    until its plan day or sets change. Today and later days are always recomputed.
+    """
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError) as exc:
+        raise HTTPException(400, "Invalid tz") from exc
+    if today is not None and parse_day_key(today) is None:
+        raise HTTPException(400, "today must be a YYYY-MM-DD date")
+    today = today or effective_day_key(datetime.now(timezone.utc), day_start_hour, zone)
+    day_keys = week_day_keys(today)
+
+    timer = request_stage_timer(request)
+    with timer.stage("load_plan"):
+        plan, set_digests = await asyncio.gather(
+            fetch_plan_for_adherence(user_id, plan_id),
+            fetch_training_day_set_digests(user_id, day_keys[0], day_keys[-1]),
+        )
+    if not plan:
+        raise HTTPException(404, "Plan not found" if plan_id else "No active plan")
+
+    plan_days = [normalize_plan_day_row(day) for day in plan.get("plan_days") or []]
+    items_by_day = plan_items_by_day_id(
+        normalize_plan_item_row(item)
+        for day in plan.get("plan_days") or []
+        for item in sorted(day.get("plan_items") or [], key=lambda item: item.get("order_index") or 0)
+    )
+    by_weekday = plan_day_by_weekday(plan_days)
+    inputs = {}
+    for day_key in day_keys:
+        plan_day = by_weekday.get(weekday_for_day_key(day_key))
+        inputs[day_key] = (plan_day, items_by_day.get(plan_day["id"], []) if plan_day else [])
+
+    closed_keys = {
+        day_key: plan_adherence_cache_key(user_id, day_key, *inputs[day_key], set_digests.get(day_key), day_start_hour)
+        for day_key in day_keys
+        if day_key < today
+    }
+    with timer.stage("cache_lookup"):
+        cached = await asyncio.gather(*(plan_adherence_cache.get(key) for key in closed_keys.values()))
+    days = dict(zip(closed_keys, cached))
+
+    pending = [day_key for day_key in day_keys if days.get(day_key) is None]
+    with timer.stage("fetch_sets"):
+        logged_sets = await fetch_adherence_sets(user_id, pending)
+    with timer.stage("compute"):
+        for day_key in pending:
+            days[day_key] = compute_plan_day(day_key, *inputs[day_key], logged_sets, day_start_hour, zone)
+    await asyncio.gather(
+        *(plan_adherence_cache.set(closed_keys[day_key], days[day_key]) for day_key in pending if day_key in closed_keys)
+    )
+
+    return {
+        "plan": {"id": plan.get("id"), "name": plan.get("name") or ""},
+        "today": today,
+        "cachedDays": len(day_keys) - len(pending),
+        **summarize_plan_progress(days[day_key] for day_key in day_keys),
+    }
+
+
+@app.post("/api/admin/profile", include_in_schema=False)
+async def profile_process(
+    req: ProfilingSessionRequest,
+    output_format: Literal["json", "collapsed"] = Query("json", alias="format"),
+    x_cron_secret: Optional[str] = Header(None),
+):
+    """Profile this process while it serves traffic; see profiling.py for the collectors.
+
+    ``format=collapsed`` returns only the CPU stacks, ready for flamegraph.pl or speedscope.
+    """
+    if not settings.profiling_enabled:
+        PROFILING_SESSIONS.labels("disabled").inc()
+        raise HTTPException(404, "Not Found")
+    require_cron_secret(x_cron_secret)
+    if output_format == "collapsed" and "cpu" not in req.modes:
+        raise HTTPException(400, "format=collapsed requires the cpu mode")
+
+    duration = min(req.duration_seconds, settings.profiling_max_duration_seconds)
+    try:
+        result = await profiler.profile(req.modes, duration, req.sample_interval_ms / 1000)
+    except ProfilerBusyError as exc:
+        PROFILING_SESSIONS.labels("busy").inc()
+        raise HTTPException(409, str(exc)) from exc
+    PROFILING_SESSIONS.labels("completed").inc()
+    logger.info("Profiling session finished: modes=%s duration=%.1fs", result["modes"], result["duration_seconds"])
+    if output_format == "collapsed":
+        return PlainTextResponse(result["cpu"]["collapsed"])
+    return result
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None), accept: Optional[str] = Header(None)):
+    # Fails closed: without METRICS_BEARER_TOKEN the endpoint does not exist.
+    if not settings.metrics_bearer_token:
+        raise HTTPException(404, "Not Found")
+    if not secrets.compare_digest(authorization or "", f"Bearer {settings.metrics_bearer_token}"):
+        raise HTTPException(401, "Unauthorized")
+    encoder, content_type = choose_encoder(accept or "")
+    return Response(encoder(REGISTRY), media_type=content_type)
 
 
 @app.get("/api/health")
@@ -686,6 +2183,18 @@ async def health():
     return settings.healthz_response
 
 
+@app.get("/api/ready")
+async def ready():
+    # Unlike /api/health (liveness), this stays 503 until startup warm-up has finished.
+    report = startup_report.as_dict()
+    if not startup_report.is_ready:
+        return JSONResponse(report, status_code=503, headers={"Retry-After": "1"})
+    return report
+
+
 @app.get("/api/rollout-flags")
 async def rollout_flags():
     return settings.feature_flags_response
+
+
+startup_report.record("app_setup", time.perf_counter() - APP_SETUP_STARTED)
@@ -0,0 +1,184 @@
+"""Prometheus instrumentation for the API, on top of ``prometheus_client``.
+
+Metrics live in a dedicated registry rendered by ``GET /metrics``; label children are
+cached by the client library, so the hot path is a dict lookup plus a locked float add.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0)
+
+# Not the library's global registry, so only this app's series are exposed.
+REGISTRY = CollectorRegistry()
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+    buckets=DEFAULT_LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served.",
+    registry=REGISTRY,
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to upstream services; status is the HTTP code or 'error' for transport failures.",
+    ("upstream", "operation", "status"),
+    buckets=DEFAULT_LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Anthropic tokens reported in the response usage field.",
+    ("model", "direction"),
+    registry=REGISTRY,
+)
+LLM_JSON_PARSE_FAILURES = Counter(
+    "llm_json_parse_failures_total",
+    "LLM responses that could not be parsed as JSON.",
+    registry=REGISTRY,
+)
+LLM_STRUCTURED_OUTPUTS = Counter(
+    "llm_structured_outputs_total",
+    "Schema validation of tool-use outputs by route and outcome (valid, repaired, repair_failed).",
+    ("route", "outcome"),
+    registry=REGISTRY,
+)
+IDENTIFY_INDEX_LOOKUPS = Counter(
+    "identify_index_lookups_total",
+    "Perceptual-hash index lookups before identify LLM calls by result (hit, miss, unhashable, error).",
+    ("result",),
+    registry=REGISTRY,
+)
+LLM_FALLBACKS = Counter(
+    "llm_fallbacks_total",
+    "Calls that switched to the fallback model by route and reason (overloaded, latency_budget).",
+    ("route", "reason"),
+    registry=REGISTRY,
+)
+WEEKLY_JOB_USERS = Counter(
+    "weekly_trend_job_users_total",
+    "Users handled by the weekly trend job by outcome.",
+    ("outcome",),
+    registry=REGISTRY,
+)
+WEEKLY_JOB_PROGRESS = Gauge(
+    "weekly_trend_job_progress_users",
+    "Progress of the most recent weekly trend job run.",
+    ("state",),
+    registry=REGISTRY,
+)
+WEEKLY_JOB_LAST_COMPLETED = Gauge(
+    "weekly_trend_job_last_completed_timestamp_seconds",
+    "Unix time the weekly trend job last finished.",
+    registry=REGISTRY,
+)
+ANALYSIS_REPORTS_PRUNED = Counter(
+    "analysis_reports_pruned_total",
+    "analysis_reports rows deleted and monthly partitions dropped by the retention job.",
+    ("kind",),
+    registry=REGISTRY,
+)
+BACKGROUND_JOBS = Counter(
+    "background_jobs_total",
+    "Background jobs by pool and outcome (succeeded, failed, rejected).",
+    ("pool", "outcome"),
+    registry=REGISTRY,
+)
+BACKGROUND_JOB_QUEUE_DEPTH = Gauge(
+    "background_job_queue_depth",
+    "Jobs waiting for a worker.",
+    ("pool",),
+    registry=REGISTRY,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Shared cache lookups by namespace and result (hit, miss).",
+    ("namespace", "result"),
+    registry=REGISTRY,
+)
+IDEMPOTENCY_REQUESTS = Counter(
+    "idempotency_requests_total",
+    "Requests carrying an Idempotency-Key by endpoint and outcome (new, replayed, in_progress, mismatch, unavailable).",
+    ("endpoint", "outcome"),
+    registry=REGISTRY,
+)
+REQUEST_CANCELLATIONS = Counter(
+    "request_cancellations_total",
+    "Requests whose work was cancelled by route and reason (client_disconnected, deadline_exceeded).",
+    ("route", "reason"),
+    registry=REGISTRY,
+)
+DATABASE_FALLBACKS = Counter(
+    "database_fallbacks_total",
+    "Direct Postgres operations retried over PostgREST because Postgres was unreachable, by operation.",
+    ("operation",),
+    registry=REGISTRY,
+)
+PROFILING_SESSIONS = Counter(
+    "profiling_sessions_total",
+    "On-demand profiling sessions by outcome (completed, busy, disabled).",
+    ("outcome",),
+    registry=REGISTRY,
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(scope: Scope) -> str:
+    """The matched route's path template (e.g. ``/api/jobs/{job_id}``), which the router
+    stores in the scope during dispatch; it keeps label cardinality bounded."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency and the in-flight gauge."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.labels(scope["method"], route_template(scope), status_code).observe(
+                time.perf_counter() - started
+            )
+
+
+def observe_upstream(upstream: str, operation: str, status: object, started: float) -> None:
+    UPSTREAM_REQUEST_DURATION.labels(upstream, operation, status).observe(time.perf_counter() - started)
+
+
+def record_llm_usage(model: str, usage: Optional[dict]) -> None:
+    if not isinstance(usage, dict):
+        return
+    for direction, field in (("input", "input_tokens"), ("output", "output_tokens")):
+        tokens = usage.get(field)
+        if isinstance(tokens, (int, float)) and tokens > 0:
+            LLM_TOKENS.labels(model, direction).inc(tokens)
@@ -0,0 +1,227 @@
+"""On-demand profiling of a live API process, for slow-production incidents.
+
+Nothing here runs until an admin starts a session, so the steady-state cost is zero:
+no sampler thread, no tracing hooks and no ``tracemalloc``. A session observes whatever
+requests the process serves during its window and combines up to three collectors:
+
+* cpu: a sampler thread that reads ``sys._current_frames()`` every ``sample_interval``
+  seconds. Stacks are aggregated in the collapsed ("folded") format that flamegraph.pl,
+  speedscope and inferno read: ``frame;frame;frame count`` per line, root first.
+* memory: ``tracemalloc`` snapshots at the start and end of the window; the result lists
+  the allocation sites that grew the most and a collapsed view weighted by bytes.
+* loop_lag: a task that sleeps ``sample_interval`` repeatedly and records how late it
+  wakes up, i.e. how long callbacks blocked the event loop.
+
+Only one session runs at a time per process.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+PROFILE_MODES = ("cpu", "memory", "loop_lag")
+TRACEMALLOC_FRAMES = 25
+TOP_STACKS = 20
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def _frame_label(code_name: str, filename: str, lineno: int) -> str:
+    return f"{code_name} ({os.path.basename(filename)}:{lineno})"
+
+
+def _thread_names() -> dict[int, str]:
+    return {thread.ident: thread.name for thread in threading.enumerate() if thread.ident is not None}
+
+
+def format_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class CPUSampler:
+    """Statistical profiler over every thread but its own, event loop included."""
+
+    def __init__(self, interval_seconds: float) -> None:
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-cpu-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        names = _thread_names()
+        while not self._stop.wait(self.interval_seconds):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                if ident not in names:
+                    names = _thread_names()
+                labels = []
+                while frame is not None:
+                    code = frame.f_code
+                    labels.append(_frame_label(code.co_qualname, code.co_filename, frame.f_lineno))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def result(self) -> dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval_seconds * 1000,
+            "top_stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common(TOP_STACKS)],
+            "collapsed": format_collapsed(self.stacks),
+        }
+
+
+class MemoryTracer:
+    def __init__(self) -> None:
+        self._started_tracing = False
+        self._before: Optional[tracemalloc.Snapshot] = None
+        self._after: Optional[tracemalloc.Snapshot] = None
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+        self._before = tracemalloc.take_snapshot()
+
+    def stop(self) -> None:
+        self._after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        self._traced = {"current_bytes": current, "peak_bytes": peak}
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def result(self) -> dict[str, Any]:
+        # Our own bookkeeping would otherwise dominate the diff.
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        before = self._before.filter_traces(filters)
+        after = self._after.filter_traces(filters)
+        growth = [diff for diff in after.compare_to(before, "traceback") if diff.size_diff > 0]
+        growth.sort(key=lambda diff: diff.size_diff, reverse=True)
+        collapsed: Counter = Counter()
+        for diff in growth:
+            # Tracebacks are ordered oldest frame first, which is already root-first.
+            labels = [_frame_label("<alloc>", frame.filename, frame.lineno) for frame in diff.traceback]
+            collapsed[";".join(labels)] += diff.size_diff
+        return {
+            **self._traced,
+            "top_growth": [
+                {
+                    "site": _frame_label("<alloc>", diff.traceback[-1].filename, diff.traceback[-1].lineno),
+                    "size_diff_bytes": diff.size_diff,
+                    "count_diff": diff.count_diff,
+                    "size_bytes": diff.size,
+                }
+                for diff in growth[:TOP_STACKS]
+            ],
+            "collapsed": format_collapsed(collapsed),
+        }
+
+
+class LoopLagMonitor:
+    def __init__(self, interval_seconds: float) -> None:
+        self.interval_seconds = interval_seconds
+        self.lags: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            self.lags.append(max(0.0, time.perf_counter() - expected))
+
+    def result(self) -> dict[str, Any]:
+        lags = sorted(lag * 1000 for lag in self.lags)
+        if not lags:
+            return {"samples": 0}
+        return {
+            "samples": len(lags),
+            "interval_ms": self.interval_seconds * 1000,
+            "mean_ms": sum(lags) / len(lags),
+            "p50_ms": _percentile(lags, 0.5),
+            "p95_ms": _percentile(lags, 0.95),
+            "p99_ms": _percentile(lags, 0.99),
+            "max_ms": lags[-1],
+        }
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self._lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, modes: Iterable[str], duration_seconds: float, sample_interval_seconds: float) -> dict[str, Any]:
+        """Run the requested collectors for ``duration_seconds`` and return their results."""
+        if self._lock.locked():
+            raise ProfilerBusyError("A profiling session is already running")
+        async with self._lock:
+            modes = [mode for mode in PROFILE_MODES if mode in set(modes)]
+            cpu = CPUSampler(sample_interval_seconds) if "cpu" in modes else None
+            memory = MemoryTracer() if "memory" in modes else None
+            loop_lag = LoopLagMonitor(sample_interval_seconds) if "loop_lag" in modes else None
+
+            started = time.perf_counter()
+            if memory:
+                memory.start()
+            if cpu:
+                cpu.start()
+            if loop_lag:
+                loop_lag.start()
+            # Collectors are torn down even when the caller disconnects mid-window.
+            try:
+                await asyncio.sleep(duration_seconds)
+            finally:
+                if loop_lag:
+                    await loop_lag.stop()
+                if cpu:
+                    await asyncio.to_thread(cpu.stop)
+                if memory:
+                    memory.stop()
+            elapsed = time.perf_counter() - started
+
+            result: dict[str, Any] = {"modes": modes, "duration_seconds": elapsed, "pid": os.getpid()}
+            if cpu:
+                result["cpu"] = cpu.result()
+            if memory:
+                result["memory"] = await asyncio.to_thread(memory.result)
+            if loop_lag:
+                result["loop_lag"] = loop_lag.result()
+            return result
@@ -1,9 +1,37 @@
 """Canonical API DTO exports for backend handlers."""
 
-from schemas.forms import IdentifyRequest, RecommendationRequest, WeeklyTrendJobRequest
+from schemas.forms import (
+    AnalysisReportRetentionJobRequest,
+    IdentifyRequest,
+    MachineDTO,
+    ProfilingSessionRequest,
+    RecommendationRequest,
+    RecommendationScope,
+    WeeklyTrendJobRequest,
+    equipment_catalog_adapter,
+)
+from schemas.llm import (
+    EnrichedMachineIdentification,
+    EvidenceItem,
+    LLMOutput,
+    MachineIdentification,
+    RecommendationReportPayload,
+    llm_tool,
+)
 
 __all__ = [
+    "AnalysisReportRetentionJobRequest",
+    "EnrichedMachineIdentification",
+    "EvidenceItem",
     "IdentifyRequest",
+    "LLMOutput",
+    "MachineDTO",
+    "MachineIdentification",
+    "ProfilingSessionRequest",
+    "RecommendationReportPayload",
     "RecommendationRequest",
+    "RecommendationScope",
     "WeeklyTrendJobRequest",
+    "equipment_catalog_adapter",
+    "llm_tool",
 ]
@@ -3,8 +3,8 @@ from __future__ import annotations
 from enum import Enum
 from typing import Any, Literal
 
-from pydantic import BaseModel, ConfigDict, Field, StringConstraints, field_validator
-from typing_extensions import Annotated
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, TypeAdapter, field_validator, model_validator
+from typing_extensions import Annotated, TypedDict
 
 # CONTRACT FREEZE NOTE:
 # DTOs in this module are the canonical backend API contract for request payloads.
@@ -60,8 +60,10 @@ class RecommendationScope(BaseModel):
         return value or ["working"]
 
 
-class GroupedTrainingBucket(BaseModel):
-    model_config = ConfigDict(extra="allow")
+class GroupedTrainingBucket(TypedDict, total=False):
+    # Buckets are opaque to the backend and only re-serialized into the prompt, so they
+    # validate to the plain dicts the client sent instead of per-bucket model instances.
+    __pydantic_config__ = ConfigDict(extra="allow")  # type: ignore[misc]
 
 
 class MachineDTO(BaseModel):
@@ -114,5 +116,35 @@ class RecommendationRequest(BaseModel):
     machines: dict[str, MachineDTO] | None = None
 
 
+equipment_catalog_adapter = TypeAdapter(dict[str, MachineDTO])
+
+
 class WeeklyTrendJobRequest(BaseModel):
     user_id: NonEmptyStr | None = None
+    # Checkpoints are keyed by run_id; batch runs default to one run per ISO week so a
+    # retried cron invocation resumes instead of starting over.
+    run_id: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=100)] | None = None
+    shard_index: int = Field(default=0, ge=0)
+    shard_count: int = Field(default=1, ge=1, le=1024)
+    after_user_id: NonEmptyStr | None = None
+    max_users: int | None = Field(default=None, ge=1)
+
+    @model_validator(mode="after")
+    def validate_shard(self) -> "WeeklyTrendJobRequest":
+        if self.shard_index >= self.shard_count:
+            raise ValueError("shard_index must be less than shard_count")
+        return self
+
+
+class AnalysisReportRetentionJobRequest(BaseModel):
+    # Upper bound on delete batches per call; the cron re-runs until ``done`` is true.
+    max_batches: int = Field(default=50, ge=1, le=1000)
+
+
+class ProfilingSessionRequest(BaseModel):
+    modes: list[Literal["cpu", "memory", "loop_lag"]] = Field(
+        default_factory=lambda: ["cpu", "memory", "loop_lag"], min_length=1
+    )
+    # Capped further by PROFILING_MAX_DURATION_SECONDS.
+    duration_seconds: float = Field(default=10.0, gt=0, le=300)
+    sample_interval_ms: float = Field(default=10.0, ge=1, le=1000)
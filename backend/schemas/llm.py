@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import Any, Literal
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from schemas.forms import NonEmptyStr
+
+# Shapes the model must return through tool use. Anthropic receives the serialization-mode
+# JSON schema, where every field is required. Validation keeps defaults for optional keys,
+# so a response that omits one still passes and only a wrong shape costs a repair call.
+# Unknown keys are kept, so the response stays additive like the rest of the contract.
+
+
+class LLMOutput(BaseModel):
+    model_config = ConfigDict(extra="allow", json_schema_serialization_defaults_required=True)
+
+
+class MuscleProfileSuggestion(LLMOutput):
+    primary: list[str] = Field(default_factory=list)
+    secondary: list[str] = Field(default_factory=list)
+
+
+class MachineIdentification(LLMOutput):
+    name: NonEmptyStr
+    exerciseType: Literal["Push", "Pull", "Legs", "Core"] | None = None
+    movement: str = ""
+    muscleGroups: list[str] = Field(default_factory=list)
+    variations: list[str] = Field(default_factory=list)
+    defaultWeight: float | None = Field(default=None, ge=0)
+    defaultReps: int | None = Field(default=None, ge=1)
+    notes: str = ""
+
+
+class EnrichedMachineIdentification(MachineIdentification):
+    muscleProfile: MuscleProfileSuggestion | None = None
+    aliases: list[str] = Field(default_factory=list)
+    likelyModel: str | None = None
+
+
+class EvidenceSource(LLMOutput):
+    grouping: Literal["training_day", "cluster", "training_week"]
+    included_set_types: list[str] = Field(default_factory=list)
+    sample_size: int = Field(default=0, ge=0)
+
+
+class EvidenceItem(LLMOutput):
+    claim: NonEmptyStr
+    metric: NonEmptyStr
+    period: str = ""
+    delta: float | None = None
+    source: EvidenceSource | None = None
+
+
+class RecommendationReportPayload(LLMOutput):
+    # LLM-produced part of the /api/recommendations response (see docs/data-contract-lock.md).
+    summary: NonEmptyStr
+    highlights: list[str] = Field(default_factory=list)
+    suggestions: list[str] = Field(default_factory=list)
+    nextSession: str = ""
+    progressNotes: str = ""
+    evidence: list[EvidenceItem] = Field(default_factory=list)
+
+
+def llm_tool(name: str, description: str, model: type[BaseModel]) -> dict[str, Any]:
+    """Anthropic tool definition whose ``input_schema`` is derived from ``model``."""
+    return {"name": name, "description": description, "input_schema": model.model_json_schema(mode="serialization")}
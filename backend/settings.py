@@ -1,7 +1,8 @@
 from functools import lru_cache
-from typing import Annotated
+from typing import Annotated, Literal
 
 import logging
+import time
 
 from pydantic import BaseModel, Field, ValidationInfo, field_validator
 from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
@@ -83,7 +84,47 @@ class AppSettings(BaseSettings):
         default_factory=lambda: ["http://localhost:5173"], alias="ALLOWED_ORIGINS"
     )
     anthropic_model: str = Field(default="claude-sonnet-4-20250514", alias="ANTHROPIC_MODEL")
+    # Per-route models default to ANTHROPIC_MODEL; the fallback is the faster tier used on overload or slowness.
+    anthropic_identify_model: str | None = Field(default=None, alias="ANTHROPIC_IDENTIFY_MODEL")
+    anthropic_identify_enriched_model: str | None = Field(default=None, alias="ANTHROPIC_IDENTIFY_ENRICHED_MODEL")
+    anthropic_recommendation_model: str | None = Field(default=None, alias="ANTHROPIC_RECOMMENDATION_MODEL")
+    anthropic_fallback_model: str | None = Field(default="claude-3-5-haiku-20241022", alias="ANTHROPIC_FALLBACK_MODEL")
+    anthropic_identify_latency_budget_seconds: float = Field(
+        default=8.0, gt=0, alias="ANTHROPIC_IDENTIFY_LATENCY_BUDGET_SECONDS"
+    )
+    anthropic_recommendation_latency_budget_seconds: float = Field(
+        default=40.0, gt=0, alias="ANTHROPIC_RECOMMENDATION_LATENCY_BUDGET_SECONDS"
+    )
+    anthropic_api_url: str = Field(default="https://api.anthropic.com", alias="ANTHROPIC_API_URL")
     max_history_tokens: int = Field(default=4000, alias="MAX_HISTORY_TOKENS")
+    export_page_size: int = Field(default=1000, ge=1, le=10000, alias="EXPORT_PAGE_SIZE")
+    recommendation_job_workers: int = Field(default=2, ge=1, alias="RECOMMENDATION_JOB_WORKERS")
+    recommendation_job_queue_size: int = Field(default=32, ge=1, alias="RECOMMENDATION_JOB_QUEUE_SIZE")
+    recommendation_job_ttl_seconds: int = Field(default=3600, ge=60, alias="RECOMMENDATION_JOB_TTL_SECONDS")
+    recommendation_assembly_max_sets: int = Field(default=5000, ge=1, alias="RECOMMENDATION_ASSEMBLY_MAX_SETS")
+    cache_backend: Literal["memory", "sqlite", "redis"] = Field(default="memory", alias="CACHE_BACKEND")
+    cache_url: str | None = Field(default=None, alias="CACHE_URL")
+    cache_max_entries: int = Field(default=10000, ge=1, alias="CACHE_MAX_ENTRIES")
+    cache_key_prefix: str = Field(default="gym-tracker:", alias="CACHE_KEY_PREFIX")
+    idempotency_ttl_seconds: int = Field(default=86400, ge=60, alias="IDEMPOTENCY_TTL_SECONDS")
+    idempotency_in_progress_ttl_seconds: int = Field(default=180, ge=10, alias="IDEMPOTENCY_IN_PROGRESS_TTL_SECONDS")
+    idempotency_wait_seconds: float = Field(default=20.0, ge=0, le=60, alias="IDEMPOTENCY_WAIT_SECONDS")
+    identify_index_enabled: bool = Field(default=True, alias="IDENTIFY_INDEX_ENABLED")
+    identify_index_min_confidence: float = Field(default=0.9, ge=0.5, le=1, alias="IDENTIFY_INDEX_MIN_CONFIDENCE")
+    identify_index_remote_hosts: Annotated[list[str], NoDecode] = Field(
+        default_factory=lambda: ["static.strengthlevel.com"], alias="IDENTIFY_INDEX_REMOTE_HOSTS"
+    )
+    startup_warmup: bool = Field(default=True, alias="STARTUP_WARMUP")
+    response_compression_min_bytes: int = Field(default=1024, ge=0, alias="RESPONSE_COMPRESSION_MIN_BYTES")
+    response_compression_encodings: Annotated[list[Literal["zstd", "br", "gzip"]], NoDecode] = Field(
+        default_factory=lambda: ["zstd", "br", "gzip"], alias="RESPONSE_COMPRESSION_ENCODINGS"
+    )
+    request_max_decompressed_bytes: int = Field(
+        default=20 * 1024 * 1024, ge=1024, alias="REQUEST_MAX_DECOMPRESSED_BYTES"
+    )
+    analysis_reports_keep_latest: int = Field(default=20, ge=1, alias="ANALYSIS_REPORTS_KEEP_LATEST")
+    analysis_reports_snapshot_months: int = Field(default=12, ge=0, alias="ANALYSIS_REPORTS_SNAPSHOT_MONTHS")
+    analysis_reports_prune_batch_size: int = Field(default=1000, ge=1, le=50000, alias="ANALYSIS_REPORTS_PRUNE_BATCH_SIZE")
 
     supabase_url: str = Field(default="", alias="SUPABASE_URL")
     supabase_jwt_secret: str | None = Field(default=None, alias="SUPABASE_JWT_SECRET")
@@ -91,8 +132,19 @@ class AppSettings(BaseSettings):
     supabase_jwt_issuer: str | None = Field(default=None, alias="SUPABASE_JWT_ISSUER")
     supabase_jwks_url: str | None = Field(default=None, alias="SUPABASE_JWKS_URL")
     supabase_service_role_key: str | None = Field(default=None, alias="SUPABASE_SERVICE_ROLE_KEY")
+    # Optional direct Postgres connection for the backend jobs (needs asyncpg); PostgREST is the fallback.
+    database_url: str | None = Field(default=None, alias="DATABASE_URL")
+    database_pool_max_size: int = Field(default=10, ge=1, le=100, alias="DATABASE_POOL_MAX_SIZE")
+    database_write_batch_size: int = Field(default=200, ge=1, le=10000, alias="DATABASE_WRITE_BATCH_SIZE")
 
     cron_shared_secret: str | None = Field(default=None, alias="CRON_SHARED_SECRET")
+    # GET /metrics is only served when this is set; unset means 404.
+    metrics_bearer_token: str | None = Field(default=None, alias="METRICS_BEARER_TOKEN")
+    # Off by default: one JSON line per request is noisy in production; Server-Timing is always sent.
+    stage_trace_logging: bool = Field(default=False, alias="STAGE_TRACE_LOGGING")
+    # Off by default; when on, cron-secret holders can profile the live process on demand.
+    profiling_enabled: bool = Field(default=False, alias="PROFILING_ENABLED")
+    profiling_max_duration_seconds: float = Field(default=60.0, gt=0, le=300, alias="PROFILING_MAX_DURATION_SECONDS")
 
     set_centric_logging: bool = Field(default=True, alias="SET_CENTRIC_LOGGING")
     library_screen_enabled: bool = Field(default=True, alias="LIBRARY_SCREEN_ENABLED")
@@ -115,6 +167,23 @@ class AppSettings(BaseSettings):
             return [origin.strip() for origin in value.split(",") if origin.strip()]
         return [origin.strip() for origin in value if str(origin).strip()]
 
+    @field_validator("response_compression_encodings", mode="before")
+    @classmethod
+    def parse_response_compression_encodings(cls, value: str | list[str] | None) -> list[str]:
+        if value is None:
+            return []
+        if isinstance(value, str):
+            value = value.split(",")
+        return [str(encoding).strip().lower() for encoding in value if str(encoding).strip()]
+
+    @field_validator("identify_index_remote_hosts", mode="before")
+    @classmethod
+    def parse_identify_index_remote_hosts(cls, value: str | list[str] | None) -> list[str]:
+        if value is None:
+            return []
+        if isinstance(value, str):
+            value = value.split(",")
+        return [str(host).strip().lower() for host in value if str(host).strip()]
 
     @field_validator(
         "set_centric_logging",
@@ -161,9 +230,9 @@ class AppSettings(BaseSettings):
         )
         return default
 
-    @field_validator("supabase_url", mode="before")
+    @field_validator("supabase_url", "anthropic_api_url", mode="before")
     @classmethod
-    def normalize_supabase_url(cls, value: str | None) -> str:
+    def normalize_base_url(cls, value: str | None) -> str:
         return (value or "").rstrip("/")
 
     @property
@@ -242,4 +311,6 @@ def get_settings() -> AppSettings:
     return AppSettings()
 
 
+_settings_load_started = time.perf_counter()
 settings = get_settings()
+SETTINGS_LOAD_SECONDS = time.perf_counter() - _settings_load_started
@@ -0,0 +1,104 @@
+"""Cold-start support: shared upstream HTTP clients and the startup timing report.
+
+Creating an ``httpx.AsyncClient`` per call pays for an SSL context plus a fresh TCP
+and TLS handshake on every upstream request. ``UpstreamClients`` keeps one pooled
+client per upstream so the connections opened during warm-up are reused by the
+first real requests. ``StartupReport`` records how long each startup phase took
+and backs the ``/api/ready`` endpoint.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamClients:
+    def __init__(self, timeouts: dict[str, float], transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self.timeouts = timeouts
+        self.transport = transport
+        self._clients: dict[str, tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        # Clients are bound to the loop they were first used on; tests and the
+        # benchmark harness may run several loops in one process.
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(name)
+        if entry is None or entry[0] is not loop or entry[1].is_closed:
+            client = httpx.AsyncClient(
+                timeout=self.timeouts.get(name, 30),
+                transport=self.transport,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60),
+            )
+            entry = self._clients[name] = (loop, client)
+        return entry[1]
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        clients, self._clients = self._clients, {}
+        for client_loop, client in clients.values():
+            if client_loop is loop:
+                await client.aclose()
+
+
+class StartupReport:
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self.state = "starting"
+        self.ready_at: Optional[float] = None
+        self.phases: list[dict[str, Any]] = []
+
+    def record(self, name: str, duration_seconds: float, error: Optional[str] = None) -> None:
+        self.phases.append(
+            {
+                "name": name,
+                "duration_ms": round(duration_seconds * 1000, 3),
+                "ok": error is None,
+                "error": error,
+            }
+        )
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as exc:
+            self.record(name, time.perf_counter() - started, error=type(exc).__name__)
+            raise
+        self.record(name, time.perf_counter() - started)
+
+    async def run_phase(self, name: str, action: Callable[[], Awaitable[Any]]) -> None:
+        """Run an optional warm-up step; failures are recorded, not raised."""
+        started = time.perf_counter()
+        try:
+            await action()
+        except Exception as exc:
+            logger.warning("Startup warm-up phase failed: phase=%s error=%s", name, exc)
+            self.record(name, time.perf_counter() - started, error=type(exc).__name__)
+        else:
+            self.record(name, time.perf_counter() - started)
+
+    def mark_ready(self) -> None:
+        self.state = "ready"
+        self.ready_at = time.time()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "status": self.state,
+            "degraded": any(not phase["ok"] for phase in self.phases),
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "ready_after_ms": round((self.ready_at - self.started_at) * 1000, 3) if self.ready_at else None,
+            "phases": list(self.phases),
+        }
@@ -0,0 +1,309 @@
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from adherence import compute_day_adherence, compute_week_adherence
+from cache import Cache, MemoryCache
+
+ADHERENCE_JS = Path(__file__).resolve().parents[2] / "frontend" / "src" / "lib" / "adherence.js"
+NODE = shutil.which("node")
+MACHINES = ["m-a", "m-b", "m-c", None]
+SET_TYPES = ["working", "warmup", "top", "", None]
+# Runs each case through the frontend module and prints the results as one JSON array.
+NODE_RUNNER = """
+import { readFileSync } from 'node:fs'
+import { computeDayAdherence, computeWeekAdherence } from %s
+const cases = JSON.parse(readFileSync(0, 'utf8'))
+const results = cases.map((c) => c.kind === 'day'
+  ? computeDayAdherence(c.items, c.sets, { dayKey: c.dayKey, dayStartHour: c.dayStartHour, now: new Date(c.now) })
+  : computeWeekAdherence({ planDays: c.planDays, planItems: c.planItems, loggedSets: c.sets, dayStartHour: c.dayStartHour, anchorDate: new Date(c.now) }))
+process.stdout.write(JSON.stringify(results))
+"""
+
+
+def _run_js(cases: list[dict], tz: str) -> list[dict]:
+    completed = subprocess.run(
+        [NODE, "--input-type=module", "-e", NODE_RUNNER % json.dumps(ADHERENCE_JS.as_uri())],
+        input=json.dumps(cases),
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "TZ": tz},
+    )
+    return json.loads(completed.stdout)
+
+
+def _run_python(cases: list[dict], tz: str) -> list[dict]:
+    zone = ZoneInfo(tz)
+    results = []
+    for case in cases:
+        now = datetime.fromisoformat(case["now"])
+        if case["kind"] == "day":
+            result = compute_day_adherence(case["items"], case["sets"], case["dayKey"], case["dayStartHour"], now, zone)
+        else:
+            result = compute_week_adherence(case["planDays"], case["planItems"], case["sets"], case["dayStartHour"], now, zone)
+        results.append(json.loads(json.dumps(result)))
+    return results
+
+
+def _random_item(rng: random.Random, index: int, plan_day_id: str) -> dict:
+    item = {
+        "planDayId": plan_day_id,
+        "equipmentId": rng.choice(MACHINES),
+        "targetSetType": rng.choice(SET_TYPES),
+        "targetSets": rng.choice([None, 0, 1, 2, 3, 4, "2", 2.5, -1]),
+        "notes": "",
+    }
+    if rng.random() < 0.9:
+        item["id"] = f"00000000-0000-0000-0000-{index:012d}"
+    if rng.random() < 0.9:
+        item["orderIndex"] = rng.choice([0, 1, 2, 3, None, "1"])
+    return item
+
+
+def _random_set(rng: random.Random, days: list[str]) -> dict:
+    logged = {"machine_id": rng.choice(MACHINES), "set_type": rng.choice(SET_TYPES)}
+    day = rng.choice(days)
+    if rng.random() < 0.7:
+        logged["training_date"] = day
+    else:
+        # Legacy rows without a training_date fall back to the logged_at window.
+        hour, minute = rng.randrange(24), rng.choice([0, 30, 59])
+        offset = rng.choice(["Z", "+02:00", "-05:00"])
+        logged["logged_at"] = f"{day}T{hour:02d}:{minute:02d}:00{offset}"
+    return logged
+
+
+def _random_cases(seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    days = [f"2026-03-{day:02d}" for day in range(2, 16)]
+    cases = []
+    for case_index in range(40):
+        day_start_hour = rng.choice([0, 4, 4, 6, 23])
+        now = f"{rng.choice(days)}T{rng.randrange(24):02d}:{rng.choice([0, 15, 45]):02d}:00+00:00"
+        sets = [_random_set(rng, days) for _ in range(rng.randrange(0, 25))]
+        if case_index % 2:
+            items = [_random_item(rng, index, "day") for index in range(rng.randrange(0, 7))]
+            day_key = rng.choice([*days, None])
+            cases.append({"kind": "day", "items": items, "sets": sets, "dayKey": day_key, "dayStartHour": day_start_hour, "now": now})
+        else:
+            weekdays = rng.sample(range(7), rng.randrange(0, 6))
+            plan_days = [{"id": f"day-{weekday}", "weekday": weekday, "label": rng.choice(["Push", "", None])} for weekday in weekdays]
+            plan_items = [
+                _random_item(rng, index, rng.choice([day["id"] for day in plan_days] or ["day-x"]))
+                for index in range(rng.randrange(0, 12))
+            ]
+            cases.append(
+                {"kind": "week", "planDays": plan_days, "planItems": plan_items, "sets": sets, "dayStartHour": day_start_hour, "now": now}
+            )
+    return cases
+
+
+EDGE_CASES = [
+    # Two items on one machine: targets fill in plan order, extras go to the open-ended item.
+    {
+        "kind": "day",
+        "items": [
+            {"id": "b", "equipmentId": "m-a", "targetSets": 2, "orderIndex": 1},
+            {"id": "a", "equipmentId": "m-a", "targetSets": None, "orderIndex": 0},
+            {"id": "c", "equipmentId": "m-a", "targetSets": 1, "orderIndex": 1},
+        ],
+        "sets": [{"machine_id": "m-a", "set_type": "working", "training_date": "2026-03-10"} for _ in range(5)],
+        "dayKey": "2026-03-10",
+        "dayStartHour": 4,
+        "now": "2026-03-10T12:00:00+00:00",
+    },
+    # No dayKey: 03:30 local is still the previous training day.
+    {
+        "kind": "day",
+        "items": [{"equipmentId": "m-b", "targetSetType": "top"}],
+        "sets": [{"machine_id": "m-b", "set_type": "top", "logged_at": "2026-03-09T23:00:00-05:00"}],
+        "dayKey": None,
+        "dayStartHour": 4,
+        "now": "2026-03-10T08:30:00+00:00",
+    },
+    # Across the US spring-forward change, on a Sunday anchor.
+    {
+        "kind": "week",
+        "planDays": [{"id": "sun", "weekday": 0, "label": "Legs"}, {"id": "sun-2", "weekday": 0}, {"id": "odd", "weekday": 2.5}],
+        "planItems": [{"id": "i-1", "planDayId": "sun-2", "equipmentId": "m-c", "targetSets": 3}],
+        "sets": [
+            {"machine_id": "m-c", "set_type": "working", "logged_at": "2026-03-08T07:30:00Z"},
+            {"machine_id": "m-c", "set_type": "working", "logged_at": "2026-03-09T07:59:00Z"},
+            {"machine_id": "m-c", "set_type": "working", "logged_at": "2026-03-09T08:01:00Z"},
+        ],
+        "dayStartHour": 4,
+        "now": "2026-03-08T20:00:00+00:00",
+    },
+]
+
+
+@pytest.mark.skipif(NODE is None, reason="node is not installed")
+@pytest.mark.parametrize("tz", ["UTC", "America/New_York", "Asia/Kolkata"])
+def test_python_port_matches_the_frontend_module(tz: str) -> None:
+    cases = EDGE_CASES + _random_cases(seed=len(tz))
+
+    assert _run_python(cases, tz) == _run_js(cases, tz)
+
+
+PLAN_ROW = {
+    "id": "plan-1",
+    "name": "PPL",
+    "plan_days": [
+        {
+            "id": "day-mon",
+            "plan_id": "plan-1",
+            "weekday": 1,
+            "label": "Push",
+            "plan_items": [
+                {"id": "item-2", "plan_day_id": "day-mon", "machine_id": "m-b", "target_set_type": "working", "target_sets": 2, "order_index": 1},
+                {"id": "item-1", "plan_day_id": "day-mon", "machine_id": "m-a", "target_set_type": "working", "target_sets": 3, "order_index": 0},
+            ],
+        },
+        {
+            "id": "day-wed",
+            "plan_id": "plan-1",
+            "weekday": 3,
+            "label": "Pull",
+            "plan_items": [
+                {"id": "item-3", "plan_day_id": "day-wed", "machine_id": "m-c", "target_set_type": "working", "target_sets": 3, "order_index": 0}
+            ],
+        },
+    ],
+}
+
+
+class FakeSupabase:
+    def __init__(self) -> None:
+        self.sets = [
+            {"machine_id": "m-a", "set_type": "working", "training_date": "2026-03-09"},
+            {"machine_id": "m-a", "set_type": "working", "training_date": "2026-03-09"},
+            {"machine_id": "m-b", "set_type": "working", "training_date": "2026-03-09"},
+            {"machine_id": "m-c", "set_type": "working", "training_date": "2026-03-11"},
+        ]
+        self.set_queries: list[str] = []
+
+    async def request(self, method, path, payload=None, params=None, prefer=None):
+        if path == "rpc/training_day_set_digests":
+            assert payload["p_user_id"] == "user-1"
+            counts = Counter(
+                (row["training_date"], row["machine_id"], row["set_type"])
+                for row in self.sets
+                if payload["p_first_day"] <= row["training_date"] <= payload["p_last_day"]
+            )
+            return [
+                {"training_date": day, "set_digest": repr(sorted((key[1:], count) for key, count in counts.items() if key[0] == day))}
+                for day in sorted({key[0] for key in counts})
+            ]
+        assert method == "GET"
+        if path == "plans":
+            assert params["user_id"] == "eq.user-1"
+            return [PLAN_ROW]
+        if path == "sets":
+            self.set_queries.append(params["training_date"])
+            days = params["training_date"][4:-1].split(",")
+            rows = sorted(
+                ({"id": f"set-{index:04d}", **row} for index, row in enumerate(self.sets) if row["training_date"] in days),
+                key=lambda row: (row["training_date"], row["id"]),
+            )
+            if "or" in params:
+                cursor = re.fullmatch(r"\(training_date\.gt\.(.+),and\(training_date\.eq\.\1,id\.gt\.(.+)\)\)", params["or"])
+                rows = [row for row in rows if (row["training_date"], row["id"]) > cursor.groups()]
+            return rows[: int(params["limit"])]
+        raise AssertionError(f"unexpected request {method} {path}")
+
+
+@pytest.fixture
+def supabase(monkeypatch: pytest.MonkeyPatch) -> FakeSupabase:
+    fake = FakeSupabase()
+    monkeypatch.setattr(main, "supabase_admin_request", fake.request)
+    monkeypatch.setattr(main, "verify_auth", lambda authorization, signing_key=None: authorization.split(" ", 1)[1])
+    monkeypatch.setattr(main, "plan_adherence_cache", Cache(MemoryCache(), "plan_adherence"))
+    return fake
+
+
+def _adherence(today: str) -> dict:
+    response = TestClient(main.app).get(
+        "/api/plans/adherence", params={"today": today}, headers={"Authorization": "Bearer user-1"}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_endpoint_matches_compute_week_adherence(supabase: FakeSupabase) -> None:
+    body = _adherence("2026-03-11")
+
+    plan_days = [main.normalize_plan_day_row(day) for day in PLAN_ROW["plan_days"]]
+    plan_items = [
+        main.normalize_plan_item_row(item)
+        for day in PLAN_ROW["plan_days"]
+        for item in sorted(day["plan_items"], key=lambda item: item["order_index"])
+    ]
+    expected = compute_week_adherence(plan_days, plan_items, supabase.sets, anchor=datetime(2026, 3, 11, 12), tz=ZoneInfo("UTC"))
+    assert json.loads(json.dumps(expected))["days"] == body["days"]
+    assert (body["plannedSets"], body["completedSets"], body["completionMode"]) == (8, 4, "set_targets")
+    assert body["plan"] == {"id": "plan-1", "name": "PPL"}
+
+
+def test_closed_days_are_cached_and_only_today_is_recomputed(supabase: FakeSupabase) -> None:
+    first = _adherence("2026-03-11")
+    supabase.sets.append({"machine_id": "m-c", "set_type": "working", "training_date": "2026-03-11"})
+    second = _adherence("2026-03-11")
+
+    assert first["cachedDays"] == 0
+    assert second["cachedDays"] == 2
+    # Monday and Tuesday come from the cache; today onwards is fetched again.
+    assert supabase.set_queries[1] == "in.(2026-03-11,2026-03-12,2026-03-13,2026-03-14,2026-03-15)"
+    assert second["days"][2]["completedSets"] == 2
+    assert second["days"][:2] == first["days"][:2]
+
+
+def test_back_dated_sets_invalidate_a_closed_day(supabase: FakeSupabase) -> None:
+    _adherence("2026-03-11")
+    supabase.sets.append({"machine_id": "m-b", "set_type": "working", "training_date": "2026-03-09"})
+
+    body = _adherence("2026-03-11")
+
+    assert body["cachedDays"] == 1
+    assert body["days"][0]["completedSets"] == 4
+    assert body["days"][0]["completeItems"] == 1
+
+
+def test_set_type_and_machine_edits_invalidate_a_closed_day(supabase: FakeSupabase) -> None:
+    _adherence("2026-03-11")
+    # Neither edit changes the day's set count, timestamps or movements.
+    supabase.sets[2] = {**supabase.sets[2], "set_type": "warmup"}
+    supabase.sets[0] = {**supabase.sets[0], "machine_id": "m-b"}
+
+    body = _adherence("2026-03-11")
+
+    assert body["cachedDays"] == 1
+    assert (body["days"][0]["completedSets"], body["days"][0]["completeItems"]) == (2, 0)
+
+
+def test_sets_are_paged_by_training_date_and_id(supabase: FakeSupabase, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main.settings, "export_page_size", 2)
+
+    body = _adherence("2026-03-11")
+
+    assert body["completedSets"] == 4
+    assert len(supabase.set_queries) == 3
+
+
+def test_invalid_time_zone_is_rejected(supabase: FakeSupabase) -> None:
+    response = TestClient(main.app).get(
+        "/api/plans/adherence", params={"tz": "Mars/Olympus"}, headers={"Authorization": "Bearer user-1"}
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,82 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+CRON_SECRET = "cron-secret"
+
+
+class FakeSupabase:
+    def __init__(self, deletable_rows: int) -> None:
+        self.deletable_rows = deletable_rows
+        self.calls: list[tuple[str, dict]] = []
+
+    async def request(self, method, path, payload=None, params=None, prefer=None):
+        assert method == "POST"
+        self.calls.append((path, payload))
+        if path == "rpc/ensure_analysis_reports_partitions":
+            return 1
+        if path == "rpc/drop_expired_analysis_report_partitions":
+            return 2
+        if path == "rpc/prune_analysis_reports":
+            deleted = min(self.deletable_rows, payload["p_batch_size"])
+            self.deletable_rows -= deleted
+            return deleted
+        raise AssertionError(f"unexpected request {method} {path}")
+
+
+@pytest.fixture
+def configure(monkeypatch: pytest.MonkeyPatch):
+    def apply(deletable_rows: int) -> FakeSupabase:
+        fake = FakeSupabase(deletable_rows)
+        monkeypatch.setattr(main, "supabase_admin_request", fake.request)
+        monkeypatch.setattr(main.settings, "cron_shared_secret", CRON_SECRET)
+        monkeypatch.setattr(main.settings, "analysis_reports_keep_latest", 5)
+        monkeypatch.setattr(main.settings, "analysis_reports_snapshot_months", 6)
+        monkeypatch.setattr(main.settings, "analysis_reports_prune_batch_size", 100)
+        return fake
+
+    return apply
+
+
+def _prune(body: dict, secret: str = CRON_SECRET):
+    return TestClient(main.app).post(
+        "/api/jobs/prune-analysis-reports", json=body, headers={"x-cron-secret": secret}
+    )
+
+
+def test_prune_drops_partitions_then_deletes_in_batches(configure) -> None:
+    fake = configure(deletable_rows=250)
+
+    response = _prune({})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "ok": True,
+        "created_partitions": 1,
+        "dropped_partitions": 2,
+        "deleted_reports": 250,
+        "batches": 3,
+        "done": True,
+    }
+    assert [path for path, _ in fake.calls[:2]] == [
+        "rpc/ensure_analysis_reports_partitions",
+        "rpc/drop_expired_analysis_report_partitions",
+    ]
+    assert fake.calls[1][1] == {"p_keep_latest": 5, "p_snapshot_months": 6}
+    assert fake.calls[2][1] == {"p_keep_latest": 5, "p_snapshot_months": 6, "p_batch_size": 100}
+
+
+def test_prune_stops_at_max_batches(configure) -> None:
+    configure(deletable_rows=1000)
+
+    result = _prune({"max_batches": 2}).json()
+
+    assert result["deleted_reports"] == 200
+    assert result["done"] is False
+
+
+def test_prune_requires_cron_secret(configure) -> None:
+    configure(deletable_rows=0)
+
+    assert _prune({}, secret="wrong").status_code == 401
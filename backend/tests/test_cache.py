@@ -0,0 +1,278 @@
+import asyncio
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import main
+from cache import REDIS_DELETE_IF_SCRIPT, Cache, MemoryCache, RedisCache, SQLiteCache
+from jobs import BackgroundJobPool
+from settings import SupabaseSettings
+
+
+class RespStubServer:
+    """Tiny in-process server speaking enough of the Redis protocol for redis-py's GET/SET/DEL.
+
+    EVAL is only understood for the compare-and-delete script RedisCache sends.
+    """
+
+    def __init__(self) -> None:
+        self.data: dict[str, tuple[float | None, str]] = {}
+        self.server: asyncio.AbstractServer | None = None
+        self.port = 0
+
+    async def __aenter__(self) -> "RespStubServer":
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> list[str]:
+        count = int((await reader.readline())[1:-2])
+        parts = []
+        for _ in range(count):
+            length = int((await reader.readline())[1:-2])
+            parts.append((await reader.readexactly(length + 2))[:-2].decode())
+        return parts
+
+    def _live(self, key: str) -> str | None:
+        entry = self.data.get(key)
+        if entry is None or (entry[0] is not None and entry[0] <= time.monotonic()):
+            self.data.pop(key, None)
+            return None
+        return entry[1]
+
+    def _execute(self, command: list[str]) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        if name == "GET":
+            value = self._live(args[0])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value.encode()), value.encode())
+        if name == "SET":
+            key, value, options = args[0], args[1], [option.upper() for option in args[2:]]
+            if "NX" in options and self._live(key) is not None:
+                return b"$-1\r\n"
+            expires_at = None
+            if "PX" in options:
+                expires_at = time.monotonic() + int(args[2 + options.index("PX") + 1]) / 1000
+            self.data[key] = (expires_at, value)
+            return b"+OK\r\n"
+        if name == "CLIENT":
+            # redis-py announces its name and version on connect.
+            return b"+OK\r\n"
+        if name == "DEL":
+            return b":%d\r\n" % int(self.data.pop(args[0], None) is not None)
+        if name == "EVAL" and args[0] == REDIS_DELETE_IF_SCRIPT:
+            key, value = args[2], args[3]
+            if self._live(key) != value:
+                return b":0\r\n"
+            del self.data[key]
+            return b":1\r\n"
+        return b"-ERR unknown command\r\n"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while not reader.at_eof():
+                command = await self._read_command(reader)
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _exercise_backend(backend) -> None:
+    await backend.set("a", "1", ttl=0.05)
+    await backend.set("b", "2")
+    assert await backend.get("a") == "1"
+    assert await backend.add("b", "3") is False
+    assert await backend.add("c", "3") is True
+    await asyncio.sleep(0.1)
+    assert await backend.get("a") is None
+    await backend.delete("b")
+    assert await backend.get("b") is None
+    assert await backend.get("c") == "3"
+    assert await backend.delete_if("c", "other") is False
+    assert await backend.get("c") == "3"
+    assert await backend.delete_if("c", "3") is True
+    assert await backend.get("c") is None
+
+
+def test_memory_backend_ttl_and_lru_eviction() -> None:
+    async def scenario() -> None:
+        await _exercise_backend(MemoryCache())
+        backend = MemoryCache(max_entries=2)
+        await backend.set("a", "1")
+        await backend.set("b", "2")
+        await backend.get("a")
+        await backend.set("c", "3")
+        assert await backend.get("b") is None
+        assert await backend.get("a") == "1"
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path) -> None:
+    async def scenario() -> None:
+        path = str(tmp_path / "cache.sqlite3")
+        await _exercise_backend(SQLiteCache(path))
+        writer, reader = SQLiteCache(path, max_entries=2), SQLiteCache(path, max_entries=2)
+        await writer.set("x", "1")
+        assert await reader.get("x") == "1"
+        await writer.set("y", "2")
+        await writer.set("z", "3")
+        assert await reader.get("c") is None
+        assert [await reader.get(key) for key in ("y", "z")] == ["2", "3"]
+        await writer.close()
+        await reader.close()
+
+    asyncio.run(scenario())
+
+
+def test_redis_backend_round_trip() -> None:
+    async def scenario() -> None:
+        async with RespStubServer() as server:
+            backend = RedisCache(f"redis://127.0.0.1:{server.port}/0")
+            await _exercise_backend(backend)
+            await backend.close()
+
+    asyncio.run(scenario())
+
+
+def test_get_or_set_collapses_concurrent_misses() -> None:
+    async def scenario() -> None:
+        backend = MemoryCache()
+        # Two Cache instances over one backend model two workers sharing a store.
+        workers = [Cache(backend, "llm"), Cache(backend, "llm")]
+        calls = 0
+
+        async def loader() -> dict:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"summary": "ok"}
+
+        results = await asyncio.gather(*(workers[index % 2].get_or_set("k", loader, ttl=60) for index in range(6)))
+
+        assert calls == 1
+        assert results == [{"summary": "ok"}] * 6
+        assert await workers[0].get("k") == {"summary": "ok"}
+
+    asyncio.run(scenario())
+
+
+def test_get_or_set_does_not_cache_failures() -> None:
+    async def scenario() -> None:
+        cache = Cache(MemoryCache(), "analytics")
+
+        async def failing_loader() -> dict:
+            raise RuntimeError("upstream down")
+
+        with pytest.raises(RuntimeError):
+            await cache.get_or_set("k", failing_loader)
+
+        async def loader() -> int:
+            return 7
+
+        assert await cache.get_or_set("k", loader) == 7
+
+    asyncio.run(scenario())
+
+
+def test_waiters_stop_once_a_failed_loader_releases_the_lock() -> None:
+    async def scenario() -> None:
+        backend = MemoryCache()
+        workers = [Cache(backend, "scopes", lock_wait=5), Cache(backend, "scopes", lock_wait=5)]
+
+        async def forbidden() -> dict:
+            await asyncio.sleep(0.05)
+            raise PermissionError("scope belongs to another user")
+
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(worker.get_or_set("scope-1", forbidden) for worker in workers), return_exceptions=True
+        )
+
+        assert [type(result) for result in results] == [PermissionError, PermissionError]
+        assert time.monotonic() - started < 1
+
+    asyncio.run(scenario())
+
+
+def test_slow_loader_does_not_release_a_lock_taken_over_by_another_worker() -> None:
+    async def scenario() -> None:
+        backend = MemoryCache()
+        cache = Cache(backend, "reports", lock_ttl=0.05)
+        lock_key = f"{cache._key('report-1')}:lock"
+
+        async def slow_loader() -> dict:
+            await asyncio.sleep(0.1)
+            return {"ok": True}
+
+        async def take_over_expired_lock() -> None:
+            await asyncio.sleep(0.07)
+            assert await backend.add(lock_key, "other-worker", 10) is True
+
+        value, _ = await asyncio.gather(cache.get_or_set("report-1", slow_loader), take_over_expired_lock())
+
+        assert value == {"ok": True}
+        assert await backend.get(lock_key) == "other-worker"
+
+    asyncio.run(scenario())
+
+
+def test_jwks_is_fetched_once_and_shared(monkeypatch: pytest.MonkeyPatch) -> None:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    public_jwk.update({"kid": "key-1", "use": "sig", "alg": "RS256"})
+    fetches = 0
+
+    async def fake_fetch_jwks(jwks_url: str) -> dict:
+        nonlocal fetches
+        fetches += 1
+        return {"keys": [public_jwk], "fetched_at": time.time()}
+
+    monkeypatch.setattr(main, "fetch_jwks", fake_fetch_jwks)
+    monkeypatch.setattr(main, "jwks_cache", Cache(MemoryCache(), "jwks"))
+    monkeypatch.setattr(main, "supabase_settings", SupabaseSettings(url="https://example.supabase.co"))
+
+    def token(sub: str) -> str:
+        claims = {"sub": sub, "exp": int(time.time()) + 60, "iss": "https://example.supabase.co/auth/v1"}
+        return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": "key-1"})
+
+    async def scenario() -> list[str]:
+        user_ids = []
+        for sub in ("user-1", "user-2"):
+            authorization = f"Bearer {token(sub)}"
+            signing_key = await main.resolve_jwks_signing_key(authorization)
+            user_ids.append(main.verify_auth(authorization, signing_key))
+        return user_ids
+
+    assert asyncio.run(scenario()) == ["user-1", "user-2"]
+    assert fetches == 1
+
+
+def test_job_state_is_visible_to_other_workers() -> None:
+    async def scenario() -> None:
+        store = MemoryCache()
+        running = BackgroundJobPool("jobs", 1, 2, 60, log_traces=False, store=Cache(store, "jobs"))
+        other_worker = BackgroundJobPool("jobs", 1, 2, 60, log_traces=False, store=Cache(store, "jobs"))
+
+        async def runner(timer) -> dict:
+            return {"answer": 42}
+
+        job = await running.submit("user-1", runner, kind="demo")
+        finished = await other_worker.wait_for_update(job["job_id"], "user-1", job["version"] + 1, timeout=5)
+
+        assert finished["status"] == "succeeded"
+        assert finished["result"] == {"answer": 42}
+        assert await other_worker.get(job["job_id"], "user-2") is None
+        await running.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import main
+from cache import Cache, MemoryCache
+from cancellation import CLIENT_CLOSED_REQUEST_STATUS, run_cancellable
+from metrics import REGISTRY
+
+REQUEST_BODY = {
+    "scope": {"grouping": "training_day", "included_set_types": ["working"]},
+    "scope_id": "scope-1",
+    "grouped_training": [{"training_bucket_id": "training_day:2026-01-02", "sets": []}],
+}
+
+
+@pytest.fixture
+def reports(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
+    persisted: list[dict] = []
+
+    async def fake_supabase_admin_request(method, path, payload=None, params=None):
+        if path == "recommendation_scopes":
+            return [{"id": "scope-1"}]
+        if path == "analysis_reports":
+            persisted.extend(payload)
+            return [{"id": "report-1"}]
+        raise AssertionError(f"unexpected request {method} {path}")
+
+    monkeypatch.setattr(main, "supabase_admin_request", fake_supabase_admin_request)
+    monkeypatch.setattr(main, "is_supabase_admin_configured", lambda: True)
+    monkeypatch.setattr(main, "scope_ownership_cache", Cache(MemoryCache(), "scope_ownership"))
+    monkeypatch.setattr(main, "verify_auth", lambda authorization, signing_key=None: authorization.split(" ", 1)[1])
+    return persisted
+
+
+def _cancellations(route: str, reason: str) -> float:
+    return REGISTRY.get_sample_value("request_cancellations_total", {"route": route, "reason": reason}) or 0
+
+
+def test_expired_deadline_cancels_llm_call_and_skips_persistence(
+    reports: list[dict], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cancelled = False
+
+    async def slow_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return json.dumps({"summary": "late"})
+
+    monkeypatch.setattr(main, "call_anthropic", slow_call_anthropic)
+    before = _cancellations("recommendations", "deadline_exceeded")
+
+    response = TestClient(main.app).post(
+        "/api/recommendations",
+        json=REQUEST_BODY,
+        headers={"Authorization": "Bearer user-1", "X-Request-Deadline": "50"},
+    )
+
+    assert response.status_code == 504
+    assert cancelled
+    assert reports == []
+    assert _cancellations("recommendations", "deadline_exceeded") == before + 1
+
+
+def test_deadline_does_not_affect_fast_requests(reports: list[dict], monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return json.dumps({"summary": "Solid week.", "evidence": []})
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+
+    response = TestClient(main.app).post(
+        "/api/recommendations",
+        json=REQUEST_BODY,
+        headers={"Authorization": "Bearer user-1", "X-Request-Deadline": "5000"},
+    )
+
+    assert response.status_code == 200
+    assert len(reports) == 1
+
+
+def test_invalid_deadline_is_rejected(reports: list[dict]) -> None:
+    response = TestClient(main.app).post(
+        "/api/recommendations",
+        json=REQUEST_BODY,
+        headers={"Authorization": "Bearer user-1", "X-Request-Deadline": "soon"},
+    )
+
+    assert response.status_code == 400
+
+
+def test_client_disconnect_cancels_work() -> None:
+    async def scenario() -> None:
+        disconnected = asyncio.Event()
+        cancelled = False
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def handler() -> dict:
+            nonlocal cancelled
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            return {"ok": True}
+
+        request = Request({"type": "http", "method": "POST", "headers": []}, receive)
+        before = _cancellations("identify-machine", "client_disconnected")
+        asyncio.get_running_loop().call_later(0.05, disconnected.set)
+
+        response = await run_cancellable(request, "identify-machine", handler)
+
+        assert response.status_code == CLIENT_CLOSED_REQUEST_STATUS
+        assert cancelled
+        assert _cancellations("identify-machine", "client_disconnected") == before + 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,140 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware, compress_bytes, decompress_body, negotiate_encoding
+
+LARGE_PAYLOAD = {"sets": [{"machine_id": f"machine-{index}", "reps": 10, "weight": 60} for index in range(200)]}
+
+
+def _app(**options) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request) -> dict:
+        body = await request.json()
+        return {"received": len(body["sets"]), "content_encoding": request.headers.get("content-encoding")}
+
+    @app.get("/large")
+    async def large() -> dict:
+        return LARGE_PAYLOAD
+
+    @app.get("/small")
+    async def small() -> dict:
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream() -> StreamingResponse:
+        async def rows():
+            for index in range(50):
+                yield json.dumps({"row": index, "padding": "x" * 40}) + "\n"
+
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    app.add_middleware(CompressionMiddleware, **options)
+    return app
+
+
+def _raw_get(client: TestClient, path: str, accept_encoding: str):
+    # Read the raw wire bytes so the assertions see what the server actually sent.
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd", "br"])
+def test_compressed_request_body_is_decoded(encoding: str) -> None:
+    if encoding == "zstd":
+        pytest.importorskip("zstandard")
+    if encoding == "br":
+        pytest.importorskip("brotli")
+    body = compress_bytes(json.dumps(LARGE_PAYLOAD).encode(), encoding)
+
+    response = TestClient(_app()).post(
+        "/echo", content=body, headers={"Content-Type": "application/json", "Content-Encoding": encoding}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"received": 200, "content_encoding": None}
+
+
+def test_decompression_bomb_is_rejected() -> None:
+    bomb = gzip.compress(b"0" * (2 * 1024 * 1024))
+    assert len(bomb) < 10 * 1024
+
+    response = TestClient(_app(max_decompressed_bytes=1024 * 1024)).post(
+        "/echo", content=bomb, headers={"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    )
+
+    assert response.status_code == 413
+
+
+def test_unsupported_and_malformed_request_encodings() -> None:
+    client = TestClient(_app())
+
+    unsupported = client.post("/echo", content=b"{}", headers={"Content-Encoding": "compress"})
+    malformed = client.post("/echo", content=b"not gzip", headers={"Content-Encoding": "gzip"})
+
+    assert unsupported.status_code == 415
+    assert malformed.status_code == 400
+
+
+def test_truncated_gzip_body_is_rejected() -> None:
+    body = gzip.compress(json.dumps(LARGE_PAYLOAD).encode())
+
+    response = TestClient(_app()).post(
+        "/echo", content=body[: len(body) // 2], headers={"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Malformed gzip body"}
+    with pytest.raises(ValueError, match="Malformed gzip body"):
+        decompress_body(body[:-4], "gzip", 1024 * 1024)
+
+
+def test_response_uses_preferred_accepted_encoding() -> None:
+    client = TestClient(_app(encodings=("zstd", "br", "gzip")))
+
+    response, raw = _raw_get(client, "/large", "gzip;q=0.5, zstd;q=0")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(raw)
+    assert json.loads(gzip.decompress(raw)) == LARGE_PAYLOAD
+
+
+def test_small_and_unaccepted_responses_are_not_compressed() -> None:
+    client = TestClient(_app(minimum_size=1024))
+
+    small, small_raw = _raw_get(client, "/small", "gzip")
+    identity, identity_raw = _raw_get(client, "/large", "identity")
+
+    assert "content-encoding" not in small.headers
+    assert json.loads(small_raw) == {"ok": True}
+    assert "content-encoding" not in identity.headers
+    assert json.loads(identity_raw) == LARGE_PAYLOAD
+
+
+def test_streaming_response_is_compressed_incrementally() -> None:
+    client = TestClient(_app(encodings=("gzip",)))
+
+    response, raw = _raw_get(client, "/stream", "gzip")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert len(lines) == 50
+
+
+def test_negotiation_ignores_unavailable_codecs(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(compression, "zstandard", None)
+
+    assert negotiate_encoding("zstd, gzip", compression.available_encodings()) == "gzip"
+    assert negotiate_encoding("*;q=0", ("gzip",)) is None
+    assert negotiate_encoding("*", ("br", "gzip")) == "br"
+    with pytest.raises(compression.UnsupportedEncoding):
+        decompress_body(b"", "zstd", 1024)
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import uuid
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from database import PostgresDataLayer
+from metrics import REGISTRY
+
+CRON_SECRET = "cron-secret"
+USER_IDS = [f"00000000-0000-0000-0000-00000000000{index}" for index in range(1, 4)]
+SETS = [
+    {"training_date": "2026-01-12", "reps": 8, "weight": 60, "set_type": "working"},
+    {"training_date": "2026-01-05", "reps": 10, "weight": 50, "set_type": "working"},
+]
+
+
+class FakeDatabase:
+    configured = True
+
+    def __init__(self, unreachable: bool = False) -> None:
+        self.unreachable = unreachable
+        self.batches: list[tuple[list[dict], list[dict]]] = []
+
+    def _check(self) -> None:
+        if self.unreachable:
+            raise ConnectionRefusedError("connection refused")
+
+    async def list_user_ids_with_sets(self, after_user_id=None):
+        self._check()
+        return [user_id for user_id in USER_IDS if after_user_id is None or user_id > after_user_id]
+
+    async def fetch_weekly_trend_sets(self, user_id, limit):
+        self._check()
+        return SETS
+
+    async def fetch_latest_report(self, user_id, report_type):
+        self._check()
+        return None
+
+    async def write_weekly_trend_batch(self, reports, checkpoints):
+        self._check()
+        self.batches.append((list(reports), list(checkpoints)))
+
+
+@pytest.fixture
+def postgrest(monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, str]]:
+    calls: list[tuple[str, str]] = []
+
+    async def fake_supabase_admin_request(method, path, payload=None, params=None, prefer=None):
+        calls.append((method, path))
+        if path == "weekly_trend_job_checkpoints" and method == "GET":
+            return []
+        if path == "sets" and params["select"] == "user_id":
+            return [{"user_id": user_id} for user_id in USER_IDS][int(params["offset"]) :]
+        if path == "sets":
+            return SETS
+        if path == "analysis_reports" and method == "GET":
+            return []
+        return None
+
+    monkeypatch.setattr(main, "supabase_admin_request", fake_supabase_admin_request)
+    monkeypatch.setattr(main.settings, "cron_shared_secret", CRON_SECRET)
+    monkeypatch.setattr(main.settings, "database_write_batch_size", 2)
+    return calls
+
+
+def _run(body: dict) -> dict:
+    response = TestClient(main.app).post(
+        "/api/jobs/generate-weekly-trends", json=body, headers={"x-cron-secret": CRON_SECRET}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_weekly_job_reads_and_writes_in_batches_over_the_direct_path(
+    postgrest: list[tuple[str, str]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    database = FakeDatabase()
+    monkeypatch.setattr(main, "database", database)
+
+    result = _run({"run_id": "run-1"})
+
+    assert result["processed_users"] == 3
+    # Only the checkpoint lookup still goes through PostgREST.
+    assert postgrest == [("GET", "weekly_trend_job_checkpoints")]
+    assert [len(reports) for reports, _ in database.batches] == [2, 1]
+    written = [report for reports, _ in database.batches for report in reports]
+    checkpoints = [checkpoint for _, batch in database.batches for checkpoint in batch]
+    assert [report["user_id"] for report in written] == USER_IDS
+    assert [checkpoint["report_id"] for checkpoint in checkpoints] == [report["id"] for report in written]
+    assert [report["report_id"] for report in result["reports"]] == [report["id"] for report in written]
+
+
+def test_unreachable_postgres_falls_back_to_postgrest(
+    postgrest: list[tuple[str, str]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(main, "database", FakeDatabase(unreachable=True))
+    labels = {"operation": "write_weekly_trend_batch"}
+    before = REGISTRY.get_sample_value("database_fallbacks_total", labels) or 0
+
+    result = _run({"run_id": "run-1"})
+
+    assert result["processed_users"] == 3
+    assert ("POST", "analysis_reports") in postgrest
+    assert ("POST", "weekly_trend_job_checkpoints") in postgrest
+    assert REGISTRY.get_sample_value("database_fallbacks_total", labels) == before + 2
+
+
+# Integration tests against a disposable local Postgres, e.g.
+# TEST_DATABASE_URL=postgresql://postgres@127.0.0.1:5432/postgres
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+SCHEMA = """
+create table sets (
+  id bigserial primary key,
+  user_id uuid not null,
+  training_date date,
+  reps int,
+  weight numeric,
+  set_type text,
+  logged_at timestamptz not null default now()
+);
+create index on sets(user_id, logged_at desc);
+create table analysis_reports (
+  id uuid not null default gen_random_uuid(),
+  user_id uuid not null,
+  recommendation_scope_id uuid,
+  report_type text not null,
+  status text not null,
+  title text,
+  summary text,
+  payload jsonb not null,
+  evidence jsonb not null,
+  metadata jsonb not null,
+  created_at timestamptz not null default clock_timestamp(),
+  primary key (id, created_at)
+) partition by range (created_at);
+create table analysis_reports_default partition of analysis_reports default;
+create table weekly_trend_job_checkpoints (
+  run_id text not null,
+  user_id uuid not null,
+  shard_index int not null default 0,
+  report_id uuid,
+  completed_at timestamptz not null default now(),
+  primary key (run_id, user_id)
+);
+"""
+
+
+@pytest.fixture
+def postgres_dsn():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    asyncpg = pytest.importorskip("asyncpg")
+    schema = f"gym_tracker_test_{uuid.uuid4().hex[:12]}"
+
+    async def execute(sql: str) -> None:
+        connection = await asyncpg.connect(TEST_DATABASE_URL)
+        try:
+            await connection.execute(sql)
+        finally:
+            await connection.close()
+
+    asyncio.run(execute(f"create schema {schema}; set search_path = {schema}; {SCHEMA}"))
+    separator = "&" if "?" in TEST_DATABASE_URL else "?"
+    yield f"{TEST_DATABASE_URL}{separator}search_path={schema}"
+    asyncio.run(execute(f"drop schema {schema} cascade"))
+
+
+def test_asyncpg_is_not_imported_without_database_url() -> None:
+    completed = subprocess.run(
+        [sys.executable, "-c", "import sys, main; print('asyncpg' in sys.modules)"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={key: value for key, value in os.environ.items() if key != "DATABASE_URL"},
+    )
+    assert completed.stdout.strip() == "False"
+
+
+def test_postgres_data_layer_round_trip(postgres_dsn: str) -> None:
+    async def scenario() -> None:
+        database = PostgresDataLayer(postgres_dsn, max_size=2)
+        pool = await database.pool()
+        await pool.executemany(
+            "insert into sets (user_id, training_date, reps, weight, set_type) values ($1, $2::text::date, $3, $4, $5)",
+            [(user_id, row["training_date"], row["reps"], row["weight"], row["set_type"]) for user_id in USER_IDS for row in SETS],
+        )
+
+        assert await database.list_user_ids_with_sets() == USER_IDS
+        assert await database.list_user_ids_with_sets(USER_IDS[0]) == USER_IDS[1:]
+        sets = await database.fetch_weekly_trend_sets(USER_IDS[0], 1)
+        assert [(row["training_date"], row["reps"], float(row["weight"])) for row in sets] == [("2026-01-12", 8, 60.0)]
+
+        report = {
+            "id": str(uuid.uuid4()),
+            **main.analysis_report_row(USER_IDS[0], "weekly_trend", {"weeks": []}, [], metadata={"fingerprint": "abc"}),
+        }
+        checkpoint = {"run_id": "run-1", "user_id": USER_IDS[0], "shard_index": 0, "report_id": report["id"]}
+        await database.write_weekly_trend_batch([report], [checkpoint])
+        # A retried batch re-records the checkpoint without failing.
+        await database.write_weekly_trend_batch([], [checkpoint])
+        direct_id = await database.insert_analysis_report(
+            main.analysis_report_row(USER_IDS[1], "weekly_trend", {"weeks": []}, [], metadata={"fingerprint": "def"})
+        )
+
+        assert await database.fetch_latest_report(USER_IDS[0], "weekly_trend") == {"id": report["id"], "fingerprint": "abc"}
+        assert (await database.fetch_latest_report(USER_IDS[1], "weekly_trend"))["id"] == direct_id
+        payload = await pool.fetchval("select payload from analysis_reports where id = $1", report["id"])
+        assert json.loads(payload) == {"weeks": []}
+        assert await pool.fetchval("select count(*) from weekly_trend_job_checkpoints") == 1
+        await database.close()
+
+    asyncio.run(scenario())
+
+
+def test_weekly_job_end_to_end_against_postgres(
+    postgres_dsn: str, postgrest: list[tuple[str, str]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    database = PostgresDataLayer(postgres_dsn, max_size=2)
+    monkeypatch.setattr(main, "database", database)
+
+    async def scenario() -> tuple[dict, dict]:
+        pool = await database.pool()
+        await pool.executemany(
+            "insert into sets (user_id, training_date, reps, weight, set_type) values ($1, $2::text::date, $3, $4, $5)",
+            [(user_id, row["training_date"], row["reps"], row["weight"], row["set_type"]) for user_id in USER_IDS for row in SETS],
+        )
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"x-cron-secret": CRON_SECRET}
+            first = await client.post("/api/jobs/generate-weekly-trends", json={"user_id": USER_IDS[0]}, headers=headers)
+            second = await client.post("/api/jobs/generate-weekly-trends", json={"user_id": USER_IDS[0]}, headers=headers)
+        await database.close()
+        return first.json(), second.json()
+
+    first, second = asyncio.run(scenario())
+
+    assert first["reports"][0]["unchanged"] is False
+    assert first["reports"][0]["weeks"][-1] == {"week_start": "2026-01-12", "total_sets": 1, "total_reps": 8, "total_volume": 480.0}
+    assert second["reports"][0] == {**first["reports"][0], "unchanged": True}
+    assert postgrest == []
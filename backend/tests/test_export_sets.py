@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def _set_row(index: int) -> dict:
+    return {
+        "id": f"set-{index:04d}",
+        "logged_at": f"2026-01-{(index % 28) + 1:02d}T10:00:00+00:00",
+        "training_date": f"2026-01-{(index % 28) + 1:02d}",
+        "training_bucket_id": f"training_day:2026-01-{(index % 28) + 1:02d}",
+        "workout_cluster_id": None,
+        "machine_id": "machine-1",
+        "set_type": "working",
+        "reps": 10,
+        "weight": 50,
+        "duration_seconds": None,
+        "rest_seconds": 90,
+        "machine": {"name": "Seated Row", "movement": "Horizontal Pull"},
+    }
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(main.settings, "export_page_size", 2)
+    main.app.dependency_overrides[main.get_current_user_id] = lambda: "user-1"
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def recorded_requests(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
+    rows = [_set_row(index) for index in range(5)]
+    requests: list[dict] = []
+
+    async def fake_supabase_admin_request(method, path, payload=None, params=None):
+        requests.append(dict(params or {}))
+        offset = 0
+        if "or" in params:
+            offset = next(i for i, row in enumerate(rows) if f"id.lt.{row['id']}" in params["or"]) + 1
+        return rows[offset : offset + int(params["limit"])]
+
+    monkeypatch.setattr(main, "supabase_admin_request", fake_supabase_admin_request)
+    return requests
+
+
+def test_export_sets_streams_ndjson_with_keyset_pagination(client, recorded_requests) -> None:
+    response = client.get("/api/export/sets")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [f"set-{index:04d}" for index in range(5)]
+    assert lines[0]["machine_name"] == "Seated Row"
+    assert lines[0]["movement"] == "Horizontal Pull"
+    assert "machine" not in lines[0]
+
+    assert len(recorded_requests) == 3
+    assert "or" not in recorded_requests[0]
+    assert recorded_requests[1]["or"] == (
+        '(logged_at.lt."2026-01-02T10:00:00+00:00",'
+        'and(logged_at.eq."2026-01-02T10:00:00+00:00",id.lt.set-0001))'
+    )
+    assert all(params["user_id"] == "eq.user-1" for params in recorded_requests)
+    assert all(params["order"] == "logged_at.desc,id.desc" for params in recorded_requests)
+
+
+def test_export_sets_streams_csv_with_header(client, recorded_requests) -> None:
+    response = client.get("/api/export/sets", params={"format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="sets-export.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 5
+    assert list(rows[0].keys()) == list(main.EXPORT_SET_COLUMNS)
+    assert rows[4]["id"] == "set-0004"
+
+
+def test_export_sets_rejects_unknown_format(client, recorded_requests) -> None:
+    response = client.get("/api/export/sets", params={"format": "xlsx"})
+
+    assert response.status_code == 422
+    assert recorded_requests == []
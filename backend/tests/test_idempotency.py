@@ -0,0 +1,191 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from cache import Cache, MemoryCache
+from idempotency import IdempotencyStore
+
+RECOMMENDATION_TEXT = json.dumps({"summary": "Solid week.", "evidence": []})
+REQUEST_BODY = {
+    "scope": {"grouping": "training_day", "included_set_types": ["working"]},
+    "scope_id": "scope-1",
+    "grouped_training": [{"training_bucket_id": "training_day:2026-01-02", "sets": []}],
+}
+IDENTIFY_BODY = {"images": [{"data": "aGVsbG8=", "media_type": "image/jpeg"}]}
+
+
+@pytest.fixture
+def llm_calls(monkeypatch: pytest.MonkeyPatch) -> list[list[dict]]:
+    calls: list[list[dict]] = []
+
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        calls.append(messages)
+        if isinstance(messages[0]["content"], list):
+            return json.dumps({"name": "Leg Press", "movement": "Leg press"})
+        return RECOMMENDATION_TEXT
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    return calls
+
+
+@pytest.fixture
+def reports(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
+    persisted: list[dict] = []
+
+    async def fake_supabase_admin_request(method, path, payload=None, params=None):
+        if path == "recommendation_scopes":
+            return [{"id": "scope-1"}] if params["user_id"] == "eq.user-1" else []
+        if path == "analysis_reports":
+            persisted.extend(payload)
+            return [{"id": f"report-{len(persisted)}"}]
+        raise AssertionError(f"unexpected request {method} {path}")
+
+    monkeypatch.setattr(main, "supabase_admin_request", fake_supabase_admin_request)
+    monkeypatch.setattr(main, "is_supabase_admin_configured", lambda: True)
+    monkeypatch.setattr(main, "scope_ownership_cache", Cache(MemoryCache(), "scope_ownership"))
+    monkeypatch.setattr(main, "verify_auth", lambda authorization, signing_key=None: authorization.split(" ", 1)[1])
+    monkeypatch.setattr(
+        main,
+        "idempotency_store",
+        IdempotencyStore(Cache(MemoryCache(), "idempotency"), ttl_seconds=60, in_progress_ttl_seconds=30, wait_seconds=0),
+    )
+    return persisted
+
+
+def _post(path: str, body: dict, key: str | None = None, user_id: str = "user-1"):
+    headers = {"Authorization": f"Bearer {user_id}"}
+    if key is not None:
+        headers["Idempotency-Key"] = key
+    return TestClient(main.app).post(path, json=body, headers=headers)
+
+
+def test_recommendation_replay_skips_the_pipeline(llm_calls: list, reports: list[dict]) -> None:
+    first = _post("/api/recommendations", REQUEST_BODY, key="rec-1")
+    second = _post("/api/recommendations", REQUEST_BODY, key="rec-1")
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["idempotency-replayed"] == "true"
+    assert "idempotency-replayed" not in first.headers
+    assert len(llm_calls) == 1
+    assert len(reports) == 1
+
+
+def test_keys_are_scoped_per_user_and_optional(llm_calls: list, reports: list[dict]) -> None:
+    assert _post("/api/recommendations", REQUEST_BODY).status_code == 200
+    assert _post("/api/recommendations", REQUEST_BODY).status_code == 200
+    assert _post("/api/recommendations", REQUEST_BODY, key="shared").status_code == 200
+    # Same key from another user is a separate request (and fails that user's scope check).
+    assert _post("/api/recommendations", REQUEST_BODY, key="shared", user_id="user-2").status_code == 400
+
+    assert len(reports) == 3
+
+
+def test_key_reused_with_different_payload_is_rejected(llm_calls: list, reports: list[dict]) -> None:
+    assert _post("/api/recommendations", REQUEST_BODY, key="rec-1").status_code == 200
+
+    response = _post("/api/recommendations", {**REQUEST_BODY, "scope": {"goals": ["strength"]}}, key="rec-1")
+
+    assert response.status_code == 422
+    assert len(llm_calls) == 1
+
+
+def test_failed_request_releases_the_key(llm_calls: list, reports: list[dict], monkeypatch: pytest.MonkeyPatch) -> None:
+    async def failing_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        raise HTTPException(502, "LLM API error")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(main, "call_anthropic", failing_call_anthropic)
+        assert _post("/api/recommendations", REQUEST_BODY, key="rec-1").status_code == 502
+
+    retry = _post("/api/recommendations", REQUEST_BODY, key="rec-1")
+
+    assert retry.status_code == 200
+    assert "idempotency-replayed" not in retry.headers
+    assert len(reports) == 1
+
+
+def test_invalid_key_is_rejected(llm_calls: list, reports: list[dict]) -> None:
+    response = _post("/api/recommendations", REQUEST_BODY, key="x" * 256)
+
+    assert response.status_code == 400
+    assert llm_calls == []
+
+
+def test_identify_machine_replay(llm_calls: list, reports: list[dict], monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main.settings, "anthropic_api_key", "sk-ant-test")
+
+    first = _post("/api/identify-machine", IDENTIFY_BODY, key="photo-1")
+    second = _post("/api/identify-machine", IDENTIFY_BODY, key="photo-1")
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert first.json()["name"] == "Leg Press"
+    assert len(llm_calls) == 1
+
+
+def test_concurrent_duplicate_waits_for_the_first_result() -> None:
+    async def scenario() -> None:
+        store = IdempotencyStore(Cache(MemoryCache(), "idempotency"), ttl_seconds=60, in_progress_ttl_seconds=30, wait_seconds=2)
+        release = asyncio.Event()
+        runs = 0
+
+        async def handler() -> dict:
+            nonlocal runs
+            runs += 1
+            await release.wait()
+            return {"ok": True}
+
+        first = asyncio.create_task(store.run("recommendations", "user-1", "k", "fp", handler))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(store.run("recommendations", "user-1", "k", "fp", handler))
+        await asyncio.sleep(0.1)
+        release.set()
+
+        assert await first == {"ok": True}
+        replayed = await second
+        assert json.loads(replayed.body) == {"ok": True}
+        assert runs == 1
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_still_in_progress_gets_409() -> None:
+    async def scenario() -> None:
+        store = IdempotencyStore(Cache(MemoryCache(), "idempotency"), ttl_seconds=60, in_progress_ttl_seconds=30, wait_seconds=0)
+        release = asyncio.Event()
+
+        async def handler() -> dict:
+            await release.wait()
+            return {"ok": True}
+
+        first = asyncio.create_task(store.run("recommendations", "user-1", "k", "fp", handler))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as excinfo:
+            await store.run("recommendations", "user-1", "k", "fp", handler)
+        release.set()
+        await first
+
+        assert excinfo.value.status_code == 409
+        assert excinfo.value.headers["Retry-After"] == "2"
+
+    asyncio.run(scenario())
+
+
+def test_unreadable_store_runs_the_handler() -> None:
+    class ReadFailingCache(MemoryCache):
+        async def get(self, key: str):
+            raise ConnectionError("cache down")
+
+    async def scenario() -> None:
+        backend = ReadFailingCache()
+        store = IdempotencyStore(Cache(backend, "idempotency"), ttl_seconds=60, in_progress_ttl_seconds=30, wait_seconds=2)
+        await backend.add("idempotency:recommendations:user-1:k", json.dumps({"v": {"state": "in_progress"}}))
+
+        assert await store.run("recommendations", "user-1", "k", "fp", lambda: asyncio.sleep(0, {"ok": True})) == {"ok": True}
+
+    asyncio.run(scenario())
@@ -0,0 +1,195 @@
+import asyncio
+import base64
+import io
+import json
+import random
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+Image = pytest.importorskip("PIL.Image")
+
+import main
+from cache import Cache, MemoryCache
+from image_index import EquipmentImageIndex, dhash, hamming_distance
+from startup import UpstreamClients
+
+
+def _photo(seed: int, size: tuple[int, int] = (320, 240), quality: int = 90) -> bytes:
+    # Blocky random scenes: structure a perceptual hash can latch on to, unique per seed.
+    rng = random.Random(seed)
+    image = Image.new("L", (16, 12))
+    image.putdata([rng.randrange(256) for _ in range(16 * 12)])
+    buffer = io.BytesIO()
+    image.resize(size, Image.Resampling.BILINEAR).convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _data_url(data: bytes) -> str:
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode()
+
+
+def _index(fetch_remote=None) -> EquipmentImageIndex:
+    return EquipmentImageIndex(
+        Cache(MemoryCache(), "identify_index"),
+        Cache(MemoryCache(), "catalog_image_hashes"),
+        min_confidence=0.9,
+        library_ttl_seconds=60,
+        identified_ttl_seconds=60,
+        remote_hash_ttl_seconds=60,
+        max_identified_entries=10,
+        remote_hosts=["catalog.example.com"],
+        fetch_remote=fetch_remote,
+    )
+
+
+def test_dhash_survives_resizing_and_recompression() -> None:
+    original = dhash(_photo(1))
+    resized = dhash(_photo(1, size=(1280, 960), quality=60))
+    other = dhash(_photo(2))
+
+    assert original is not None and resized is not None and other is not None
+    assert hamming_distance(original, resized) <= 3
+    assert hamming_distance(original, other) > 12
+
+
+def test_flat_and_undecodable_images_are_not_hashed() -> None:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "gray").save(buffer, format="PNG")
+
+    assert dhash(buffer.getvalue()) is None
+    assert dhash(b"hello") is None
+
+
+def test_catalog_thumbnail_fetch_stops_past_the_byte_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    chunks_sent: list[int] = []
+
+    async def endless_body():
+        for _ in range(100):
+            chunks_sent.append(1)
+            yield b"x" * 1024
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/declared.jpg":
+            return httpx.Response(200, headers={"Content-Length": str(10 * 1024 * 1024)}, content=endless_body())
+        if request.url.path == "/chunked.jpg":
+            return httpx.Response(200, content=endless_body())
+        return httpx.Response(200, content=b"small")
+
+    monkeypatch.setattr(main, "IDENTIFY_INDEX_MAX_REMOTE_IMAGE_BYTES", 4 * 1024)
+    monkeypatch.setattr(main, "upstream_clients", UpstreamClients({"images": 10}, transport=httpx.MockTransport(handler)))
+
+    async def fetch(path: str) -> bytes:
+        return await main.fetch_catalog_thumbnail(f"https://catalog.example.com{path}")
+
+    assert asyncio.run(fetch("/small.jpg")) == b"small"
+    with pytest.raises(ValueError):
+        asyncio.run(fetch("/declared.jpg"))
+    assert chunks_sent == []
+    with pytest.raises(ValueError):
+        asyncio.run(fetch("/chunked.jpg"))
+    assert len(chunks_sent) == 5
+
+
+def test_remote_thumbnails_are_fetched_only_from_allowed_hosts_and_cached() -> None:
+    fetched: list[str] = []
+
+    async def fetch_remote(url: str) -> bytes:
+        fetched.append(url)
+        return _photo(3)
+
+    async def scenario() -> None:
+        index = _index(fetch_remote)
+        machines = [
+            {"id": "m-1", "name": "Lat Pulldown", "source": "default_catalog", "thumbnails": ["https://catalog.example.com/lat.avif"]},
+            {"id": "m-2", "name": "Mystery", "thumbnails": ["http://169.254.169.254/latest", "https://evil.example.org/x.jpg"]},
+        ]
+
+        async def load_library(user_id: str) -> list[dict]:
+            return machines
+
+        hashes = await index.hash_images([_photo(3, size=(640, 480))])
+        match = await index.lookup("user-1", hashes, load_library)
+        # A second user with the same catalog row reuses the cached hash.
+        await index.lookup("user-2", hashes, load_library)
+
+        assert match is not None
+        assert (match.machine_id, match.source) == ("m-1", "catalog")
+        assert match.confidence >= 0.9
+
+    asyncio.run(scenario())
+    assert fetched == ["https://catalog.example.com/lat.avif"]
+
+
+@pytest.fixture
+def identify_client(monkeypatch: pytest.MonkeyPatch):
+    library_loads: list[str] = []
+    llm_calls: list[list[dict]] = []
+
+    async def fake_supabase_admin_request(method, path, payload=None, params=None):
+        assert (method, path) == ("GET", "machines")
+        library_loads.append(params["user_id"])
+        return [
+            {
+                "id": "machine-1",
+                "name": "Seated Row",
+                "movement": "Horizontal Pull",
+                "muscle_groups": ["Back", "Biceps"],
+                "exercise_type": "Pull",
+                "default_weight": 40,
+                "default_reps": 10,
+                "notes": "Lead with elbows",
+                "thumbnails": [_data_url(_photo(10))],
+            }
+        ]
+
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        llm_calls.append(messages)
+        return json.dumps({"name": "Leg Press", "exerciseType": "Legs", "movement": "Leg press"})
+
+    monkeypatch.setattr(main, "supabase_admin_request", fake_supabase_admin_request)
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    monkeypatch.setattr(main, "verify_auth", lambda authorization, signing_key=None: authorization.split(" ", 1)[1])
+    monkeypatch.setattr(main, "equipment_image_index", _index())
+    monkeypatch.setattr(main.settings, "identify_index_enabled", True)
+    return TestClient(main.app), library_loads, llm_calls
+
+
+def _identify(client: TestClient, photo: bytes):
+    return client.post(
+        "/api/identify-machine",
+        json={"images": [{"data": base64.b64encode(photo).decode()}]},
+        headers={"Authorization": "Bearer user-1"},
+    )
+
+
+def test_library_match_skips_the_llm(identify_client) -> None:
+    client, library_loads, llm_calls = identify_client
+
+    response = _identify(client, _photo(10, size=(1024, 768), quality=70))
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["fromIndex"] is True
+    assert body["indexMatch"]["machineId"] == "machine-1"
+    assert body["indexMatch"]["source"] == "library"
+    assert body["name"] == "Seated Row"
+    assert body["muscleGroups"] == ["Back", "Biceps"]
+    assert llm_calls == []
+    assert library_loads == ["eq.user-1"]
+
+
+def test_identified_photos_are_remembered(identify_client) -> None:
+    client, library_loads, llm_calls = identify_client
+
+    first = _identify(client, _photo(20))
+    second = _identify(client, _photo(20, quality=75))
+
+    assert first.json()["fromIndex"] is False
+    assert second.json()["fromIndex"] is True
+    assert second.json()["indexMatch"]["source"] == "identify"
+    assert second.json()["name"] == "Leg Press"
+    assert len(llm_calls) == 1
+    # The library is loaded once and then served from the cache.
+    assert library_loads == ["eq.user-1"]
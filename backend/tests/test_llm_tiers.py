@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import Cache, MemoryCache
+from llm_tiers import LLMResult, ModelOverloadedError, ModelTier, call_with_fallback
+
+TIER = ModelTier("strong-model", "fast-model", latency_budget_seconds=0.05)
+
+
+def test_primary_within_budget_is_used() -> None:
+    async def send(model: str) -> str:
+        return f"from {model}"
+
+    result = asyncio.run(call_with_fallback(TIER, "recommendation", send))
+
+    assert result == LLMResult("from strong-model", "strong-model")
+
+
+def test_overloaded_primary_falls_back_immediately() -> None:
+    calls: list[str] = []
+
+    async def send(model: str) -> str:
+        calls.append(model)
+        if model == "strong-model":
+            raise ModelOverloadedError(model, 529)
+        return "fast answer"
+
+    result = asyncio.run(call_with_fallback(TIER, "recommendation", send))
+
+    assert calls == ["strong-model", "fast-model"]
+    assert result == LLMResult("fast answer", "fast-model", "overloaded")
+
+
+def test_slow_primary_races_the_fallback_and_is_cancelled() -> None:
+    cancelled: list[str] = []
+
+    async def send(model: str) -> str:
+        try:
+            await asyncio.sleep(5 if model == "strong-model" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return f"from {model}"
+
+    result = asyncio.run(call_with_fallback(TIER, "recommendation", send))
+
+    assert result == LLMResult("from fast-model", "fast-model", "latency_budget")
+    assert cancelled == ["strong-model"]
+
+
+def test_primary_finishing_during_the_race_still_wins() -> None:
+    async def send(model: str) -> str:
+        await asyncio.sleep(0.08 if model == "strong-model" else 5)
+        return f"from {model}"
+
+    result = asyncio.run(call_with_fallback(TIER, "recommendation", send))
+
+    assert result == LLMResult("from strong-model", "strong-model")
+
+
+def test_without_fallback_errors_propagate() -> None:
+    async def send(model: str) -> str:
+        raise ModelOverloadedError(model, 529)
+
+    with pytest.raises(ModelOverloadedError):
+        asyncio.run(call_with_fallback(ModelTier("strong-model"), "recommendation", send))
+
+
+@pytest.fixture
+def reports(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
+    persisted: list[dict] = []
+
+    async def fake_supabase_admin_request(method, path, payload=None, params=None):
+        if path == "recommendation_scopes":
+            return [{"id": "scope-1"}]
+        if path == "analysis_reports":
+            persisted.extend(payload)
+            return [{"id": "report-1"}]
+        raise AssertionError(f"unexpected request {method} {path}")
+
+    monkeypatch.setattr(main, "supabase_admin_request", fake_supabase_admin_request)
+    monkeypatch.setattr(main, "is_supabase_admin_configured", lambda: True)
+    monkeypatch.setattr(main, "scope_ownership_cache", Cache(MemoryCache(), "scope_ownership"))
+    monkeypatch.setattr(main, "verify_auth", lambda authorization, signing_key=None: authorization.split(" ", 1)[1])
+    monkeypatch.setattr(main.settings, "anthropic_model", "default-model")
+    monkeypatch.setattr(main.settings, "anthropic_identify_model", "fast-model")
+    monkeypatch.setattr(main.settings, "anthropic_identify_enriched_model", None)
+    monkeypatch.setattr(main.settings, "anthropic_recommendation_model", "strong-model")
+    monkeypatch.setattr(main.settings, "anthropic_fallback_model", "fast-model")
+    return persisted
+
+
+def test_models_are_chosen_per_route_and_mode(reports: list[dict], monkeypatch: pytest.MonkeyPatch) -> None:
+    models: list[str] = []
+
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        models.append(model)
+        return json.dumps({"name": "Leg Press"})
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    client = TestClient(main.app)
+    image = {"images": [{"data": "aGVsbG8="}]}
+
+    client.post("/api/identify-machine", json=image, headers={"Authorization": "Bearer user-1"})
+    client.post(
+        "/api/identify-machine",
+        json={**image, "enrich_with_web_search": True},
+        headers={"Authorization": "Bearer user-1"},
+    )
+
+    assert models == ["fast-model", "default-model"]
+
+
+def test_report_metadata_records_the_fallback_model(reports: list[dict], monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        if model == "strong-model":
+            raise ModelOverloadedError(model, 529)
+        return json.dumps({"summary": "Solid week.", "evidence": []})
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+
+    response = TestClient(main.app).post(
+        "/api/recommendations",
+        json={"scope_id": "scope-1", "grouped_training": [], "scope": {}},
+        headers={"Authorization": "Bearer user-1"},
+    )
+
+    assert response.status_code == 200
+    assert reports[0]["metadata"]["model"] == "fast-model"
+    assert reports[0]["metadata"]["model_fallback"] == "overloaded"
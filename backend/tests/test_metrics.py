@@ -0,0 +1,83 @@
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from metrics import REGISTRY
+
+METRICS_HEADERS = {"Authorization": "Bearer scrape-token"}
+
+
+def _sample_value(text: str, sample: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"sample not found: {sample}")
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    monkeypatch.setattr(main.settings, "metrics_bearer_token", "scrape-token")
+    return TestClient(main.app)
+
+
+def test_metrics_endpoint_reports_route_templates(client: TestClient) -> None:
+    sample = 'http_request_duration_seconds_count{method="GET",route="/api/health",status="200"}'
+    before = client.get("/metrics", headers=METRICS_HEADERS).text
+    baseline = _sample_value(before, sample) if sample in before else 0
+
+    assert client.get("/api/health").status_code == 200
+    response = client.get("/metrics", headers=METRICS_HEADERS)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert _sample_value(response.text, sample) == baseline + 1
+    assert "http_requests_in_flight 1.0" in response.text
+
+
+def test_path_parameters_are_labelled_with_the_route_template(client: TestClient) -> None:
+    labels = {"method": "GET", "route": "/api/recommendations/jobs/{job_id}", "status": "401"}
+    before = REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0
+
+    assert client.get("/api/recommendations/jobs/job-123").status_code == 401
+
+    assert REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) == before + 1
+
+
+def test_compressed_requests_are_labelled_with_the_route_template(client: TestClient) -> None:
+    body = gzip.compress(json.dumps({"scope_id": "scope-1", "padding": "x" * 8192}).encode())
+    labels = {"method": "POST", "route": "/api/recommendations", "status": "401"}
+    before = REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0
+
+    response = client.post(
+        "/api/recommendations",
+        content=body,
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+
+    assert response.status_code == 401
+    assert REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) == before + 1
+
+
+def test_metrics_endpoint_requires_configured_bearer_token(client: TestClient) -> None:
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers=METRICS_HEADERS).status_code == 200
+
+
+def test_metrics_endpoint_is_disabled_without_a_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main.settings, "metrics_bearer_token", None)
+
+    assert TestClient(main.app).get("/metrics").status_code == 404
+
+
+def test_parse_json_response_counts_failures() -> None:
+    before = REGISTRY.get_sample_value("llm_json_parse_failures_total")
+
+    with pytest.raises(json.JSONDecodeError):
+        main.parse_json_response("not json")
+
+    assert main.parse_json_response('```json\n{"ok": true}\n```') == {"ok": True}
+    assert REGISTRY.get_sample_value("llm_json_parse_failures_total") == before + 1
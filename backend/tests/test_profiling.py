@@ -0,0 +1,101 @@
+import asyncio
+import re
+import time
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from profiling import Profiler, ProfilerBusyError
+
+CRON_SECRET = "cron-secret"
+retained: list[bytes] = []
+
+
+def _block_event_loop(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_session_reports_cpu_stacks_memory_growth_and_loop_lag() -> None:
+    profiler = Profiler()
+
+    async def workload() -> None:
+        await asyncio.sleep(0.05)
+        retained.extend(bytes(1024) for _ in range(512))
+        _block_event_loop(0.1)
+
+    async def scenario() -> dict:
+        result, _ = await asyncio.gather(
+            profiler.profile(["cpu", "memory", "loop_lag"], duration_seconds=0.4, sample_interval_seconds=0.005),
+            workload(),
+        )
+        return result
+
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        retained.clear()
+
+    assert result["modes"] == ["cpu", "memory", "loop_lag"]
+    assert result["cpu"]["samples"] > 0
+    assert "_block_event_loop (test_profiling.py:" in result["cpu"]["collapsed"]
+    assert all(re.fullmatch(r".+ \d+", line) for line in result["cpu"]["collapsed"].splitlines())
+    assert any("test_profiling.py" in entry["site"] for entry in result["memory"]["top_growth"])
+    assert result["loop_lag"]["max_ms"] >= 50
+    # tracemalloc is only left running if something else started it.
+    assert not tracemalloc.is_tracing()
+
+
+def test_only_one_session_runs_at_a_time() -> None:
+    profiler = Profiler()
+
+    async def scenario() -> None:
+        first = asyncio.create_task(profiler.profile(["loop_lag"], 0.1, 0.01))
+        await asyncio.sleep(0)
+        with pytest.raises(ProfilerBusyError):
+            await profiler.profile(["loop_lag"], 0.1, 0.01)
+        await first
+        assert not profiler.busy
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    monkeypatch.setattr(main.settings, "cron_shared_secret", CRON_SECRET)
+    monkeypatch.setattr(main.settings, "profiling_enabled", True)
+    monkeypatch.setattr(main, "profiler", Profiler())
+    return TestClient(main.app)
+
+
+def test_profiling_is_hidden_when_disabled(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main.settings, "profiling_enabled", False)
+
+    response = client.post("/api/admin/profile", json={}, headers={"x-cron-secret": CRON_SECRET})
+
+    assert response.status_code == 404
+
+
+def test_profiling_requires_the_cron_secret(client: TestClient) -> None:
+    response = client.post("/api/admin/profile", json={}, headers={"x-cron-secret": "wrong"})
+
+    assert response.status_code == 401
+
+
+def test_collapsed_format_returns_flamegraph_input(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main.settings, "profiling_max_duration_seconds", 0.2)
+
+    response = client.post(
+        "/api/admin/profile?format=collapsed",
+        json={"modes": ["cpu"], "duration_seconds": 30, "sample_interval_ms": 5},
+        headers={"x-cron-secret": CRON_SECRET},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert lines
+    assert all(re.fullmatch(r".+ \d+", line) for line in lines)
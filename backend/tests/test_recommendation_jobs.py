@@ -0,0 +1,201 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import jobs
+import main
+from jobs import BackgroundJobPool
+
+RECOMMENDATION_TEXT = json.dumps(
+    {
+        "summary": "Solid week.",
+        "highlights": [],
+        "suggestions": [],
+        "nextSession": "Legs",
+        "progressNotes": "",
+        "evidence": [],
+    }
+)
+REQUEST_BODY = {
+    "scope": {"grouping": "training_day", "included_set_types": ["working"]},
+    "scope_id": "scope-1",
+    "grouped_training": [{"training_bucket_id": "training_day:2026-01-02", "sets": []}],
+}
+
+
+@pytest.fixture
+def persisted_reports(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
+    reports: list[dict] = []
+
+    async def fake_supabase_admin_request(method, path, payload=None, params=None):
+        if path == "recommendation_scopes":
+            return [{"id": "scope-1"}] if params["user_id"] == "eq.user-1" else []
+        if path == "analysis_reports":
+            reports.extend(payload)
+            return [{"id": f"report-{len(reports)}"}]
+        raise AssertionError(f"unexpected request {method} {path}")
+
+    monkeypatch.setattr(main, "supabase_admin_request", fake_supabase_admin_request)
+    monkeypatch.setattr(main, "is_supabase_admin_configured", lambda: True)
+    return reports
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch, persisted_reports):
+    monkeypatch.setattr(main.settings, "anthropic_api_key", "sk-ant-test")
+    monkeypatch.setattr(main.settings, "supabase_url", "https://example.supabase.co")
+    monkeypatch.setattr(main.settings, "supabase_service_role_key", "service-role")
+    monkeypatch.setattr(main.settings, "startup_warmup", False)
+    monkeypatch.setattr(main, "verify_auth", lambda authorization, signing_key=None: authorization.split(" ", 1)[1])
+    monkeypatch.setattr(
+        main,
+        "recommendation_jobs",
+        BackgroundJobPool("recommendation_jobs", worker_count=1, queue_size=2, ttl_seconds=60, log_traces=False),
+    )
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def _auth(user_id: str = "user-1") -> dict[str, str]:
+    return {"Authorization": f"Bearer {user_id}"}
+
+
+def _wait_for_terminal(client: TestClient, job_id: str) -> dict:
+    version = -1
+    for _ in range(20):
+        job = client.get(
+            f"/api/recommendations/jobs/{job_id}",
+            params={"wait": 5, "after_version": version},
+            headers=_auth(),
+        ).json()
+        if job["status"] in {"succeeded", "failed"}:
+            return job
+        version = job["version"]
+    raise AssertionError("job did not finish")
+
+
+def test_job_returns_immediately_and_persists_result(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, persisted_reports: list[dict]
+) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return RECOMMENDATION_TEXT
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+
+    submitted = client.post("/api/recommendations/jobs", json=REQUEST_BODY, headers=_auth())
+
+    assert submitted.status_code == 202
+    body = submitted.json()
+    assert body["status"] == "queued"
+    assert body["poll_url"] == f"/api/recommendations/jobs/{body['job_id']}"
+    assert "owner_id" not in body
+
+    job = _wait_for_terminal(client, body["job_id"])
+    assert job["status"] == "succeeded"
+    assert job["result"]["report_id"] == "report-1"
+    assert job["result"]["scope_id"] == "scope-1"
+    assert job["result"]["report_persisted"] is True
+    assert set(job["stage_timings_ms"]) == {"prompt_build", "llm", "parse", "persist"}
+    assert persisted_reports[0]["metadata"]["source"] == "api/recommendations/jobs"
+
+
+def test_job_is_only_visible_to_its_owner(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return RECOMMENDATION_TEXT
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    job_id = client.post("/api/recommendations/jobs", json=REQUEST_BODY, headers=_auth()).json()["job_id"]
+
+    assert client.get(f"/api/recommendations/jobs/{job_id}", headers=_auth("user-2")).status_code == 404
+
+
+def test_invalid_scope_is_rejected_before_queueing(client: TestClient) -> None:
+    response = client.post("/api/recommendations/jobs", json=REQUEST_BODY, headers=_auth("user-2"))
+
+    assert response.status_code == 400
+
+
+def test_llm_failure_marks_job_failed(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return "not json"
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    job_id = client.post("/api/recommendations/jobs", json=REQUEST_BODY, headers=_auth()).json()["job_id"]
+
+    job = _wait_for_terminal(client, job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == {"status_code": 502, "detail": "Failed to parse LLM response"}
+
+
+def test_full_queue_returns_503(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def blocked_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(main, "call_anthropic", blocked_call_anthropic)
+    statuses = [
+        client.post("/api/recommendations/jobs", json=REQUEST_BODY, headers=_auth()).status_code
+        for _ in range(4)
+    ]
+
+    # One job runs on the single worker, two wait in the queue, the rest are rejected.
+    assert statuses[:3] == [202, 202, 202]
+    assert statuses[3] == 503
+
+
+def test_events_stream_ends_with_terminal_status(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return RECOMMENDATION_TEXT
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    job_id = client.post("/api/recommendations/jobs", json=REQUEST_BODY, headers=_auth()).json()["job_id"]
+
+    response = client.get(f"/api/recommendations/jobs/{job_id}/events", headers=_auth())
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        json.loads(line[len("data: "):])
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
+    assert events[-1]["status"] == "succeeded"
+    assert [event["version"] for event in events] == sorted(event["version"] for event in events)
+
+
+def test_expired_jobs_are_dropped_on_lookup() -> None:
+    pool = BackgroundJobPool("test_jobs", worker_count=1, queue_size=2, ttl_seconds=60, log_traces=False)
+
+    async def scenario() -> None:
+        async def runner(timer):
+            return {"ok": True}
+
+        job_id = (await pool.submit("user-1", runner, kind="recommendation"))["job_id"]
+        await pool._queue.join()
+        assert (await pool.get(job_id, "user-1"))["status"] == "succeeded"
+
+        pool._jobs[job_id]["updated_at"] -= 61
+        assert await pool.get(job_id, "user-1") is None
+        assert job_id not in pool._jobs
+        await pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_sweeper_drops_expired_jobs_without_further_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(jobs, "MAX_SWEEP_INTERVAL_SECONDS", 0.01)
+    pool = BackgroundJobPool("test_jobs", worker_count=1, queue_size=2, ttl_seconds=60, log_traces=False)
+
+    async def scenario() -> None:
+        async def runner(timer):
+            return {"ok": True}
+
+        job_id = (await pool.submit("user-1", runner, kind="recommendation"))["job_id"]
+        await pool._queue.join()
+        pool._jobs[job_id]["updated_at"] -= 61
+        await asyncio.sleep(0.05)
+        assert job_id not in pool._jobs
+        await pool.shutdown()
+        assert pool._sweeper is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,286 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import Cache, MemoryCache
+
+RECOMMENDATION_TEXT = json.dumps({"summary": "Solid week.", "evidence": []})
+REQUEST_BODY = {
+    "scope": {"grouping": "training_day", "included_set_types": ["working"]},
+    "scope_id": "scope-1",
+    "grouped_training": [{"training_bucket_id": "training_day:2026-01-02", "sets": []}],
+}
+
+
+SET_ROWS = [
+    {
+        "id": "set-3",
+        "machine_id": "machine-1",
+        "reps": 8,
+        "weight": 60,
+        "set_type": "working",
+        "logged_at": "2026-01-03T09:10:00+00:00",
+        "training_date": "2026-01-03",
+        "training_bucket_id": "training_day:2026-01-03",
+        "workout_cluster_id": "cluster-b",
+    },
+    {
+        "id": "set-2",
+        "machine_id": "machine-1",
+        "reps": 10,
+        "weight": 55,
+        "set_type": "working",
+        "logged_at": "2026-01-02T18:05:00+00:00",
+        "training_date": "2026-01-02",
+        "training_bucket_id": "training_day:2026-01-02",
+        "workout_cluster_id": "cluster-a2",
+    },
+    {
+        "id": "set-1",
+        "machine_id": "machine-2",
+        "reps": 12,
+        "weight": 20,
+        "set_type": "working",
+        "logged_at": "2026-01-02T07:00:00+00:00",
+        "training_date": "2026-01-02",
+        "training_bucket_id": "training_day:2026-01-02",
+        "workout_cluster_id": "cluster-a1",
+    },
+]
+
+
+class FakeSupabase:
+    def __init__(self) -> None:
+        self.scope_lookups = 0
+        self.set_pages = 0
+        self.before_scope_reply = None
+        self.before_history_reply = None
+        self.requests: dict[str, list[dict]] = {}
+        self.reports: list[dict] = []
+
+    async def request(self, method, path, payload=None, params=None):
+        self.requests.setdefault(path, []).append(params or {})
+        if path == "recommendation_scopes":
+            self.scope_lookups += 1
+            if self.before_scope_reply is not None:
+                await self.before_scope_reply()
+            if params["user_id"] != "eq.user-1":
+                return []
+            return [
+                {
+                    "id": "scope-1",
+                    "grouping": "training_day",
+                    "date_start": "2026-01-01",
+                    "date_end": "2026-01-07",
+                    "included_set_types": ["working"],
+                }
+            ]
+        if path in {"sets", "machines", "soreness_reports"} and self.before_history_reply is not None:
+            await self.before_history_reply()
+        if path == "sets":
+            self.set_pages += 1
+            start = 0
+            if "or" in params:
+                start = next(i for i, row in enumerate(SET_ROWS) if f'id.lt."{row["id"]}"' in params["or"]) + 1
+            return SET_ROWS[start : start + int(params["limit"])]
+        if path == "machines":
+            return [
+                {"id": "machine-1", "name": "Leg Press", "movement": "Leg press", "muscle_groups": ["Legs"], "equipment_type": "machine"},
+                {"id": "machine-2", "name": "Row", "movement": "Seated row", "muscle_groups": ["Back"], "equipment_type": "cable"},
+            ]
+        if path == "soreness_reports":
+            return [{"training_bucket_id": "training_day:2026-01-02", "muscle_group": "Legs", "level": 4, "reported_at": "2026-01-03T08:00:00+00:00"}]
+        if path == "analysis_reports":
+            self.reports.extend(payload)
+            return [{"id": "report-1"}]
+        raise AssertionError(f"unexpected request {method} {path}")
+
+
+@pytest.fixture
+def supabase(monkeypatch: pytest.MonkeyPatch) -> FakeSupabase:
+    fake = FakeSupabase()
+    monkeypatch.setattr(main, "supabase_admin_request", fake.request)
+    monkeypatch.setattr(main, "is_supabase_admin_configured", lambda: True)
+    monkeypatch.setattr(main, "scope_ownership_cache", Cache(MemoryCache(), "scope_ownership"))
+    monkeypatch.setattr(main, "verify_auth", lambda authorization, signing_key=None: authorization.split(" ", 1)[1])
+    return fake
+
+
+def _post(user_id: str = "user-1"):
+    return TestClient(main.app).post(
+        "/api/recommendations", json=REQUEST_BODY, headers={"Authorization": f"Bearer {user_id}"}
+    )
+
+
+def test_scope_check_overlaps_the_llm_call(supabase: FakeSupabase, monkeypatch: pytest.MonkeyPatch) -> None:
+    llm_started = asyncio.Event()
+
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        llm_started.set()
+        return RECOMMENDATION_TEXT
+
+    async def wait_for_llm() -> None:
+        # Deadlocks (and times out) if the ownership check still runs before the LLM call.
+        await asyncio.wait_for(llm_started.wait(), 2)
+
+    supabase.before_scope_reply = wait_for_llm
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+
+    response = _post()
+
+    assert response.status_code == 200
+    assert response.json()["scope_id"] == "scope-1"
+    assert response.json()["report_id"] == "report-1"
+
+
+def test_invalid_scope_cancels_the_llm_call(supabase: FakeSupabase, monkeypatch: pytest.MonkeyPatch) -> None:
+    cancelled = False
+
+    async def slow_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return RECOMMENDATION_TEXT
+
+    monkeypatch.setattr(main, "call_anthropic", slow_call_anthropic)
+
+    response = _post("user-2")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid scope_id"
+    assert cancelled
+
+
+def test_validated_scope_is_cached(supabase: FakeSupabase, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return RECOMMENDATION_TEXT
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+
+    assert _post().status_code == 200
+    second = _post()
+
+    assert second.status_code == 200
+    assert supabase.scope_lookups == 1
+    assert "scope_validation" not in second.headers["server-timing"]
+
+
+def test_scope_id_only_request_is_assembled_server_side(
+    supabase: FakeSupabase, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    prompts: list[str] = []
+    started: set[str] = set()
+    all_started = asyncio.Event()
+
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        prompts.append(messages[0]["content"])
+        return RECOMMENDATION_TEXT
+
+    async def wait_for_sibling_fetches() -> None:
+        # Completes only if sets, machines and soreness are requested concurrently.
+        started.add(f"fetch-{len(started)}")
+        if len(started) == 3:
+            all_started.set()
+        await asyncio.wait_for(all_started.wait(), 2)
+
+    supabase.before_history_reply = wait_for_sibling_fetches
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+
+    response = TestClient(main.app).post(
+        "/api/recommendations", json={"scope_id": "scope-1"}, headers={"Authorization": "Bearer user-1"}
+    )
+
+    assert response.status_code == 200
+    assert supabase.scope_lookups == 1
+    set_params = supabase.requests["sets"][0]
+    assert set_params["set_type"] == "in.(working)"
+    assert set_params["and"] == "(training_date.gte.2026-01-01,training_date.lte.2026-01-07)"
+    assert set_params["order"] == "training_bucket_id.desc,logged_at.desc,id.desc"
+    assert supabase.requests["soreness_reports"][0]["and"] == "(reported_at.gte.2026-01-01,reported_at.lt.2026-01-08)"
+
+    prompt = prompts[0]
+    assert '"training_bucket_id": "training_day:2026-01-02"' in prompt
+    assert prompt.index("training_day:2026-01-02") < prompt.index("training_day:2026-01-03")
+    assert '"machine_name": "Seated row"' in prompt
+    assert '"level": 4' in prompt
+    assert supabase.reports[0]["metadata"]["input_assembly"] == "server"
+    assert response.json()["sets_truncated"] is False
+    assert "fetch_training" in response.headers["server-timing"]
+
+
+@pytest.mark.parametrize(("max_sets", "kept", "truncated"), [(2, 2, True), (3, 3, False)])
+def test_scope_sets_are_paged_by_key_and_flag_truncation(
+    supabase: FakeSupabase, monkeypatch: pytest.MonkeyPatch, max_sets: int, kept: int, truncated: bool
+) -> None:
+    monkeypatch.setattr(main.settings, "export_page_size", 1)
+    monkeypatch.setattr(main.settings, "recommendation_assembly_max_sets", max_sets)
+    scope = {"grouping": "training_day", "included_set_types": ["working"]}
+
+    rows, sets_truncated = asyncio.run(main.fetch_scope_sets("user-1", scope))
+
+    assert [row["id"] for row in rows] == [row["id"] for row in SET_ROWS[:kept]]
+    assert sets_truncated is truncated
+    # One row per page, plus the look-ahead page that decides whether older sets remain.
+    assert supabase.set_pages == kept + 1
+    assert "offset" not in supabase.requests["sets"][-1]
+    assert supabase.requests["sets"][1]["or"] == (
+        '(training_bucket_id.lt."training_day:2026-01-03",and(training_bucket_id.eq."training_day:2026-01-03",'
+        'or(logged_at.lt."2026-01-03T09:10:00+00:00",and(logged_at.eq."2026-01-03T09:10:00+00:00",or(id.lt."set-3")))))'
+    )
+
+
+def test_truncated_scope_is_flagged_in_the_response(supabase: FakeSupabase, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return RECOMMENDATION_TEXT
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    monkeypatch.setattr(main.settings, "recommendation_assembly_max_sets", 1)
+
+    response = TestClient(main.app).post(
+        "/api/recommendations", json={"scope_id": "scope-1"}, headers={"Authorization": "Bearer user-1"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["sets_truncated"] is True
+    assert supabase.reports[0]["metadata"]["sets_truncated"] is True
+
+
+def test_cluster_keyset_handles_sets_without_a_cluster() -> None:
+    row = {"training_date": "2026-01-02", "workout_cluster_id": None, "logged_at": "2026-01-02T07:00:00+00:00", "id": "set-9"}
+
+    after = main.keyset_after(row, main.RECOMMENDATION_SET_KEYS["cluster"])
+
+    # Descending order puts unclustered sets first within a day, so every clustered set follows.
+    assert after.startswith(
+        '(training_date.lt."2026-01-02",and(training_date.eq."2026-01-02",'
+        "or(workout_cluster_id.not.is.null,and(workout_cluster_id.is.null,"
+    )
+
+
+def test_server_side_assembly_groups_by_cluster() -> None:
+    buckets = main.group_sets_into_buckets(SET_ROWS, {}, "cluster")
+
+    assert [bucket["training_bucket_id"] for bucket in buckets] == [
+        "cluster:cluster-a1",
+        "cluster:cluster-a2",
+        "cluster:cluster-b",
+    ]
+    assert buckets[0]["workout_cluster_id"] == "cluster-a1"
+    assert buckets[0]["sets"][0]["machine_name"] == "Unknown"
+
+
+def test_server_side_assembly_groups_by_training_day() -> None:
+    buckets = main.group_sets_into_buckets(SET_ROWS, {}, "training_day")
+
+    assert [bucket["training_bucket_id"] for bucket in buckets] == ["training_day:2026-01-02", "training_day:2026-01-03"]
+    first = buckets[0]
+    assert [entry["logged_at"] for entry in first["sets"]] == ["2026-01-02T07:00:00+00:00", "2026-01-02T18:05:00+00:00"]
+    assert first["workout_cluster_ids"] == ["cluster-a2", "cluster-a1"]
+    assert first["workout_cluster_id"] is None
+    assert (first["started_at"], first["ended_at"]) == ("2026-01-02T07:00:00+00:00", "2026-01-02T18:05:00+00:00")
@@ -95,6 +95,20 @@ def test_recommendation_request_accepts_representative_valid_payload() -> None:
     assert request.equipment is not None and "machine-1" in request.equipment
 
 
+def test_grouped_training_validates_to_plain_dicts_without_copying_sets() -> None:
+    sets = [{"machine_id": "machine-1", "reps": 10, "weight": 80}]
+    payload = {"scope": {"grouping": "training_day"}, "grouped_training": [{"training_bucket_id": "bucket-1", "sets": sets}]}
+
+    request = RecommendationRequest.model_validate(payload)
+
+    assert request.grouped_training == [{"training_bucket_id": "bucket-1", "sets": sets}]
+    assert type(request.grouped_training[0]) is dict
+    assert request.grouped_training[0]["sets"] is sets
+
+    with pytest.raises(ValidationError):
+        RecommendationRequest.model_validate({"grouped_training": ["not-a-bucket"]})
+
+
 def test_schema_contract_snapshot_matches_expected() -> None:
     snapshot_path = Path(__file__).parent / "snapshots" / "forms_schema_snapshot.json"
     expected = json.loads(snapshot_path.read_text())
@@ -0,0 +1,95 @@
+import json
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from tracing import StageTimer, StageTimingMiddleware
+
+
+def _server_timing_names(header: str) -> list[str]:
+    return [entry.split(";", 1)[0].strip() for entry in header.split(",")]
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    monkeypatch.setattr(main, "verify_auth", lambda authorization, signing_key=None: "user-1")
+    return TestClient(main.app)
+
+
+def test_stage_timer_aggregates_repeated_and_absorbed_stages() -> None:
+    parent = StageTimer("job")
+    child = StageTimer("child", parent.traceparent())
+    child.record("fetch", 0.010)
+    child.record("fetch", 0.005)
+    parent.absorb(child)
+    parent.record("list_users", 0.002)
+
+    assert child.trace_id == parent.trace_id
+    assert child.parent_span_id == parent.root_span_id
+    assert parent.stage_totals_ms() == pytest.approx({"fetch": 15.0, "list_users": 2.0})
+    assert _server_timing_names(parent.server_timing_header()) == ["fetch", "list_users", "total"]
+
+
+@pytest.fixture
+def trace_logging(monkeypatch: pytest.MonkeyPatch) -> None:
+    # STAGE_TRACE_LOGGING is read when the middleware stack is built, so rebuild it for the test.
+    middleware = next(entry for entry in main.app.user_middleware if entry.cls is StageTimingMiddleware)
+    monkeypatch.setitem(middleware.kwargs, "log_traces", True)
+    monkeypatch.setattr(main.app, "middleware_stack", None)
+
+
+def test_identify_emits_server_timing_and_trace_log(
+    client: TestClient, trace_logging: None, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return '{"name": "Row"}'
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    traceparent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+    with caplog.at_level(logging.INFO, logger="gym_tracker.trace"):
+        response = client.post(
+            "/api/identify-machine",
+            json={"images": [{"data": "aGVsbG8="}]},
+            headers={"Authorization": "Bearer token", "traceparent": traceparent},
+        )
+
+    assert response.status_code == 200
+    assert _server_timing_names(response.headers["server-timing"]) == ["auth", "index_lookup", "prompt_build", "llm", "parse", "total"]
+    trace = json.loads(caplog.records[-1].getMessage())
+    assert trace["traceId"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert trace["parentSpanId"] == "00f067aa0ba902b7"
+    assert trace["attributes"]["http.status_code"] == 200
+    assert [span["name"] for span in trace["spans"]] == ["auth", "index_lookup", "prompt_build", "llm", "parse"]
+
+
+def test_failed_stage_is_reported_on_error_responses(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return "not json"
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+
+    response = client.post(
+        "/api/identify-machine",
+        json={"images": [{"data": "aGVsbG8="}]},
+        headers={"Authorization": "Bearer token"},
+    )
+
+    assert response.status_code == 502
+    assert "parse" in _server_timing_names(response.headers["server-timing"])
+
+
+def test_trace_logs_are_off_by_default(client: TestClient, caplog: pytest.LogCaptureFixture) -> None:
+    with caplog.at_level(logging.INFO, logger="gym_tracker.trace"):
+        response = client.post("/api/identify-machine", json={"images": []}, headers={"Authorization": "Bearer token"})
+
+    assert "server-timing" in response.headers
+    assert not [record for record in caplog.records if record.name == "gym_tracker.trace"]
+
+
+def test_routes_without_stages_have_no_server_timing(client: TestClient) -> None:
+    response = client.get("/api/health")
+
+    assert "server-timing" not in response.headers
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi.testclient import TestClient
+
+import main
+from cache import Cache, MemoryCache
+from settings import SupabaseSettings
+from startup import StartupReport, UpstreamClients
+
+JWKS_URL = "https://example.supabase.co/auth/v1/.well-known/jwks.json"
+
+
+@pytest.fixture
+def upstream_requests(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    public_jwk.update({"kid": "key-1", "use": "sig"})
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(f"{request.method} {request.url}")
+        if str(request.url) == JWKS_URL:
+            return httpx.Response(200, json={"keys": [public_jwk]})
+        if request.url.host == "api.anthropic.com":
+            return httpx.Response(503)
+        return httpx.Response(200)
+
+    monkeypatch.setattr(main.settings, "anthropic_api_key", "sk-ant-test")
+    monkeypatch.setattr(main.settings, "supabase_url", "https://example.supabase.co")
+    monkeypatch.setattr(main.settings, "supabase_service_role_key", "service-role")
+    monkeypatch.setattr(main.settings, "startup_warmup", True)
+    monkeypatch.setattr(main, "supabase_settings", SupabaseSettings(url="https://example.supabase.co"))
+    monkeypatch.setattr(main, "startup_report", StartupReport())
+    monkeypatch.setattr(main, "jwks_cache", Cache(MemoryCache(), "jwks"))
+    monkeypatch.setattr(
+        main, "upstream_clients", UpstreamClients({"anthropic": 60, "supabase": 30}, transport=httpx.MockTransport(handler))
+    )
+    return seen
+
+
+def _wait_until_ready(client: TestClient) -> httpx.Response:
+    for _ in range(100):
+        response = client.get("/api/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.01)
+    raise AssertionError("service never became ready")
+
+
+def test_ready_reports_warm_up_phases(upstream_requests: list[str]) -> None:
+    with TestClient(main.app) as client:
+        report = _wait_until_ready(client).json()
+
+    assert report["status"] == "ready"
+    phases = {phase["name"]: phase for phase in report["phases"]}
+    assert {"settings_validation", "connect_anthropic", "connect_supabase", "jwks_prefetch"} <= set(phases)
+    assert all(phase["ok"] for phase in phases.values())
+    assert f"GET {JWKS_URL}" in upstream_requests
+    assert "HEAD https://example.supabase.co/rest/v1/" in upstream_requests
+
+
+def test_ready_is_503_until_warm_up_finishes() -> None:
+    report = StartupReport()
+    report.state = "warming"
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(main, "startup_report", report)
+        response = TestClient(main.app).get("/api/ready")
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.json()["status"] == "warming"
+
+
+def test_failed_warm_up_phase_is_reported_as_degraded(
+    upstream_requests: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def broken_handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("unreachable", request=request)
+
+    monkeypatch.setattr(
+        main, "upstream_clients", UpstreamClients({"anthropic": 60, "supabase": 30}, transport=httpx.MockTransport(broken_handler))
+    )
+
+    with TestClient(main.app) as client:
+        report = _wait_until_ready(client).json()
+
+    assert report["degraded"] is True
+    failed = {phase["name"]: phase["error"] for phase in report["phases"] if not phase["ok"]}
+    assert failed["connect_supabase"] == "ConnectError"
+
+
+def test_upstream_clients_are_reused_within_a_loop() -> None:
+    clients = UpstreamClients({"supabase": 30})
+
+    async def scenario() -> bool:
+        first = clients.get("supabase")
+        second = clients.get("supabase")
+        await clients.aclose()
+        return first is second and first.is_closed
+
+    assert asyncio.run(scenario())
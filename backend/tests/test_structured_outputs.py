@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import Cache, MemoryCache
+from metrics import REGISTRY
+from startup import UpstreamClients
+
+VALID_RECOMMENDATION = {
+    "summary": "Solid week.",
+    "highlights": ["Consistent"],
+    "suggestions": [],
+    "nextSession": "Legs",
+    "progressNotes": "",
+    "evidence": [{"claim": "More volume", "metric": "volume", "period": "week", "delta": 2.5, "source": None}],
+}
+
+
+def test_call_anthropic_forces_the_tool_and_returns_its_input(monkeypatch: pytest.MonkeyPatch) -> None:
+    sent: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content))
+        return httpx.Response(
+            200,
+            json={
+                "model": "test-model",
+                "content": [{"type": "tool_use", "name": "record_training_recommendation", "input": VALID_RECOMMENDATION}],
+            },
+        )
+
+    monkeypatch.setattr(main.settings, "anthropic_api_key", "sk-ant-test")
+    monkeypatch.setattr(
+        main, "upstream_clients", UpstreamClients({"anthropic": 60}, transport=httpx.MockTransport(handler))
+    )
+
+    text = asyncio.run(main.call_anthropic([{"role": "user", "content": "hi"}], tool=main.RECOMMENDATION_TOOL))
+
+    assert json.loads(text) == VALID_RECOMMENDATION
+    assert sent[0]["tools"] == [main.RECOMMENDATION_TOOL]
+    assert sent[0]["tool_choice"] == {"type": "tool", "name": "record_training_recommendation"}
+    assert "nextSession" in main.RECOMMENDATION_TOOL["input_schema"]["required"]
+
+
+@pytest.fixture
+def reports(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
+    persisted: list[dict] = []
+
+    async def fake_supabase_admin_request(method, path, payload=None, params=None):
+        if path == "recommendation_scopes":
+            return [{"id": "scope-1"}]
+        if path == "analysis_reports":
+            persisted.extend(payload)
+            return [{"id": "report-1"}]
+        raise AssertionError(f"unexpected request {method} {path}")
+
+    monkeypatch.setattr(main, "supabase_admin_request", fake_supabase_admin_request)
+    monkeypatch.setattr(main, "is_supabase_admin_configured", lambda: True)
+    monkeypatch.setattr(main, "scope_ownership_cache", Cache(MemoryCache(), "scope_ownership"))
+    monkeypatch.setattr(main, "verify_auth", lambda authorization, signing_key=None: authorization.split(" ", 1)[1])
+    return persisted
+
+
+def _post_recommendation():
+    return TestClient(main.app).post(
+        "/api/recommendations",
+        json={"scope_id": "scope-1", "grouped_training": [], "scope": {}},
+        headers={"Authorization": "Bearer user-1"},
+    )
+
+
+def _outcomes(outcome: str) -> float:
+    return REGISTRY.get_sample_value("llm_structured_outputs_total", {"route": "recommendation", "outcome": outcome}) or 0
+
+
+def test_invalid_output_gets_one_targeted_repair(reports: list[dict], monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[list[dict]] = []
+    invalid = {**VALID_RECOMMENDATION, "evidence": [{"claim": "More volume", "delta": "a lot"}]}
+
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        calls.append(messages)
+        return json.dumps(invalid if len(calls) == 1 else VALID_RECOMMENDATION)
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    before = _outcomes("repaired")
+
+    response = _post_recommendation()
+
+    assert response.status_code == 200
+    assert response.json()["evidence"][0]["delta"] == 2.5
+    assert len(calls) == 2
+    repair_prompt = calls[1][-1]["content"]
+    assert "evidence.0.metric: Field required" in repair_prompt
+    assert "evidence.0.delta" in repair_prompt
+    assert calls[1][-2] == {"role": "assistant", "content": json.dumps(invalid)}
+    assert _outcomes("repaired") == before + 1
+    assert len(reports) == 1
+
+
+def test_output_still_invalid_after_repair_is_a_502(reports: list[dict], monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = 0
+
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        nonlocal calls
+        calls += 1
+        return "not json"
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+    before = _outcomes("repair_failed")
+
+    response = _post_recommendation()
+
+    assert response.status_code == 502
+    assert calls == 2
+    assert _outcomes("repair_failed") == before + 1
+    assert reports == []
+
+
+def test_valid_output_is_normalized_to_the_full_contract(reports: list[dict], monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_call_anthropic(messages, max_tokens=1000, model=None, tool=None):
+        return json.dumps({"summary": "Solid week."})
+
+    monkeypatch.setattr(main, "call_anthropic", fake_call_anthropic)
+
+    body = _post_recommendation().json()
+
+    assert {"summary", "highlights", "suggestions", "nextSession", "progressNotes", "evidence"} <= body.keys()
+    assert body["evidence"] == []
@@ -0,0 +1,137 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+CRON_SECRET = "cron-secret"
+USER_IDS = [f"00000000-0000-0000-0000-00000000000{index}" for index in range(1, 7)]
+
+
+class FakeSupabase:
+    def __init__(self) -> None:
+        self.checkpoints: dict[tuple[str, str], dict] = {}
+        self.reports: list[dict] = []
+        self.fail_for: set[str] = set()
+        self.sets = [{"training_date": "2026-01-05", "reps": 10, "weight": 50, "set_type": "working"}]
+
+    async def request(self, method, path, payload=None, params=None, prefer=None):
+        if path == "sets" and params["select"] == "user_id":
+            cursor = params["user_id"]
+            users = [user_id for user_id in USER_IDS if not cursor.startswith("gt.") or user_id > cursor[3:]]
+            return [{"user_id": user_id} for user_id in users][int(params["offset"]) :]
+        if path == "sets":
+            user_id = params["user_id"][3:]
+            if user_id in self.fail_for:
+                raise HTTPException(502, "Database persistence error")
+            return self.sets
+        if path == "analysis_reports" and method == "GET":
+            assert (params["report_type"], params["order"], params["limit"]) == ("eq.weekly_trend", "created_at.desc", "1")
+            user_id = params["user_id"][3:]
+            latest = [
+                {"id": f"report-{index + 1}", "fingerprint": report["metadata"]["fingerprint"]}
+                for index, report in enumerate(self.reports)
+                if report["user_id"] == user_id
+            ]
+            return latest[-1:]
+        if path == "analysis_reports":
+            self.reports.extend(payload)
+            return [{"id": f"report-{len(self.reports)}"}]
+        if path == "weekly_trend_job_checkpoints" and method == "GET":
+            run_id = params["run_id"][3:]
+            return [{"user_id": user_id} for (run, user_id) in self.checkpoints if run == run_id]
+        if path == "weekly_trend_job_checkpoints" and method == "POST":
+            assert prefer == "resolution=ignore-duplicates,return=minimal"
+            for row in payload:
+                self.checkpoints.setdefault((row["run_id"], row["user_id"]), row)
+            return None
+        raise AssertionError(f"unexpected request {method} {path}")
+
+
+@pytest.fixture
+def supabase(monkeypatch: pytest.MonkeyPatch) -> FakeSupabase:
+    fake = FakeSupabase()
+    monkeypatch.setattr(main, "supabase_admin_request", fake.request)
+    monkeypatch.setattr(main.settings, "cron_shared_secret", CRON_SECRET)
+    return fake
+
+
+def _run(body: dict, expect_status: int = 200) -> dict:
+    response = TestClient(main.app, raise_server_exceptions=False).post(
+        "/api/jobs/generate-weekly-trends", json=body, headers={"x-cron-secret": CRON_SECRET}
+    )
+    assert response.status_code == expect_status, response.text
+    return response.json() if expect_status == 200 else {}
+
+
+def test_interrupted_run_resumes_without_redoing_completed_users(supabase: FakeSupabase) -> None:
+    supabase.fail_for = {USER_IDS[3]}
+    _run({"run_id": "run-1"}, expect_status=502)
+    assert len(supabase.reports) == 3
+
+    supabase.fail_for = set()
+    result = _run({"run_id": "run-1"})
+
+    assert result["processed_users"] == 3
+    assert result["skipped_users"] == 3
+    assert result["done"] is True
+    assert [report["user_id"] for report in supabase.reports] == USER_IDS
+    assert {user_id for (_, user_id) in supabase.checkpoints} == set(USER_IDS)
+
+
+def test_shards_partition_users(supabase: FakeSupabase) -> None:
+    handled: dict[str, int] = {}
+    for shard_index in range(3):
+        result = _run({"run_id": "run-2", "shard_index": shard_index, "shard_count": 3})
+        for report in result["reports"]:
+            handled[report["user_id"]] = shard_index
+
+    assert sorted(handled) == USER_IDS
+    assert all(handled[user_id] == main.weekly_trend_shard(user_id, 3) for user_id in USER_IDS)
+    assert all(row["shard_index"] == handled[user_id] for (_, user_id), row in supabase.checkpoints.items())
+
+
+def test_max_users_returns_resume_cursor(supabase: FakeSupabase) -> None:
+    first = _run({"run_id": "run-3", "max_users": 4})
+
+    assert first["processed_users"] == 4
+    assert first["remaining_users"] == 2
+    assert first["done"] is False
+    assert first["next_cursor"] == USER_IDS[3]
+
+    second = _run({"run_id": "run-3", "after_user_id": first["next_cursor"], "max_users": 4})
+
+    assert second["processed_users"] == 2
+    assert second["skipped_users"] == 0
+    assert second["done"] is True
+    assert second["next_cursor"] is None
+
+
+def test_batch_runs_default_to_one_run_per_week(supabase: FakeSupabase) -> None:
+    result = _run({})
+
+    assert result["run_id"] == main.default_weekly_trend_run_id()
+    assert main.default_weekly_trend_run_id(date(2026, 10, 21)) == "weekly-2026-10-19"
+    assert _run({})["skipped_users"] == len(USER_IDS)
+
+
+def test_invalid_shard_is_rejected(supabase: FakeSupabase) -> None:
+    _run({"shard_index": 2, "shard_count": 2}, expect_status=422)
+
+
+def test_unchanged_trends_reuse_the_latest_report(supabase: FakeSupabase) -> None:
+    first = _run({"user_id": USER_IDS[0]})
+    second = _run({"user_id": USER_IDS[0]})
+
+    assert first["unchanged_reports"] == 0
+    assert second["unchanged_reports"] == 1
+    assert second["reports"][0]["report_id"] == first["reports"][0]["report_id"]
+    assert len(supabase.reports) == 1
+
+    supabase.sets = supabase.sets + [{"training_date": "2026-01-12", "reps": 8, "weight": 55, "set_type": "working"}]
+    third = _run({"user_id": USER_IDS[0]})
+
+    assert third["unchanged_reports"] == 0
+    assert len(supabase.reports) == 2
@@ -0,0 +1,174 @@
+"""Per-request stage timing.
+
+Handlers record named stages on a ``StageTimer`` stored in ``request.state``. The
+``StageTimingMiddleware`` then emits the stages as a ``Server-Timing`` response
+header and, once the response is sent, logs one structured JSON trace line whose
+span fields follow the OpenTelemetry (OTLP/JSON) naming so logs can be shipped to
+an OTel collector unchanged.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import secrets
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+trace_logger = logging.getLogger("gym_tracker.trace")
+
+STATE_KEY = "stage_timer"
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_SERVER_TIMING_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _parse_traceparent(value: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"}:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+class StageTimer:
+    def __init__(self, name: str, traceparent: Optional[str] = None) -> None:
+        trace_id, parent_span_id = _parse_traceparent(traceparent)
+        self.name = name
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.root_span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.started_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.spans: list[dict[str, Any]] = []
+        self.attributes: dict[str, Any] = {}
+        self._absorbed_ms: dict[str, float] = {}
+
+    def traceparent(self) -> str:
+        """W3C traceparent for child work (e.g. per-user traces under a batch job)."""
+        return f"00-{self.trace_id}-{self.root_span_id}-01"
+
+    @contextmanager
+    def stage(self, name: str, **attributes: Any) -> Iterator[None]:
+        started_ns = time.time_ns()
+        started = time.perf_counter()
+        status = "OK"
+        try:
+            yield
+        except BaseException:
+            status = "ERROR"
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, started_ns=started_ns, status=status, **attributes)
+
+    def record(
+        self,
+        name: str,
+        duration_seconds: float,
+        started_ns: Optional[int] = None,
+        status: str = "OK",
+        **attributes: Any,
+    ) -> None:
+        start = started_ns if started_ns is not None else time.time_ns() - int(duration_seconds * 1e9)
+        self.spans.append(
+            {
+                "name": name,
+                "spanId": secrets.token_hex(8),
+                "startTimeUnixNano": start,
+                "endTimeUnixNano": start + int(duration_seconds * 1e9),
+                "durationMs": round(duration_seconds * 1000, 3),
+                "status": status,
+                "attributes": attributes,
+            }
+        )
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def absorb(self, other: "StageTimer") -> None:
+        """Fold another timer's stage totals into this one without copying its spans."""
+        for name, duration in other.stage_totals_ms().items():
+            self._absorbed_ms[name] = self._absorbed_ms.get(name, 0.0) + duration
+
+    def stage_totals_ms(self) -> dict[str, float]:
+        totals = dict(self._absorbed_ms)
+        for span in self.spans:
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["durationMs"]
+        return totals
+
+    def server_timing_header(self) -> str:
+        entries = [
+            f"{_SERVER_TIMING_NAME_RE.sub('_', name)};dur={duration:.1f}"
+            for name, duration in self.stage_totals_ms().items()
+        ]
+        entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+    def to_trace(self, status_code: Optional[int] = None) -> dict[str, Any]:
+        end_ns = self.started_ns + int(self.elapsed_ms() * 1e6)
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.root_span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "startTimeUnixNano": self.started_ns,
+            "endTimeUnixNano": end_ns,
+            "durationMs": round(self.elapsed_ms(), 3),
+            "attributes": {
+                **self.attributes,
+                **({"http.status_code": status_code} if status_code else {}),
+                **({"absorbedStageTotalsMs": self._absorbed_ms} if self._absorbed_ms else {}),
+            },
+            "spans": [{**span, "traceId": self.trace_id, "parentSpanId": self.root_span_id} for span in self.spans],
+        }
+
+    def log(self, status_code: Optional[int] = None) -> None:
+        if trace_logger.isEnabledFor(logging.INFO):
+            trace_logger.info(json.dumps(self.to_trace(status_code), default=str))
+
+
+def request_stage_timer(request: Request) -> StageTimer:
+    """Return the request's timer, creating it on first use."""
+    timer = getattr(request.state, STATE_KEY, None)
+    if timer is None:
+        timer = StageTimer(f"{request.method} {request.url.path}", request.headers.get("traceparent"))
+        setattr(request.state, STATE_KEY, timer)
+    return timer
+
+
+class StageTimingMiddleware:
+    """Adds ``Server-Timing`` and logs traces for requests whose handlers used a StageTimer."""
+
+    def __init__(self, app: ASGIApp, log_traces: bool = True) -> None:
+        self.app = app
+        self.log_traces = log_traces
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Handlers write into this dict through request.state.
+        state = scope.setdefault("state", {})
+        status_code: Optional[int] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timer = state.get(STATE_KEY)
+                if timer is not None:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", timer.server_timing_header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            timer = state.get(STATE_KEY)
+            if timer is not None and self.log_traces:
+                timer.log(status_code)
@@ -10,7 +10,7 @@ import {
   getTodayPlanSuggestions, getEquipmentFavorites,
   getAnalysisReports, getAnalysisReport,
 } from './lib/supabase'
-import { getRecommendations, identifyMachine } from './lib/api'
+import { getPlanAdherence, getRecommendations, identifyMachine } from './lib/api'
 import { DEFAULT_FLAGS } from './lib/featureFlags'
 import { queryKeys } from './lib/queryKeys'
 import { addLog } from './lib/logs'
@@ -44,10 +44,7 @@ import {
   buildSampleWarning,
   computeWindowedSets,
 } from './lib/dashboardMetrics'
-import {
-  computeDayAdherence,
-  computeWeekAdherence,
-} from './lib/adherence'
+import { computeDayAdherence } from './lib/adherence'
 import { buildTrainingBuckets } from './lib/trainingBuckets'
 
 // ─── Helpers ───────────────────────────────────────────────
@@ -1340,10 +1337,8 @@ export function PlanScreen({ machines, sets, onBack }) {
     [items, sets, selectedDayKey],
   )
 
-  const selectedWeekProgress = useMemo(
-    () => computeWeekAdherence({ planDays: days, planItems: allDayItems, loggedSets: sets, dayStartHour: PLAN_DAY_START_HOUR }),
-    [days, allDayItems, sets],
-  )
+  // The week comes from the server, which caches closed days; only the selected day is computed here.
+  const [selectedWeekProgress, setSelectedWeekProgress] = useState(null)
 
   const validateDay = (day) => Number.isInteger(day.weekday) && day.weekday >= 0 && day.weekday <= 6
   const validateItem = (item) => {
@@ -1407,6 +1402,26 @@ export function PlanScreen({ machines, sets, onBack }) {
     return () => { active = false }
   }, [selectedPlanId])
 
+  // Plan edits and newly logged sets change the open days, so both refresh the snapshot.
+  useEffect(() => {
+    if (!selectedPlanId) {
+      setSelectedWeekProgress(null)
+      return
+    }
+    let active = true
+    ;(async () => {
+      try {
+        const data = await getPlanAdherence({ planId: selectedPlanId, dayStartHour: PLAN_DAY_START_HOUR })
+        if (active) setSelectedWeekProgress(data)
+      } catch (error) {
+        if (!active) return
+        addLog({ level: 'warn', event: 'plan_adherence.load_failed', message: error?.message || 'Failed to load week adherence.' })
+        setSelectedWeekProgress(null)
+      }
+    })()
+    return () => { active = false }
+  }, [selectedPlanId, days, allDayItems, sets])
+
   useEffect(() => {
     if (!days.length) {
       setAllDayItems([])
@@ -1609,7 +1624,7 @@ export function PlanScreen({ machines, sets, onBack }) {
               : `${selectedDayAdherence.touchedItems}/${selectedDayAdherence.totalItems} exercises touched for selected weekday`)
             : 'Select a weekday template to view adherence progress.'}
         </div>
-        {selectedDay && (
+        {selectedDay && selectedWeekProgress && (
           <div style={{ marginTop: 4, fontSize: 12, color: 'var(--text-muted)' }}>
             Week snapshot: {selectedWeekProgress.completedSets}/{selectedWeekProgress.plannedSets || 0} planned sets ({Math.round(selectedWeekProgress.ratio * 100)}%)
           </div>
@@ -4008,6 +4023,11 @@ export function AnalysisScreen({
               Generated successfully but couldn&apos;t save to Reports.
             </div>
           )}
+          {recs.sets_truncated === true && (
+            <div style={{ fontSize: 12, color: '#f7b267', marginBottom: 8 }}>
+              Based on your most recent sets only; narrow the date range to include older training.
+            </div>
+          )}
           {recs.summary && <div style={{ fontSize: 14, color: 'var(--text)', lineHeight: 1.5, marginBottom: 10, overflowWrap: 'anywhere' }}>{recs.summary}</div>}
           {recs.highlights?.length > 0 && recs.highlights.map((item, idx) => <div key={`h-${idx}`} style={{ fontSize: 13, color: '#cde8ff', marginBottom: 4, overflowWrap: 'anywhere' }}>• {item}</div>)}
         </div>
@@ -4,6 +4,18 @@ import { addLog, logIdentifyTelemetry } from './logs'
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000'
 export const API_BASE_URL = API_URL
 
+// Parses `Server-Timing: auth;dur=1.2, llm;dur=3400.5` into `{ auth: 1.2, llm: 3400.5 }` (milliseconds).
+export function parseServerTiming(headerValue) {
+  if (!headerValue) return {}
+  return headerValue.split(',').reduce((stages, entry) => {
+    const [name, ...params] = entry.trim().split(';')
+    const dur = params.map((param) => param.trim()).find((param) => param.startsWith('dur='))
+    const value = dur ? Number(dur.slice(4)) : NaN
+    if (name && Number.isFinite(value)) stages[name] = value
+    return stages
+  }, {})
+}
+
 async function authHeaders() {
   const { data: { session } } = await supabase.auth.getSession()
   return {
@@ -12,8 +24,44 @@ async function authHeaders() {
   }
 }
 
-export async function identifyMachine(images, { enrichWithWebSearch = false } = {}) {
-  const requestId = `${Date.now()}-${Math.random().toString(16).slice(2)}`
+const REQUEST_COMPRESSION_MIN_BYTES = 8 * 1024
+
+// Gzips large JSON bodies (photo uploads, client-assembled history) when the browser
+// supports CompressionStream; the backend decodes `Content-Encoding: gzip` transparently.
+async function jsonRequestBody(payload, headers) {
+  const text = JSON.stringify(payload)
+  if (typeof CompressionStream === 'undefined' || text.length < REQUEST_COMPRESSION_MIN_BYTES) {
+    return { body: text, headers }
+  }
+  try {
+    const stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'))
+    const body = await new Response(stream).arrayBuffer()
+    return { body, headers: { ...headers, 'Content-Encoding': 'gzip' } }
+  } catch {
+    return { body: text, headers }
+  }
+}
+
+// The backend cancels the model call once this budget (sent as X-Request-Deadline) runs out.
+const IDENTIFY_TIMEOUT_MS = 15000
+// Dropped connections, gateway errors and "still in progress" (409) are retried with the same
+// Idempotency-Key, so a request that already finished server-side is replayed, not re-run.
+const IDENTIFY_MAX_ATTEMPTS = 3
+const IDENTIFY_RETRY_STATUSES = new Set([409, 502, 503, 504])
+const IDENTIFY_MIN_ATTEMPT_MS = 1000
+
+export function newRequestId() {
+  return `${Date.now()}-${Math.random().toString(16).slice(2)}`
+}
+
+function retryDelayMs(res, attempt) {
+  const retryAfter = Number(res?.headers.get('Retry-After'))
+  return Number.isFinite(retryAfter) && retryAfter > 0 ? retryAfter * 1000 : 500 * attempt
+}
+
+// One user action may pass the same requestId to several calls (e.g. a "try again" on the
+// same photos); it doubles as the Idempotency-Key.
+export async function identifyMachine(images, { enrichWithWebSearch = false, requestId = newRequestId() } = {}) {
   const startTime = Date.now()
   addLog({
     level: 'info',
@@ -26,18 +74,45 @@ export async function identifyMachine(images, { enrichWithWebSearch = false } =
       url: `${API_URL}/api/identify-machine`,
     },
   })
-  const headers = await authHeaders()
+  const request = await jsonRequestBody(
+    { images, enrich_with_web_search: enrichWithWebSearch },
+    // The backend replays the stored result if this exact request is retried.
+    { ...(await authHeaders()), 'Idempotency-Key': requestId, 'X-Request-Deadline': String(IDENTIFY_TIMEOUT_MS) },
+  )
   const mode = enrichWithWebSearch ? 'web_search_enriched' : 'base'
   logIdentifyTelemetry({ phase: 'start', mode, requestId })
   const controller = new AbortController()
-  const timeoutId = setTimeout(() => controller.abort(), 15000)
+  const timeoutId = setTimeout(() => controller.abort(), IDENTIFY_TIMEOUT_MS)
   try {
-    const res = await fetch(`${API_URL}/api/identify-machine`, {
-      method: 'POST',
-      headers,
-      body: JSON.stringify({ images, enrich_with_web_search: enrichWithWebSearch }),
-      signal: controller.signal,
-    })
+    let res
+    for (let attempt = 1; ; attempt += 1) {
+      const remainingMs = IDENTIFY_TIMEOUT_MS - (Date.now() - startTime)
+      try {
+        res = await fetch(`${API_URL}/api/identify-machine`, {
+          method: 'POST',
+          headers: { ...request.headers, 'X-Request-Deadline': String(Math.max(remainingMs, 0)) },
+          body: request.body,
+          signal: controller.signal,
+        })
+      } catch (err) {
+        if (!(err instanceof TypeError) || attempt >= IDENTIFY_MAX_ATTEMPTS) throw err
+        res = null
+      }
+      if (res && !IDENTIFY_RETRY_STATUSES.has(res.status)) break
+      const delayMs = retryDelayMs(res, attempt)
+      if (attempt >= IDENTIFY_MAX_ATTEMPTS || remainingMs - delayMs < IDENTIFY_MIN_ATTEMPT_MS) {
+        if (res) break
+        throw new TypeError('Failed to fetch')
+      }
+      addLog({
+        level: 'warn',
+        event: 'identify.retry',
+        message: 'Retrying identify request with the same Idempotency-Key.',
+        meta: { requestId, attempt, status: res?.status ?? null, delay_ms: delayMs },
+      })
+      await new Promise((resolve) => setTimeout(resolve, delayMs))
+    }
+    const serverTiming = parseServerTiming(res.headers.get('Server-Timing'))
     addLog({
       level: res.ok ? 'info' : 'error',
       event: 'identify.response',
@@ -45,14 +120,14 @@ export async function identifyMachine(images, { enrichWithWebSearch = false } =
       meta: { requestId, status: res.status, ok: res.ok, mode, duration_ms: Date.now() - startTime },
     })
     if (!res.ok) {
-      logIdentifyTelemetry({ phase: 'failed', mode, requestId, success: false, durationMs: Date.now() - startTime, status: res.status })
+      logIdentifyTelemetry({ phase: 'failed', mode, requestId, success: false, durationMs: Date.now() - startTime, status: res.status, serverTiming })
       const errText = (await res.text()).trim()
       const detail = errText || `Server error (${res.status})`
       throw new Error(`Identify failed: ${detail}`)
     }
     try {
       const data = await res.json()
-      logIdentifyTelemetry({ phase: 'completed', mode, requestId, success: true, durationMs: Date.now() - startTime, status: res.status })
+      logIdentifyTelemetry({ phase: 'completed', mode, requestId, success: true, durationMs: Date.now() - startTime, status: res.status, serverTiming, fromIndex: data?.fromIndex === true })
       return data
     } catch {
       throw new Error('Identify failed: Invalid JSON response from server.')
@@ -81,6 +156,12 @@ export async function identifyMachine(images, { enrichWithWebSearch = false } =
   }
 }
 
+// Fire-and-forget request that wakes a spun-down backend while the user is still
+// navigating, so the first identify call does not pay the cold start.
+export function wakeBackend() {
+  fetch(`${API_URL}/api/ready`).catch(() => {})
+}
+
 export async function pingHealth() {
   const headers = await authHeaders()
   const startTime = Date.now()
@@ -95,6 +176,54 @@ export async function pingHealth() {
   return { ok: res.ok, status: res.status, body: text }
 }
 
+export async function getPlanAdherence({ planId = null, dayStartHour = 4 } = {}) {
+  const headers = await authHeaders()
+  const params = new URLSearchParams({
+    tz: Intl.DateTimeFormat().resolvedOptions().timeZone || 'UTC',
+    day_start_hour: String(dayStartHour),
+  })
+  if (planId) params.set('plan_id', planId)
+  const res = await fetch(`${API_URL}/api/plans/adherence?${params}`, { headers })
+  if (!res.ok) {
+    const err = (await res.text()).trim()
+    throw new Error(`Plan adherence failed: ${err || `Server error (${res.status})`}`)
+  }
+  return res.json()
+}
+
+const RECOMMENDATION_JOB_TIMEOUT_MS = 180000
+const RECOMMENDATION_JOB_LONG_POLL_SECONDS = 10
+
+async function waitForRecommendationJob(job, headers, { requestId, scopeId, startTime }) {
+  const deadline = Date.now() + RECOMMENDATION_JOB_TIMEOUT_MS
+  let current = job
+  while (current.status !== 'succeeded' && current.status !== 'failed') {
+    if (Date.now() > deadline) {
+      throw new Error('Recommendations failed: Timed out waiting for analysis. Check the reports list shortly.')
+    }
+    const params = new URLSearchParams({
+      wait: String(RECOMMENDATION_JOB_LONG_POLL_SECONDS),
+      after_version: String(current.version ?? -1),
+    })
+    const res = await fetch(`${API_URL}/api/recommendations/jobs/${current.job_id}?${params}`, { headers })
+    if (!res.ok) {
+      const err = (await res.text()).trim()
+      throw new Error(`Recommendations failed: ${err || `Server error (${res.status})`}`)
+    }
+    current = await res.json()
+  }
+  addLog({
+    level: current.status === 'succeeded' ? 'info' : 'error',
+    event: 'recs.job',
+    message: `Recommendations job ${current.status}.`,
+    meta: { requestId, scopeId, jobId: current.job_id, stage_timings_ms: current.stage_timings_ms, duration_ms: Date.now() - startTime },
+  })
+  if (current.status === 'failed') {
+    throw new Error(`Recommendations failed: ${current.error?.detail || 'Analysis job failed.'}`)
+  }
+  return current.result
+}
+
 export async function getRecommendations(scope, groupedTraining, equipment, sorenessData) {
   const requestId = `${Date.now()}-${Math.random().toString(16).slice(2)}`
   const startTime = Date.now()
@@ -115,17 +244,28 @@ export async function getRecommendations(scope, groupedTraining, equipment, sore
     })
     scopeId = persistedScope?.id || null
 
-    const res = await fetch(`${API_URL}/api/recommendations`, {
-      method: 'POST',
-      headers,
-      body: JSON.stringify({
-        scope,
-        scope_id: scopeId,
-        grouped_training: groupedTraining,
-        equipment,
-        soreness_data: sorenessData || [],
-      }),
-    })
+    // With a persisted scope the backend loads sets, equipment and soreness itself, so the
+    // full history is only uploaded when the scope could not be saved.
+    const { body, headers: bodyHeaders } = await jsonRequestBody(
+      scopeId
+        ? { scope, scope_id: scopeId }
+        : {
+            scope,
+            scope_id: scopeId,
+            grouped_training: groupedTraining,
+            equipment,
+            soreness_data: sorenessData || [],
+          },
+      { ...headers, 'Idempotency-Key': requestId },
+    )
+    // Job mode returns immediately and is polled, so slow generations are never cut off by
+    // client or proxy timeouts. Older backends without the jobs route fall back to the
+    // synchronous endpoint.
+    const jobRes = await fetch(`${API_URL}/api/recommendations/jobs`, { method: 'POST', headers: bodyHeaders, body })
+    let res = jobRes
+    if (jobRes.status === 404 || jobRes.status === 405) {
+      res = await fetch(`${API_URL}/api/recommendations`, { method: 'POST', headers: bodyHeaders, body })
+    }
     addLog({
       level: res.ok ? 'info' : 'error',
       event: 'recs.response',
@@ -137,7 +277,10 @@ export async function getRecommendations(scope, groupedTraining, equipment, sore
       const detail = err || `Server error (${res.status})`
       throw new Error(`Recommendations failed: ${detail}`)
     }
-    const data = await res.json()
+    let data = await res.json()
+    if (res === jobRes) {
+      data = await waitForRecommendationJob(data, headers, { requestId, scopeId, startTime })
+    }
     return { ...data, scope_id: data?.scope_id || scopeId, report_id: data?.report_id || null }
   } catch (error) {
     addLog({
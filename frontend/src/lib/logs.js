@@ -89,7 +89,7 @@ export function subscribeLogs(listener) {
   return () => listeners.delete(listener)
 }
 
-export function logIdentifyTelemetry({ phase = 'start', mode = 'base', requestId, success, durationMs, status, error } = {}) {
+export function logIdentifyTelemetry({ phase = 'start', mode = 'base', requestId, success, durationMs, status, error, serverTiming, fromIndex } = {}) {
   const normalizedMode = mode === 'web_search_enriched' ? 'web_search_enriched' : 'base'
   const event = `identify.telemetry.${phase}`
   const level = phase === 'failed' || success === false ? 'error' : 'info'
@@ -104,6 +104,8 @@ export function logIdentifyTelemetry({ phase = 'start', mode = 'base', requestId
       duration_ms: Number.isFinite(durationMs) ? durationMs : undefined,
       status,
       error,
+      server_timing: serverTiming && Object.keys(serverTiming).length ? serverTiming : undefined,
+      from_index: typeof fromIndex === 'boolean' ? fromIndex : undefined,
     },
   })
 }
@@ -4,10 +4,13 @@ import { QueryClientProvider } from '@tanstack/react-query'
 import { RouterProvider } from '@tanstack/react-router'
 import { getQueryClient } from './app/queryClient'
 import { router } from './app/router'
+import { wakeBackend } from './lib/api'
 import './index.css'
 
 const queryClient = getQueryClient()
 
+wakeBackend()
+
 function Devtools() {
   const [QueryDevtoolsComponent, setQueryDevtoolsComponent] = React.useState(null)
   const [RouterDevtoolsComponent, setRouterDevtoolsComponent] = React.useState(null)
@@ -0,0 +1,143 @@
+-- Read-time comparison: legacy full-history equipment_set_counts aggregate vs the
+-- trigger-maintained equipment_daily_set_counts view.
+--
+-- Usage (against a local/dev database with supabase_schema.sql or all migrations applied):
+--   psql "$DATABASE_URL" -v sets=120000 -f supabase/benchmarks/equipment_set_counts.sql
+--
+-- Everything runs inside one transaction that is rolled back, so no data is left behind.
+-- Sets are bulk-loaded with triggers disabled (session_replication_role = replica) to keep
+-- the load fast; the daily counts for the synthetic user are then backfilled exactly as the
+-- migration does.
+
+\set ON_ERROR_STOP on
+\if :{?sets}
+\else
+  \set sets 120000
+\endif
+\timing off
+
+begin;
+
+create temporary table bench_config on commit drop as
+select
+  '00000000-0000-0000-0000-00000000be01'::uuid as user_id,
+  :sets::int as set_count,
+  40 as machine_count;
+
+insert into auth.users (id, email)
+select user_id, 'equipment-bench@example.com' from bench_config;
+
+insert into public.machines (id, user_id, name, movement, muscle_groups)
+select
+  uuid_generate_v5(uuid_ns_url(), format('bench-machine:%s', n)),
+  c.user_id,
+  format('Bench station %s', n),
+  'Bench movement',
+  array['Legs']
+from bench_config c, generate_series(1, c.machine_count) as n;
+
+set local session_replication_role = replica;
+
+-- ~4 years of history, skewed so a handful of machines dominate (realistic favorites).
+insert into public.sets (user_id, machine_id, reps, weight, set_type, logged_at, training_date, training_bucket_id)
+select
+  g.user_id,
+  uuid_generate_v5(uuid_ns_url(), format('bench-machine:%s', 1 + floor(power(random(), 2) * g.machine_count)::int)),
+  8 + (g.n % 5),
+  40 + (g.n % 9) * 2.5,
+  'working',
+  g.logged_at,
+  (g.logged_at at time zone 'UTC')::date,
+  'training_day:' || (g.logged_at at time zone 'UTC')::date::text
+from (
+  select c.user_id, c.machine_count, n, now() - random() * interval '1460 days' as logged_at
+  from bench_config c, generate_series(1, c.set_count) as n
+) g;
+
+set local session_replication_role = origin;
+
+insert into public.equipment_daily_set_counts (user_id, machine_id, day, set_count)
+select st.user_id, st.machine_id, (st.logged_at at time zone 'UTC')::date, count(*)::int
+from public.sets st
+join bench_config c on c.user_id = st.user_id
+where st.machine_id is not null
+group by 1, 2, 3;
+
+analyze public.sets;
+analyze public.equipment_daily_set_counts;
+
+create temporary view legacy_equipment_set_counts as
+with machine_set_counts as (
+  select
+    st.user_id,
+    st.machine_id,
+    count(*) filter (where st.logged_at >= now() - interval '30 days')::bigint as sets_30d,
+    count(*) filter (where st.logged_at >= now() - interval '90 days')::bigint as sets_90d,
+    count(*)::bigint as sets_all
+  from public.sets st
+  where st.machine_id is not null
+  group by st.user_id, st.machine_id
+)
+select
+  msc.user_id,
+  msc.machine_id,
+  msc.sets_30d,
+  msc.sets_90d,
+  msc.sets_all,
+  rank() over (partition by msc.user_id order by msc.sets_30d desc, msc.machine_id) as rank_30d,
+  rank() over (partition by msc.user_id order by msc.sets_90d desc, msc.machine_id) as rank_90d,
+  rank() over (partition by msc.user_id order by msc.sets_all desc, msc.machine_id) as rank_all
+from machine_set_counts msc;
+
+select
+  (select count(*) from public.sets s join bench_config c using (user_id)) as bench_sets,
+  (select count(*) from public.equipment_daily_set_counts d join bench_config c using (user_id)) as daily_count_rows;
+
+-- Median of 20 runs of the favorites read (the same shape getEquipmentFavorites requests).
+create temporary table bench_results (variant text, run int, duration_ms numeric) on commit drop;
+
+do $$
+declare
+  v_user uuid := (select user_id from bench_config);
+  v_started timestamptz;
+  v_variant text;
+begin
+  foreach v_variant in array array['legacy_aggregate', 'daily_counts_view'] loop
+    for v_run in 1..20 loop
+      v_started := clock_timestamp();
+      if v_variant = 'legacy_aggregate' then
+        perform * from legacy_equipment_set_counts where user_id = v_user order by rank_30d;
+      else
+        perform * from public.equipment_set_counts where user_id = v_user order by rank_30d;
+      end if;
+      insert into bench_results
+      values (v_variant, v_run, extract(epoch from clock_timestamp() - v_started) * 1000);
+    end loop;
+  end loop;
+end;
+$$;
+
+select
+  variant,
+  round(percentile_cont(0.5) within group (order by duration_ms)::numeric, 3) as p50_ms,
+  round(max(duration_ms), 3) as max_ms
+from bench_results
+group by variant
+order by variant;
+
+-- Both variants must agree on all-time counts and all-time ranks.
+select count(*) as all_time_mismatches
+from legacy_equipment_set_counts l
+full join public.equipment_set_counts v using (user_id, machine_id)
+where coalesce(l.user_id, v.user_id) = (select user_id from bench_config)
+  and (l.sets_all is distinct from v.sets_all or l.rank_all is distinct from v.rank_all);
+
+explain (analyze, buffers, costs off)
+select * from legacy_equipment_set_counts
+where user_id = '00000000-0000-0000-0000-00000000be01' order by rank_30d;
+
+explain (analyze, buffers, costs off)
+select * from public.equipment_set_counts
+where user_id = '00000000-0000-0000-0000-00000000be01' order by rank_30d;
+
+rollback;
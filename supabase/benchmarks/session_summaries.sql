@@ -0,0 +1,159 @@
+-- Read-time comparison: legacy full-history session_summaries aggregate vs the
+-- trigger-maintained training_day_summaries view.
+--
+-- Usage (against a local/dev database with supabase_schema.sql or all migrations applied):
+--   psql "$DATABASE_URL" -v sets=120000 -f supabase/benchmarks/session_summaries.sql
+--
+-- Everything runs inside one transaction that is rolled back, so no data is left behind.
+-- Sets are bulk-loaded with triggers disabled (session_replication_role = replica) to keep
+-- the load fast; the training-day summaries for the synthetic user are then backfilled exactly as the
+-- migration does.
+
+\set ON_ERROR_STOP on
+\if :{?sets}
+\else
+  \set sets 120000
+\endif
+\timing off
+
+begin;
+
+create temporary table bench_config on commit drop as
+select
+  '00000000-0000-0000-0000-00000000be02'::uuid as user_id,
+  :sets::int as set_count,
+  40 as machine_count;
+
+insert into auth.users (id, email)
+select user_id, 'history-bench@example.com' from bench_config;
+
+insert into public.machines (id, user_id, name, movement, muscle_groups)
+select
+  uuid_generate_v5(uuid_ns_url(), format('bench-machine:%s', n)),
+  c.user_id,
+  format('Bench station %s', n),
+  format('Bench movement %s', n),
+  array[(array['Chest', 'Back', 'Legs', 'Shoulders', 'Arms'])[1 + n % 5], (array['Core', 'Glutes', 'Biceps', 'Triceps'])[1 + n % 4]]
+from bench_config c, generate_series(1, c.machine_count) as n;
+
+set local session_replication_role = replica;
+
+-- ~4 years of history across 40 stations.
+insert into public.sets (user_id, machine_id, reps, weight, set_type, logged_at, training_date, training_bucket_id)
+select
+  g.user_id,
+  uuid_generate_v5(uuid_ns_url(), format('bench-machine:%s', 1 + floor(power(random(), 2) * g.machine_count)::int)),
+  8 + (g.n % 5),
+  40 + (g.n % 9) * 2.5,
+  'working',
+  g.logged_at,
+  (g.logged_at at time zone 'UTC')::date,
+  'training_day:' || (g.logged_at at time zone 'UTC')::date::text
+from (
+  select c.user_id, c.machine_count, n, now() - random() * interval '1460 days' as logged_at
+  from bench_config c, generate_series(1, c.set_count) as n
+) g;
+
+set local session_replication_role = origin;
+
+insert into public.training_day_summaries (
+  user_id,
+  training_date,
+  training_bucket_id,
+  started_at,
+  ended_at,
+  set_count,
+  exercises,
+  muscle_groups_trained
+)
+select
+  st.user_id,
+  st.training_date,
+  st.training_bucket_id,
+  min(st.logged_at),
+  max(st.logged_at),
+  count(st.id),
+  array_agg(distinct m.movement) filter (where m.movement is not null),
+  array_agg(distinct mg) filter (where mg is not null)
+from public.sets st
+join bench_config c on c.user_id = st.user_id
+left join public.machines m on m.id = st.machine_id
+left join lateral unnest(m.muscle_groups) as mg on true
+group by st.user_id, st.training_date, st.training_bucket_id;
+
+analyze public.sets;
+analyze public.training_day_summaries;
+
+create temporary view legacy_session_summaries as
+select
+  st.user_id,
+  st.training_date,
+  st.training_bucket_id,
+  min(st.logged_at) as started_at,
+  max(st.logged_at) as ended_at,
+  count(st.id) as set_count,
+  array_agg(distinct m.movement) filter (where m.movement is not null) as exercises,
+  array_agg(distinct mg) filter (where mg is not null) as muscle_groups_trained
+from public.sets st
+left join public.machines m on m.id = st.machine_id
+left join lateral unnest(m.muscle_groups) as mg on true
+group by st.user_id, st.training_date, st.training_bucket_id;
+
+select
+  (select count(*) from public.sets s join bench_config c using (user_id)) as bench_sets,
+  (select count(*) from public.training_day_summaries d join bench_config c using (user_id)) as summary_rows;
+
+-- Median of 20 runs of a history-screen read: the user's full training-day list, newest first.
+create temporary table bench_results (variant text, run int, duration_ms numeric) on commit drop;
+
+do $$
+declare
+  v_user uuid := (select user_id from bench_config);
+  v_started timestamptz;
+  v_variant text;
+begin
+  foreach v_variant in array array['legacy_aggregate', 'summaries_view'] loop
+    for v_run in 1..20 loop
+      v_started := clock_timestamp();
+      if v_variant = 'legacy_aggregate' then
+        perform * from legacy_session_summaries where user_id = v_user order by training_date desc;
+      else
+        perform * from public.session_summaries where user_id = v_user order by training_date desc;
+      end if;
+      insert into bench_results
+      values (v_variant, v_run, extract(epoch from clock_timestamp() - v_started) * 1000);
+    end loop;
+  end loop;
+end;
+$$;
+
+select
+  variant,
+  round(percentile_cont(0.5) within group (order by duration_ms)::numeric, 3) as p50_ms,
+  round(max(duration_ms), 3) as max_ms
+from bench_results
+group by variant
+order by variant;
+
+-- Both variants must return identical rows.
+select
+  (select count(*) from (
+    select * from legacy_session_summaries where user_id = (select user_id from bench_config)
+    except
+    select * from public.session_summaries where user_id = (select user_id from bench_config)
+  ) missing)
+  + (select count(*) from (
+    select * from public.session_summaries where user_id = (select user_id from bench_config)
+    except
+    select * from legacy_session_summaries where user_id = (select user_id from bench_config)
+  ) extra) as mismatched_rows;
+
+explain (analyze, buffers, costs off)
+select * from legacy_session_summaries
+where user_id = '00000000-0000-0000-0000-00000000be02' order by training_date desc;
+
+explain (analyze, buffers, costs off)
+select * from public.session_summaries
+where user_id = '00000000-0000-0000-0000-00000000be02' order by training_date desc;
+
+rollback;
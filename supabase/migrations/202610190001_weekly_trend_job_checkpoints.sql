@@ -0,0 +1,18 @@
+-- Non-destructive incremental migration.
+-- Per-run checkpoints for the weekly trend job: one row per user whose report was
+-- written during a run, so retried or sharded invocations skip finished users.
+
+create table if not exists public.weekly_trend_job_checkpoints (
+  run_id text not null,
+  user_id uuid not null references auth.users(id) on delete cascade,
+  shard_index int not null default 0 check (shard_index >= 0),
+  report_id uuid references public.analysis_reports(id) on delete set null,
+  completed_at timestamptz not null default now(),
+  primary key (run_id, user_id)
+);
+
+-- Only the service role (backend cron job) reads or writes checkpoints.
+alter table public.weekly_trend_job_checkpoints enable row level security;
+
+create index if not exists idx_weekly_trend_job_checkpoints_completed
+  on public.weekly_trend_job_checkpoints(completed_at);
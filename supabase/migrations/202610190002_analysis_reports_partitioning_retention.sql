@@ -0,0 +1,264 @@
+-- Incremental migration: range-partition analysis_reports by created_at (monthly) and add
+-- the retention functions used by POST /api/jobs/prune-analysis-reports.
+--
+-- Retention policy (per user and report_type):
+--   * the p_keep_latest newest reports are always kept;
+--   * within the last p_snapshot_months months, the newest report of each calendar month
+--     is kept as a monthly snapshot;
+--   * everything else is deleted in batches.
+-- Monthly partitions older than the snapshot horizon that hold no retained rows are
+-- dropped outright instead of being deleted row by row.
+--
+-- The table is rebuilt in place, so run this in a maintenance window: it takes an
+-- exclusive lock on analysis_reports while rows are copied.
+
+begin;
+
+-- Partitioned tables need the partition key in every unique constraint, so report ids can
+-- no longer be the target of a foreign key.
+alter table public.weekly_trend_job_checkpoints
+  drop constraint if exists weekly_trend_job_checkpoints_report_id_fkey;
+
+alter table public.analysis_reports rename to analysis_reports_unpartitioned;
+alter index if exists public.idx_analysis_reports_user_created rename to idx_analysis_reports_user_created_unpartitioned;
+alter index if exists public.idx_analysis_reports_user_type_created rename to idx_analysis_reports_user_type_created_unpartitioned;
+drop policy if exists "Users manage own analysis reports" on public.analysis_reports_unpartitioned;
+
+create table public.analysis_reports (
+  id uuid not null default uuid_generate_v4(),
+  user_id uuid not null references auth.users(id) on delete cascade,
+  recommendation_scope_id uuid references public.recommendation_scopes(id) on delete set null,
+  report_type text not null default 'recommendation' check (report_type in ('recommendation', 'weekly_trend')),
+  status text not null default 'ready' check (status in ('ready', 'failed')),
+  title text,
+  summary text,
+  payload jsonb not null default '{}'::jsonb,
+  evidence jsonb not null default '[]'::jsonb,
+  metadata jsonb not null default '{}'::jsonb,
+  created_at timestamptz not null default now(),
+  primary key (id, created_at)
+) partition by range (created_at);
+
+-- Catches rows outside the pre-created monthly range (e.g. backfilled timestamps).
+create table public.analysis_reports_default partition of public.analysis_reports default;
+
+create or replace function public.ensure_analysis_reports_partitions(
+  p_from date default current_date,
+  p_months_ahead int default 3
+)
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_month date := date_trunc('month', p_from)::date;
+  v_last date := (date_trunc('month', current_date) + make_interval(months => p_months_ahead))::date;
+  v_name text;
+  v_created int := 0;
+begin
+  while v_month <= v_last loop
+    v_name := format('analysis_reports_y%sm%s', to_char(v_month, 'YYYY'), to_char(v_month, 'MM'));
+    if to_regclass(format('public.%I', v_name)) is null then
+      execute format(
+        'create table public.%I partition of public.analysis_reports for values from (%L) to (%L)',
+        v_name,
+        v_month,
+        (v_month + interval '1 month')::date
+      );
+      v_created := v_created + 1;
+    end if;
+    v_month := (v_month + interval '1 month')::date;
+  end loop;
+  return v_created;
+end;
+$$;
+
+select public.ensure_analysis_reports_partitions(
+  coalesce((select min(created_at)::date from public.analysis_reports_unpartitioned), current_date)
+);
+
+insert into public.analysis_reports
+select
+  id,
+  user_id,
+  recommendation_scope_id,
+  report_type,
+  status,
+  title,
+  summary,
+  payload,
+  evidence,
+  metadata,
+  created_at
+from public.analysis_reports_unpartitioned;
+
+drop table public.analysis_reports_unpartitioned;
+
+alter table public.analysis_reports enable row level security;
+create policy "Users manage own analysis reports" on public.analysis_reports
+  for all
+  using ((select auth.uid()) = user_id)
+  with check ((select auth.uid()) = user_id);
+create index idx_analysis_reports_user_created on public.analysis_reports(user_id, created_at desc);
+create index idx_analysis_reports_user_type_created on public.analysis_reports(user_id, report_type, created_at desc);
+
+create or replace function public.prune_analysis_reports(
+  p_keep_latest int default 20,
+  p_snapshot_months int default 12,
+  p_batch_size int default 1000
+)
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_horizon timestamptz := date_trunc('month', now()) - make_interval(months => p_snapshot_months);
+  v_deleted int;
+begin
+  if p_keep_latest < 1 then
+    raise exception 'p_keep_latest must be at least 1';
+  end if;
+
+  -- Every step is an index probe on idx_analysis_reports_user_type_created, so a batch
+  -- never ranks the whole table: walk the distinct (user_id, report_type) groups, find
+  -- each group's p_keep_latest-th newest created_at once, and only look at older rows.
+  -- Ties at the cutoff (and at a month's newest report) are kept.
+  with recursive report_groups as (
+    (
+      select user_id, report_type
+      from public.analysis_reports
+      order by user_id, report_type
+      limit 1
+    )
+    union all
+    select next_group.user_id, next_group.report_type
+    from report_groups g
+    cross join lateral (
+      select r.user_id, r.report_type
+      from public.analysis_reports r
+      where (r.user_id, r.report_type) > (g.user_id, g.report_type)
+      order by r.user_id, r.report_type
+      limit 1
+    ) next_group
+  ),
+  cutoffs as (
+    select g.user_id, g.report_type, kept.created_at as cutoff
+    from report_groups g
+    cross join lateral (
+      select r.created_at
+      from public.analysis_reports r
+      where r.user_id = g.user_id
+        and r.report_type = g.report_type
+      order by r.created_at desc
+      offset p_keep_latest - 1
+      limit 1
+    ) kept
+  ),
+  expired as (
+    select old.id, old.created_at
+    from cutoffs c
+    cross join lateral (
+      select r.id, r.created_at
+      from public.analysis_reports r
+      where r.user_id = c.user_id
+        and r.report_type = c.report_type
+        and r.created_at < c.cutoff
+        and (
+          r.created_at < v_horizon
+          -- Inside the horizon the newest report of each month is kept as its snapshot.
+          or exists (
+            select 1
+            from public.analysis_reports newer
+            where newer.user_id = r.user_id
+              and newer.report_type = r.report_type
+              and newer.created_at > r.created_at
+              and newer.created_at < date_trunc('month', r.created_at) + interval '1 month'
+          )
+        )
+      order by r.created_at
+      limit p_batch_size
+    ) old
+    limit p_batch_size
+  )
+  delete from public.analysis_reports r
+  using expired e
+  where r.id = e.id
+    and r.created_at = e.created_at;
+
+  get diagnostics v_deleted = row_count;
+  return v_deleted;
+end;
+$$;
+
+create or replace function public.drop_expired_analysis_report_partitions(
+  p_keep_latest int default 20,
+  p_snapshot_months int default 12
+)
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_horizon date := (date_trunc('month', current_date) - make_interval(months => p_snapshot_months))::date;
+  v_partition record;
+  v_month_end date;
+  v_has_retained boolean;
+  v_dropped int := 0;
+begin
+  for v_partition in
+    select child.relname
+    from pg_inherits
+    join pg_class parent on parent.oid = pg_inherits.inhparent
+    join pg_class child on child.oid = pg_inherits.inhrelid
+    join pg_namespace ns on ns.oid = parent.relnamespace
+    where ns.nspname = 'public'
+      and parent.relname = 'analysis_reports'
+      and child.relname ~ '^analysis_reports_y[0-9]{4}m[0-9]{2}$'
+    order by child.relname
+  loop
+    v_month_end := (to_date(substr(v_partition.relname, 19), 'YYYY"m"MM') + interval '1 month')::date;
+    continue when v_month_end > v_horizon;
+
+    -- Past the snapshot horizon only the newest p_keep_latest reports per user/type survive.
+    execute format(
+      'select exists (
+         select 1
+         from public.%I r
+         where (
+           select count(*)
+           from (
+             select 1
+             from public.analysis_reports newer
+             where newer.user_id = r.user_id
+               and newer.report_type = r.report_type
+               and newer.created_at > r.created_at
+             limit $1
+           ) newer_rows
+         ) < $1
+       )',
+      v_partition.relname
+    )
+    into v_has_retained
+    using p_keep_latest;
+
+    if not v_has_retained then
+      execute format('drop table public.%I', v_partition.relname);
+      v_dropped := v_dropped + 1;
+    end if;
+  end loop;
+  return v_dropped;
+end;
+$$;
+
+-- Maintenance functions are for the backend (service role) only.
+revoke all on function public.ensure_analysis_reports_partitions(date, int) from public, anon, authenticated;
+revoke all on function public.prune_analysis_reports(int, int, int) from public, anon, authenticated;
+revoke all on function public.drop_expired_analysis_report_partitions(int, int) from public, anon, authenticated;
+grant execute on function public.ensure_analysis_reports_partitions(date, int) to service_role;
+grant execute on function public.prune_analysis_reports(int, int, int) to service_role;
+grant execute on function public.drop_expired_analysis_report_partitions(int, int) to service_role;
+
+commit;
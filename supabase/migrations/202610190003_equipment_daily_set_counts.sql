@@ -0,0 +1,218 @@
+-- Non-destructive incremental migration.
+-- Replaces the full-history aggregate behind equipment_set_counts with a per-(user,
+-- machine, UTC day) count table maintained by statement-level triggers on sets. The view
+-- keeps its columns, tie-breaking and rolling now()-relative 30d/90d windows: whole days
+-- come from the count table and only the day each window starts in is read from sets.
+
+begin;
+
+create table if not exists public.equipment_daily_set_counts (
+  user_id uuid not null references auth.users(id) on delete cascade,
+  machine_id uuid not null references public.machines(id) on delete cascade,
+  day date not null,
+  set_count int not null check (set_count > 0),
+  primary key (user_id, machine_id, day)
+);
+
+alter table public.equipment_daily_set_counts enable row level security;
+drop policy if exists "Users read own equipment daily set counts" on public.equipment_daily_set_counts;
+-- Rows are written only by the sets triggers below (security definer).
+create policy "Users read own equipment daily set counts" on public.equipment_daily_set_counts
+  for select
+  using ((select auth.uid()) = user_id);
+
+create or replace function public.apply_equipment_daily_set_count_changes()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_user_ids uuid[];
+  v_machine_ids uuid[];
+  v_days date[];
+  v_deltas int[];
+begin
+  -- Net per-key deltas: updates that keep user, machine and UTC day (cluster recomputation,
+  -- reps/weight edits) cancel out and touch nothing.
+  if tg_op = 'INSERT' then
+    select array_agg(user_id), array_agg(machine_id), array_agg(day), array_agg(delta)
+    into v_user_ids, v_machine_ids, v_days, v_deltas
+    from (
+      select user_id, machine_id, (logged_at at time zone 'UTC')::date as day, count(*)::int as delta
+      from new_rows
+      where machine_id is not null
+      group by 1, 2, 3
+    ) changes;
+  elsif tg_op = 'DELETE' then
+    select array_agg(user_id), array_agg(machine_id), array_agg(day), array_agg(delta)
+    into v_user_ids, v_machine_ids, v_days, v_deltas
+    from (
+      select user_id, machine_id, (logged_at at time zone 'UTC')::date as day, -count(*)::int as delta
+      from old_rows
+      where machine_id is not null
+      group by 1, 2, 3
+    ) changes;
+  else
+    select array_agg(user_id), array_agg(machine_id), array_agg(day), array_agg(delta)
+    into v_user_ids, v_machine_ids, v_days, v_deltas
+    from (
+      select user_id, machine_id, day, sum(delta)::int as delta
+      from (
+        select user_id, machine_id, (logged_at at time zone 'UTC')::date as day, 1 as delta
+        from new_rows
+        where machine_id is not null
+        union all
+        select user_id, machine_id, (logged_at at time zone 'UTC')::date as day, -1 as delta
+        from old_rows
+        where machine_id is not null
+      ) row_changes
+      group by 1, 2, 3
+      having sum(delta) <> 0
+    ) changes;
+  end if;
+
+  if v_user_ids is null then
+    return null;
+  end if;
+
+  -- Serialize per user so a concurrent decrement cannot delete a row another transaction just
+  -- incremented. One lock per user rather than per key keeps bulk statements (imports,
+  -- account deletion) within max_locks_per_transaction.
+  perform pg_advisory_xact_lock(hashtextextended(format('equipment-daily-set-count:%s', user_id::text), 0))
+  from (select distinct unnest(v_user_ids) as user_id order by 1) locked_users;
+
+  insert into public.equipment_daily_set_counts as c (user_id, machine_id, day, set_count)
+  select d.user_id, d.machine_id, d.day, d.delta
+  from unnest(v_user_ids, v_machine_ids, v_days, v_deltas) as d(user_id, machine_id, day, delta)
+  where d.delta > 0
+  on conflict (user_id, machine_id, day)
+  do update set set_count = c.set_count + excluded.set_count;
+
+  delete from public.equipment_daily_set_counts c
+  using unnest(v_user_ids, v_machine_ids, v_days, v_deltas) as d(user_id, machine_id, day, delta)
+  where d.delta < 0
+    and c.user_id = d.user_id
+    and c.machine_id = d.machine_id
+    and c.day = d.day
+    and c.set_count <= -d.delta;
+
+  update public.equipment_daily_set_counts c
+  set set_count = c.set_count + d.delta
+  from unnest(v_user_ids, v_machine_ids, v_days, v_deltas) as d(user_id, machine_id, day, delta)
+  where d.delta < 0
+    and c.user_id = d.user_id
+    and c.machine_id = d.machine_id
+    and c.day = d.day;
+
+  return null;
+end;
+$$;
+
+-- Transition tables cannot be combined with column lists or multi-event triggers,
+-- so each event gets its own statement-level trigger.
+drop trigger if exists trg_sets_equipment_counts_insert on public.sets;
+drop trigger if exists trg_sets_equipment_counts_update on public.sets;
+drop trigger if exists trg_sets_equipment_counts_delete on public.sets;
+
+-- Block set writes until the backfill below is committed so no change is missed or double counted.
+lock table public.sets in share row exclusive mode;
+
+create trigger trg_sets_equipment_counts_insert
+after insert on public.sets
+referencing new table as new_rows
+for each statement
+execute function public.apply_equipment_daily_set_count_changes();
+
+create trigger trg_sets_equipment_counts_update
+after update on public.sets
+referencing old table as old_rows new table as new_rows
+for each statement
+execute function public.apply_equipment_daily_set_count_changes();
+
+create trigger trg_sets_equipment_counts_delete
+after delete on public.sets
+referencing old table as old_rows
+for each statement
+execute function public.apply_equipment_daily_set_count_changes();
+
+truncate public.equipment_daily_set_counts;
+insert into public.equipment_daily_set_counts (user_id, machine_id, day, set_count)
+select st.user_id, st.machine_id, (st.logged_at at time zone 'UTC')::date, count(*)::int
+from public.sets st
+where st.machine_id is not null
+group by 1, 2, 3;
+
+-- Canonical equipment volume signal for favorites/recommendations.
+-- Edge cases:
+--   * No data: users without any matching sets simply produce no rows.
+--   * Null machine_id: excluded because favorites must map to concrete equipment.
+--   * Ties: rank columns remain deterministic by applying machine_id as a secondary sort key.
+create or replace view public.equipment_set_counts
+with (security_invoker = true) as
+with windows as not materialized (
+  select
+    now() - interval '30 days' as start_30d,
+    now() - interval '90 days' as start_90d,
+    ((now() - interval '30 days') at time zone 'UTC')::date as first_day_30d,
+    ((now() - interval '90 days') at time zone 'UTC')::date as first_day_90d
+),
+daily_set_counts as (
+  -- Whole UTC days after the day each window starts in.
+  select
+    c.user_id,
+    c.machine_id,
+    coalesce(sum(c.set_count) filter (where c.day > w.first_day_30d), 0)::bigint as sets_30d,
+    coalesce(sum(c.set_count) filter (where c.day > w.first_day_90d), 0)::bigint as sets_90d,
+    sum(c.set_count)::bigint as sets_all
+  from public.equipment_daily_set_counts c
+  cross join windows w
+  group by c.user_id, c.machine_id
+),
+boundary_set_counts as (
+  -- The day a window starts in is only partly inside it, so its sets are counted from the
+  -- raw rows (idx_sets_user_logged); this keeps the rolling now()-relative windows.
+  select
+    st.user_id,
+    st.machine_id,
+    count(*) filter (
+      where st.logged_at >= w.start_30d
+        and st.logged_at < (w.first_day_30d + 1)::timestamp at time zone 'UTC'
+    )::bigint as sets_30d,
+    count(*) filter (
+      where st.logged_at >= w.start_90d
+        and st.logged_at < (w.first_day_90d + 1)::timestamp at time zone 'UTC'
+    )::bigint as sets_90d
+  from public.sets st
+  cross join windows w
+  where st.machine_id is not null
+    and (
+      (st.logged_at >= w.start_30d and st.logged_at < (w.first_day_30d + 1)::timestamp at time zone 'UTC')
+      or (st.logged_at >= w.start_90d and st.logged_at < (w.first_day_90d + 1)::timestamp at time zone 'UTC')
+    )
+  group by st.user_id, st.machine_id
+),
+machine_set_counts as (
+  select
+    d.user_id,
+    d.machine_id,
+    d.sets_30d + coalesce(b.sets_30d, 0) as sets_30d,
+    d.sets_90d + coalesce(b.sets_90d, 0) as sets_90d,
+    d.sets_all
+  from daily_set_counts d
+  left join boundary_set_counts b
+    on b.user_id = d.user_id
+   and b.machine_id = d.machine_id
+)
+select
+  msc.user_id,
+  msc.machine_id,
+  msc.sets_30d,
+  msc.sets_90d,
+  msc.sets_all,
+  rank() over (partition by msc.user_id order by msc.sets_30d desc, msc.machine_id) as rank_30d,
+  rank() over (partition by msc.user_id order by msc.sets_90d desc, msc.machine_id) as rank_90d,
+  rank() over (partition by msc.user_id order by msc.sets_all desc, msc.machine_id) as rank_all
+from machine_set_counts msc;
+
+commit;
@@ -0,0 +1,232 @@
+-- Non-destructive incremental migration.
+-- Replaces the full-history aggregate behind session_summaries with a training_day_summaries
+-- table kept current by triggers on sets (inserts, deletes and grouping-relevant updates) and
+-- on machines (movement / muscle_groups edits). The view keeps its columns, types and
+-- semantics, so existing readers are unaffected.
+
+begin;
+
+create table if not exists public.training_day_summaries (
+  user_id uuid not null references auth.users(id) on delete cascade,
+  training_date date not null,
+  training_bucket_id text not null,
+  started_at timestamptz not null,
+  ended_at timestamptz not null,
+  set_count bigint not null check (set_count > 0),
+  exercises text[],
+  muscle_groups_trained text[],
+  primary key (user_id, training_date, training_bucket_id)
+);
+
+alter table public.training_day_summaries enable row level security;
+drop policy if exists "Users read own training day summaries" on public.training_day_summaries;
+-- Rows are written only by the sets/machines triggers below (security definer).
+create policy "Users read own training day summaries" on public.training_day_summaries
+  for select
+  using ((select auth.uid()) = user_id);
+
+create or replace function public.refresh_training_day_summaries(
+  p_user_ids uuid[],
+  p_training_dates date[],
+  p_training_bucket_ids text[]
+)
+returns void
+language plpgsql
+set search_path = public
+as $$
+begin
+  if coalesce(cardinality(p_user_ids), 0) = 0 then
+    return;
+  end if;
+
+  -- Serialize refreshes per user so a concurrent writer's recomputation cannot overwrite a
+  -- newer one. One lock per user rather than per day keeps bulk statements (imports, account
+  -- deletion) within max_locks_per_transaction.
+  perform pg_advisory_xact_lock(hashtextextended(format('training-day-summary:%s', user_id::text), 0))
+  from (select distinct unnest(p_user_ids) as user_id order by 1) locked_users;
+
+  delete from public.training_day_summaries s
+  using unnest(p_user_ids, p_training_dates, p_training_bucket_ids) as d(user_id, training_date, training_bucket_id)
+  where s.user_id = d.user_id
+    and s.training_date = d.training_date
+    and s.training_bucket_id = d.training_bucket_id;
+
+  -- A training day holds at most a few dozen sets, so recomputing it from sets is cheap
+  -- and keeps min/max and distinct arrays exact without per-value reference counts.
+  insert into public.training_day_summaries (
+    user_id,
+    training_date,
+    training_bucket_id,
+    started_at,
+    ended_at,
+    set_count,
+    exercises,
+    muscle_groups_trained
+  )
+  select
+    st.user_id,
+    st.training_date,
+    st.training_bucket_id,
+    min(st.logged_at),
+    max(st.logged_at),
+    count(st.id),
+    array_agg(distinct m.movement) filter (where m.movement is not null),
+    array_agg(distinct mg) filter (where mg is not null)
+  from (
+    select distinct user_id, training_date, training_bucket_id
+    from unnest(p_user_ids, p_training_dates, p_training_bucket_ids) as d(user_id, training_date, training_bucket_id)
+  ) d
+  join public.sets st
+    on st.user_id = d.user_id
+    and st.training_date = d.training_date
+    and st.training_bucket_id = d.training_bucket_id
+  left join public.machines m on m.id = st.machine_id
+  left join lateral unnest(m.muscle_groups) as mg on true
+  group by st.user_id, st.training_date, st.training_bucket_id;
+end;
+$$;
+
+create or replace function public.apply_training_day_summary_changes()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_user_ids uuid[];
+  v_training_dates date[];
+  v_training_bucket_ids text[];
+begin
+  if tg_op = 'INSERT' then
+    select array_agg(user_id), array_agg(training_date), array_agg(training_bucket_id)
+    into v_user_ids, v_training_dates, v_training_bucket_ids
+    from (select distinct user_id, training_date, training_bucket_id from new_rows) changed_days;
+  elsif tg_op = 'DELETE' then
+    select array_agg(user_id), array_agg(training_date), array_agg(training_bucket_id)
+    into v_user_ids, v_training_dates, v_training_bucket_ids
+    from (select distinct user_id, training_date, training_bucket_id from old_rows) changed_days;
+  else
+    -- Only updates that move a set or change what it contributes touch summaries;
+    -- cluster recomputation and reps/weight edits are skipped.
+    select array_agg(user_id), array_agg(training_date), array_agg(training_bucket_id)
+    into v_user_ids, v_training_dates, v_training_bucket_ids
+    from (
+      select o.user_id, o.training_date, o.training_bucket_id
+      from old_rows o
+      join new_rows n on n.id = o.id
+      where (o.user_id, o.training_date, o.training_bucket_id, o.logged_at, o.machine_id)
+        is distinct from (n.user_id, n.training_date, n.training_bucket_id, n.logged_at, n.machine_id)
+      union
+      select n.user_id, n.training_date, n.training_bucket_id
+      from old_rows o
+      join new_rows n on n.id = o.id
+      where (o.user_id, o.training_date, o.training_bucket_id, o.logged_at, o.machine_id)
+        is distinct from (n.user_id, n.training_date, n.training_bucket_id, n.logged_at, n.machine_id)
+    ) changed_days;
+  end if;
+
+  perform public.refresh_training_day_summaries(v_user_ids, v_training_dates, v_training_bucket_ids);
+  return null;
+end;
+$$;
+
+create or replace function public.refresh_machine_training_day_summaries()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_user_ids uuid[];
+  v_training_dates date[];
+  v_training_bucket_ids text[];
+begin
+  select array_agg(user_id), array_agg(training_date), array_agg(training_bucket_id)
+  into v_user_ids, v_training_dates, v_training_bucket_ids
+  from (
+    select distinct st.user_id, st.training_date, st.training_bucket_id
+    from public.sets st
+    where st.user_id = new.user_id
+      and st.machine_id = new.id
+  ) affected_days;
+
+  perform public.refresh_training_day_summaries(v_user_ids, v_training_dates, v_training_bucket_ids);
+  return null;
+end;
+$$;
+
+revoke all on function public.refresh_training_day_summaries(uuid[], date[], text[]) from public, anon, authenticated;
+
+drop trigger if exists trg_sets_training_day_summaries_insert on public.sets;
+drop trigger if exists trg_sets_training_day_summaries_update on public.sets;
+drop trigger if exists trg_sets_training_day_summaries_delete on public.sets;
+drop trigger if exists trg_machines_refresh_training_day_summaries on public.machines;
+
+-- Block set and machine writes until the backfill below is committed so no change is missed.
+lock table public.sets, public.machines in share row exclusive mode;
+
+create trigger trg_sets_training_day_summaries_insert
+after insert on public.sets
+referencing new table as new_rows
+for each statement
+execute function public.apply_training_day_summary_changes();
+
+create trigger trg_sets_training_day_summaries_update
+after update on public.sets
+referencing old table as old_rows new table as new_rows
+for each statement
+execute function public.apply_training_day_summary_changes();
+
+create trigger trg_sets_training_day_summaries_delete
+after delete on public.sets
+referencing old table as old_rows
+for each statement
+execute function public.apply_training_day_summary_changes();
+
+-- No column list: trg_sync_machine_muscle_fields rewrites muscle_groups from muscle_profile in a
+-- BEFORE trigger, and column-list triggers ignore columns changed that way.
+create trigger trg_machines_refresh_training_day_summaries
+after update on public.machines
+for each row
+when (old.movement is distinct from new.movement or old.muscle_groups is distinct from new.muscle_groups)
+execute function public.refresh_machine_training_day_summaries();
+
+truncate public.training_day_summaries;
+insert into public.training_day_summaries (
+  user_id,
+  training_date,
+  training_bucket_id,
+  started_at,
+  ended_at,
+  set_count,
+  exercises,
+  muscle_groups_trained
+)
+select
+  st.user_id,
+  st.training_date,
+  st.training_bucket_id,
+  min(st.logged_at),
+  max(st.logged_at),
+  count(st.id),
+  array_agg(distinct m.movement) filter (where m.movement is not null),
+  array_agg(distinct mg) filter (where mg is not null)
+from public.sets st
+left join public.machines m on m.id = st.machine_id
+left join lateral unnest(m.muscle_groups) as mg on true
+group by st.user_id, st.training_date, st.training_bucket_id;
+
+create or replace view public.session_summaries
+with (security_invoker = true) as
+select
+  s.user_id,
+  s.training_date,
+  s.training_bucket_id,
+  s.started_at,
+  s.ended_at,
+  s.set_count,
+  s.exercises,
+  s.muscle_groups_trained
+from public.training_day_summaries s;
+
+commit;
@@ -0,0 +1,37 @@
+-- Non-destructive incremental migration.
+-- Per-training-day digest of a user's sets by (machine_id, set_type), the inputs plan adherence
+-- matches on. GET /api/plans/adherence keys its cached closed days on it, so any insert, delete,
+-- move or set_type/machine edit on a past day invalidates that day's cached result.
+
+begin;
+
+create or replace function public.training_day_set_digests(
+  p_user_id uuid,
+  p_first_day date,
+  p_last_day date
+)
+returns table (training_date date, set_digest text)
+language sql
+stable
+set search_path = public
+as $$
+  -- Served by idx_sets_cluster (user_id, training_date, ...); a week holds a few hundred sets at most.
+  select
+    g.training_date,
+    md5(string_agg(format('%s:%s:%s', coalesce(g.machine_id::text, ''), g.set_type, g.set_count), ',' order by g.machine_id::text nulls first, g.set_type))
+  from (
+    select st.training_date, st.machine_id, st.set_type, count(*) as set_count
+    from public.sets st
+    where st.user_id = p_user_id
+      and st.training_date between p_first_day and p_last_day
+    group by 1, 2, 3
+  ) g
+  group by g.training_date
+  order by g.training_date;
+$$;
+
+-- Called by the backend (service role) only.
+revoke all on function public.training_day_set_digests(uuid, date, date) from public, anon, authenticated;
+grant execute on function public.training_day_set_digests(uuid, date, date) to service_role;
+
+commit;
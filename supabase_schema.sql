@@ -130,9 +130,12 @@ $$;
 -- Drop in dependency order for clean re-apply during development.
 drop view if exists public.session_summaries;
 drop view if exists public.equipment_set_counts;
+drop table if exists public.weekly_trend_job_checkpoints cascade;
 drop table if exists public.analysis_reports cascade;
 drop table if exists public.recommendation_scopes cascade;
 drop table if exists public.soreness_reports cascade;
+drop table if exists public.equipment_daily_set_counts cascade;
+drop table if exists public.training_day_summaries cascade;
 drop table if exists public.sets cascade;
 drop table if exists public.sessions cascade;
 drop table if exists public.plan_items cascade;
@@ -686,8 +689,9 @@ create policy "Users manage own recommendation scopes" on public.recommendation_
 create index idx_recommendation_scopes_user on public.recommendation_scopes(user_id, created_at desc);
 
 -- ─── ANALYSIS REPORTS (persisted recommendation + trend outputs) ─
+-- Range-partitioned by month on created_at; see prune_analysis_reports for the retention policy.
 create table public.analysis_reports (
-  id uuid primary key default uuid_generate_v4(),
+  id uuid not null default uuid_generate_v4(),
   user_id uuid not null references auth.users(id) on delete cascade,
   recommendation_scope_id uuid references public.recommendation_scopes(id) on delete set null,
   report_type text not null default 'recommendation' check (report_type in ('recommendation', 'weekly_trend')),
@@ -697,8 +701,46 @@ create table public.analysis_reports (
   payload jsonb not null default '{}'::jsonb,
   evidence jsonb not null default '[]'::jsonb,
   metadata jsonb not null default '{}'::jsonb,
-  created_at timestamptz not null default now()
-);
+  created_at timestamptz not null default now(),
+  primary key (id, created_at)
+) partition by range (created_at);
+
+-- Catches rows outside the pre-created monthly range (e.g. backfilled timestamps).
+create table public.analysis_reports_default partition of public.analysis_reports default;
+
+create or replace function public.ensure_analysis_reports_partitions(
+  p_from date default current_date,
+  p_months_ahead int default 3
+)
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_month date := date_trunc('month', p_from)::date;
+  v_last date := (date_trunc('month', current_date) + make_interval(months => p_months_ahead))::date;
+  v_name text;
+  v_created int := 0;
+begin
+  while v_month <= v_last loop
+    v_name := format('analysis_reports_y%sm%s', to_char(v_month, 'YYYY'), to_char(v_month, 'MM'));
+    if to_regclass(format('public.%I', v_name)) is null then
+      execute format(
+        'create table public.%I partition of public.analysis_reports for values from (%L) to (%L)',
+        v_name,
+        v_month,
+        (v_month + interval '1 month')::date
+      );
+      v_created := v_created + 1;
+    end if;
+    v_month := (v_month + interval '1 month')::date;
+  end loop;
+  return v_created;
+end;
+$$;
+
+select public.ensure_analysis_reports_partitions();
 
 alter table public.analysis_reports enable row level security;
 create policy "Users manage own analysis reports" on public.analysis_reports
@@ -708,22 +750,521 @@ create policy "Users manage own analysis reports" on public.analysis_reports
 create index idx_analysis_reports_user_created on public.analysis_reports(user_id, created_at desc);
 create index idx_analysis_reports_user_type_created on public.analysis_reports(user_id, report_type, created_at desc);
 
--- ─── HELPER VIEW (training-day summaries) ───────────────────
+create or replace function public.prune_analysis_reports(
+  p_keep_latest int default 20,
+  p_snapshot_months int default 12,
+  p_batch_size int default 1000
+)
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_horizon timestamptz := date_trunc('month', now()) - make_interval(months => p_snapshot_months);
+  v_deleted int;
+begin
+  if p_keep_latest < 1 then
+    raise exception 'p_keep_latest must be at least 1';
+  end if;
+
+  -- Every step is an index probe on idx_analysis_reports_user_type_created, so a batch
+  -- never ranks the whole table: walk the distinct (user_id, report_type) groups, find
+  -- each group's p_keep_latest-th newest created_at once, and only look at older rows.
+  -- Ties at the cutoff (and at a month's newest report) are kept.
+  with recursive report_groups as (
+    (
+      select user_id, report_type
+      from public.analysis_reports
+      order by user_id, report_type
+      limit 1
+    )
+    union all
+    select next_group.user_id, next_group.report_type
+    from report_groups g
+    cross join lateral (
+      select r.user_id, r.report_type
+      from public.analysis_reports r
+      where (r.user_id, r.report_type) > (g.user_id, g.report_type)
+      order by r.user_id, r.report_type
+      limit 1
+    ) next_group
+  ),
+  cutoffs as (
+    select g.user_id, g.report_type, kept.created_at as cutoff
+    from report_groups g
+    cross join lateral (
+      select r.created_at
+      from public.analysis_reports r
+      where r.user_id = g.user_id
+        and r.report_type = g.report_type
+      order by r.created_at desc
+      offset p_keep_latest - 1
+      limit 1
+    ) kept
+  ),
+  expired as (
+    select old.id, old.created_at
+    from cutoffs c
+    cross join lateral (
+      select r.id, r.created_at
+      from public.analysis_reports r
+      where r.user_id = c.user_id
+        and r.report_type = c.report_type
+        and r.created_at < c.cutoff
+        and (
+          r.created_at < v_horizon
+          -- Inside the horizon the newest report of each month is kept as its snapshot.
+          or exists (
+            select 1
+            from public.analysis_reports newer
+            where newer.user_id = r.user_id
+              and newer.report_type = r.report_type
+              and newer.created_at > r.created_at
+              and newer.created_at < date_trunc('month', r.created_at) + interval '1 month'
+          )
+        )
+      order by r.created_at
+      limit p_batch_size
+    ) old
+    limit p_batch_size
+  )
+  delete from public.analysis_reports r
+  using expired e
+  where r.id = e.id
+    and r.created_at = e.created_at;
+
+  get diagnostics v_deleted = row_count;
+  return v_deleted;
+end;
+$$;
+
+create or replace function public.drop_expired_analysis_report_partitions(
+  p_keep_latest int default 20,
+  p_snapshot_months int default 12
+)
+returns int
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_horizon date := (date_trunc('month', current_date) - make_interval(months => p_snapshot_months))::date;
+  v_partition record;
+  v_month_end date;
+  v_has_retained boolean;
+  v_dropped int := 0;
+begin
+  for v_partition in
+    select child.relname
+    from pg_inherits
+    join pg_class parent on parent.oid = pg_inherits.inhparent
+    join pg_class child on child.oid = pg_inherits.inhrelid
+    join pg_namespace ns on ns.oid = parent.relnamespace
+    where ns.nspname = 'public'
+      and parent.relname = 'analysis_reports'
+      and child.relname ~ '^analysis_reports_y[0-9]{4}m[0-9]{2}$'
+    order by child.relname
+  loop
+    v_month_end := (to_date(substr(v_partition.relname, 19), 'YYYY"m"MM') + interval '1 month')::date;
+    continue when v_month_end > v_horizon;
+
+    -- Past the snapshot horizon only the newest p_keep_latest reports per user/type survive.
+    execute format(
+      'select exists (
+         select 1
+         from public.%I r
+         where (
+           select count(*)
+           from (
+             select 1
+             from public.analysis_reports newer
+             where newer.user_id = r.user_id
+               and newer.report_type = r.report_type
+               and newer.created_at > r.created_at
+             limit $1
+           ) newer_rows
+         ) < $1
+       )',
+      v_partition.relname
+    )
+    into v_has_retained
+    using p_keep_latest;
+
+    if not v_has_retained then
+      execute format('drop table public.%I', v_partition.relname);
+      v_dropped := v_dropped + 1;
+    end if;
+  end loop;
+  return v_dropped;
+end;
+$$;
+
+-- Maintenance functions are for the backend (service role) only.
+revoke all on function public.ensure_analysis_reports_partitions(date, int) from public, anon, authenticated;
+revoke all on function public.prune_analysis_reports(int, int, int) from public, anon, authenticated;
+revoke all on function public.drop_expired_analysis_report_partitions(int, int) from public, anon, authenticated;
+grant execute on function public.ensure_analysis_reports_partitions(date, int) to service_role;
+grant execute on function public.prune_analysis_reports(int, int, int) to service_role;
+grant execute on function public.drop_expired_analysis_report_partitions(int, int) to service_role;
+
+-- ─── WEEKLY TREND JOB CHECKPOINTS (service role only) ───────
+create table public.weekly_trend_job_checkpoints (
+  run_id text not null,
+  user_id uuid not null references auth.users(id) on delete cascade,
+  shard_index int not null default 0 check (shard_index >= 0),
+  report_id uuid,
+  completed_at timestamptz not null default now(),
+  primary key (run_id, user_id)
+);
+
+alter table public.weekly_trend_job_checkpoints enable row level security;
+create index idx_weekly_trend_job_checkpoints_completed on public.weekly_trend_job_checkpoints(completed_at);
+
+-- ─── TRAINING DAY SUMMARIES (trigger-maintained, backs session_summaries) ──────
+create table public.training_day_summaries (
+  user_id uuid not null references auth.users(id) on delete cascade,
+  training_date date not null,
+  training_bucket_id text not null,
+  started_at timestamptz not null,
+  ended_at timestamptz not null,
+  set_count bigint not null check (set_count > 0),
+  exercises text[],
+  muscle_groups_trained text[],
+  primary key (user_id, training_date, training_bucket_id)
+);
+
+alter table public.training_day_summaries enable row level security;
+-- Rows are written only by the sets/machines triggers below (security definer).
+create policy "Users read own training day summaries" on public.training_day_summaries
+  for select
+  using ((select auth.uid()) = user_id);
+
+create or replace function public.refresh_training_day_summaries(
+  p_user_ids uuid[],
+  p_training_dates date[],
+  p_training_bucket_ids text[]
+)
+returns void
+language plpgsql
+set search_path = public
+as $$
+begin
+  if coalesce(cardinality(p_user_ids), 0) = 0 then
+    return;
+  end if;
+
+  -- Serialize refreshes per user so a concurrent writer's recomputation cannot overwrite a
+  -- newer one. One lock per user rather than per day keeps bulk statements (imports, account
+  -- deletion) within max_locks_per_transaction.
+  perform pg_advisory_xact_lock(hashtextextended(format('training-day-summary:%s', user_id::text), 0))
+  from (select distinct unnest(p_user_ids) as user_id order by 1) locked_users;
+
+  delete from public.training_day_summaries s
+  using unnest(p_user_ids, p_training_dates, p_training_bucket_ids) as d(user_id, training_date, training_bucket_id)
+  where s.user_id = d.user_id
+    and s.training_date = d.training_date
+    and s.training_bucket_id = d.training_bucket_id;
+
+  -- A training day holds at most a few dozen sets, so recomputing it from sets is cheap
+  -- and keeps min/max and distinct arrays exact without per-value reference counts.
+  insert into public.training_day_summaries (
+    user_id,
+    training_date,
+    training_bucket_id,
+    started_at,
+    ended_at,
+    set_count,
+    exercises,
+    muscle_groups_trained
+  )
+  select
+    st.user_id,
+    st.training_date,
+    st.training_bucket_id,
+    min(st.logged_at),
+    max(st.logged_at),
+    count(st.id),
+    array_agg(distinct m.movement) filter (where m.movement is not null),
+    array_agg(distinct mg) filter (where mg is not null)
+  from (
+    select distinct user_id, training_date, training_bucket_id
+    from unnest(p_user_ids, p_training_dates, p_training_bucket_ids) as d(user_id, training_date, training_bucket_id)
+  ) d
+  join public.sets st
+    on st.user_id = d.user_id
+    and st.training_date = d.training_date
+    and st.training_bucket_id = d.training_bucket_id
+  left join public.machines m on m.id = st.machine_id
+  left join lateral unnest(m.muscle_groups) as mg on true
+  group by st.user_id, st.training_date, st.training_bucket_id;
+end;
+$$;
+
+create or replace function public.apply_training_day_summary_changes()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_user_ids uuid[];
+  v_training_dates date[];
+  v_training_bucket_ids text[];
+begin
+  if tg_op = 'INSERT' then
+    select array_agg(user_id), array_agg(training_date), array_agg(training_bucket_id)
+    into v_user_ids, v_training_dates, v_training_bucket_ids
+    from (select distinct user_id, training_date, training_bucket_id from new_rows) changed_days;
+  elsif tg_op = 'DELETE' then
+    select array_agg(user_id), array_agg(training_date), array_agg(training_bucket_id)
+    into v_user_ids, v_training_dates, v_training_bucket_ids
+    from (select distinct user_id, training_date, training_bucket_id from old_rows) changed_days;
+  else
+    -- Only updates that move a set or change what it contributes touch summaries;
+    -- cluster recomputation and reps/weight edits are skipped.
+    select array_agg(user_id), array_agg(training_date), array_agg(training_bucket_id)
+    into v_user_ids, v_training_dates, v_training_bucket_ids
+    from (
+      select o.user_id, o.training_date, o.training_bucket_id
+      from old_rows o
+      join new_rows n on n.id = o.id
+      where (o.user_id, o.training_date, o.training_bucket_id, o.logged_at, o.machine_id)
+        is distinct from (n.user_id, n.training_date, n.training_bucket_id, n.logged_at, n.machine_id)
+      union
+      select n.user_id, n.training_date, n.training_bucket_id
+      from old_rows o
+      join new_rows n on n.id = o.id
+      where (o.user_id, o.training_date, o.training_bucket_id, o.logged_at, o.machine_id)
+        is distinct from (n.user_id, n.training_date, n.training_bucket_id, n.logged_at, n.machine_id)
+    ) changed_days;
+  end if;
+
+  perform public.refresh_training_day_summaries(v_user_ids, v_training_dates, v_training_bucket_ids);
+  return null;
+end;
+$$;
+
+create or replace function public.refresh_machine_training_day_summaries()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_user_ids uuid[];
+  v_training_dates date[];
+  v_training_bucket_ids text[];
+begin
+  select array_agg(user_id), array_agg(training_date), array_agg(training_bucket_id)
+  into v_user_ids, v_training_dates, v_training_bucket_ids
+  from (
+    select distinct st.user_id, st.training_date, st.training_bucket_id
+    from public.sets st
+    where st.user_id = new.user_id
+      and st.machine_id = new.id
+  ) affected_days;
+
+  perform public.refresh_training_day_summaries(v_user_ids, v_training_dates, v_training_bucket_ids);
+  return null;
+end;
+$$;
+
+revoke all on function public.refresh_training_day_summaries(uuid[], date[], text[]) from public, anon, authenticated;
+
+
+create trigger trg_sets_training_day_summaries_insert
+after insert on public.sets
+referencing new table as new_rows
+for each statement
+execute function public.apply_training_day_summary_changes();
+
+create trigger trg_sets_training_day_summaries_update
+after update on public.sets
+referencing old table as old_rows new table as new_rows
+for each statement
+execute function public.apply_training_day_summary_changes();
+
+create trigger trg_sets_training_day_summaries_delete
+after delete on public.sets
+referencing old table as old_rows
+for each statement
+execute function public.apply_training_day_summary_changes();
+
+-- No column list: trg_sync_machine_muscle_fields rewrites muscle_groups from muscle_profile in a
+-- BEFORE trigger, and column-list triggers ignore columns changed that way.
+create trigger trg_machines_refresh_training_day_summaries
+after update on public.machines
+for each row
+when (old.movement is distinct from new.movement or old.muscle_groups is distinct from new.muscle_groups)
+execute function public.refresh_machine_training_day_summaries();
+
 create or replace view public.session_summaries
 with (security_invoker = true) as
 select
-  st.user_id,
-  st.training_date,
-  st.training_bucket_id,
-  min(st.logged_at) as started_at,
-  max(st.logged_at) as ended_at,
-  count(st.id) as set_count,
-  array_agg(distinct m.movement) filter (where m.movement is not null) as exercises,
-  array_agg(distinct mg) filter (where mg is not null) as muscle_groups_trained
-from public.sets st
-left join public.machines m on m.id = st.machine_id
-left join lateral unnest(m.muscle_groups) as mg on true
-group by st.user_id, st.training_date, st.training_bucket_id;
+  s.user_id,
+  s.training_date,
+  s.training_bucket_id,
+  s.started_at,
+  s.ended_at,
+  s.set_count,
+  s.exercises,
+  s.muscle_groups_trained
+from public.training_day_summaries s;
+
+-- Per-day (machine_id, set_type) digest; GET /api/plans/adherence keys cached closed days on it.
+create or replace function public.training_day_set_digests(
+  p_user_id uuid,
+  p_first_day date,
+  p_last_day date
+)
+returns table (training_date date, set_digest text)
+language sql
+stable
+set search_path = public
+as $$
+  -- Served by idx_sets_cluster (user_id, training_date, ...); a week holds a few hundred sets at most.
+  select
+    g.training_date,
+    md5(string_agg(format('%s:%s:%s', coalesce(g.machine_id::text, ''), g.set_type, g.set_count), ',' order by g.machine_id::text nulls first, g.set_type))
+  from (
+    select st.training_date, st.machine_id, st.set_type, count(*) as set_count
+    from public.sets st
+    where st.user_id = p_user_id
+      and st.training_date between p_first_day and p_last_day
+    group by 1, 2, 3
+  ) g
+  group by g.training_date
+  order by g.training_date;
+$$;
+
+-- Called by the backend (service role) only.
+revoke all on function public.training_day_set_digests(uuid, date, date) from public, anon, authenticated;
+grant execute on function public.training_day_set_digests(uuid, date, date) to service_role;
+
+-- ─── EQUIPMENT DAILY SET COUNTS (trigger-maintained, backs equipment_set_counts) ─
+create table public.equipment_daily_set_counts (
+  user_id uuid not null references auth.users(id) on delete cascade,
+  machine_id uuid not null references public.machines(id) on delete cascade,
+  day date not null,
+  set_count int not null check (set_count > 0),
+  primary key (user_id, machine_id, day)
+);
+
+alter table public.equipment_daily_set_counts enable row level security;
+-- Rows are written only by the sets triggers below (security definer).
+create policy "Users read own equipment daily set counts" on public.equipment_daily_set_counts
+  for select
+  using ((select auth.uid()) = user_id);
+
+create or replace function public.apply_equipment_daily_set_count_changes()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_user_ids uuid[];
+  v_machine_ids uuid[];
+  v_days date[];
+  v_deltas int[];
+begin
+  -- Net per-key deltas: updates that keep user, machine and UTC day (cluster recomputation,
+  -- reps/weight edits) cancel out and touch nothing.
+  if tg_op = 'INSERT' then
+    select array_agg(user_id), array_agg(machine_id), array_agg(day), array_agg(delta)
+    into v_user_ids, v_machine_ids, v_days, v_deltas
+    from (
+      select user_id, machine_id, (logged_at at time zone 'UTC')::date as day, count(*)::int as delta
+      from new_rows
+      where machine_id is not null
+      group by 1, 2, 3
+    ) changes;
+  elsif tg_op = 'DELETE' then
+    select array_agg(user_id), array_agg(machine_id), array_agg(day), array_agg(delta)
+    into v_user_ids, v_machine_ids, v_days, v_deltas
+    from (
+      select user_id, machine_id, (logged_at at time zone 'UTC')::date as day, -count(*)::int as delta
+      from old_rows
+      where machine_id is not null
+      group by 1, 2, 3
+    ) changes;
+  else
+    select array_agg(user_id), array_agg(machine_id), array_agg(day), array_agg(delta)
+    into v_user_ids, v_machine_ids, v_days, v_deltas
+    from (
+      select user_id, machine_id, day, sum(delta)::int as delta
+      from (
+        select user_id, machine_id, (logged_at at time zone 'UTC')::date as day, 1 as delta
+        from new_rows
+        where machine_id is not null
+        union all
+        select user_id, machine_id, (logged_at at time zone 'UTC')::date as day, -1 as delta
+        from old_rows
+        where machine_id is not null
+      ) row_changes
+      group by 1, 2, 3
+      having sum(delta) <> 0
+    ) changes;
+  end if;
+
+  if v_user_ids is null then
+    return null;
+  end if;
+
+  -- Serialize per user so a concurrent decrement cannot delete a row another transaction just
+  -- incremented. One lock per user rather than per key keeps bulk statements (imports,
+  -- account deletion) within max_locks_per_transaction.
+  perform pg_advisory_xact_lock(hashtextextended(format('equipment-daily-set-count:%s', user_id::text), 0))
+  from (select distinct unnest(v_user_ids) as user_id order by 1) locked_users;
+
+  insert into public.equipment_daily_set_counts as c (user_id, machine_id, day, set_count)
+  select d.user_id, d.machine_id, d.day, d.delta
+  from unnest(v_user_ids, v_machine_ids, v_days, v_deltas) as d(user_id, machine_id, day, delta)
+  where d.delta > 0
+  on conflict (user_id, machine_id, day)
+  do update set set_count = c.set_count + excluded.set_count;
+
+  delete from public.equipment_daily_set_counts c
+  using unnest(v_user_ids, v_machine_ids, v_days, v_deltas) as d(user_id, machine_id, day, delta)
+  where d.delta < 0
+    and c.user_id = d.user_id
+    and c.machine_id = d.machine_id
+    and c.day = d.day
+    and c.set_count <= -d.delta;
+
+  update public.equipment_daily_set_counts c
+  set set_count = c.set_count + d.delta
+  from unnest(v_user_ids, v_machine_ids, v_days, v_deltas) as d(user_id, machine_id, day, delta)
+  where d.delta < 0
+    and c.user_id = d.user_id
+    and c.machine_id = d.machine_id
+    and c.day = d.day;
+
+  return null;
+end;
+$$;
+
+-- Transition tables cannot be combined with column lists or multi-event triggers,
+-- so each event gets its own statement-level trigger.
+
+create trigger trg_sets_equipment_counts_insert
+after insert on public.sets
+referencing new table as new_rows
+for each statement
+execute function public.apply_equipment_daily_set_count_changes();
+
+create trigger trg_sets_equipment_counts_update
+after update on public.sets
+referencing old table as old_rows new table as new_rows
+for each statement
+execute function public.apply_equipment_daily_set_count_changes();
+
+create trigger trg_sets_equipment_counts_delete
+after delete on public.sets
+referencing old table as old_rows
+for each statement
+execute function public.apply_equipment_daily_set_count_changes();
 
 -- Canonical equipment volume signal for favorites/recommendations.
 -- Edge cases:
@@ -732,16 +1273,59 @@ group by st.user_id, st.training_date, st.training_bucket_id;
 --   * Ties: rank columns remain deterministic by applying machine_id as a secondary sort key.
 create or replace view public.equipment_set_counts
 with (security_invoker = true) as
-with machine_set_counts as (
+with windows as not materialized (
+  select
+    now() - interval '30 days' as start_30d,
+    now() - interval '90 days' as start_90d,
+    ((now() - interval '30 days') at time zone 'UTC')::date as first_day_30d,
+    ((now() - interval '90 days') at time zone 'UTC')::date as first_day_90d
+),
+daily_set_counts as (
+  -- Whole UTC days after the day each window starts in.
+  select
+    c.user_id,
+    c.machine_id,
+    coalesce(sum(c.set_count) filter (where c.day > w.first_day_30d), 0)::bigint as sets_30d,
+    coalesce(sum(c.set_count) filter (where c.day > w.first_day_90d), 0)::bigint as sets_90d,
+    sum(c.set_count)::bigint as sets_all
+  from public.equipment_daily_set_counts c
+  cross join windows w
+  group by c.user_id, c.machine_id
+),
+boundary_set_counts as (
+  -- The day a window starts in is only partly inside it, so its sets are counted from the
+  -- raw rows (idx_sets_user_logged); this keeps the rolling now()-relative windows.
   select
     st.user_id,
     st.machine_id,
-    count(*) filter (where st.logged_at >= now() - interval '30 days')::bigint as sets_30d,
-    count(*) filter (where st.logged_at >= now() - interval '90 days')::bigint as sets_90d,
-    count(*)::bigint as sets_all
+    count(*) filter (
+      where st.logged_at >= w.start_30d
+        and st.logged_at < (w.first_day_30d + 1)::timestamp at time zone 'UTC'
+    )::bigint as sets_30d,
+    count(*) filter (
+      where st.logged_at >= w.start_90d
+        and st.logged_at < (w.first_day_90d + 1)::timestamp at time zone 'UTC'
+    )::bigint as sets_90d
   from public.sets st
+  cross join windows w
   where st.machine_id is not null
+    and (
+      (st.logged_at >= w.start_30d and st.logged_at < (w.first_day_30d + 1)::timestamp at time zone 'UTC')
+      or (st.logged_at >= w.start_90d and st.logged_at < (w.first_day_90d + 1)::timestamp at time zone 'UTC')
+    )
   group by st.user_id, st.machine_id
+),
+machine_set_counts as (
+  select
+    d.user_id,
+    d.machine_id,
+    d.sets_30d + coalesce(b.sets_30d, 0) as sets_30d,
+    d.sets_90d + coalesce(b.sets_90d, 0) as sets_90d,
+    d.sets_all
+  from daily_set_counts d
+  left join boundary_set_counts b
+    on b.user_id = d.user_id
+   and b.machine_id = d.machine_id
 )
 select
   msc.user_id,
@@ -753,3 +1337,4 @@ select
   rank() over (partition by msc.user_id order by msc.sets_90d desc, msc.machine_id) as rank_90d,
   rank() over (partition by msc.user_id order by msc.sets_all desc, msc.machine_id) as rank_all
 from machine_set_counts msc;
+